@@ -0,0 +1,294 @@
+"""
+Batch Dashboard - Many questions to one multi-sheet QuickSight analysis.
+
+The chat workflow turns one question into one visual and one create_analysis
+call. A batch runs a list of questions through the data insights and visual
+planning stages concurrently (at most BATCH_DASHBOARD_CONCURRENCY questions at
+a time), compiles every plan into a visual with its own IDs, lays the visuals
+out on a grid across one or more sheets, and publishes the merged Definition
+with a single analysis creation job.
+
+Visual IDs are derived from the question text, so rebuilding the same
+dashboard keeps the same IDs. A question that cannot be answered or planned
+is reported and left out; the rest of the dashboard is still published.
+
+Usage:
+    python -m src.agents.batch_dashboard --name "Weekly Review" questions.txt
+
+questions.txt holds one question per line; a "## Sheet name" line starts a
+new sheet, and lines starting with "#" are comments.
+"""
+
+from dataclasses import dataclass, field
+from typing import Optional, Dict, Any, List, Union
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import time
+
+from .data_insights_agent import answer_question
+from .visual_coordinator_agent import plan_visual
+from .tools.definition_compiler import compile_visual, compile_calculated_fields, normalize_plan
+from .tools.visual_creator import add_dataset_identifier
+from .tools.visual_plan import VisualPlan
+from ..memory.context_window import ContextRecord
+from ..services.analysis_jobs import ANALYSIS_JOBS, AnalysisJob
+from ..services.stage_runner import StageFailedError
+from ..instrumentation import span, payload_size, KIND_STAGE
+
+# Questions answered and planned at the same time
+BATCH_DASHBOARD_CONCURRENCY = int(os.getenv("BATCH_DASHBOARD_CONCURRENCY", "4"))
+# Visuals per sheet for questions without an explicit sheet
+DASHBOARD_VISUALS_PER_SHEET = int(os.getenv("DASHBOARD_VISUALS_PER_SHEET", "6"))
+
+# QuickSight grid layouts are 36 columns wide; two visuals per row
+GRID_COLUMNS = 36
+GRID_VISUAL_COLUMN_SPAN = 18
+GRID_VISUAL_ROW_SPAN = 12
+
+
+@dataclass
+class DashboardQuestion:
+    """One question of a batch and the sheet its visual goes on (None: next page)"""
+
+    question: str
+    sheet: Optional[str] = None
+
+
+@dataclass
+class DashboardItem:
+    """Outcome of one question: its plan and compiled visual, or the error"""
+
+    question: str
+    sheet: Optional[str]
+    visual_id: str
+    plan: Optional[VisualPlan] = None
+    visual: Optional[Dict[str, Any]] = None
+    calculated_fields: List[Dict[str, str]] = field(default_factory=list)
+    error: Optional[str] = None
+    elapsed_ms: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return self.visual is not None and self.error is None
+
+    def as_dict(self) -> Dict[str, Any]:
+        item = {"question": self.question, "visual_id": self.visual_id, "elapsed_ms": round(self.elapsed_ms, 1)}
+        if self.ok:
+            item["visual_type"] = next(iter(self.visual))
+        else:
+            item["error"] = self.error
+        return item
+
+
+@dataclass
+class BatchDashboard:
+    """A merged multi-sheet definition and the job publishing it"""
+
+    name: str
+    analysis_id: str
+    items: List[DashboardItem]
+    definition: Optional[Dict[str, Any]] = None
+    job: Optional[AnalysisJob] = None
+    elapsed_ms: float = 0.0
+
+    @property
+    def failed(self) -> List[DashboardItem]:
+        return [item for item in self.items if not item.ok]
+
+    def as_dict(self) -> Dict[str, Any]:
+        """JSON-friendly summary for tools and the CLI"""
+        sheets = self.definition["Definition"]["Sheets"] if self.definition else []
+        return {
+            "status": "submitted" if self.job is not None else ("built" if self.definition else "failed"),
+            "analysis_name": self.name,
+            "analysis_id": self.analysis_id,
+            "sheets": [{"name": sheet["Name"], "visuals": len(sheet["Visuals"])} for sheet in sheets],
+            "visuals": len(self.items) - len(self.failed),
+            "failed": [item.as_dict() for item in self.failed],
+            "job": self.job.as_dict() if self.job is not None else None,
+            "elapsed_ms": round(self.elapsed_ms, 1),
+        }
+
+
+def visual_id_for(question: str, used: Dict[str, int]) -> str:
+    """Stable visual ID from the question text; repeated questions get a suffix"""
+    digest = hashlib.sha1(" ".join(question.lower().split()).encode()).hexdigest()[:12]
+    base = f"visual-{digest}"
+    used[base] = used.get(base, 0) + 1
+    return base if used[base] == 1 else f"{base}-{used[base]}"
+
+
+def parse_questions(text: str) -> List[DashboardQuestion]:
+    """Questions file: one per line, "## Sheet name" starts a sheet, "#" lines are comments"""
+    questions = []
+    sheet = None
+    for line in text.splitlines():
+        line = line.strip()
+        if line.startswith("##"):
+            sheet = line.lstrip("#").strip() or None
+        elif line and not line.startswith("#"):
+            questions.append(DashboardQuestion(line, sheet))
+    return questions
+
+
+def grid_layout(visual_ids: List[str]) -> Dict[str, Any]:
+    """Grid layout placing the visuals left to right, top to bottom"""
+    per_row = GRID_COLUMNS // GRID_VISUAL_COLUMN_SPAN
+    elements = [
+        {
+            "ElementId": visual_id,
+            "ElementType": "VISUAL",
+            "ColumnIndex": (position % per_row) * GRID_VISUAL_COLUMN_SPAN,
+            "ColumnSpan": GRID_VISUAL_COLUMN_SPAN,
+            "RowIndex": (position // per_row) * GRID_VISUAL_ROW_SPAN,
+            "RowSpan": GRID_VISUAL_ROW_SPAN,
+        }
+        for position, visual_id in enumerate(visual_ids)
+    ]
+    return {"Configuration": {"GridLayout": {"Elements": elements}}}
+
+
+def merge_visuals(name: str, items: List[DashboardItem],
+                  visuals_per_sheet: int = DASHBOARD_VISUALS_PER_SHEET) -> Dict[str, Any]:
+    """
+    Merge compiled visuals into one {"Definition": {...}} with a grid layout per sheet.
+
+    Items with a sheet name are grouped on that sheet, in first-seen order; the
+    others fill pages of visuals_per_sheet. Calculated fields are declared once;
+    an item whose calculated field clashes with an earlier one is marked failed.
+    """
+    calculated_fields: Dict[str, Dict[str, str]] = {}
+    sheets: Dict[str, List[DashboardItem]] = {}
+    pages = 0
+    unnamed = 0
+    for item in items:
+        if not item.ok:
+            continue
+        clash = next((calculated["Name"] for calculated in item.calculated_fields
+                      if calculated["Name"] in calculated_fields
+                      and calculated_fields[calculated["Name"]]["Expression"] != calculated["Expression"]), None)
+        if clash is not None:
+            item.error = f"calculated field {clash} is defined differently by another question"
+            continue
+        for calculated in item.calculated_fields:
+            calculated_fields.setdefault(calculated["Name"], calculated)
+        if item.sheet:
+            sheets.setdefault(item.sheet, []).append(item)
+            continue
+        if unnamed % visuals_per_sheet == 0:
+            pages += 1
+        unnamed += 1
+        sheets.setdefault(f"{name} ({pages})" if pages > 1 else name, []).append(item)
+
+    definition: Dict[str, Any] = {
+        "Sheets": [
+            {
+                "SheetId": f"sheet{position}",
+                "Name": sheet_name,
+                "Visuals": [item.visual for item in sheet_items],
+                "Layouts": [grid_layout([item.visual_id for item in sheet_items])],
+            }
+            for position, (sheet_name, sheet_items) in enumerate(sheets.items(), start=1)
+        ]
+    }
+    if calculated_fields:
+        definition["CalculatedFields"] = list(calculated_fields.values())
+    return {"Definition": definition}
+
+
+async def _build_item(item: DashboardItem, semaphore: asyncio.Semaphore):
+    """Answer, plan and compile one question; errors are recorded on the item"""
+    async with semaphore:
+        started = time.perf_counter()
+        with span("batch_dashboard.question", KIND_STAGE, visual_id=item.visual_id) as question_span:
+            try:
+                _, agent_response = await answer_question(item.question)
+                if agent_response is None:
+                    raise RuntimeError("the knowledge base returned no SQL answer")
+                latest_context = ContextRecord.from_pair(item.question, agent_response)
+                item.plan = await plan_visual(item.question, latest_context, latest_context.to_prompt())
+                plan = normalize_plan(item.plan.to_plan_dict())
+                # The question doubles as the subtitle, so each chart says what it answers
+                plan.setdefault("SUBTITLE", item.question)
+                item.visual = compile_visual(plan, visual_id=item.visual_id, field_id_prefix=f"{item.visual_id}.")
+                item.calculated_fields = compile_calculated_fields(plan)
+            except Exception as e:
+                if isinstance(e, StageFailedError) and e.error is not None:
+                    e = e.error
+                item.error = str(e)
+                print(f"\n⚠️ Dashboard question failed ({item.question}): {item.error} \n")
+            item.elapsed_ms = (time.perf_counter() - started) * 1000
+            question_span.set(ok=item.ok)
+
+
+async def build_dashboard(questions: List[Union[str, DashboardQuestion]], name: str,
+                          analysis_id: Optional[str] = None, publish: bool = True,
+                          concurrency: int = BATCH_DASHBOARD_CONCURRENCY,
+                          session_id: Optional[str] = None) -> BatchDashboard:
+    """
+    Build one multi-sheet analysis from a list of questions.
+
+    Args:
+        questions: Question strings, or DashboardQuestion entries with a sheet name
+        name: Analysis display name (also the sheet name of unnamed pages)
+        analysis_id: Analysis ID; defaults to the name without spaces
+        publish: Submit the analysis creation job; False only builds the definition
+        concurrency: Questions answered and planned at the same time
+        session_id: Conversation the publishing job belongs to (None for scripts)
+
+    Returns:
+        BatchDashboard with the per-question outcomes, the merged definition and the job
+    """
+    started = time.perf_counter()
+    analysis_id = analysis_id or "".join(name.split())
+    used_ids: Dict[str, int] = {}
+    items = []
+    for entry in questions:
+        if isinstance(entry, str):
+            entry = DashboardQuestion(entry)
+        items.append(DashboardItem(entry.question, entry.sheet, visual_id_for(entry.question, used_ids)))
+    batch = BatchDashboard(name, analysis_id, items)
+
+    with span("batch_dashboard.build", KIND_STAGE, questions=len(items), concurrency=concurrency) as build_span:
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+        await asyncio.gather(*(_build_item(item, semaphore) for item in items))
+        if any(item.ok for item in items):
+            batch.definition = add_dataset_identifier(merge_visuals(name, items))
+            build_span.set(definition_bytes=payload_size(batch.definition), failed=len(batch.failed))
+            if publish:
+                # One creation job for the whole dashboard
+                batch.job = ANALYSIS_JOBS.submit(batch.definition, name, analysis_id, session_id)
+    batch.elapsed_ms = (time.perf_counter() - started) * 1000
+    print(f"\n📊 Dashboard {name}: {len(items) - len(batch.failed)} of {len(items)} visuals "
+          f"in {batch.elapsed_ms:.0f} ms\n")
+    return batch
+
+
+def main():
+    """Build (and by default publish) a dashboard from a questions file"""
+    parser = argparse.ArgumentParser(description="Build one multi-sheet QuickSight analysis from a list of questions")
+    parser.add_argument("questions", help="File with one question per line ('## Sheet name' starts a sheet)")
+    parser.add_argument("--name", required=True, help="Analysis name")
+    parser.add_argument("--analysis-id", default=None, help="Analysis ID (default: the name without spaces)")
+    parser.add_argument("--concurrency", type=int, default=BATCH_DASHBOARD_CONCURRENCY)
+    parser.add_argument("--no-publish", action="store_true", help="Only build the definition")
+    parser.add_argument("--output", default=None, help="Write the merged definition to this JSON file")
+    args = parser.parse_args()
+
+    with open(args.questions) as handle:
+        questions = parse_questions(handle.read())
+    batch = asyncio.run(build_dashboard(questions, args.name, args.analysis_id,
+                                        publish=not args.no_publish, concurrency=args.concurrency))
+    if args.output and batch.definition:
+        with open(args.output, "w") as handle:
+            json.dump(batch.definition, handle, indent=2)
+    if batch.job is not None:
+        ANALYSIS_JOBS.wait(batch.job.job_id)
+    print(json.dumps(batch.as_dict(), indent=2, default=str))
+
+
+if __name__ == "__main__":
+    main()
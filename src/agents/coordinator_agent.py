@@ -5,13 +5,34 @@ This agent acts as the central dispatcher, routing user requests to appropriate
 specialized agents based on the intent (data analysis vs visualization).
 """
 
-from agents import Agent, ModelSettings, function_tool, Runner
+from typing import Dict, Any, List
+from agents import Agent, ModelSettings, RunContextWrapper, function_tool, Runner
 from .data_insights_agent import data_insights_agent
 from .visual_coordinator_agent import visual_coordinator_agent
+from .batch_dashboard import build_dashboard
+from ..memory.agent_memory import AgentRunContext, memory_from_context, session_id_from_context
 
 
 
 
+@function_tool
+async def create_dashboard(ctx: RunContextWrapper[AgentRunContext], questions: List[str], dashboard_name: str) -> Dict[str, Any]:
+    """
+    Answer several questions and publish one chart per question as a single multi-sheet QuickSight analysis.
+
+    Args:
+        questions: The questions to chart, one per visual
+        dashboard_name: Name of the analysis
+    """
+    batch = await build_dashboard(questions, dashboard_name, session_id=session_id_from_context(ctx))
+    if batch.job is not None:
+        # Lets the visual coordinator's analysis_job_status report on the dashboard
+        memory = memory_from_context(ctx)
+        with memory.lock:
+            memory.set_quicksight_analysis_id(batch.analysis_id)
+            memory.set_analysis_job_id(batch.job.job_id)
+    return batch.as_dict()
+
 
 # Agent instructions defining routing logic and behavior
 INSTRUCTIONS = """
@@ -20,12 +41,15 @@ You are a Main Coordinator Agent that routes user requests to the appropriate sp
 TOOLS:
 - run_data_insights_agent: For getting data insights
 - visual_coordinator_agent: For creating visualizations
+- create_dashboard: For building one dashboard from several questions at once
 
 TOOL USAGE:
 - When the user wants to get data insights or to get answers to questions about the data :
     - HANDOFF to run_data_insights_agent
 - When the user wants to visualize the data insights :
     - HANDOFF to visual_coordinator_agent
+- When the user wants one dashboard built from a list of several questions :
+    - CALL create_dashboard with the list of questions and the dashboard name (make a meaningful name if none is given)
 
 - OUTPUT FORMAT:
     - ALWAYS ONLY return the exact output of the tool call. DO NOT add any other text or comments or formatting.
@@ -37,5 +61,6 @@ coordinator_agent = Agent(
     name="Coordinator Agent",
     model="gpt-4o-mini",
     instructions=INSTRUCTIONS,
+    tools=[create_dashboard],
     handoffs=[data_insights_agent, visual_coordinator_agent]
 )
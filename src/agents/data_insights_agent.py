@@ -5,76 +5,214 @@ This agent processes user questions about e-commerce data, creates query plans,
 retrieves results from the knowledge base, and formats responses with insights.
 """
 
-from agents import Agent, Runner, function_tool
-from .tools.insights_planner import query_planner_agent, query_KB
-from typing import Optional, Dict
-from ..memory.agent_memory import AGENT_MEMORY
+from agents import Agent, Runner, RunContextWrapper, function_tool
+from .tools.insights_planner import query_planner_agent, query_KB_async
+from .tools.schema_planner import plan_query
+from typing import Optional, Dict, Any, Tuple, Callable
+import asyncio
+import os
+from ..memory.agent_memory import AgentRunContext, memory_from_context, partial_callback_from_context
+from ..memory.answer_cache import KB_ANSWER_CACHE
+from ..services.stage_runner import StageRunner, StageFailedError
+from ..services.local_engine import LOCAL_ENGINE, QueryResult
+from .tools.sql_parser import extract_sql
+from .tools.result_profile import ResultProfile
+from ..instrumentation import span, KIND_CACHE
 
-@function_tool
-async def plan_and_retrieve(user_input: str) -> str:
+# Stage budgets for plan_and_retrieve; a planner timeout falls back to the raw question
+QUERY_PLANNER_TIMEOUT_SECONDS = float(os.getenv("QUERY_PLANNER_TIMEOUT_SECONDS", "30"))
+KB_TIMEOUT_SECONDS = float(os.getenv("KB_TIMEOUT_SECONDS", "120"))
+# Fire a raw-question KB call alongside the LLM planner, used if the planned query fails. Off by default:
+# it doubles the KB calls of every LLM-planned question, and the fallback is only needed when the planned query fails
+SPECULATIVE_KB_ENABLED = os.getenv("SPECULATIVE_KB", "0") == "1"
+
+
+def _kb_event(question: str) -> Dict[str, Any]:
+    """Format a question as a knowledge base API request"""
+    return {
+        'requestBody': {
+            'content': {
+                'application/json': {
+                    'properties': [{'name': 'question', 'value': question}]
+                }
+            }
+        }
+    }
+
+
+def _cached_answer(question: str, query_plan: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """KB answer cache lookup, recorded as a cache span"""
+    with span("kb_cache.get", KIND_CACHE) as cache_span:
+        kb_results = KB_ANSWER_CACHE.get(question, query_plan)
+        cache_span.set(cache_hit=kb_results is not None)
+    return kb_results
+
+
+def _has_answer(kb_results: Optional[Dict[str, Any]]) -> bool:
+    return bool(kb_results) and bool(kb_results.get('sql')) and bool(kb_results.get('answer'))
+
+
+async def _run_locally(sql: Optional[str]) -> Optional[QueryResult]:
+    """Execute SQL on the local engine, or None when it is unavailable or cannot run the query"""
+    if not sql or not LOCAL_ENGINE.available:
+        return None
+    try:
+        return await asyncio.to_thread(LOCAL_ENGINE.execute, sql, profile=True)
+    except Exception as e:
+        print(f"\n⚠️ Local engine could not run the query, using the knowledge base: {e} \n")
+        return None
+
+
+async def _with_local_results(kb_results: Dict[str, Any]) -> Tuple[Dict[str, Any], Optional[ResultProfile]]:
     """
-    Main tool for processing data queries.
-    Creates query plan, retrieves KB results, and stores context in memory.
+    Run the KB's SQL locally, when available, for a "sample_data" Markdown table
+    of real rows and the result profile stored with the context pair.
     """
+    if not isinstance(kb_results, dict):
+        return kb_results, None
+    local_result = await _run_locally(kb_results.get('sql'))
+    if local_result is None:
+        return kb_results, None
+    # Copy so cached KB answers stay free of row data
+    return {**kb_results, 'sample_data': local_result.as_markdown()}, local_result.profile
 
-    agent_response: Optional [Dict[str, str]] = None
-    try:
-        
-        # Step 1: Create structured query plan
+
+async def answer_question(user_input: str, on_partial: Optional[Callable[[str], None]] = None
+                          ) -> Tuple[Dict[str, Any], Optional[Dict[str, Any]]]:
+    """
+    Plan and answer one question: query plan (rules or LLM) and KB retrieval,
+    plus local sample rows and result profile when the local engine is available.
+
+    Returns:
+        (kb_results, agent_response) where agent_response is the context pair
+        response to store in memory, or None when the KB gave no SQL answer
+
+    Raises StageFailedError when the knowledge base cannot answer.
+    """
+    # Step 1: Create structured query plan, from the schema graph when confident, else via the LLM
+    rule_plan = plan_query(user_input)
+    speculate = (not rule_plan.is_confident and SPECULATIVE_KB_ENABLED
+                 and KB_ANSWER_CACHE.peek(user_input) is None)
+    runner = StageRunner("plan_and_retrieve")
+
+    async def plan():
+        if rule_plan.is_confident:
+            return rule_plan.plan_text, "rules"
         query_plan_result = await Runner.run(query_planner_agent, f"Create a query plan for this question: {user_input}")
-        query_plan = query_plan_result.final_output
-        print(f"\n🔍 Query plan: {query_plan} \n")
-        
+        return query_plan_result.final_output, "llm"
+
+    async def speculative_kb():
+        # Raw question, no partials: only used if the planned query cannot produce an answer
+        kb_results = await query_KB_async(_kb_event(user_input))
+        if _has_answer(kb_results):
+            KB_ANSWER_CACHE.put(user_input, None, kb_results)
+        return kb_results
+
+    async def kb(plan):
+        if plan is None:
+            print(f"\n⚠️ Query planner unavailable, answering the raw question \n")
+            if speculate:
+                kb_results = await runner.result("speculative_kb")
+                if kb_results is not None:
+                    return kb_results
+            return await query_KB_async(_kb_event(user_input), on_partial=on_partial)
+
         # Step 2: Combine question and plan for KB query
+        query_plan = plan[0]
         combined_input = f""" Question: {user_input} Query Plan: {query_plan}"""
-        
-        # Step 3: Format request for knowledge base API
-        event = {
-            'requestBody': {
-                'content': {
-                    'application/json': {
-                        'properties': [{'name': 'question', 'value': combined_input}]
-                    }
-                }
-            }
-        }
-        
-        # Step 4: Query knowledge base for results
-        kb_results = query_KB(event)
-        print(f"\n✅ Got KB results: {kb_results} \n")
-        
-        # Step 5: Store context and return results
-        if kb_results['sql'] and kb_results['answer']:
-            agent_response = {"query_plan": query_plan, "sql": kb_results['sql'], "insights": kb_results['answer']}
-            AGENT_MEMORY.add_data_insights_context_pair(user_input, agent_response)
-            
+
+        # Step 3: Query knowledge base for results, reusing cached answers when possible
+        kb_results = _cached_answer(user_input, query_plan)
+        if kb_results is not None:
+            print(f"\n⚡ KB cache hit: {KB_ANSWER_CACHE.stats.as_dict()} \n")
+            return kb_results
+        try:
+            kb_results = await query_KB_async(_kb_event(combined_input), on_partial=on_partial)
+        except Exception as e:
+            if not speculate:
+                raise
+            print(f"\n⚠️ Planned KB query failed ({e}), using the speculative answer \n")
+            kb_results = None
+        if _has_answer(kb_results):
+            KB_ANSWER_CACHE.put(user_input, query_plan, kb_results)
+            return kb_results
+        if speculate:
+            speculative_results = await runner.result("speculative_kb")
+            if _has_answer(speculative_results):
+                return speculative_results
+        if kb_results is None:
+            raise RuntimeError("the knowledge base returned no answer")
         return kb_results
-        
+
+    runner.add("plan", plan, timeout=QUERY_PLANNER_TIMEOUT_SECONDS, optional=True)
+    if speculate:
+        runner.add("speculative_kb", speculative_kb, timeout=KB_TIMEOUT_SECONDS, speculative=True)
+    runner.add("kb", kb, depends_on=("plan",), timeout=KB_TIMEOUT_SECONDS)
+    pipeline = await runner.run()
+
+    query_plan, planner_path = pipeline["plan"] or (None, "none")
+    kb_results, profile = await _with_local_results(pipeline["kb"])
+    print(f"\n🧭 Query planner path: {planner_path} (confidence {rule_plan.confidence:.2f}) \n")
+    print(f"\n🔍 Query plan: {query_plan} \n")
+    print(f"\n✅ Got KB results: {kb_results} \n")
+
+    agent_response = None
+    if _has_answer(kb_results):
+        agent_response = {"query_plan": query_plan, "planner_path": planner_path, "sql": kb_results['sql'],
+                          "insights": kb_results['answer'], "profile": profile}
+    return kb_results, agent_response
+
+
+@function_tool
+async def plan_and_retrieve(ctx: RunContextWrapper[AgentRunContext], user_input: str) -> str:
+    """
+    Main tool for processing data queries.
+    Creates query plan, retrieves KB results, and stores context in memory.
+    """
+    try:
+        kb_results, agent_response = await answer_question(user_input, on_partial=partial_callback_from_context(ctx))
+
+        # Step 4: Store context and return results
+        if agent_response is not None:
+            memory_from_context(ctx).add_data_insights_context_pair(user_input, agent_response)
+        return kb_results
+
     except Exception as e:
+        if isinstance(e, StageFailedError) and e.error is not None:
+            e = e.error
         error_msg = f"Sorry, I encountered an error while retrieving data: {str(e)}."
         print(f"\n❌ Error in retrieve_query_results: {error_msg} \n")
         return error_msg
 
 @function_tool
-async def retrieve_results(user_input: str) -> str:
+async def retrieve_results(ctx: RunContextWrapper[AgentRunContext], user_input: str) -> str:
     """
-    Retrieve the results from the knowledge base.
+    Retrieve the results of a direct SQL query, computed locally when table
+    snapshots are available, otherwise from the knowledge base.
     """
-    AGENT_MEMORY.set_has_direct_sql_query(True)
+    memory = memory_from_context(ctx)
+    memory.set_has_direct_sql_query(True)
     try:
-        event = {
-            'requestBody': {
-                'content': {
-                    'application/json': {
-                        'properties': [{'name': 'question', 'value': user_input}]
-                    }
-                }
-            }
-        }
-        kb_results = query_KB(event)
+        # Direct SQL runs on the local engine when table snapshots are available
+        sql = extract_sql(user_input)
+        local_result = await _run_locally(sql)
+        if local_result is not None:
+            print(f"\n🦆 Answered locally in {local_result.elapsed_ms:.1f} ms \n")
+            kb_results = {"sql": local_result.sql, "answer": local_result.summary(),
+                          "sample_data": local_result.as_markdown()}
+            profile = local_result.profile
+        else:
+            kb_results = _cached_answer(user_input)
+            if kb_results is not None:
+                print(f"\n⚡ KB cache hit: {KB_ANSWER_CACHE.stats.as_dict()} \n")
+            else:
+                kb_results = await query_KB_async(_kb_event(user_input), on_partial=partial_callback_from_context(ctx))
+                if kb_results.get('sql') and kb_results.get('answer'):
+                    KB_ANSWER_CACHE.put(user_input, None, kb_results)
+            kb_results, profile = await _with_local_results(kb_results)
         if kb_results['sql'] and kb_results['answer']:
-            agent_response = {"sql": kb_results['sql'], "insights": kb_results['answer']}
-            AGENT_MEMORY.add_data_insights_context_pair(user_input, agent_response)
+            agent_response = {"sql": kb_results['sql'], "insights": kb_results['answer'], "profile": profile}
+            memory.add_data_insights_context_pair(user_input, agent_response)
         return kb_results
     except Exception as e:
         error_msg = f"Sorry, I encountered an error while retrieving data: {str(e)}."
@@ -101,7 +239,7 @@ INSTRUCTIONS = """
             - Whenever you receive a response from plan_and_retrieve tool or retrieve_results tool, present it as follows:
                 - Summary: A concise answer to the user's question.
                 - Key Findings: Bullet points or a numbered list of main insights.
-                - Sample Data: (Optional) A small Markdown table if sample rows are part of the answer.
+                - Sample Data: If the tool response has sample_data, include that Markdown table exactly as given; otherwise (Optional) a small Markdown table if sample rows are part of the answer.
                 - SQL Used: ALWAYS include the SQL query used in a markdown code block like this:
                 ```sql
                 [SQL query here]
@@ -0,0 +1,317 @@
+"""
+Definition Compiler - Deterministic QuickSight definition generation.
+
+This module compiles a structured visualization plan (VISUAL_TYPE,
+FIELD_WELLS_TYPE, DIMENSION_FIELDS, MEASURE_FIELDS, aggregation, sort and
+calculated fields) directly into a QuickSight analysis Definition dict, one
+field-well layout per supported visual type. It replaces the LLM template
+filling and markdown JSON extraction for every visual type it supports.
+"""
+
+from dataclasses import dataclass
+from typing import Optional, Dict, Any, List, Tuple, Union
+import json
+import re
+
+from .schema_planner import NUMERIC_COLUMNS, DATE_COLUMNS
+from .visual_creator import DATASET_IDENTIFIER
+from .visual_plan import VisualPlan
+
+
+class DefinitionCompileError(ValueError):
+    """Raised when a visualization plan cannot be compiled into a definition"""
+
+
+@dataclass(frozen=True)
+class VisualSpec:
+    """Field-well layout of one QuickSight visual type"""
+
+    field_wells_type: Optional[str]
+    dimension_wells: Tuple[str, ...]
+    measure_wells: Tuple[str, ...]
+    sort_key: Optional[str] = None
+    min_dimensions: int = 1
+    min_measures: int = 1
+
+
+# Supported visual types. Wells are filled in order; the last well takes any
+# remaining fields. A field_wells_type of None means the wells sit directly
+# under FieldWells (KPI and gauge visuals).
+VISUAL_SPECS: Dict[str, VisualSpec] = {
+    "BarChartVisual": VisualSpec("BarChartAggregatedFieldWells", ("Category",), ("Values",), "CategorySort"),
+    "LineChartVisual": VisualSpec("LineChartAggregatedFieldWells", ("Category",), ("Values",), "CategorySort"),
+    "PieChartVisual": VisualSpec("PieChartAggregatedFieldWells", ("Category",), ("Values",), "CategorySort"),
+    "FunnelChartVisual": VisualSpec("FunnelChartAggregatedFieldWells", ("Category",), ("Values",), "CategorySort"),
+    "RadarChartVisual": VisualSpec("RadarChartAggregatedFieldWells", ("Category",), ("Values",), "CategorySort"),
+    "ComboChartVisual": VisualSpec("ComboChartAggregatedFieldWells", ("Category",), ("BarValues", "LineValues"), "CategorySort"),
+    "WaterfallVisual": VisualSpec("WaterfallChartAggregatedFieldWells", ("Categories",), ("Values",), "CategorySort"),
+    "WordCloudVisual": VisualSpec("WordCloudAggregatedFieldWells", ("GroupBy",), ("Size",), "CategorySort"),
+    "BoxPlotVisual": VisualSpec("BoxPlotAggregatedFieldWells", ("GroupBy",), ("Values",), "CategorySort"),
+    "TableVisual": VisualSpec("TableAggregatedFieldWells", ("GroupBy",), ("Values",), "RowSort", min_dimensions=0),
+    "PivotTableVisual": VisualSpec("PivotTableAggregatedFieldWells", ("Rows", "Columns"), ("Values",)),
+    "HeatMapVisual": VisualSpec("HeatMapAggregatedFieldWells", ("Rows", "Columns"), ("Values",), "HeatMapRowSort"),
+    "TreeMapVisual": VisualSpec("TreeMapAggregatedFieldWells", ("Groups",), ("Sizes", "Colors"), "TreeMapSort"),
+    "FilledMapVisual": VisualSpec("FilledMapAggregatedFieldWells", ("Geospatial",), ("Values",), "CategorySort"),
+    "GeospatialMapVisual": VisualSpec("GeospatialMapAggregatedFieldWells", ("Geospatial",), ("Values",)),
+    "ScatterPlotVisual": VisualSpec("ScatterPlotCategoricallyAggregatedFieldWells", ("Category",), ("XAxis", "YAxis", "Size"), min_measures=2),
+    "HistogramVisual": VisualSpec("HistogramAggregatedFieldWells", (), ("Values",), min_dimensions=0),
+    "KPIVisual": VisualSpec(None, ("TrendGroups",), ("Values", "TargetValues"), min_dimensions=0),
+    "GaugeChartVisual": VisualSpec(None, (), ("Values", "TargetValues"), min_dimensions=0),
+}
+
+AGGREGATION_FUNCTIONS = frozenset({
+    "SUM", "AVERAGE", "MIN", "MAX", "COUNT", "DISTINCT_COUNT", "VAR", "VARP", "STDEV", "STDEVP", "MEDIAN",
+})
+_AGGREGATION_ALIASES = {"AVG": "AVERAGE", "MEAN": "AVERAGE", "COUNT_DISTINCT": "DISTINCT_COUNT"}
+SORT_TYPES = frozenset({"FieldSort", "ColumnSort"})
+SORT_DIRECTIONS = frozenset({"ASC", "DESC"})
+TIME_GRANULARITIES = frozenset({"YEAR", "QUARTER", "MONTH", "WEEK", "DAY", "HOUR", "MINUTE", "SECOND"})
+
+_SIMPLE_AGGREGATION = re.compile(r'"?SimpleNumericalAggregation"?\s*:\s*"?([A-Z_]+)"?')
+
+
+def _parse_bool(value: Any) -> bool:
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().strip('"\'').lower() in ("true", "yes", "1")
+
+
+def _parse_list(value: Any) -> List[str]:
+    if isinstance(value, (list, tuple)):
+        return [str(item).strip() for item in value if str(item).strip()]
+    text = str(value).strip()
+    if not text or text.lower() in ("none", "null", "[]", "n/a"):
+        return []
+    try:
+        parsed = json.loads(text)
+        if isinstance(parsed, list):
+            return [str(item).strip() for item in parsed if str(item).strip()]
+        return [str(parsed).strip()]
+    except json.JSONDecodeError:
+        return [item.strip().strip('"\'`') for item in text.strip("[]").split(",") if item.strip().strip('"\'`')]
+
+
+def _parse_aggregations(value: Any) -> List[str]:
+    if isinstance(value, (list, tuple)):
+        names = [str(item) for item in value]
+    else:
+        text = str(value)
+        names = _SIMPLE_AGGREGATION.findall(text) or re.findall(r"[A-Za-z_]+", text)
+    return [aggregation for aggregation in map(normalize_aggregation, names) if aggregation]
+
+
+def normalize_aggregation(name: str) -> Optional[str]:
+    """QuickSight aggregation name for a function name or alias (e.g. avg -> AVERAGE), or None"""
+    name = str(name).strip().upper().replace(" ", "_")
+    name = _AGGREGATION_ALIASES.get(name, name)
+    return name if name in AGGREGATION_FUNCTIONS else None
+
+
+def _parse_calculated_fields(value: Any) -> Dict[str, str]:
+    if isinstance(value, dict):
+        return {str(name): str(expression) for name, expression in value.items()}
+    text = str(value).strip()
+    if not text or text.lower() in ("none", "null", "{}"):
+        return {}
+    try:
+        parsed = json.loads(text)
+        if isinstance(parsed, dict):
+            return {str(name): str(expression) for name, expression in parsed.items()}
+    except json.JSONDecodeError:
+        pass
+    fields = {}
+    for part in re.split(r"[;\n]|,\s*(?=[A-Za-z_]\w*\s*=)", text):
+        if "=" in part:
+            name, expression = part.split("=", 1)
+            fields[name.strip().strip('"\'{} ')] = expression.strip().strip('"\'{} ')
+    return fields
+
+
+def normalize_plan(plan: Dict[str, Any]) -> Dict[str, Any]:
+    """Coerce plan values into the types the compiler expects"""
+    normalized = dict(plan)
+    normalized["VISUAL_TYPE"] = str(plan.get("VISUAL_TYPE", "")).strip().strip('"\'`')
+    normalized["FIELD_WELLS_TYPE"] = str(plan.get("FIELD_WELLS_TYPE") or "").strip().strip('"\'`')
+    normalized["DIMENSION_FIELDS"] = _parse_list(plan.get("DIMENSION_FIELDS", []))
+    normalized["MEASURE_FIELDS"] = _parse_list(plan.get("MEASURE_FIELDS", []))
+    normalized["AGGREGATION_FUNCTION_REQUIRED"] = _parse_bool(plan.get("AGGREGATION_FUNCTION_REQUIRED", False))
+    normalized["AGGREGATION_FUNCTIONS"] = _parse_aggregations(plan.get("AGGREGATION_FUNCTIONS", []))
+    normalized["SORT_TYPE"] = str(plan.get("SORT_TYPE") or "").strip().strip('"\'`') or None
+    normalized["SORT_DIRECTION"] = str(plan.get("SORT_DIRECTION") or "").strip().strip('"\'`').upper() or None
+    normalized["FILTER_TYPES"] = _parse_list(plan.get("FILTER_TYPES", []))
+    normalized["CALCULATED_FIELDS_REQUIRED"] = _parse_bool(plan.get("CALCULATED_FIELDS_REQUIRED", False))
+    normalized["CALCULATED_FIELDS"] = _parse_calculated_fields(plan.get("CALCULATED_FIELDS", {}))
+    normalized["DATE_GRANULARITY"] = str(plan.get("DATE_GRANULARITY") or "").strip().strip('"\'`').upper() or None
+    return normalized
+
+
+def _title_case(column: str) -> str:
+    return column.replace("_", " ").title()
+
+
+def _column(column: str, dataset_identifier: str) -> Dict[str, str]:
+    return {"DataSetIdentifier": dataset_identifier, "ColumnName": column}
+
+
+def _dimension_field(field_id: str, column: str, dataset_identifier: str,
+                     date_granularity: Optional[str] = None) -> Dict[str, Any]:
+    if column in DATE_COLUMNS:
+        field: Dict[str, Any] = {"FieldId": field_id, "Column": _column(column, dataset_identifier)}
+        if date_granularity:
+            field["DateGranularity"] = date_granularity
+        return {"DateDimensionField": field}
+    if column in NUMERIC_COLUMNS:
+        return {"NumericalDimensionField": {"FieldId": field_id, "Column": _column(column, dataset_identifier)}}
+    return {"CategoricalDimensionField": {"FieldId": field_id, "Column": _column(column, dataset_identifier)}}
+
+
+def _measure_field(field_id: str, column: str, aggregation: Optional[str], calculated: bool,
+                   dataset_identifier: str) -> Dict[str, Any]:
+    column_ref = _column(column, dataset_identifier)
+    if aggregation and not calculated and column not in NUMERIC_COLUMNS and aggregation in ("COUNT", "DISTINCT_COUNT"):
+        # Counting a categorical column (e.g. sale_id, product_name)
+        return {"CategoricalMeasureField": {"FieldId": field_id, "Column": column_ref, "AggregationFunction": aggregation}}
+    field: Dict[str, Any] = {"FieldId": field_id, "Column": column_ref}
+    if aggregation:
+        field["AggregationFunction"] = {"SimpleNumericalAggregation": aggregation}
+    return {"NumericalMeasureField": field}
+
+
+def _distribute(fields: List[Dict[str, Any]], wells: Tuple[str, ...]) -> Dict[str, List[Dict[str, Any]]]:
+    """Fill wells in order, one field each, the last well taking the rest"""
+    distributed: Dict[str, List[Dict[str, Any]]] = {}
+    for position, field in enumerate(fields):
+        well = wells[min(position, len(wells) - 1)]
+        distributed.setdefault(well, []).append(field)
+    return distributed
+
+
+def _sort_options(plan: Dict[str, Any], field_id: str, column: str, dataset_identifier: str) -> Dict[str, Any]:
+    sort_type = plan.get("SORT_TYPE") or "FieldSort"
+    direction = plan.get("SORT_DIRECTION") or "DESC"
+    if sort_type not in SORT_TYPES:
+        raise DefinitionCompileError(f"Unsupported SORT_TYPE: {sort_type}")
+    if direction not in SORT_DIRECTIONS:
+        raise DefinitionCompileError(f"Unsupported SORT_DIRECTION: {direction}")
+    if sort_type == "ColumnSort":
+        return {"ColumnSort": {"SortBy": _column(column, dataset_identifier), "Direction": direction}}
+    return {"FieldSort": {"FieldId": field_id, "Direction": direction}}
+
+
+def compile_visual(plan: Dict[str, Any], visual_id: str = "visual1",
+                   dataset_identifier: str = DATASET_IDENTIFIER, field_id_prefix: str = "") -> Dict[str, Any]:
+    """
+    Compile a normalized plan into a single QuickSight visual dict
+    ({"<VISUAL_TYPE>": {...}}).
+
+    field_id_prefix is prepended to every FieldId, so several visuals can share
+    one definition without FieldId collisions.
+    """
+    visual_type = plan.get("VISUAL_TYPE")
+    spec = VISUAL_SPECS.get(visual_type)
+    if spec is None:
+        raise DefinitionCompileError(f"Unsupported VISUAL_TYPE: {visual_type}")
+
+    dimensions = plan.get("DIMENSION_FIELDS", [])
+    measures = plan.get("MEASURE_FIELDS", [])
+    if len(dimensions) < spec.min_dimensions:
+        raise DefinitionCompileError(f"{visual_type} needs at least {spec.min_dimensions} dimension field(s)")
+    if len(measures) < spec.min_measures:
+        raise DefinitionCompileError(f"{visual_type} needs at least {spec.min_measures} measure field(s)")
+    if dimensions and not spec.dimension_wells:
+        dimensions = []
+    date_granularity = plan.get("DATE_GRANULARITY")
+    if date_granularity and date_granularity not in TIME_GRANULARITIES:
+        raise DefinitionCompileError(f"Unsupported DATE_GRANULARITY: {date_granularity}")
+
+    calculated_fields = plan.get("CALCULATED_FIELDS", {}) if plan.get("CALCULATED_FIELDS_REQUIRED") else {}
+    aggregations = plan.get("AGGREGATION_FUNCTIONS", []) if plan.get("AGGREGATION_FUNCTION_REQUIRED") else []
+    if plan.get("AGGREGATION_FUNCTION_REQUIRED") and not aggregations:
+        raise DefinitionCompileError("AGGREGATION_FUNCTION_REQUIRED is True but no AGGREGATION_FUNCTIONS given")
+
+    used_ids: Dict[str, int] = {}
+
+    def unique_id(base: str) -> str:
+        used_ids[base] = used_ids.get(base, 0) + 1
+        return field_id_prefix + (base if used_ids[base] == 1 else f"{base}_{used_ids[base]}")
+
+    dimension_ids = [unique_id(column) for column in dimensions]
+    dimension_fields = [_dimension_field(field_id, column, dataset_identifier, date_granularity)
+                        for field_id, column in zip(dimension_ids, dimensions)]
+
+    measure_fields = []
+    for position, column in enumerate(measures):
+        aggregation = aggregations[min(position, len(aggregations) - 1)] if aggregations else None
+        measure_fields.append(_measure_field(unique_id(column), column, aggregation,
+                                             column in calculated_fields, dataset_identifier))
+
+    wells: Dict[str, Any] = {}
+    wells.update(_distribute(dimension_fields, spec.dimension_wells) if spec.dimension_wells else {})
+    wells.update(_distribute(measure_fields, spec.measure_wells))
+    field_wells = {spec.field_wells_type: wells} if spec.field_wells_type else wells
+
+    chart_configuration: Dict[str, Any] = {"FieldWells": field_wells}
+    if spec.sort_key and plan.get("SORT_TYPE") and dimensions:
+        sort = _sort_options(plan, dimension_ids[0], dimensions[0], dataset_identifier)
+        chart_configuration["SortConfiguration"] = {spec.sort_key: [sort]}
+
+    title = plan.get("TITLE") or default_title(dimensions, measures, aggregations)
+    visual: Dict[str, Any] = {
+        "VisualId": visual_id,
+        "Title": {"FormatText": {"PlainText": title}},
+    }
+    if plan.get("SUBTITLE"):
+        visual["Subtitle"] = {"FormatText": {"PlainText": plan["SUBTITLE"]}}
+    visual["ChartConfiguration"] = chart_configuration
+    return {visual_type: visual}
+
+
+def default_title(dimensions: List[str], measures: List[str], aggregations: List[str]) -> str:
+    measure_label = " and ".join(_title_case(measure) for measure in measures)
+    if aggregations:
+        measure_label = f"{_title_case(aggregations[0].replace('_', ' ').lower())} of {measure_label}"
+    if dimensions:
+        return f"{measure_label} by {' and '.join(_title_case(dimension) for dimension in dimensions)}"
+    return measure_label
+
+
+def compile_calculated_fields(plan: Dict[str, Any], dataset_identifier: str = DATASET_IDENTIFIER) -> List[Dict[str, str]]:
+    """Build the Definition CalculatedFields list for a plan"""
+    if not plan.get("CALCULATED_FIELDS_REQUIRED"):
+        return []
+    return [
+        {"DataSetIdentifier": dataset_identifier, "Name": name, "Expression": expression}
+        for name, expression in plan.get("CALCULATED_FIELDS", {}).items()
+    ]
+
+
+def compile_definition(plan: Union[VisualPlan, Dict[str, Any]], dataset_identifier: str = DATASET_IDENTIFIER) -> Dict[str, Any]:
+    """
+    Compile a visualization plan into a {"Definition": {...}} dict.
+
+    Args:
+        plan: VisualPlan, or plan dict with the visual planner's keys (raw values are normalized)
+        dataset_identifier: Logical dataset identifier used by every column reference
+
+    Returns:
+        Definition dict in the same shape the JSON definition template produces
+    """
+    if isinstance(plan, VisualPlan):
+        plan = plan.to_plan_dict()
+    plan = normalize_plan(plan)
+    visual = compile_visual(plan, dataset_identifier=dataset_identifier)
+    title = next(iter(visual.values()))["Title"]["FormatText"]["PlainText"]
+
+    definition: Dict[str, Any] = {
+        "Sheets": [
+            {
+                "SheetId": "sheet1",
+                "Name": plan.get("SHEET_NAME") or title,
+                "Visuals": [visual],
+            }
+        ]
+    }
+    calculated_fields = compile_calculated_fields(plan, dataset_identifier)
+    if calculated_fields:
+        definition["CalculatedFields"] = calculated_fields
+    return {"Definition": definition}
@@ -0,0 +1,427 @@
+"""
+Definition Patch - Structural diff/patch of QuickSight Definition trees and typed visual edits.
+
+Tweaking one chart (another visual type, aggregation or sort order) used to
+re-run the visual planner and the definition generator and rebuild the whole
+definition. Here an edit is applied to the stored definition directly: the
+visual is transformed with the field-well layouts in VISUAL_SPECS, the change
+is expressed as a short list of patch operations (diff), and only those
+operations are applied to the definition (patch), leaving everything else as
+it was.
+
+Patch operations follow JSON Patch (add / remove / replace). List elements
+carrying a QuickSight identifier (SheetId, VisualId, FieldId, ...) are
+addressed by that identifier rather than by position, so a patch still applies
+after unrelated visuals or fields have moved.
+"""
+
+from dataclasses import dataclass, field
+from typing import Optional, Dict, Any, List, Tuple, Union
+import copy
+
+from .definition_compiler import VISUAL_SPECS, SORT_DIRECTIONS, normalize_aggregation, default_title
+
+OP_ADD = "add"
+OP_REMOVE = "remove"
+OP_REPLACE = "replace"
+
+# Keys identifying list elements, in order of precedence. Visuals and fields are
+# wrapped in a one-key dict ({"BarChartVisual": {...}}), so the key is also looked
+# up one level down.
+IDENTITY_KEYS = ("SheetId", "VisualId", "FieldId", "ElementId", "FilterGroupId", "Identifier", "Name")
+
+_SORT_OPTION_TYPES = ("FieldSort", "ColumnSort")
+
+
+class PatchError(ValueError):
+    """Raised when a patch does not apply to a definition"""
+
+
+class DefinitionEditError(ValueError):
+    """Raised when an edit cannot be made to the stored definition"""
+
+
+@dataclass(frozen=True)
+class Match:
+    """Path step selecting the list element whose identity key has this value"""
+
+    key: str
+    value: Any
+
+    def __str__(self) -> str:
+        return f"{self.key}={self.value}"
+
+
+PathStep = Union[str, int, Match]
+
+
+@dataclass
+class PatchOp:
+    """One patch operation; for "add" into a list the last path step is the index"""
+
+    op: str
+    path: Tuple[PathStep, ...]
+    value: Any = None
+
+    @property
+    def pointer(self) -> str:
+        """JSON-pointer-like rendering of the path, e.g. /Sheets/SheetId=sheet1/Visuals"""
+        return "/" + "/".join(str(step) for step in self.path)
+
+    def as_dict(self) -> Dict[str, Any]:
+        operation = {"op": self.op, "path": self.pointer}
+        if self.op != OP_REMOVE:
+            operation["value"] = self.value
+        return operation
+
+
+def identity(element: Any) -> Optional[Match]:
+    """The Match addressing a list element, or None when it carries no identifier"""
+    if not isinstance(element, dict):
+        return None
+    for key in IDENTITY_KEYS:
+        if key in element and isinstance(element[key], (str, int)):
+            return Match(key, element[key])
+    if len(element) == 1:
+        inner = next(iter(element.values()))
+        if isinstance(inner, dict):
+            for key in IDENTITY_KEYS:
+                if key in inner and isinstance(inner[key], (str, int)):
+                    return Match(key, inner[key])
+    return None
+
+
+def diff(old: Any, new: Any, path: Tuple[PathStep, ...] = ()) -> List[PatchOp]:
+    """
+    Patch operations turning old into new.
+
+    Dicts are compared key by key. Lists whose elements all carry distinct
+    identifiers are compared element by element (removals, nested changes,
+    then insertions at their final index); other lists, and lists whose common
+    elements were reordered, are replaced whole.
+    """
+    if old == new:
+        return []
+    if isinstance(old, dict) and isinstance(new, dict):
+        if len(old) == len(new) == 1 and old.keys() != new.keys():
+            # A wrapper changing type ({"BarChartVisual": ...} -> {"PieChartVisual": ...}) is replaced
+            # whole, so the element never loses the identifier its path is resolved by
+            return [PatchOp(OP_REPLACE, path, new)]
+        operations = [PatchOp(OP_REMOVE, path + (key,)) for key in old if key not in new]
+        for key, value in new.items():
+            if key not in old:
+                operations.append(PatchOp(OP_ADD, path + (key,), value))
+            else:
+                operations += diff(old[key], value, path + (key,))
+        return operations
+    if isinstance(old, list) and isinstance(new, list):
+        return _diff_list(old, new, path)
+    return [PatchOp(OP_REPLACE, path, new)]
+
+
+def _diff_list(old: List[Any], new: List[Any], path: Tuple[PathStep, ...]) -> List[PatchOp]:
+    old_ids = [identity(element) for element in old]
+    new_ids = [identity(element) for element in new]
+    keyed = (None not in old_ids and None not in new_ids
+             and len(set(old_ids)) == len(old_ids) and len(set(new_ids)) == len(new_ids))
+    if not keyed:
+        if len(old) != len(new):
+            return [PatchOp(OP_REPLACE, path, new)]
+        operations = []
+        for position, (old_element, new_element) in enumerate(zip(old, new)):
+            operations += diff(old_element, new_element, path + (position,))
+        return operations
+
+    old_by_id = dict(zip(old_ids, old))
+    new_set = set(new_ids)
+    if [match for match in old_ids if match in new_set] != [match for match in new_ids if match in old_by_id]:
+        return [PatchOp(OP_REPLACE, path, new)]
+    operations = [PatchOp(OP_REMOVE, path + (match,)) for match in old_ids if match not in new_set]
+    additions = []
+    for position, (match, element) in enumerate(zip(new_ids, new)):
+        if match in old_by_id:
+            operations += diff(old_by_id[match], element, path + (match,))
+        else:
+            additions.append(PatchOp(OP_ADD, path + (position,), element))
+    return operations + additions
+
+
+def _child(node: Any, step: PathStep, pointer: str) -> Any:
+    if isinstance(node, dict) and isinstance(step, str) and step in node:
+        return node[step]
+    if isinstance(node, list):
+        return node[_index(node, step, pointer)]
+    raise PatchError(f"Path {pointer} not found")
+
+
+def _index(node: List[Any], step: PathStep, pointer: str) -> int:
+    if isinstance(step, int) and 0 <= step < len(node):
+        return step
+    if isinstance(step, Match):
+        for position, element in enumerate(node):
+            if identity(element) == step:
+                return position
+    raise PatchError(f"Path {pointer} not found")
+
+
+def _shallow_copy(node: Any) -> Any:
+    return dict(node) if isinstance(node, dict) else list(node) if isinstance(node, list) else node
+
+
+def apply_patch(document: Dict[str, Any], operations: List[PatchOp]) -> Dict[str, Any]:
+    """
+    Apply patch operations to a copy of document and return the copy.
+
+    Only the containers on each operation's path are copied; untouched
+    subtrees are shared with the original, which is never modified.
+    Raises PatchError when a path does not resolve.
+    """
+    root = _shallow_copy(document)
+    # Containers already copied by an earlier operation of this patch
+    copied = {id(root)}
+    for operation in operations:
+        if not operation.path:
+            raise PatchError("Patching the document root is not supported")
+        parent = root
+        for step in operation.path[:-1]:
+            child = _child(parent, step, operation.pointer)
+            if id(child) not in copied:
+                child = _shallow_copy(child)
+                copied.add(id(child))
+                if isinstance(parent, dict):
+                    parent[step] = child
+                else:
+                    parent[_index(parent, step, operation.pointer)] = child
+            parent = child
+
+        last = operation.path[-1]
+        value = copy.deepcopy(operation.value)
+        if isinstance(parent, dict):
+            if operation.op == OP_REMOVE:
+                if last not in parent:
+                    raise PatchError(f"Path {operation.pointer} not found")
+                del parent[last]
+            elif operation.op == OP_REPLACE and last not in parent:
+                raise PatchError(f"Path {operation.pointer} not found")
+            else:
+                parent[last] = value
+        elif isinstance(parent, list):
+            if operation.op == OP_ADD:
+                if not isinstance(last, int) or not 0 <= last <= len(parent):
+                    raise PatchError(f"Insert position {operation.pointer} is out of range")
+                parent.insert(last, value)
+            elif operation.op == OP_REMOVE:
+                del parent[_index(parent, last, operation.pointer)]
+            else:
+                parent[_index(parent, last, operation.pointer)] = value
+        else:
+            raise PatchError(f"Path {operation.pointer} does not lead to a container")
+    return root
+
+
+# ========================================
+# TYPED VISUAL EDITS
+# ========================================
+
+@dataclass
+class VisualEdit:
+    """
+    A small change to one visual; fields left as None are kept.
+
+    Args:
+        visual_id: Visual to edit; None for the only visual of the definition
+        visual_type: New visual type, e.g. "PieChartVisual"
+        aggregation: New aggregation for the measures, e.g. "AVERAGE"
+        measure: Column whose aggregation changes; None for every measure
+        sort_direction: "ASC" or "DESC"
+        sort_by: Column to sort by (one of the visual's fields)
+        title: New title text
+    """
+
+    visual_id: Optional[str] = None
+    visual_type: Optional[str] = None
+    aggregation: Optional[str] = None
+    measure: Optional[str] = None
+    sort_direction: Optional[str] = None
+    sort_by: Optional[str] = None
+    title: Optional[str] = None
+
+    @property
+    def is_empty(self) -> bool:
+        return not any((self.visual_type, self.aggregation, self.sort_direction, self.sort_by, self.title))
+
+
+@dataclass
+class EditResult:
+    """The edited definition and the patch that produced it"""
+
+    definition: Dict[str, Any]
+    visual_id: str
+    operations: List[PatchOp] = field(default_factory=list)
+
+    def changes(self) -> List[Dict[str, Any]]:
+        return [operation.as_dict() for operation in self.operations]
+
+
+def find_visual(definition: Dict[str, Any], visual_id: Optional[str] = None) -> Tuple[Tuple[PathStep, ...], Dict[str, Any]]:
+    """(path, visual) of the visual with this id, or of the only visual when visual_id is None"""
+    root = definition.get("Definition", definition)
+    prefix: Tuple[PathStep, ...] = ("Definition",) if "Definition" in definition else ()
+    found = []
+    for sheet_position, sheet in enumerate(root.get("Sheets", [])):
+        sheet_step = identity(sheet) or sheet_position
+        for visual_position, visual in enumerate(sheet.get("Visuals", [])):
+            match = identity(visual)
+            if visual_id is None or (match is not None and match.value == visual_id):
+                found.append((prefix + ("Sheets", sheet_step, "Visuals", match or visual_position), visual))
+    if not found:
+        raise DefinitionEditError(f"Visual {visual_id} not found" if visual_id else "The definition has no visuals")
+    if len(found) > 1:
+        ids = ", ".join(str(identity(visual).value) for _, visual in found if identity(visual))
+        raise DefinitionEditError(f"The definition has several visuals, choose one of: {ids}")
+    return found[0]
+
+
+def _wells(visual_type: str, body: Dict[str, Any]) -> Dict[str, List[Dict[str, Any]]]:
+    spec = VISUAL_SPECS.get(visual_type)
+    if spec is None:
+        raise DefinitionEditError(f"Editing {visual_type} is not supported")
+    field_wells = body.get("ChartConfiguration", {}).get("FieldWells", {})
+    return field_wells.get(spec.field_wells_type, {}) if spec.field_wells_type else field_wells
+
+
+def _fields(visual_type: str, body: Dict[str, Any]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """(dimension fields, measure fields) of a visual, in well order"""
+    wells = _wells(visual_type, body)
+    spec = VISUAL_SPECS[visual_type]
+    dimensions = [item for well in spec.dimension_wells for item in wells.get(well, [])]
+    measures = [item for well in spec.measure_wells for item in wells.get(well, [])]
+    return dimensions, measures
+
+
+def _field_body(item: Dict[str, Any]) -> Dict[str, Any]:
+    return next(iter(item.values()))
+
+
+def _column_name(item: Dict[str, Any]) -> Optional[str]:
+    return _field_body(item).get("Column", {}).get("ColumnName")
+
+
+def _aggregation(item: Dict[str, Any]) -> Optional[str]:
+    aggregation = _field_body(item).get("AggregationFunction")
+    if isinstance(aggregation, dict):
+        return aggregation.get("SimpleNumericalAggregation")
+    return aggregation
+
+
+def _distribute(items: List[Dict[str, Any]], wells: Tuple[str, ...]) -> Dict[str, List[Dict[str, Any]]]:
+    distributed: Dict[str, List[Dict[str, Any]]] = {}
+    for position, item in enumerate(items):
+        distributed.setdefault(wells[min(position, len(wells) - 1)], []).append(item)
+    return distributed
+
+
+def _change_type(visual_type: str, body: Dict[str, Any], new_type: str) -> Dict[str, Any]:
+    spec = VISUAL_SPECS.get(new_type)
+    if spec is None:
+        raise DefinitionEditError(f"Unsupported visual type {new_type}; choose one of: {', '.join(VISUAL_SPECS)}")
+    dimensions, measures = _fields(visual_type, body)
+    if not spec.dimension_wells:
+        dimensions = []
+    if len(dimensions) < spec.min_dimensions or len(measures) < spec.min_measures:
+        raise DefinitionEditError(f"{new_type} needs at least {spec.min_dimensions} dimension and "
+                                  f"{spec.min_measures} measure field(s); re-plan the visual instead")
+
+    wells = _distribute(dimensions, spec.dimension_wells) if dimensions else {}
+    wells.update(_distribute(measures, spec.measure_wells))
+    chart_configuration: Dict[str, Any] = {"FieldWells": {spec.field_wells_type: wells} if spec.field_wells_type else wells}
+    # Sort options carry over when the new type sorts; other chart options are type specific and dropped
+    old_sort_key = VISUAL_SPECS[visual_type].sort_key
+    old_sort = body.get("ChartConfiguration", {}).get("SortConfiguration", {}).get(old_sort_key)
+    if spec.sort_key and old_sort and dimensions:
+        chart_configuration["SortConfiguration"] = {spec.sort_key: old_sort}
+    return {**body, "ChartConfiguration": chart_configuration}
+
+
+def _change_aggregation(visual_type: str, body: Dict[str, Any], aggregation: str, measure: Optional[str]) -> None:
+    dimensions, measures = _fields(visual_type, body)
+    targets = [item for item in measures if measure is None or _column_name(item) == measure]
+    if not targets:
+        raise DefinitionEditError(f"The visual has no measure {measure}" if measure else "The visual has no measures")
+    title = body.get("Title", {}).get("FormatText", {}).get("PlainText")
+    generated_title = title == default_title([_column_name(item) for item in dimensions],
+                                             [_column_name(item) for item in measures],
+                                             [_aggregation(item) for item in measures if _aggregation(item)])
+    for item in targets:
+        field_type, field_body = next(iter(item.items()))
+        if field_type == "CategoricalMeasureField":
+            if aggregation not in ("COUNT", "DISTINCT_COUNT"):
+                raise DefinitionEditError(f"{_column_name(item)} is not numeric; it can only be counted")
+            field_body["AggregationFunction"] = aggregation
+        elif field_type == "NumericalMeasureField":
+            field_body["AggregationFunction"] = {"SimpleNumericalAggregation": aggregation}
+        else:
+            raise DefinitionEditError(f"Changing the aggregation of a {field_type} is not supported")
+    # Keep a compiler-generated title in step ("Sum of X by Y" -> "Average of X by Y")
+    if generated_title:
+        body["Title"]["FormatText"]["PlainText"] = default_title(
+            [_column_name(item) for item in dimensions], [_column_name(item) for item in measures],
+            [_aggregation(item) for item in measures if _aggregation(item)])
+
+
+def _change_sort(visual_type: str, body: Dict[str, Any], direction: Optional[str], sort_by: Optional[str]) -> None:
+    spec = VISUAL_SPECS[visual_type]
+    if spec.sort_key is None:
+        raise DefinitionEditError(f"{visual_type} cannot be sorted")
+    if direction is not None and direction not in SORT_DIRECTIONS:
+        raise DefinitionEditError(f"Sort direction must be ASC or DESC, not {direction}")
+    dimensions, measures = _fields(visual_type, body)
+    chart_configuration = body.setdefault("ChartConfiguration", {})
+    options = chart_configuration.setdefault("SortConfiguration", {}).setdefault(spec.sort_key, [])
+
+    if sort_by is not None or not options:
+        candidates = [item for item in dimensions + measures if sort_by is None or _column_name(item) == sort_by]
+        if not candidates:
+            raise DefinitionEditError(f"The visual has no field {sort_by} to sort by")
+        previous = next((option[key].get("Direction") for option in options for key in _SORT_OPTION_TYPES if key in option), None)
+        options[:] = [{"FieldSort": {"FieldId": _field_body(candidates[0])["FieldId"],
+                                     "Direction": direction or previous or "DESC"}}]
+    elif direction is not None:
+        for option in options:
+            for key in _SORT_OPTION_TYPES:
+                if key in option:
+                    option[key]["Direction"] = direction
+
+
+def edit_visual(definition: Dict[str, Any], edit: VisualEdit) -> EditResult:
+    """
+    Apply a typed edit to one visual of a {"Definition": ...} dict.
+
+    The visual is transformed on a copy, diffed against the original, and the
+    resulting patch applied to the definition; the input is not modified.
+    Raises DefinitionEditError when the edit does not fit the visual.
+    """
+    if edit.is_empty:
+        raise DefinitionEditError("Nothing to change: give a visual type, aggregation, sort or title")
+    path, visual = find_visual(definition, edit.visual_id)
+    visual_type, body = next(iter(visual.items()))
+    if visual_type not in VISUAL_SPECS:
+        raise DefinitionEditError(f"Editing {visual_type} is not supported")
+    body = copy.deepcopy(body)
+
+    aggregation = None
+    if edit.aggregation:
+        aggregation = normalize_aggregation(edit.aggregation)
+        if aggregation is None:
+            raise DefinitionEditError(f"Unknown aggregation {edit.aggregation}")
+        _change_aggregation(visual_type, body, aggregation, edit.measure)
+    if edit.visual_type and edit.visual_type != visual_type:
+        body = _change_type(visual_type, body, edit.visual_type)
+        visual_type = edit.visual_type
+    if edit.sort_direction or edit.sort_by:
+        _change_sort(visual_type, body, edit.sort_direction.upper() if edit.sort_direction else None, edit.sort_by)
+    if edit.title:
+        body["Title"] = {"FormatText": {"PlainText": edit.title}}
+
+    operations = diff(visual, {visual_type: body}, path)
+    return EditResult(apply_patch(definition, operations), str(body.get("VisualId")), operations)
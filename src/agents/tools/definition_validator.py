@@ -0,0 +1,345 @@
+"""
+Definition Validator - Offline checks of a QuickSight analysis Definition.
+
+create_analysis and update_analysis reject invalid definitions only after a
+network round trip, and the analysis then sits in CREATION_FAILED. This module
+checks a complete {"Definition": ...} dict locally in a single pass:
+
+- every visual is one of the types the visual planner may choose, wrapped in
+  a field-well container that matches its type, using only that type's wells
+- every field has a FieldId unique within its visual, a known field type, a
+  declared DataSetIdentifier and a column that exists in the dataset (or is a
+  calculated field), and a valid aggregation
+- every sort option references a FieldId of the visual's wells (or an existing
+  column) and has a valid direction
+- calculated fields have a unique name and a non-empty expression, and grid
+  layout elements reference visuals of their sheet
+
+The per-visual-type rules are compiled once at import from VisualType and the
+compiler's VISUAL_SPECS, so validation is a dictionary walk of well under a
+millisecond per definition. Identifiers and enum values of the wrong JSON type
+(a list where a string belongs) are reported like any other problem.
+"""
+
+from dataclasses import dataclass
+from typing import Optional, Dict, Any, List, Iterable, FrozenSet
+
+from .definition_compiler import VISUAL_SPECS, AGGREGATION_FUNCTIONS, SORT_TYPES, SORT_DIRECTIONS
+from .schema_planner import DATASET_COLUMNS
+from .visual_plan import VisualType, VISUAL_FIELD_WELLS
+
+DIMENSION_FIELD_TYPES = frozenset({"CategoricalDimensionField", "NumericalDimensionField", "DateDimensionField"})
+MEASURE_FIELD_TYPES = frozenset({"NumericalMeasureField", "CategoricalMeasureField", "DateMeasureField",
+                                 "CalculatedMeasureField"})
+FIELD_TYPES = DIMENSION_FIELD_TYPES | MEASURE_FIELD_TYPES | {"UnaggregatedField"}
+CATEGORICAL_AGGREGATIONS = frozenset({"COUNT", "DISTINCT_COUNT"})
+DATE_AGGREGATIONS = frozenset({"COUNT", "DISTINCT_COUNT", "MIN", "MAX"})
+
+# Field-well containers QuickSight also accepts besides the compiler's own
+_ALTERNATIVE_FIELD_WELLS = {
+    "TableVisual": ("TableUnaggregatedFieldWells",),
+    "ScatterPlotVisual": ("ScatterPlotUnaggregatedFieldWells",),
+}
+
+
+class DefinitionValidationError(ValueError):
+    """Raised when a definition fails validation"""
+
+    def __init__(self, errors: List[str]):
+        self.errors = errors
+        super().__init__("Invalid QuickSight definition: " + "; ".join(errors))
+
+
+@dataclass(frozen=True)
+class VisualRule:
+    """What a visual type's ChartConfiguration may contain"""
+
+    field_wells_types: FrozenSet[str]
+    # Wells of the compiler's field-well container; empty when not known
+    wells: FrozenSet[str]
+    # True when the wells sit directly under FieldWells (KPI and gauge visuals)
+    direct_wells: bool
+
+
+def _compile_rules() -> Dict[str, VisualRule]:
+    rules = {}
+    for visual_type in VisualType:
+        name = visual_type.value
+        spec = VISUAL_SPECS.get(name)
+        if spec is not None:
+            containers = {spec.field_wells_type} if spec.field_wells_type else set()
+            wells = frozenset(spec.dimension_wells + spec.measure_wells)
+            rules[name] = VisualRule(frozenset(containers | set(_ALTERNATIVE_FIELD_WELLS.get(name, ()))), wells,
+                                     spec.field_wells_type is None)
+        else:
+            field_wells_type = VISUAL_FIELD_WELLS.get(visual_type)
+            containers = {field_wells_type.value} if field_wells_type else set()
+            rules[name] = VisualRule(frozenset(containers), frozenset(), False)
+    return rules
+
+
+# Compiled once: visual type -> rule, for every visual type the visual planner may choose
+VISUAL_RULES: Dict[str, VisualRule] = _compile_rules()
+
+
+class _Checker:
+    """One validation pass over a definition; collects errors instead of stopping at the first"""
+
+    def __init__(self, known_columns: FrozenSet[str], calculated: FrozenSet[str], datasets: Optional[FrozenSet[str]]):
+        self.known_columns = known_columns
+        self.calculated = calculated
+        self.datasets = datasets
+        self.errors: List[str] = []
+
+    def column(self, where: str, column: Any):
+        if not isinstance(column, dict):
+            self.errors.append(f"{where}: Column is missing")
+            return
+        dataset = column.get("DataSetIdentifier")
+        if not isinstance(dataset, str):
+            self.errors.append(f"{where}: DataSetIdentifier must be a string, not {dataset!r}")
+        elif self.datasets is not None and dataset not in self.datasets:
+            self.errors.append(f"{where}: DataSetIdentifier {dataset!r} is not declared")
+        name = column.get("ColumnName")
+        if not isinstance(name, str):
+            self.errors.append(f"{where}: ColumnName must be a string, not {name!r}")
+        elif name not in self.known_columns and name not in self.calculated:
+            self.errors.append(f"{where}: unknown column {name!r}")
+
+    def field(self, where: str, item: Any, field_ids: Dict[str, str]):
+        """Check one well entry ({"NumericalMeasureField": {...}}) and record its FieldId"""
+        if not isinstance(item, dict) or len(item) != 1:
+            self.errors.append(f"{where}: each field must be a single {{FieldType: {{...}}}} object")
+            return
+        field_type, body = next(iter(item.items()))
+        if field_type not in FIELD_TYPES or not isinstance(body, dict):
+            self.errors.append(f"{where}: unknown field type {field_type!r}")
+            return
+        field_id = body.get("FieldId")
+        if not field_id or not isinstance(field_id, str):
+            self.errors.append(f"{where}: {field_type} has no FieldId")
+            return
+        if field_id in field_ids:
+            self.errors.append(f"{where}: FieldId {field_id!r} is used twice")
+        field_ids[field_id] = field_type
+
+        if field_type == "CalculatedMeasureField":
+            expression = body.get("Expression")
+            if not isinstance(expression, str) or not expression.strip():
+                self.errors.append(f"{where}: CalculatedMeasureField {field_id!r} has an empty Expression")
+            return
+        self.column(f"{where} {field_id}", body.get("Column"))
+
+        aggregation = body.get("AggregationFunction")
+        if aggregation is None:
+            return
+        if field_type == "NumericalMeasureField":
+            simple = aggregation.get("SimpleNumericalAggregation") if isinstance(aggregation, dict) else None
+            if isinstance(aggregation, dict) and simple is None and "PercentileAggregation" in aggregation:
+                return
+            if not isinstance(simple, str) or simple not in AGGREGATION_FUNCTIONS:
+                self.errors.append(f"{where} {field_id}: invalid AggregationFunction {aggregation!r}")
+        elif field_type == "CategoricalMeasureField" and (not isinstance(aggregation, str)
+                                                          or aggregation not in CATEGORICAL_AGGREGATIONS):
+            self.errors.append(f"{where} {field_id}: a CategoricalMeasureField can only use COUNT or DISTINCT_COUNT")
+        elif field_type == "DateMeasureField" and (not isinstance(aggregation, str) or aggregation not in DATE_AGGREGATIONS):
+            self.errors.append(f"{where} {field_id}: invalid DateMeasureField aggregation {aggregation!r}")
+
+    def sort_options(self, where: str, options: List[Any], field_ids: Dict[str, str]):
+        """FieldSort and ColumnSort options; other sort entries (e.g. DataPathSort) pass through"""
+        for option in options:
+            if not isinstance(option, dict):
+                self.errors.append(f"{where}: invalid sort option {option!r}")
+                continue
+            if "FieldId" in option and (not isinstance(option["FieldId"], str) or option["FieldId"] not in field_ids):
+                # Pivot table FieldSortOptions
+                self.errors.append(f"{where}: sort references FieldId {option['FieldId']!r}, which is not in the field wells")
+            for sort_type in SORT_TYPES.intersection(option):
+                body = option[sort_type]
+                if not isinstance(body, dict):
+                    self.errors.append(f"{where}: invalid {sort_type}")
+                    continue
+                direction = body.get("Direction")
+                if not isinstance(direction, str) or direction not in SORT_DIRECTIONS:
+                    self.errors.append(f"{where}: {sort_type} Direction must be ASC or DESC, not {direction!r}")
+                if sort_type == "ColumnSort":
+                    self.column(f"{where} ColumnSort", body.get("SortBy"))
+                elif not body.get("FieldId"):
+                    self.errors.append(f"{where}: FieldSort has no FieldId")
+                elif not isinstance(body["FieldId"], str) or body["FieldId"] not in field_ids:
+                    self.errors.append(f"{where}: FieldSort references FieldId {body['FieldId']!r}, which is not in the field wells")
+
+    def visual(self, sheet_name: str, item: Any) -> Optional[str]:
+        """Check one visual; returns its VisualId"""
+        if not isinstance(item, dict) or len(item) != 1:
+            self.errors.append(f"{sheet_name}: each visual must be a single {{VisualType: {{...}}}} object")
+            return None
+        visual_type, body = next(iter(item.items()))
+        rule = VISUAL_RULES.get(visual_type)
+        if rule is None:
+            self.errors.append(f"{sheet_name}: unknown visual type {visual_type!r}")
+            return None
+        if not isinstance(body, dict) or not body.get("VisualId"):
+            self.errors.append(f"{sheet_name}: {visual_type} has no VisualId")
+            return None
+        visual_id = body["VisualId"]
+        if not isinstance(visual_id, str):
+            self.errors.append(f"{sheet_name}: {visual_type} VisualId must be a string, not {visual_id!r}")
+            return None
+        where = f"{visual_type} {visual_id}"
+        chart_configuration = body.get("ChartConfiguration")
+        if chart_configuration is None:
+            return visual_id
+        if not isinstance(chart_configuration, dict):
+            self.errors.append(f"{where}: ChartConfiguration must be an object")
+            return visual_id
+
+        field_ids: Dict[str, str] = {}
+        field_wells = chart_configuration.get("FieldWells") or {}
+        if not isinstance(field_wells, dict):
+            self.errors.append(f"{where}: FieldWells must be an object")
+            field_wells = {}
+        if rule.direct_wells:
+            containers = {None: field_wells}
+        else:
+            containers = {}
+            for container, wells in field_wells.items():
+                if rule.field_wells_types and container not in rule.field_wells_types:
+                    expected = " or ".join(sorted(rule.field_wells_types))
+                    self.errors.append(f"{where}: field wells must be {expected}, not {container}")
+                # Fields of a mismatched container are still checked, so sorts resolve against them
+                containers[container] = wells
+        for container, wells in containers.items():
+            if not isinstance(wells, dict):
+                self.errors.append(f"{where}: {container or 'FieldWells'} must be an object")
+                continue
+            # Well names are only known for the compiler's own container
+            check_wells = rule.wells and (rule.direct_wells or container in rule.field_wells_types
+                                          and container not in _ALTERNATIVE_FIELD_WELLS.get(visual_type, ()))
+            for well, items in wells.items():
+                if check_wells and well not in rule.wells:
+                    self.errors.append(f"{where}: {container or 'FieldWells'} has no well {well!r} "
+                                       f"(expected {', '.join(sorted(rule.wells))})")
+                if not isinstance(items, list):
+                    self.errors.append(f"{where} {well}: fields must be a list")
+                    continue
+                for entry in items:
+                    self.field(f"{where} {well}", entry, field_ids)
+
+        sort_configuration = chart_configuration.get("SortConfiguration")
+        if isinstance(sort_configuration, dict):
+            for sort_key, options in sort_configuration.items():
+                if isinstance(options, list):
+                    self.sort_options(f"{where} {sort_key}", options, field_ids)
+        return visual_id
+
+
+def _objects(errors: List[str], where: str, value: Any) -> List[Dict[str, Any]]:
+    """The dict entries of a list-valued key; a non-list or non-object entries are reported"""
+    if value is None:
+        return []
+    if not isinstance(value, list):
+        errors.append(f"{where} must be a list")
+        return []
+    objects = [entry for entry in value if isinstance(entry, dict)]
+    if len(objects) != len(value):
+        errors.append(f"{where} has {len(value) - len(objects)} entries that are not objects")
+    return objects
+
+
+def validate_definition(definition: Dict[str, Any], known_columns: Iterable[str] = DATASET_COLUMNS) -> List[str]:
+    """
+    Check a {"Definition": ...} dict in a single pass and return the list of problems found.
+
+    Args:
+        definition: Analysis definition as sent to create_analysis / update_analysis
+        known_columns: Dataset column names (defaults to the fashion store dataset)
+    """
+    root = definition.get("Definition") if isinstance(definition, dict) else None
+    if not isinstance(root, dict):
+        return ["Definition key not found in the json definition"]
+    errors: List[str] = []
+    columns = known_columns if isinstance(known_columns, frozenset) else frozenset(known_columns)
+
+    declarations = _objects(errors, "DataSetIdentifierDeclarations", root.get("DataSetIdentifierDeclarations"))
+    if not declarations:
+        errors.append("DataSetIdentifierDeclarations is missing")
+        datasets = None
+    else:
+        identifiers = [declaration.get("Identifier") for declaration in declarations]
+        for identifier in identifiers:
+            if not isinstance(identifier, str) or not identifier:
+                errors.append(f"A dataset declaration has an invalid Identifier {identifier!r}")
+        datasets = frozenset(identifier for identifier in identifiers if isinstance(identifier, str))
+
+    calculated_names = set()
+    for calculated in _objects(errors, "CalculatedFields", root.get("CalculatedFields")):
+        name = calculated.get("Name")
+        name = name.strip() if isinstance(name, str) else name
+        if not name:
+            errors.append("A calculated field has no Name")
+        elif not isinstance(name, str):
+            errors.append(f"Calculated field Name must be a string, not {name!r}")
+            name = ""
+        elif name in calculated_names:
+            errors.append(f"Calculated field {name!r} is defined twice")
+        expression = calculated.get("Expression")
+        if not isinstance(expression, str) or not expression.strip():
+            errors.append(f"Calculated field {name or '?'!r} has an empty Expression")
+        dataset = calculated.get("DataSetIdentifier")
+        if datasets is not None and (not isinstance(dataset, str) or dataset not in datasets):
+            errors.append(f"Calculated field {name or '?'!r}: DataSetIdentifier is not declared")
+        if name:
+            calculated_names.add(name)
+
+    checker = _Checker(columns, frozenset(calculated_names), datasets)
+    sheets = _objects(errors, "Sheets", root.get("Sheets"))
+    if not sheets:
+        errors.append("The definition has no Sheets")
+    sheet_ids = set()
+    visual_ids = set()
+    for sheet in sheets:
+        sheet_id = sheet.get("SheetId")
+        if not sheet_id:
+            errors.append("A sheet has no SheetId")
+            continue
+        if not isinstance(sheet_id, str):
+            errors.append(f"SheetId must be a string, not {sheet_id!r}")
+            continue
+        if sheet_id in sheet_ids:
+            errors.append(f"SheetId {sheet_id!r} is used twice")
+        sheet_ids.add(sheet_id)
+
+        sheet_visuals = set()
+        visuals = sheet.get("Visuals") or []
+        if not isinstance(visuals, list):
+            errors.append(f"Sheet {sheet_id}: Visuals must be a list")
+            visuals = []
+        for item in visuals:
+            visual_id = checker.visual(f"Sheet {sheet_id}", item)
+            if visual_id is None:
+                continue
+            if visual_id in visual_ids:
+                errors.append(f"VisualId {visual_id!r} is used twice")
+            visual_ids.add(visual_id)
+            sheet_visuals.add(visual_id)
+
+        for layout in _objects(errors, f"Sheet {sheet_id} Layouts", sheet.get("Layouts")):
+            configuration = layout.get("Configuration")
+            grid = configuration.get("GridLayout") if isinstance(configuration, dict) else None
+            if not isinstance(grid, dict):
+                continue
+            for element in _objects(errors, f"Sheet {sheet_id} GridLayout Elements", grid.get("Elements")):
+                element_id = element.get("ElementId")
+                if element.get("ElementType") == "VISUAL" and (not isinstance(element_id, str)
+                                                                or element_id not in sheet_visuals):
+                    errors.append(f"Sheet {sheet_id}: layout element {element_id!r} is not a visual of the sheet")
+    return errors + checker.errors
+
+
+def ensure_valid_definition(definition: Dict[str, Any], known_columns: Iterable[str] = DATASET_COLUMNS) -> Dict[str, Any]:
+    """Return the definition unchanged, or raise DefinitionValidationError listing every problem"""
+    errors = validate_definition(definition, known_columns)
+    if errors:
+        raise DefinitionValidationError(errors)
+    return definition
@@ -1,22 +1,24 @@
 from agents import Agent, Runner
-import boto3
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import contextvars
 import logging
-from typing import Optional, Dict
+import os
+import time
+from typing import Optional, Dict, Callable
+from .schema_planner import describe_schema
+from ...services.aws_clients import get_client
+from ...instrumentation import span, KIND_BEDROCK
 
-client = boto3.client('bedrock-agent-runtime')
+# Upper bound on concurrent KB requests across all sessions in this process
+KB_MAX_CONCURRENCY = int(os.getenv("KB_MAX_CONCURRENCY", "8"))
+_kb_executor = ThreadPoolExecutor(max_workers=KB_MAX_CONCURRENCY, thread_name_prefix="kb-query")
 
-INSTRUCTIONS = """
+INSTRUCTIONS = f"""
     You are a database query planner. Analyze the user's question and create a query plan.
     
     DATABASE SCHEMA: 
-    - public
-        - dataset_fashion_store_sales (sale_id, channel, discounted, total_amount, start_date, customer_id, country)
-        - dataset_fashion_store_customers (customer_id, country, age_range, signup_date)
-        - dataset_fashion_store_stock (country, product_id, stock_quantity)
-        - dataset_fashion_store_products (product_id, product_name, category, brand, color, size, catalog_price, cost_price, gender)
-        - dataset_fashion_store_salesitems (item_id, sale_id, product_id, quantity, original_price, unit_price, discount_applied, discount_percent, discounted, item_total, sale_date, channel, channel_campaigns)
-        - dataset_fashion_store_campaigns (campaign_id, campaign_name, start_date, end_date, channel, discount_type, discount_value)
-        - dataset_fashion_store_channels (channel, description)
+    {describe_schema()}
     
     Your task:
     1. Identify which tables, columns and the relationships between tables that need to be joined to answer the question
@@ -35,42 +37,128 @@ query_planner_agent = Agent(
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
+# Knowledge base used for text-to-SQL retrieval and answer generation
+KB_CONFIGURATION = {
+    'knowledgeBaseConfiguration': {
+        'knowledgeBaseId': 'QCQ10YU9FE',
+        'modelArn': 'arn:aws:bedrock:us-west-2::foundation-model/anthropic.claude-3-5-sonnet-20241022-v2:0'
+    },
+    'type': 'KNOWLEDGE_BASE'
+}
+
+
+def _extract_question(event) -> Optional[str]:
+    """Pull the question value out of the action-group style request body"""
+    try:
+        props = event['requestBody']['content']['application/json']['properties']
+        for prop in props:
+            if prop.get('name') == 'question':
+                return prop.get('value')
+    except Exception as ex:
+        logger.error(f"Failed to extract user question from requestBody: {ex}")
+    return None
+
+
+def _sql_from_references(references) -> Optional[str]:
+    """Last SQL query found in a list of retrieved references"""
+    sql_query = None
+    for ref in references or []:
+        sql_loc = ref.get('location', {}).get('sqlLocation')
+        if sql_loc and 'query' in sql_loc:
+            sql_query = sql_loc['query']
+    return sql_query
+
+
 def query_KB(event):
     try:
         # question  = event['question']
-        question = None
-        try:
-            props = event['requestBody']['content']['application/json']['properties']
-            for prop in props:
-                if prop.get('name') == 'question':
-                    question = prop.get('value')
-                    break
-        except Exception as ex:
-            logger.error(f"Failed to extract user question from requestBody: {ex}")   
+        question = _extract_question(event)
         if not question:
             return {"error": "No question provided in the request."}    
         
-        response = client.retrieve_and_generate(
-            input={'text': question},
-            retrieveAndGenerateConfiguration={
-                'knowledgeBaseConfiguration': {
-                    'knowledgeBaseId': 'QCQ10YU9FE',
-                    'modelArn': 'arn:aws:bedrock:us-west-2::foundation-model/anthropic.claude-3-5-sonnet-20241022-v2:0'
-                },
-                'type': 'KNOWLEDGE_BASE'
-            }
-        )
-        answer = response['output']['text']
-        sql_query = None
-        for citation in response.get('citations', []):
-            for ref in citation.get('retrievedReferences', []):
-                sql_loc = ref.get('location', {}).get('sqlLocation')
-                if sql_loc and 'query' in sql_loc:
-                    sql_query = sql_loc['query']
+        client = get_client('bedrock-agent-runtime')
+        with span("bedrock.retrieve_and_generate", KIND_BEDROCK, question_chars=len(question)) as kb_span:
+            response = client.retrieve_and_generate(
+                input={'text': question},
+                retrieveAndGenerateConfiguration=KB_CONFIGURATION
+            )
+            answer = response['output']['text']
+            sql_query = None
+            for citation in response.get('citations', []):
+                sql_query = _sql_from_references(citation.get('retrievedReferences')) or sql_query
+            kb_span.set(answer_chars=len(answer), has_sql=sql_query is not None)
         return {
             "answer": answer,
             "sql": sql_query
         }
     except Exception as e:
         logger.error(f"Error in query_KB: {str(e)}")
-        raise
\ No newline at end of file
+        raise
+
+
+def query_KB_streaming(event, on_partial: Callable[[str], None]):
+    """
+    Streaming variant of query_KB: calls on_partial with each generated text chunk
+    as it arrives and returns the same {"answer", "sql"} payload at the end.
+
+    Falls back to query_KB when the streaming API cannot be started.
+    """
+    question = _extract_question(event)
+    if not question:
+        return {"error": "No question provided in the request."}
+
+    client = get_client('bedrock-agent-runtime')
+    with span("bedrock.retrieve_and_generate_stream", KIND_BEDROCK, question_chars=len(question)) as kb_span:
+        started = time.perf_counter()
+        try:
+            response = client.retrieve_and_generate_stream(
+                input={'text': question},
+                retrieveAndGenerateConfiguration=KB_CONFIGURATION
+            )
+        except Exception as e:
+            logger.error(f"KB streaming unavailable, falling back to query_KB: {str(e)}")
+            kb_span.set(fallback=True)
+            return query_KB(event)
+
+        chunks = []
+        sql_query = None
+        for stream_event in response['stream']:
+            if 'output' in stream_event:
+                text = stream_event['output'].get('text', '')
+                if text:
+                    if not chunks:
+                        kb_span.set(first_chunk_ms=round((time.perf_counter() - started) * 1000, 1))
+                    chunks.append(text)
+                    on_partial(text)
+            elif 'citation' in stream_event:
+                citation_event = stream_event['citation']
+                references = citation_event.get('retrievedReferences') or citation_event.get('citation', {}).get('retrievedReferences')
+                sql_query = _sql_from_references(references) or sql_query
+            else:
+                # Errors arrive as events, e.g. {'throttlingException': {...}}
+                error_name = next(iter(stream_event), 'unknown')
+                if error_name.endswith('Exception'):
+                    raise RuntimeError(f"KB stream failed with {error_name}: {stream_event[error_name].get('message', '')}")
+        answer = "".join(chunks)
+        kb_span.set(answer_chars=len(answer), chunks=len(chunks), has_sql=sql_query is not None)
+    return {
+        "answer": answer,
+        "sql": sql_query
+    }
+
+
+async def query_KB_async(event, on_partial: Optional[Callable[[str], None]] = None):
+    """
+    Non-blocking variant of query_KB for use inside async tools.
+
+    Runs the boto3 call on a bounded thread pool so the event loop keeps serving
+    other sessions while the KB request is in flight. Returns the same
+    {"answer", "sql"} payload as query_KB. When on_partial is given the answer is
+    streamed and on_partial is called (from the worker thread) with each chunk.
+    """
+    loop = asyncio.get_running_loop()
+    # run_in_executor does not carry context variables; copy them so KB spans join the current trace
+    context = contextvars.copy_context()
+    if on_partial is not None:
+        return await loop.run_in_executor(_kb_executor, context.run, query_KB_streaming, event, on_partial)
+    return await loop.run_in_executor(_kb_executor, context.run, query_KB, event)
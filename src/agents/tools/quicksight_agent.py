@@ -1,23 +1,27 @@
-from agents import Agent, ModelSettings, function_tool
-from ...memory.agent_memory import AGENT_MEMORY
+from agents import Agent, ModelSettings, RunContextWrapper, function_tool
+from ...memory.agent_memory import AgentRunContext, memory_from_context
 
 
 @function_tool
-def set_create_analysis(user_input: str):
+def set_create_analysis(ctx: RunContextWrapper[AgentRunContext], user_input: str):
     """Set create_analysis"""
-    AGENT_MEMORY.set_create_analysis(True)
-    AGENT_MEMORY.set_quicksight_analysis_name(user_input)
+    memory = memory_from_context(ctx)
+    with memory.lock:
+        memory.set_create_analysis(True)
+        memory.set_quicksight_analysis_name(user_input)
 
 @function_tool
-def set_update_analysis(user_input: str):
+def set_update_analysis(ctx: RunContextWrapper[AgentRunContext], user_input: str):
     """Set update_analysis"""
-    AGENT_MEMORY.set_update_analysis(True)
-    AGENT_MEMORY.set_quicksight_analysis_name(user_input)
+    memory = memory_from_context(ctx)
+    with memory.lock:
+        memory.set_update_analysis(True)
+        memory.set_quicksight_analysis_name(user_input)
 
 @function_tool
-def set_list_analyses():
+def set_list_analyses(ctx: RunContextWrapper[AgentRunContext]):
     """Set list_analyses"""
-    AGENT_MEMORY.set_list_analyses(True)
+    memory_from_context(ctx).set_list_analyses(True)
 
 INSTRUCTIONS = """
 Your role:
@@ -0,0 +1,230 @@
+"""
+Result Profile - Compact shape of a query's result set and rule-based visual choice.
+
+The visual planner used to see only the SQL and the knowledge base's prose
+answer, so it had to guess how many categories a chart would get and which
+columns were numeric (pie charts with 200 slices, extra LLM retries). A
+ResultProfile records the column types, row count, distinct counts and min/max
+of an actual result set. It is stored with the data insights context pair, and
+choose_visual_plan turns it into a VisualPlan with fixed rules (line for time
+series, pie only for a handful of slices, bar up to BAR_MAX_CATEGORIES,
+table beyond) without another model round trip. Results of SQL that filters
+or limits its rows are left to the LLM planner.
+"""
+
+from dataclasses import dataclass, field
+from typing import Optional, Dict, Any, List, Tuple
+import os
+import re
+
+from .schema_planner import DATASET_COLUMNS, DATE_COLUMNS
+from .visual_plan import VisualPlan
+
+BAR_MAX_CATEGORIES = int(os.getenv("BAR_MAX_CATEGORIES", "20"))
+PIE_MAX_SLICES = int(os.getenv("PIE_MAX_SLICES", "6"))
+# Columns described in the prompt line of a profile
+PROFILE_PROMPT_COLUMNS = int(os.getenv("PROFILE_PROMPT_COLUMNS", "8"))
+
+ROLE_DIMENSION = "dimension"
+ROLE_MEASURE = "measure"
+ROLE_TIME = "time"
+
+_NUMERIC_TYPES = re.compile(r"^(TINYINT|SMALLINT|INTEGER|BIGINT|HUGEINT|UTINYINT|USMALLINT|UINTEGER|UBIGINT|"
+                            r"FLOAT|REAL|DOUBLE|DECIMAL|NUMERIC|INT\d*)\b", re.IGNORECASE)
+_TIME_TYPES = re.compile(r"^(DATE|TIME|TIMESTAMP|INTERVAL)", re.IGNORECASE)
+_AGGREGATE_EXPRESSION = re.compile(
+    r"^\s*(sum|avg|average|count|min|max|median)\s*\(\s*(distinct\s+)?(?:[\w\"]+\s*\.\s*)?\"?(\w+|\*)\"?\s*\)\s*$",
+    re.IGNORECASE,
+)
+_IDENTIFIER = re.compile(r"\b\w+\b")
+_BARE_COLUMN = re.compile(r"^\s*(?:\w+\.)?\w+\s*$")
+_DATE_TRUNC = re.compile(r"^\s*date_trunc\s*\(\s*'(\w+)'", re.IGNORECASE)
+# DATE_TRUNC unit -> QuickSight TimeGranularity
+_TRUNC_GRANULARITIES = {"year": "YEAR", "quarter": "QUARTER", "month": "MONTH", "week": "WEEK", "day": "DAY",
+                        "hour": "HOUR", "minute": "MINUTE", "second": "SECOND"}
+
+_AGGREGATIONS = {"sum": "SUM", "avg": "AVERAGE", "average": "AVERAGE", "count": "COUNT", "min": "MIN",
+                 "max": "MAX", "median": "MEDIAN"}
+
+# Visual requested in the user's words; anything not listed is left to the LLM planner
+_REQUESTED_VISUALS = (
+    (re.compile(r"\b(pie|donut|doughnut)\b", re.IGNORECASE), "PieChartVisual"),
+    (re.compile(r"\bline\b", re.IGNORECASE), "LineChartVisual"),
+    (re.compile(r"\b(bar|column)\b", re.IGNORECASE), "BarChartVisual"),
+    (re.compile(r"\btable\b", re.IGNORECASE), "TableVisual"),
+)
+_OTHER_VISUALS = re.compile(r"\b(scatter|heat ?map|tree ?map|funnel|gauge|kpi|histogram|box ?plot|waterfall|"
+                            r"word ?cloud|radar|combo|map|pivot|sankey)\b", re.IGNORECASE)
+
+
+def column_role(column_type: str) -> str:
+    """Role implied by an engine column type"""
+    if _TIME_TYPES.match(column_type or ""):
+        return ROLE_TIME
+    if _NUMERIC_TYPES.match(column_type or ""):
+        return ROLE_MEASURE
+    return ROLE_DIMENSION
+
+
+@dataclass
+class ColumnProfile:
+    """Type, cardinality and range of one result column (min/max only for measures and time)"""
+
+    name: str
+    type: str
+    role: str = ROLE_DIMENSION
+    distinct: Optional[int] = None
+    nulls: int = 0
+    min: Any = None
+    max: Any = None
+
+    def describe(self) -> str:
+        text = f"{self.name} {self.type} {self.role}"
+        details = []
+        if self.distinct is not None:
+            details.append(f"{self.distinct} distinct")
+        if self.min is not None and self.max is not None:
+            details.append(f"{_format_value(self.min)}..{_format_value(self.max)}")
+        if self.nulls:
+            details.append(f"{self.nulls} null")
+        return f"{text} ({', '.join(details)})" if details else text
+
+
+@dataclass
+class ResultProfile:
+    """Shape of a query result set"""
+
+    row_count: int
+    columns: List[ColumnProfile] = field(default_factory=list)
+
+    def column(self, name: str) -> Optional[ColumnProfile]:
+        return next((column for column in self.columns if column.name == name), None)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "row_count": self.row_count,
+            "columns": [dict(column.__dict__) for column in self.columns],
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ResultProfile":
+        return cls(data.get("row_count", 0), [ColumnProfile(**column) for column in data.get("columns", [])])
+
+    def to_prompt(self) -> str:
+        """One line for prompts, e.g. '12 rows; category VARCHAR dimension (12 distinct); ...'"""
+        parts = [f"{self.row_count} rows"]
+        parts += [column.describe() for column in self.columns[:PROFILE_PROMPT_COLUMNS]]
+        if len(self.columns) > PROFILE_PROMPT_COLUMNS:
+            parts.append(f"{len(self.columns) - PROFILE_PROMPT_COLUMNS} more columns")
+        return "; ".join(parts)
+
+
+def _format_value(value: Any) -> str:
+    if isinstance(value, float):
+        return f"{value:,.2f}"
+    if isinstance(value, int):
+        return f"{value:,}"
+    return str(value)
+
+
+def json_value(value: Any) -> Any:
+    """Profile min/max as a JSON-compatible value (numbers stay numbers, the rest becomes text)"""
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    try:
+        return float(value)  # Decimal
+    except (TypeError, ValueError):
+        return str(value)  # dates, timestamps
+
+
+def _source_column(name: str, breakdown: Dict[str, Any]) -> Tuple[Optional[str], Optional[str]]:
+    """
+    (dataset column, aggregation) behind a result column, using the SQL breakdown.
+
+    Returns (None, None) when the column cannot be traced to a single dataset column.
+    """
+    expression = breakdown.get("column_aliases", {}).get(name)
+    if expression is None:
+        return (name, None) if name in DATASET_COLUMNS else (None, None)
+    match = _AGGREGATE_EXPRESSION.match(expression)
+    if match:
+        function, distinct, column = match.group(1).lower(), match.group(2), match.group(3)
+        if column == "*":
+            return None, None
+        aggregation = "DISTINCT_COUNT" if function == "count" and distinct else _AGGREGATIONS[function]
+        return (column, aggregation) if column in DATASET_COLUMNS else (None, None)
+    # Non-aggregated expression such as DATE_TRUNC('month', si.sale_date): a dimension over one column
+    columns = {word for word in _IDENTIFIER.findall(expression) if word in DATASET_COLUMNS}
+    return (columns.pop(), None) if len(columns) == 1 else (None, None)
+
+
+def choose_visual_plan(profile: ResultProfile, breakdown: Dict[str, Any], user_input: str = "") -> Optional[VisualPlan]:
+    """
+    Pick the visual for a result set with one dimension and up to three measures.
+
+    Returns None when the result does not fit these rules, the user asked for a
+    visual type the rules do not cover, or the SQL filters or limits its rows,
+    so the LLM planner decides instead.
+    """
+    if _OTHER_VISUALS.search(user_input or ""):
+        return None
+    if breakdown.get("row_filters"):
+        # The profile counts rows after WHERE/HAVING/LIMIT, but the definition charts the whole
+        # dataset: a pie of the top 5 products would show every product
+        return None
+    dimensions: List[Tuple[str, ColumnProfile]] = []
+    measures: List[Tuple[str, str]] = []
+    for column in profile.columns:
+        source, aggregation = _source_column(column.name, breakdown)
+        if source is None:
+            return None
+        if aggregation is not None:
+            measures.append((source, aggregation))
+        else:
+            dimensions.append((source, column))
+    if len(dimensions) != 1 or not 1 <= len(measures) <= 3:
+        return None
+
+    dimension, dimension_profile = dimensions[0]
+    categories = dimension_profile.distinct if dimension_profile.distinct is not None else profile.row_count
+    is_time = dimension in DATE_COLUMNS or dimension_profile.role == ROLE_TIME
+    granularity = None
+    expression = breakdown.get("column_aliases", {}).get(dimension_profile.name)
+    if is_time and expression is not None and not _BARE_COLUMN.match(expression):
+        # Chart at the grain of the result, e.g. DATE_TRUNC('month', sale_date) -> MONTH
+        match = _DATE_TRUNC.match(expression)
+        granularity = _TRUNC_GRANULARITIES.get(match.group(1).lower()) if match else None
+        if granularity is None:
+            # EXTRACT, TO_CHAR and other date expressions have no QuickSight equivalent here
+            return None
+    requested = next((visual for pattern, visual in _REQUESTED_VISUALS if pattern.search(user_input or "")), None)
+
+    if requested == "TableVisual":
+        visual, reason = "TableVisual", "a table was requested"
+    elif requested == "PieChartVisual" and categories <= PIE_MAX_SLICES and len(measures) == 1:
+        visual, reason = "PieChartVisual", f"{categories} slices (at most {PIE_MAX_SLICES})"
+    elif is_time and requested in (None, "LineChartVisual"):
+        visual, reason = "LineChartVisual", f"{dimension} is a time dimension"
+    elif requested == "LineChartVisual":
+        return None
+    elif categories <= BAR_MAX_CATEGORIES:
+        visual, reason = "BarChartVisual", f"{categories} categories (at most {BAR_MAX_CATEGORIES})"
+    else:
+        visual, reason = "TableVisual", f"{categories} categories are too many for a chart"
+    if requested not in (None, visual):
+        reason += f"; {requested} does not fit this result"
+
+    sort = {"LineChartVisual": ("FieldSort", "ASC"), "TableVisual": (None, None)}.get(visual, ("FieldSort", "DESC"))
+    return VisualPlan.from_dict({
+        "VISUAL_TYPE": visual,
+        "DIMENSION_FIELDS": [dimension],
+        "MEASURE_FIELDS": [column for column, _ in measures],
+        "AGGREGATION_FUNCTION_REQUIRED": True,
+        "AGGREGATION_FUNCTIONS": [aggregation for _, aggregation in measures],
+        "SORT_TYPE": sort[0],
+        "SORT_DIRECTION": sort[1],
+        "DATE_GRANULARITY": granularity,
+        "SUMMARY": f"{visual} of {', '.join(column for column, _ in measures)} by {dimension}"
+                   f"{f' per {granularity.lower()}' if granularity else ''}, "
+                   f"chosen from the result profile: {reason}.",
+    })
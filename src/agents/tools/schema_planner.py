@@ -0,0 +1,411 @@
+"""
+Schema Planner - Deterministic query planner for the fashion store schema.
+
+This module holds a graph of the dataset_fashion_store_* tables, their columns
+and the foreign-key edges between them. Questions are matched against column
+keywords and the tables involved are connected with shortest join paths, so
+that common questions get a query plan without an LLM round trip. Questions
+with a word the planner does not understand (usually a filter value), a number
+or a time period are left to the LLM query planner.
+"""
+
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Optional, Dict, List, Tuple, Set
+import os
+import re
+
+SCHEMA_NAME = "public"
+TABLE_PREFIX = "dataset_fashion_store_"
+
+# Tables and their columns
+SCHEMA_TABLES: Dict[str, List[str]] = {
+    "dataset_fashion_store_sales": ["sale_id", "channel", "discounted", "total_amount", "start_date", "customer_id", "country"],
+    "dataset_fashion_store_customers": ["customer_id", "country", "age_range", "signup_date"],
+    "dataset_fashion_store_stock": ["country", "product_id", "stock_quantity"],
+    "dataset_fashion_store_products": ["product_id", "product_name", "category", "brand", "color", "size", "catalog_price", "cost_price", "gender"],
+    "dataset_fashion_store_salesitems": ["item_id", "sale_id", "product_id", "quantity", "original_price", "unit_price", "discount_applied", "discount_percent", "discounted", "item_total", "sale_date", "channel", "channel_campaigns"],
+    "dataset_fashion_store_campaigns": ["campaign_id", "campaign_name", "start_date", "end_date", "channel", "discount_type", "discount_value"],
+    "dataset_fashion_store_channels": ["channel", "description"],
+}
+
+# Foreign-key edges: (table, column, table, column)
+JOIN_EDGES: List[Tuple[str, str, str, str]] = [
+    ("dataset_fashion_store_salesitems", "sale_id", "dataset_fashion_store_sales", "sale_id"),
+    ("dataset_fashion_store_salesitems", "product_id", "dataset_fashion_store_products", "product_id"),
+    ("dataset_fashion_store_stock", "product_id", "dataset_fashion_store_products", "product_id"),
+    ("dataset_fashion_store_sales", "customer_id", "dataset_fashion_store_customers", "customer_id"),
+    ("dataset_fashion_store_sales", "channel", "dataset_fashion_store_channels", "channel"),
+    ("dataset_fashion_store_salesitems", "channel", "dataset_fashion_store_channels", "channel"),
+    ("dataset_fashion_store_campaigns", "channel", "dataset_fashion_store_channels", "channel"),
+    ("dataset_fashion_store_salesitems", "channel_campaigns", "dataset_fashion_store_campaigns", "campaign_name"),
+]
+
+# Every column name available in the dataset
+DATASET_COLUMNS: Set[str] = {column for columns in SCHEMA_TABLES.values() for column in columns}
+
+# Column types used when building QuickSight fields
+NUMERIC_COLUMNS: Set[str] = {
+    "total_amount", "stock_quantity", "catalog_price", "cost_price", "quantity", "original_price",
+    "unit_price", "discount_percent", "item_total", "discount_value",
+}
+DATE_COLUMNS: Set[str] = {"start_date", "end_date", "signup_date", "sale_date"}
+
+# Business vocabulary -> (table short name, column); short names drop TABLE_PREFIX
+KEYWORD_COLUMNS: Dict[str, Tuple[str, str]] = {
+    "revenue": ("salesitems", "item_total"),
+    "sale amount": ("sales", "total_amount"),
+    "order value": ("sales", "total_amount"),
+    "order": ("sales", "sale_id"),
+    "transaction": ("sales", "sale_id"),
+    "sale": ("salesitems", "item_total"),
+    "sold": ("salesitems", "quantity"),
+    "unit": ("salesitems", "quantity"),
+    "quantity": ("salesitems", "quantity"),
+    "item": ("salesitems", "item_id"),
+    "price": ("salesitems", "unit_price"),
+    "discount": ("salesitems", "discount_percent"),
+    "month": ("salesitems", "sale_date"),
+    "monthly": ("salesitems", "sale_date"),
+    "week": ("salesitems", "sale_date"),
+    "day": ("salesitems", "sale_date"),
+    "date": ("salesitems", "sale_date"),
+    "trend": ("salesitems", "sale_date"),
+    "time": ("salesitems", "sale_date"),
+    "product category": ("products", "category"),
+    "product name": ("products", "product_name"),
+    "product": ("products", "product_name"),
+    "category": ("products", "category"),
+    "brand": ("products", "brand"),
+    "color": ("products", "color"),
+    "colour": ("products", "color"),
+    "size": ("products", "size"),
+    "gender": ("products", "gender"),
+    "cost": ("products", "cost_price"),
+    "catalog": ("products", "catalog_price"),
+    "customer": ("customers", "customer_id"),
+    "age": ("customers", "age_range"),
+    "signup": ("customers", "signup_date"),
+    "country": ("sales", "country"),
+    "region": ("sales", "country"),
+    "stock": ("stock", "stock_quantity"),
+    "inventory": ("stock", "stock_quantity"),
+    "campaign": ("campaigns", "campaign_name"),
+    "promotion": ("campaigns", "campaign_name"),
+    "channel": ("channels", "channel"),
+}
+
+# Words that describe intent rather than data; they count as understood
+INTENT_WORDS = frozenset({
+    "top", "bottom", "best", "worst", "most", "least", "highest", "lowest", "total", "sum",
+    "average", "avg", "mean", "count", "number", "many", "much", "per", "each", "every", "by",
+    "compare", "comparison", "different", "across", "between", "breakdown", "distribution",
+    "performing", "performance", "perform", "term", "terms", "made", "make", "generated",
+    "overall", "all", "over", "trend", "analysis", "analyze", "rank", "ranking", "share",
+    "percentage", "percent", "growth", "selling", "sell", "it", "they", "their", "its",
+    "this", "that", "these", "those", "has", "have", "had", "been", "be", "was", "were",
+    "there", "from", "at", "than", "more", "less", "year", "how",
+    "who", "where", "when", "why", "get", "find", "see", "want", "like", "would", "could",
+    "should", "into", "via", "as", "s", "data", "value", "values", "amount", "level", "levels",
+})
+
+STOP_WORDS = frozenset({
+    "a", "an", "the", "of", "in", "on", "for", "to", "and", "or", "is", "are", "what",
+    "which", "show", "me", "give", "list", "please", "can", "you", "i", "we", "do", "does",
+    "with", "our", "my", "tell", "about", "store", "shop", "e", "commerce", "ecommerce",
+})
+
+AGGREGATION_KEYWORDS: List[Tuple[str, str]] = [
+    ("average", "AVG"), ("avg", "AVG"), ("mean", "AVG"),
+    ("how many", "COUNT"), ("number of", "COUNT"), ("count", "COUNT"),
+    ("minimum", "MIN"), ("maximum", "MAX"),
+]
+
+# Minimum confidence required to skip the LLM planner
+RULE_PLANNER_MIN_CONFIDENCE = float(os.getenv("RULE_PLANNER_MIN_CONFIDENCE", "0.75"))
+
+_TOKEN = re.compile(r"[a-z0-9_]+")
+_TOP_N = re.compile(r"\b(top|bottom|best|worst|highest|lowest|most|least)\s+(\d+)\b")
+# Words that ask for the smallest values first
+ASCENDING_WORDS = frozenset({"bottom", "worst", "lowest", "least"})
+# Time periods and row filters; plans have no WHERE clause, so these questions go to the LLM planner
+_FILTER = re.compile(
+    r"\b(?:this|last|next|past|previous|current)\s+(?:\d+\s+)?(?:day|week|month|quarter|year)s?\b"
+    r"|\b(?:ytd|mtd|yesterday|today|since|before|after|during|until|excluding|except|only)\b"
+    r"|\b(?:january|february|march|april|may|june|july|august|september|october|november|december)\b"
+)
+
+
+def _full_table_name(short_name: str) -> str:
+    return short_name if short_name.startswith(TABLE_PREFIX) else TABLE_PREFIX + short_name
+
+
+def _short_table_name(table: str) -> str:
+    return table[len(TABLE_PREFIX):] if table.startswith(TABLE_PREFIX) else table
+
+
+def _build_adjacency() -> Dict[str, List[Tuple[str, str, str]]]:
+    """table -> [(neighbour table, local column, neighbour column)]"""
+    adjacency: Dict[str, List[Tuple[str, str, str]]] = {table: [] for table in SCHEMA_TABLES}
+    for left, left_column, right, right_column in JOIN_EDGES:
+        adjacency[left].append((right, left_column, right_column))
+        adjacency[right].append((left, right_column, left_column))
+    return adjacency
+
+
+def _build_column_index() -> Dict[str, List[str]]:
+    """column name -> tables that contain it"""
+    index: Dict[str, List[str]] = {}
+    for table, columns in SCHEMA_TABLES.items():
+        for column in columns:
+            index.setdefault(column, []).append(table)
+    return index
+
+
+_ADJACENCY = _build_adjacency()
+_COLUMN_TABLES = _build_column_index()
+
+
+@dataclass
+class JoinStep:
+    """One edge of a join path"""
+
+    left_table: str
+    left_column: str
+    right_table: str
+    right_column: str
+
+    def describe(self) -> str:
+        return (f"{_short_table_name(self.left_table)}.{self.left_column} = "
+                f"{_short_table_name(self.right_table)}.{self.right_column}")
+
+
+@dataclass
+class RulePlan:
+    """Result of the rule-based planner"""
+
+    plan_text: str
+    tables: List[str] = field(default_factory=list)
+    columns: List[Tuple[str, str]] = field(default_factory=list)
+    joins: List[JoinStep] = field(default_factory=list)
+    aggregation: Optional[str] = None
+    limit: Optional[int] = None
+    ascending: bool = False
+    confidence: float = 0.0
+    path: str = "rules"
+
+    @property
+    def is_confident(self) -> bool:
+        return self.confidence >= RULE_PLANNER_MIN_CONFIDENCE
+
+
+def shortest_join_path(source: str, target: str) -> Optional[List[JoinStep]]:
+    """Breadth-first search for the fewest joins between two tables"""
+    if source == target:
+        return []
+    previous: Dict[str, Tuple[str, str, str]] = {source: ("", "", "")}
+    queue = deque([source])
+    while queue:
+        table = queue.popleft()
+        for neighbour, local_column, neighbour_column in _ADJACENCY[table]:
+            if neighbour in previous:
+                continue
+            previous[neighbour] = (table, local_column, neighbour_column)
+            if neighbour == target:
+                steps: List[JoinStep] = []
+                node = target
+                while node != source:
+                    parent, parent_column, node_column = previous[node]
+                    steps.append(JoinStep(parent, parent_column, node, node_column))
+                    node = parent
+                return list(reversed(steps))
+            queue.append(neighbour)
+    return None
+
+
+def connect_tables(tables: List[str]) -> Tuple[List[str], List[JoinStep]]:
+    """
+    Connect all tables with joins by growing a tree from the first table and
+    attaching each remaining table through its shortest path to the tree.
+    """
+    if not tables:
+        return [], []
+    connected = [tables[0]]
+    joins: List[JoinStep] = []
+    for table in tables[1:]:
+        if table in connected:
+            continue
+        best: Optional[List[JoinStep]] = None
+        for anchor in connected:
+            path = shortest_join_path(anchor, table)
+            if path is not None and (best is None or len(path) < len(best)):
+                best = path
+        for step in best or []:
+            if step.right_table not in connected:
+                connected.append(step.right_table)
+                joins.append(step)
+    return connected, joins
+
+
+def _tokenize(question: str) -> List[str]:
+    tokens = []
+    for token in _TOKEN.findall(question.lower()):
+        # Naive singularization is enough for the schema vocabulary
+        if len(token) > 3 and token.endswith("ies"):
+            token = token[:-3] + "y"
+        elif len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+def _match_columns(tokens: List[str]) -> Tuple[List[Tuple[str, str]], Set[int]]:
+    """Match bigrams then unigrams against vocabulary and column names"""
+    matches: List[Tuple[str, str]] = []
+    matched_positions: Set[int] = set()
+
+    for position in range(len(tokens) - 1):
+        phrase = f"{tokens[position]} {tokens[position + 1]}"
+        column_name = f"{tokens[position]}_{tokens[position + 1]}"
+        hit = KEYWORD_COLUMNS.get(phrase)
+        if hit:
+            matches.append((_full_table_name(hit[0]), hit[1]))
+            matched_positions.update((position, position + 1))
+        elif column_name in _COLUMN_TABLES:
+            matches.append((_COLUMN_TABLES[column_name][0], column_name))
+            matched_positions.update((position, position + 1))
+
+    for position, token in enumerate(tokens):
+        if position in matched_positions:
+            continue
+        hit = KEYWORD_COLUMNS.get(token)
+        if hit:
+            matches.append((_full_table_name(hit[0]), hit[1]))
+            matched_positions.add(position)
+        elif token in _COLUMN_TABLES:
+            matches.append((_COLUMN_TABLES[token][0], token))
+            matched_positions.add(position)
+
+    return matches, matched_positions
+
+
+def _resolve_shared_columns(matches: List[Tuple[str, str]]) -> List[Tuple[str, str]]:
+    """Move columns present in several tables onto a table the plan already needs"""
+    resolved: List[Tuple[str, str]] = []
+    for index, (table, column) in enumerate(matches):
+        other_tables = {other for position, (other, _) in enumerate(matches) if position != index}
+        if table not in other_tables:
+            shared = [candidate for candidate in _COLUMN_TABLES.get(column, []) if candidate in other_tables]
+            if shared:
+                table = shared[0]
+        if (table, column) not in resolved:
+            resolved.append((table, column))
+    return resolved
+
+
+def _detect_aggregation(question: str, columns: List[Tuple[str, str]]) -> Optional[str]:
+    lowered = question.lower()
+    for keyword, aggregation in AGGREGATION_KEYWORDS:
+        if re.search(rf"\b{keyword}\b", lowered):
+            return aggregation
+    numeric = {"item_total", "total_amount", "quantity", "stock_quantity", "unit_price",
+               "original_price", "cost_price", "catalog_price", "discount_percent", "discount_value"}
+    if any(column in numeric for _, column in columns):
+        return "SUM"
+    return None
+
+
+def _render_plan(plan: RulePlan, question: str) -> str:
+    """Summarize the plan into a small paragraph, as the LLM planner does"""
+    table_list = ", ".join(f"{SCHEMA_NAME}.{table}" for table in plan.tables)
+    column_list = ", ".join(f"{_short_table_name(table)}.{column}" for table, column in plan.columns)
+    sentences = [f"To answer \"{question.strip()}\", use {table_list}."]
+    if plan.joins:
+        sentences.append("Join " + ", then ".join(step.describe() for step in plan.joins) + ".")
+    sentences.append(f"The relevant columns are {column_list}.")
+
+    dimensions = [(t, c) for t, c in plan.columns if not _is_measure(c, plan.aggregation)]
+    measures = [(t, c) for t, c in plan.columns if _is_measure(c, plan.aggregation)]
+    if plan.aggregation and measures:
+        table, column = measures[0]
+        distinct = "DISTINCT " if plan.aggregation == "COUNT" and column.endswith("_id") else ""
+        expression = f"{plan.aggregation}({distinct}{_short_table_name(table)}.{column})"
+        if dimensions:
+            group_by = ", ".join(f"{_short_table_name(t)}.{c}" for t, c in dimensions)
+            sentences.append(f"Aggregate {expression} grouped by {group_by}.")
+        else:
+            sentences.append(f"Aggregate {expression} over the matching rows.")
+    elif plan.aggregation == "COUNT" and dimensions:
+        sentences.append("Count the matching rows grouped by "
+                         + ", ".join(f"{_short_table_name(t)}.{c}" for t, c in dimensions) + ".")
+    direction = "ascending" if plan.ascending else "descending"
+    if plan.limit:
+        sentences.append(f"Order the results {direction} and keep the {'bottom' if plan.ascending else 'top'} {plan.limit}.")
+    elif plan.ascending:
+        sentences.append(f"Order the results {direction}.")
+    return " ".join(sentences)
+
+
+def _is_measure(column: str, aggregation: Optional[str] = None) -> bool:
+    if aggregation == "COUNT" and column.endswith("_id"):
+        return True
+    return column.endswith(("_total", "_amount", "quantity", "_price", "_percent", "_value"))
+
+
+def plan_query(question: str) -> RulePlan:
+    """
+    Create a query plan for a question from the schema graph alone.
+
+    The returned plan carries a confidence score; callers should only use the
+    plan text when RulePlan.is_confident is True and fall back to the LLM
+    query planner otherwise.
+    """
+    tokens = _tokenize(question)
+    content_positions = [i for i, token in enumerate(tokens) if token not in STOP_WORDS and not token.isdigit()]
+    matches, matched_positions = _match_columns(tokens)
+    columns = _resolve_shared_columns(matches)
+
+    if not columns:
+        return RulePlan(plan_text="", confidence=0.0)
+
+    requested_tables = []
+    for table, _ in columns:
+        if table not in requested_tables:
+            requested_tables.append(table)
+    tables, joins = connect_tables(requested_tables)
+
+    understood = [i for i in content_positions if i in matched_positions or tokens[i] in INTENT_WORDS]
+    # Every content word must be understood: an unknown word is usually a filter value ("in Germany",
+    # "for women") that a plan without a WHERE clause would drop or turn into a group-by
+    complete = bool(content_positions) and len(understood) == len(content_positions)
+    # Long join chains are where the LLM tends to add value
+    confidence = (1.0 if complete else 0.0) * (1.0 if len(joins) <= 2 else 0.85)
+
+    lowered = question.lower()
+    top_n = _TOP_N.search(lowered)
+    # Any number besides "top N" (a year, a threshold) or a time/row filter needs a WHERE clause
+    if _FILTER.search(lowered) or re.search(r"\d", _TOP_N.sub(" ", lowered)):
+        confidence = 0.0
+    plan = RulePlan(
+        plan_text="",
+        tables=tables,
+        columns=columns,
+        joins=joins,
+        aggregation=_detect_aggregation(question, columns),
+        limit=int(top_n.group(2)) if top_n else None,
+        ascending=any(token in ASCENDING_WORDS for token in tokens),
+        confidence=round(confidence, 3),
+    )
+    plan.plan_text = _render_plan(plan, question)
+    return plan
+
+
+def describe_schema() -> str:
+    """Render the schema graph in the format used by the LLM planner prompt"""
+    lines = [f"- {SCHEMA_NAME}"]
+    for table, columns in SCHEMA_TABLES.items():
+        lines.append(f"    - {table} ({', '.join(columns)})")
+    lines.append("    JOIN KEYS:")
+    for left, left_column, right, right_column in JOIN_EDGES:
+        lines.append(f"    - {left}.{left_column} = {right}.{right_column}")
+    return "\n".join(lines)
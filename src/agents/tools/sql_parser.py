@@ -0,0 +1,426 @@
+"""
+SQL Parser - Local SQL breakdown engine for visualization planning.
+
+This module breaks a SQL query down into the actual table columns and tables
+it uses, separating them from SELECT aliases, table aliases, CTE names and
+subquery names. It produces the same column_names / table_names structure as
+the sql_analyzer_agent without an LLM round trip, and memoizes results by the
+hash of the normalized SQL.
+"""
+
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional, Dict, Any, List, Tuple
+import copy
+import hashlib
+import re
+import threading
+
+# SQL keywords that can never be column names
+KEYWORDS = frozenset({
+    "select", "from", "where", "group", "by", "order", "having", "limit", "offset", "as",
+    "on", "join", "inner", "left", "right", "full", "outer", "cross", "natural", "using",
+    "and", "or", "not", "in", "is", "null", "like", "ilike", "between", "exists", "case",
+    "when", "then", "else", "end", "distinct", "all", "union", "intersect", "except", "with",
+    "recursive", "asc", "desc", "nulls", "first", "last", "over", "partition", "rows",
+    "range", "preceding", "following", "unbounded", "current", "row", "filter", "within",
+    "interval", "true", "false", "cast", "extract", "year", "quarter", "month", "week", "day",
+    "hour", "minute", "second", "epoch", "dow", "doy", "date", "timestamp", "time", "fetch",
+    "next", "only", "top", "any", "some", "similar", "escape", "lateral", "window", "values",
+    "at", "zone", "varchar", "integer", "int", "bigint", "numeric", "decimal", "float",
+    "double", "precision", "text", "boolean", "char", "real", "smallint",
+})
+
+# Clause keywords after which a table reference follows
+_TABLE_CLAUSES = frozenset({"from", "join"})
+
+# Keywords that end a table reference list
+_CLAUSE_BOUNDARIES = frozenset({
+    "where", "group", "order", "having", "limit", "offset", "on", "using", "join", "inner",
+    "left", "right", "full", "outer", "cross", "natural", "union", "intersect", "except",
+    "window", "fetch", "lateral",
+})
+
+# Clauses that restrict which rows the query returns
+_ROW_FILTER_CLAUSES = frozenset({"where", "having", "limit", "offset", "fetch", "top"})
+
+_TOKEN_PATTERN = re.compile(
+    r"""
+    (?P<comment>--[^\n]*|/\*.*?\*/)
+    |(?P<string>'(?:[^']|'')*')
+    |(?P<quoted>"(?:[^"]|"")*"|`[^`]*`)
+    |(?P<number>\d+(?:\.\d*)?(?:[eE][+-]?\d+)?|\.\d+)
+    |(?P<word>[A-Za-z_][A-Za-z0-9_$]*)
+    |(?P<cast>::)
+    |(?P<symbol><>|!=|<=|>=|\|\||[(),.;*+\-/%<>=])
+    |(?P<space>\s+)
+    """,
+    re.VERBOSE | re.DOTALL,
+)
+
+_CACHE_SIZE = 256
+
+
+class SqlParseError(ValueError):
+    """Raised when a SQL query cannot be broken down"""
+
+
+@dataclass
+class _Token:
+    kind: str
+    value: str
+
+    @property
+    def lower(self) -> str:
+        return self.value.lower()
+
+    @property
+    def is_identifier(self) -> bool:
+        return self.kind == "quoted" or (self.kind == "word" and self.lower not in KEYWORDS)
+
+
+def _tokenize(sql: str) -> List[_Token]:
+    tokens: List[_Token] = []
+    position = 0
+    while position < len(sql):
+        match = _TOKEN_PATTERN.match(sql, position)
+        if match is None:
+            raise SqlParseError(f"Unexpected character {sql[position]!r} at position {position}")
+        position = match.end()
+        kind = match.lastgroup
+        if kind in ("space", "comment"):
+            continue
+        value = match.group(kind)
+        if kind == "quoted":
+            value = value[1:-1].replace('""', '"')
+        tokens.append(_Token(kind, value))
+    return tokens
+
+
+def _render(tokens: List[_Token]) -> str:
+    """Rebuild expression text from tokens with conventional spacing"""
+    text = ""
+    for token in tokens:
+        value = f"'{token.value[1:-1]}'" if token.kind == "string" else token.value
+        if text and not text.endswith(("(", ".")) and value not in (")", ",", ".", "("):
+            text += " "
+        elif value == "(" and text and not text[-1].isalnum() and not text.endswith(("(", ".")):
+            text += " "
+        text += value
+    return text
+
+
+def _append_unique(items: List[str], value: str) -> None:
+    if value not in items:
+        items.append(value)
+
+
+class _Breakdown:
+    """Single pass over the token stream collecting tables, aliases and columns"""
+
+    def __init__(self, tokens: List[_Token]):
+        self.tokens = tokens
+        self.table_names: List[str] = []
+        self.table_aliases: Dict[str, str] = {}
+        self.derived_names: List[str] = []
+        self.column_aliases: Dict[str, str] = {}
+        self.column_refs: List[Tuple[Optional[str], str]] = []
+        self.aggregates: Dict[str, List[str]] = {}
+        self.row_filters: List[str] = []
+
+    def _peek(self, index: int) -> Optional[_Token]:
+        return self.tokens[index] if 0 <= index < len(self.tokens) else None
+
+    def _read_dotted_name(self, index: int) -> Tuple[List[str], int]:
+        """Read identifier(.identifier)* starting at index"""
+        parts = [self.tokens[index].value]
+        index += 1
+        while (self._peek(index) is not None and self.tokens[index].value == "."
+               and self._peek(index + 1) is not None
+               and self.tokens[index + 1].kind in ("word", "quoted")):
+            parts.append(self.tokens[index + 1].value)
+            index += 2
+        return parts, index
+
+    def _read_cte_names(self) -> None:
+        """Collect CTE names declared as WITH name AS (...), name AS (...)"""
+        for index, token in enumerate(self.tokens):
+            if token.lower != "as":
+                continue
+            following = self._peek(index + 1)
+            previous = self._peek(index - 1)
+            before = self._peek(index - 2)
+            if (following is not None and following.value == "(" and previous is not None
+                    and previous.is_identifier and before is not None
+                    and (before.lower in ("with", "recursive") or before.value == ",")):
+                _append_unique(self.derived_names, previous.value)
+
+    def run(self) -> Dict[str, Any]:
+        self._read_cte_names()
+
+        # Stack of paren kinds: "function", "subquery" or "group"
+        parens: List[str] = []
+        # Parens that belong to a FROM/JOIN table reference, by depth
+        table_context_depths: List[int] = []
+        in_table_list = False
+        select_depths: List[int] = []
+        # Start index of the current SELECT list expression, by depth
+        expression_start: Dict[int, int] = {}
+        aggregate_stack: List[Tuple[str, int]] = []
+
+        index = 0
+        while index < len(self.tokens):
+            token = self.tokens[index]
+            lower = token.lower
+            depth = len(parens)
+
+            if token.value == "(":
+                previous = self._peek(index - 1)
+                following = self._peek(index + 1)
+                if following is not None and following.lower in ("select", "with"):
+                    parens.append("subquery")
+                elif previous is not None and (previous.is_identifier or previous.lower in (
+                        "cast", "extract", "count", "over", "filter", "within")):
+                    parens.append("function")
+                    if previous.lower in _AGGREGATES:
+                        aggregate_stack.append((previous.lower, len(parens)))
+                else:
+                    parens.append("group")
+                if in_table_list and parens[-1] == "subquery":
+                    table_context_depths.append(len(parens))
+                in_table_list = False
+                index += 1
+                continue
+
+            if token.value == ")":
+                if not parens:
+                    raise SqlParseError("Unbalanced parenthesis in SQL query")
+                closing_depth = len(parens)
+                parens.pop()
+                while aggregate_stack and aggregate_stack[-1][1] == closing_depth:
+                    aggregate_stack.pop()
+                while select_depths and select_depths[-1] > len(parens):
+                    select_depths.pop()
+                if table_context_depths and table_context_depths[-1] == closing_depth:
+                    # Alias of a derived table: (SELECT ...) [AS] name
+                    table_context_depths.pop()
+                    alias_index = index + 1
+                    if self._peek(alias_index) is not None and self.tokens[alias_index].lower == "as":
+                        alias_index += 1
+                    alias = self._peek(alias_index)
+                    if alias is not None and alias.is_identifier:
+                        _append_unique(self.derived_names, alias.value)
+                        index = alias_index + 1
+                        in_table_list = True
+                        continue
+                index += 1
+                continue
+
+            if lower == "select":
+                select_depths.append(depth)
+                expression_start[depth] = index + 1
+                in_table_list = False
+                index += 1
+                continue
+
+            if lower in _TABLE_CLAUSES and (not parens or parens[-1] != "function"):
+                if lower == "from" and select_depths and select_depths[-1] == depth:
+                    # The SELECT list ends here; later identifiers are not aliases
+                    select_depths.pop()
+                in_table_list = True
+                index += 1
+                continue
+
+            if lower in _CLAUSE_BOUNDARIES or lower == "select":
+                in_table_list = False
+
+            if token.kind == "word" and lower in _ROW_FILTER_CLAUSES:
+                _append_unique(self.row_filters, lower.upper())
+
+            if token.value == "," and select_depths and select_depths[-1] == depth:
+                expression_start[depth] = index + 1
+
+            if token.kind == "cast":
+                # Skip the type name of a ::type cast
+                index += 2
+                continue
+
+            if lower == "as":
+                following = self._peek(index + 1)
+                if parens and parens[-1] == "function":
+                    # CAST(x AS type): skip the type name
+                    index += 2
+                    continue
+                if following is not None and following.kind in ("word", "quoted") and not in_table_list:
+                    if following.value not in self.derived_names:
+                        start = expression_start.get(depth, index)
+                        expression = _render(self.tokens[start:index])
+                        self.column_aliases[following.value] = expression
+                    index += 2
+                    continue
+
+            if in_table_list and token.is_identifier:
+                parts, next_index = self._read_dotted_name(index)
+                table = parts[-1]
+                if table not in self.derived_names:
+                    _append_unique(self.table_names, table)
+                alias_index = next_index
+                if self._peek(alias_index) is not None and self.tokens[alias_index].lower == "as":
+                    alias_index += 1
+                alias = self._peek(alias_index)
+                if alias is not None and alias.is_identifier and alias.lower not in _CLAUSE_BOUNDARIES:
+                    self.table_aliases[alias.value] = table
+                    next_index = alias_index + 1
+                self.table_aliases.setdefault(table, table)
+                index = next_index
+                continue
+
+            if token.is_identifier:
+                following = self._peek(index + 1)
+                if following is not None and following.value == "(":
+                    # Function name
+                    index += 1
+                    continue
+                parts, next_index = self._read_dotted_name(index)
+                qualifier = parts[-2] if len(parts) > 1 else None
+                column = parts[-1]
+                if self._is_implicit_alias(index, depth, select_depths):
+                    start = expression_start.get(depth, index)
+                    self.column_aliases[column] = _render(self.tokens[start:index])
+                else:
+                    self.column_refs.append((qualifier, column))
+                    for aggregate, _ in aggregate_stack:
+                        _append_unique(self.aggregates.setdefault(aggregate.upper(), []), column)
+                index = next_index
+                continue
+
+            index += 1
+
+        if parens:
+            raise SqlParseError("Unbalanced parenthesis in SQL query")
+        return self._result()
+
+    def _is_implicit_alias(self, index: int, depth: int, select_depths: List[int]) -> bool:
+        """SELECT SUM(x) total_revenue -- an identifier right after a complete expression"""
+        if not select_depths or select_depths[-1] != depth:
+            return False
+        previous = self._peek(index - 1)
+        following = self._peek(index + 1)
+        if previous is None or previous.value in (",", "(", ".") or previous.lower == "select":
+            return False
+        if previous.kind == "word" and previous.lower in KEYWORDS and previous.lower not in ("end",):
+            return False
+        if previous.kind == "symbol" and previous.value not in (")", "*"):
+            return False
+        return following is None or following.value == "," or following.lower == "from"
+
+    def _result(self) -> Dict[str, Any]:
+        column_names: List[str] = []
+        for qualifier, column in self.column_refs:
+            if column == "*":
+                continue
+            if qualifier is None and column in self.column_aliases:
+                continue
+            if column in self.derived_names or column in self.table_aliases:
+                continue
+            source = self.table_aliases.get(qualifier, qualifier) if qualifier else None
+            if source is not None and source in self.derived_names and column in self.column_aliases:
+                continue
+            _append_unique(column_names, column)
+
+        return {
+            "column_names": column_names,
+            "table_names": list(self.table_names),
+            "column_aliases": dict(self.column_aliases),
+            "table_aliases": {alias: table for alias, table in self.table_aliases.items() if alias != table},
+            "aggregations": {name: list(columns) for name, columns in self.aggregates.items()},
+            "derived_tables": list(self.derived_names),
+            "row_filters": list(self.row_filters),
+        }
+
+
+_AGGREGATES = frozenset({"sum", "avg", "count", "min", "max", "median", "stddev", "variance",
+                         "stddev_pop", "stddev_samp", "var_pop", "var_samp"})
+
+_breakdown_cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _sql_hash(sql: str) -> str:
+    """Cache key of a query; only the case of keywords and aggregate names, whitespace and comments are normalised"""
+    parts = []
+    position = 0
+    while position < len(sql):
+        match = _TOKEN_PATTERN.match(sql, position)
+        if match is None:
+            # Not tokenizable: parsing will fail anyway, so whitespace-only normalisation is enough
+            parts = [" ".join(sql.split())]
+            break
+        position = match.end()
+        kind = match.lastgroup
+        if kind in ("space", "comment"):
+            continue
+        value = match.group(kind)
+        # Literals and quoted identifiers keep their case: 'Zara' and 'ZARA' are different queries
+        folded = kind == "word" and (value.lower() in KEYWORDS or value.lower() in _AGGREGATES)
+        parts.append(value.lower() if folded else value)
+    while parts and parts[-1] == ";":
+        parts.pop()
+    return hashlib.sha256(" ".join(parts).encode("utf-8")).hexdigest()
+
+
+def analyze_sql(sql: str) -> Dict[str, Any]:
+    """
+    Break a SQL query down into its real columns and tables.
+
+    Args:
+        sql: SQL query text
+
+    Returns:
+        Dict with "column_names" and "table_names" (as produced by the
+        sql_analyzer_agent), plus "column_aliases", "table_aliases",
+        "aggregations" and "derived_tables" details, and "row_filters" (the
+        WHERE/HAVING/LIMIT/OFFSET/FETCH/TOP clauses present)
+    """
+    if not sql or not sql.strip():
+        raise SqlParseError("Empty SQL query")
+
+    key = _sql_hash(sql)
+    with _cache_lock:
+        cached = _breakdown_cache.get(key)
+        if cached is not None:
+            _breakdown_cache.move_to_end(key)
+            return copy.deepcopy(cached)
+
+    breakdown = _Breakdown(_tokenize(sql)).run()
+
+    with _cache_lock:
+        _breakdown_cache[key] = breakdown
+        while len(_breakdown_cache) > _CACHE_SIZE:
+            _breakdown_cache.popitem(last=False)
+    return copy.deepcopy(breakdown)
+
+
+def format_sql_breakdown(breakdown: Dict[str, Any]) -> str:
+    """Render a breakdown in the sql_analyzer_agent output format"""
+    lines = [
+        "SQL BREAKDOWN:",
+        f"    - \"column_names\": {breakdown['column_names']}",
+        f"    - \"table_names\": {breakdown['table_names']}",
+    ]
+    if breakdown.get("column_aliases"):
+        lines.append(f"    - \"alias_names\": {breakdown['column_aliases']}")
+    return "\n".join(lines)
+
+
+def extract_sql(text: str) -> Optional[str]:
+    """Pull a SQL query out of free text (```sql blocks or a bare SELECT/WITH statement)"""
+    if not text:
+        return None
+    block = re.search(r"```sql\s*([\s\S]*?)```", text, re.IGNORECASE)
+    if block:
+        return block.group(1).strip()
+    statement = re.search(r"\b(with|select)\b[\s\S]*", text, re.IGNORECASE)
+    if statement and re.search(r"\bfrom\b", statement.group(0), re.IGNORECASE):
+        return statement.group(0).strip()
+    return None
@@ -1,10 +1,12 @@
 from agents import Agent
 import json
 import re
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 
 DATASET_IDENTIFIER = "4485d828-ce32-44bf-b38e-75fa8fcd571c"
 DATASET_ARN = "arn:aws:quicksight:us-west-2:817491136527:dataset/4485d828-ce32-44bf-b38e-75fa8fcd571c"
+# Value the JSON definition template uses before the dataset identifier is filled in
+DATASET_PLACEHOLDER = "Do_not_change_this_value"
 
 INSTRUCTIONS = """
 You are a dashboard definition generator expert for Amazon QuickSight. Your role is to analyze, follow and use the values and guidelines from the visualisation_plan and generate a complete QuickSight dashboard definition in JSON format.
@@ -177,30 +179,56 @@ def get_definition_json(visual_json_definition: str) -> Dict[str, Any]:
         print(f"❌ JSON parsing failed: {str(e)}")
         raise ValueError(f"Failed to parse JSON: {e}")
 
-def add_dataset_identifier(json_definition: Dict[str, Any]) -> Dict[str, Any]:
+def add_dataset_identifier(
+  json_definition: Dict[str, Any],
+  datasets: Optional[Dict[str, str]] = None,
+  substitutions: Optional[Dict[str, str]] = None,
+) -> Dict[str, Any]:
   """
-  Add the dataset identifier to the json definition and replace all DataSetIdentifier placeholders.
+  Add the dataset declarations to the json definition and substitute DataSetIdentifier values in place.
+
+  Only values stored under a "DataSetIdentifier" key are rewritten, so user text such as titles or
+  calculated field expressions is never touched.
+
+  Args:
+    json_definition: Dictionary with a "Definition" key; modified in place and returned
+    datasets: Logical dataset identifier -> dataset ARN to declare (defaults to the fashion store dataset)
+    substitutions: DataSetIdentifier value -> logical identifier to use instead
+      (defaults to mapping the template placeholder to the first declared dataset)
   """
-  if "Definition" in json_definition:
-    # Add DataSetIdentifierDeclarations
-    json_definition["Definition"]["DataSetIdentifierDeclarations"] = [
-      {
-        "DataSetArn": DATASET_ARN,
-        "Identifier": DATASET_IDENTIFIER
-      }
-    ]
-    
-    # Convert to JSON string to replace all DataSetIdentifier placeholders throughout the definition
-    json_string = json.dumps(json_definition)
-    
-    json_string = json_string.replace("Do_not_change_this_value", DATASET_IDENTIFIER)
-    
-    # Convert back to dictionary
-    json_definition = json.loads(json_string)
-    
-  else:
-    raise ValueError("Definition key not found in the json definition")
+  if "Definition" not in json_definition:
     print(f"\n❌ Definition key not found in the json definition: {json_definition} \n")
-  
-  print(f"\n✅ Added dataset identifier and replaced placeholders in the json definition")
-  return json_definition
\ No newline at end of file
+    raise ValueError("Definition key not found in the json definition")
+
+  datasets = datasets or {DATASET_IDENTIFIER: DATASET_ARN}
+  if substitutions is None:
+    substitutions = {DATASET_PLACEHOLDER: next(iter(datasets))}
+
+  definition = json_definition["Definition"]
+
+  # Declare every dataset once, keeping declarations already present
+  declarations = definition.setdefault("DataSetIdentifierDeclarations", [])
+  declared = {declaration.get("Identifier") for declaration in declarations}
+  for identifier, arn in datasets.items():
+    if identifier not in declared:
+      declarations.append({"DataSetArn": arn, "Identifier": identifier})
+
+  replaced = 0
+  stack = [value for key, value in definition.items() if key != "DataSetIdentifierDeclarations"]
+  while stack:
+    node = stack.pop()
+    if type(node) is dict:
+      identifier = node.get("DataSetIdentifier")
+      if identifier.__class__ is str and identifier in substitutions:
+        node["DataSetIdentifier"] = substitutions[identifier]
+        replaced += 1
+      for value in node.values():
+        if type(value) is dict or type(value) is list:
+          stack.append(value)
+    elif type(node) is list:
+      for value in node:
+        if type(value) is dict or type(value) is list:
+          stack.append(value)
+
+  print(f"\n✅ Added dataset identifier and replaced {replaced} placeholders in the json definition")
+  return json_definition
@@ -0,0 +1,274 @@
+"""
+Visual Plan - Typed structured output of the visual planner agent.
+
+This module defines the VisualPlan returned by the visual_planner_agent, with
+enum-validated visual types, field-well types, aggregations and sort options
+as listed in the planner's instructions. A single-pass validator checks the
+visual type / field-well pairing and the column names against the known
+dataset columns, so invalid plans are rejected before any QuickSight call.
+"""
+
+from dataclasses import dataclass
+from enum import Enum
+from typing import Optional, Dict, Any, List, Iterable
+
+from .schema_planner import DATASET_COLUMNS
+
+
+class VisualType(str, Enum):
+    TableVisual = "TableVisual"
+    PivotTableVisual = "PivotTableVisual"
+    BarChartVisual = "BarChartVisual"
+    KPIVisual = "KPIVisual"
+    PieChartVisual = "PieChartVisual"
+    GaugeChartVisual = "GaugeChartVisual"
+    LineChartVisual = "LineChartVisual"
+    HeatMapVisual = "HeatMapVisual"
+    TreeMapVisual = "TreeMapVisual"
+    GeospatialMapVisual = "GeospatialMapVisual"
+    FilledMapVisual = "FilledMapVisual"
+    LayerMapVisual = "LayerMapVisual"
+    FunnelChartVisual = "FunnelChartVisual"
+    ScatterPlotVisual = "ScatterPlotVisual"
+    ComboChartVisual = "ComboChartVisual"
+    BoxPlotVisual = "BoxPlotVisual"
+    WaterfallVisual = "WaterfallVisual"
+    HistogramVisual = "HistogramVisual"
+    WordCloudVisual = "WordCloudVisual"
+    InsightVisual = "InsightVisual"
+    SankeyDiagramVisual = "SankeyDiagramVisual"
+    CustomContentVisual = "CustomContentVisual"
+    EmptyVisual = "EmptyVisual"
+    RadarChartVisual = "RadarChartVisual"
+    PluginVisual = "PluginVisual"
+
+
+class FieldWellsType(str, Enum):
+    TableAggregatedFieldWells = "TableAggregatedFieldWells"
+    PivotTableAggregatedFieldWells = "PivotTableAggregatedFieldWells"
+    BarChartAggregatedFieldWells = "BarChartAggregatedFieldWells"
+    KPIAggregatedFieldWells = "KPIAggregatedFieldWells"
+    PieChartAggregatedFieldWells = "PieChartAggregatedFieldWells"
+    GaugeChartAggregatedFieldWells = "GaugeChartAggregatedFieldWells"
+    LineChartAggregatedFieldWells = "LineChartAggregatedFieldWells"
+    HeatMapAggregatedFieldWells = "HeatMapAggregatedFieldWells"
+    TreeMapAggregatedFieldWells = "TreeMapAggregatedFieldWells"
+    GeospatialMapAggregatedFieldWells = "GeospatialMapAggregatedFieldWells"
+    FilledMapAggregatedFieldWells = "FilledMapAggregatedFieldWells"
+    FunnelChartAggregatedFieldWells = "FunnelChartAggregatedFieldWells"
+    ScatterPlotAggregatedFieldWells = "ScatterPlotAggregatedFieldWells"
+    ComboChartAggregatedFieldWells = "ComboChartAggregatedFieldWells"
+    BoxPlotAggregatedFieldWells = "BoxPlotAggregatedFieldWells"
+    WaterfallAggregatedFieldWells = "WaterfallAggregatedFieldWells"
+    HistogramAggregatedFieldWells = "HistogramAggregatedFieldWells"
+    WordCloudAggregatedFieldWells = "WordCloudAggregatedFieldWells"
+    SankeyDiagramAggregatedFieldWells = "SankeyDiagramAggregatedFieldWells"
+    RadarChartAggregatedFieldWells = "RadarChartAggregatedFieldWells"
+
+
+class AggregationFunction(str, Enum):
+    SUM = "SUM"
+    AVERAGE = "AVERAGE"
+    MIN = "MIN"
+    MAX = "MAX"
+    COUNT = "COUNT"
+    DISTINCT_COUNT = "DISTINCT_COUNT"
+    VAR = "VAR"
+    VARP = "VARP"
+    STDEV = "STDEV"
+    STDEVP = "STDEVP"
+    MEDIAN = "MEDIAN"
+
+
+class SortType(str, Enum):
+    FieldSort = "FieldSort"
+    ColumnSort = "ColumnSort"
+
+
+class SortDirection(str, Enum):
+    ASC = "ASC"
+    DESC = "DESC"
+
+
+class TimeGranularity(str, Enum):
+    YEAR = "YEAR"
+    QUARTER = "QUARTER"
+    MONTH = "MONTH"
+    WEEK = "WEEK"
+    DAY = "DAY"
+    HOUR = "HOUR"
+    MINUTE = "MINUTE"
+    SECOND = "SECOND"
+
+
+class FilterType(str, Enum):
+    CategoryFilter = "CategoryFilter"
+    NumericRangeFilter = "NumericRangeFilter"
+    NumericEqualityFilter = "NumericEqualityFilter"
+    TimeEqualityFilter = "TimeEqualityFilter"
+    TimeRangeFilter = "TimeRangeFilter"
+    RelativeDatesFilter = "RelativeDatesFilter"
+    TopBottomFilter = "TopBottomFilter"
+    NestedFilter = "NestedFilter"
+
+
+# Field-well type each visual type must be paired with; None means the visual has no field wells type
+VISUAL_FIELD_WELLS: Dict[VisualType, Optional[FieldWellsType]] = {
+    visual_type: FieldWellsType.__members__.get(visual_type.value.replace("Visual", "AggregatedFieldWells"))
+    for visual_type in VisualType
+}
+
+
+@dataclass
+class CalculatedField:
+    """A calculated field: name = expression"""
+
+    name: str
+    expression: str
+
+
+@dataclass
+class VisualPlan:
+    """Structured visualization plan produced by the visual planner agent"""
+
+    visual_type: VisualType
+    dimension_fields: List[str]
+    measure_fields: List[str]
+    aggregation_function_required: bool
+    aggregation_functions: List[AggregationFunction]
+    sort_type: Optional[SortType]
+    sort_direction: Optional[SortDirection]
+    filter_types: List[FilterType]
+    calculated_fields_required: bool
+    calculated_fields: List[CalculatedField]
+    summary: str
+    # Filled from VISUAL_FIELD_WELLS by validate_visual_plan when not given
+    field_wells_type: Optional[FieldWellsType] = None
+    # Grain of date dimensions, e.g. MONTH for DATE_TRUNC('month', ...); None keeps QuickSight's default
+    date_granularity: Optional[TimeGranularity] = None
+
+    @classmethod
+    def from_dict(cls, plan: Dict[str, Any]) -> "VisualPlan":
+        """Build a plan from a KEY: value plan dict, raising ValueError on unknown enum values"""
+        def enum_or_none(enum_type, value):
+            return enum_type(value) if value else None
+
+        return cls(
+            visual_type=VisualType(plan.get("VISUAL_TYPE")),
+            dimension_fields=list(plan.get("DIMENSION_FIELDS", [])),
+            measure_fields=list(plan.get("MEASURE_FIELDS", [])),
+            aggregation_function_required=bool(plan.get("AGGREGATION_FUNCTION_REQUIRED")),
+            aggregation_functions=[AggregationFunction(name) for name in plan.get("AGGREGATION_FUNCTIONS", [])],
+            sort_type=enum_or_none(SortType, plan.get("SORT_TYPE")),
+            sort_direction=enum_or_none(SortDirection, plan.get("SORT_DIRECTION")),
+            filter_types=[FilterType(name) for name in plan.get("FILTER_TYPES", []) or []],
+            calculated_fields_required=bool(plan.get("CALCULATED_FIELDS_REQUIRED")),
+            calculated_fields=[CalculatedField(name, expression)
+                               for name, expression in plan.get("CALCULATED_FIELDS", {}).items()],
+            summary=plan.get("SUMMARY", ""),
+            field_wells_type=enum_or_none(FieldWellsType, plan.get("FIELD_WELLS_TYPE")),
+            date_granularity=enum_or_none(TimeGranularity, plan.get("DATE_GRANULARITY")),
+        )
+
+    def to_plan_dict(self) -> Dict[str, Any]:
+        """Plan dict with the planner's KEY names, as consumed by the definition compiler"""
+        return {
+            "VISUAL_TYPE": self.visual_type.value,
+            "FIELD_WELLS_TYPE": self.field_wells_type.value if self.field_wells_type else None,
+            "DIMENSION_FIELDS": list(self.dimension_fields),
+            "MEASURE_FIELDS": list(self.measure_fields),
+            "AGGREGATION_FUNCTION_REQUIRED": self.aggregation_function_required,
+            "AGGREGATION_FUNCTIONS": [function.value for function in self.aggregation_functions],
+            "SORT_TYPE": self.sort_type.value if self.sort_type else None,
+            "SORT_DIRECTION": self.sort_direction.value if self.sort_direction else None,
+            "FILTER_TYPES": [filter_type.value for filter_type in self.filter_types],
+            "CALCULATED_FIELDS_REQUIRED": self.calculated_fields_required,
+            "CALCULATED_FIELDS": {field.name: field.expression for field in self.calculated_fields},
+            "SUMMARY": self.summary,
+            "DATE_GRANULARITY": self.date_granularity.value if self.date_granularity else None,
+        }
+
+    def to_text(self) -> str:
+        """Render the plan in the planner's KEY: value format for display"""
+        plan = self.to_plan_dict()
+        lines = [
+            f"VISUAL_TYPE: {plan['VISUAL_TYPE']}",
+            f"FIELD_WELLS_TYPE: {plan['FIELD_WELLS_TYPE']}",
+            f"DIMENSION_FIELDS: {plan['DIMENSION_FIELDS']}",
+            f"MEASURE_FIELDS: {plan['MEASURE_FIELDS']}",
+            f"AGGREGATION_FUNCTION_REQUIRED: {plan['AGGREGATION_FUNCTION_REQUIRED']}",
+        ]
+        if plan["AGGREGATION_FUNCTION_REQUIRED"]:
+            lines.append(f"AGGREGATION_FUNCTIONS: {plan['AGGREGATION_FUNCTIONS']}")
+        lines += [
+            f"SORT_TYPE: {plan['SORT_TYPE']}",
+            f"SORT_DIRECTION: {plan['SORT_DIRECTION']}",
+            f"FILTER_TYPES: {plan['FILTER_TYPES']}",
+            f"CALCULATED_FIELDS_REQUIRED: {plan['CALCULATED_FIELDS_REQUIRED']}",
+        ]
+        if plan["CALCULATED_FIELDS_REQUIRED"]:
+            lines.append(f"CALCULATED_FIELDS: {plan['CALCULATED_FIELDS']}")
+        if plan["DATE_GRANULARITY"]:
+            lines.append(f"DATE_GRANULARITY: {plan['DATE_GRANULARITY']}")
+        lines.append(f"\nSUMMARY: {self.summary}")
+        return "\n".join(lines)
+
+    def __str__(self) -> str:
+        return self.to_text()
+
+
+class VisualPlanError(ValueError):
+    """Raised when a visualization plan fails validation"""
+
+    def __init__(self, errors: List[str]):
+        self.errors = errors
+        super().__init__("Invalid visualization plan: " + "; ".join(errors))
+
+
+def validate_visual_plan(plan: VisualPlan, known_columns: Iterable[str] = DATASET_COLUMNS) -> List[str]:
+    """
+    Check a plan in a single pass and return the list of problems found.
+
+    Fills a missing field-well type from the visual type, then checks the
+    visual type / field-well pairing, that every dimension and measure is a
+    known dataset column or a declared calculated field, and that aggregation
+    and calculated-field flags agree with their values.
+    """
+    errors: List[str] = []
+    columns = known_columns if isinstance(known_columns, (set, frozenset)) else set(known_columns)
+
+    expected_wells = VISUAL_FIELD_WELLS.get(plan.visual_type)
+    if plan.field_wells_type is None:
+        plan.field_wells_type = expected_wells
+    elif expected_wells is not None and plan.field_wells_type != expected_wells:
+        errors.append(f"{plan.visual_type.value} must use {expected_wells.value}, not {plan.field_wells_type.value}")
+
+    calculated_names = set()
+    for calculated_field in plan.calculated_fields:
+        if not calculated_field.name.strip() or not calculated_field.expression.strip():
+            errors.append(f"Calculated field {calculated_field.name!r} needs both a name and an expression")
+        calculated_names.add(calculated_field.name)
+
+    for role, fields in (("dimension", plan.dimension_fields), ("measure", plan.measure_fields)):
+        for name in fields:
+            if name not in columns and name not in calculated_names:
+                errors.append(f"Unknown {role} column {name!r}")
+
+    if not plan.measure_fields and plan.visual_type not in (VisualType.EmptyVisual, VisualType.InsightVisual,
+                                                           VisualType.CustomContentVisual):
+        errors.append("At least one measure field is required")
+    if plan.aggregation_function_required and not plan.aggregation_functions:
+        errors.append("AGGREGATION_FUNCTION_REQUIRED is True but no aggregation functions were given")
+    if plan.calculated_fields_required and not plan.calculated_fields:
+        errors.append("CALCULATED_FIELDS_REQUIRED is True but no calculated fields were given")
+    if (plan.sort_type is None) != (plan.sort_direction is None):
+        errors.append("SORT_TYPE and SORT_DIRECTION must be given together")
+    return errors
+
+
+def ensure_valid_visual_plan(plan: VisualPlan, known_columns: Iterable[str] = DATASET_COLUMNS) -> VisualPlan:
+    """Return the plan unchanged, or raise VisualPlanError listing every problem"""
+    errors = validate_visual_plan(plan, known_columns)
+    if errors:
+        raise VisualPlanError(errors)
+    return plan
@@ -6,6 +6,7 @@ visual plans with appropriate chart types, field mappings, and configurations.
 """
 
 from agents import Agent
+from .visual_plan import VisualPlan
 
 # Comprehensive instructions for visual planning with all QuickSight options
 INSTRUCTIONS = """
@@ -174,6 +175,8 @@ ANALYSIS PROCESS:
 OUTPUT FORMAT :
 
 - ALWAYS FOLLOW THE BELOW OUTPUT FORMAT.
+- The output is returned as a structured VisualPlan object. Each KEY below maps to the field of the same name in lower case
+  (e.g. VISUAL_TYPE -> visual_type), CALCULATED_FIELDS is a list of {name, expression} objects and SUMMARY goes in summary.
 
    - REQUIRED KEYS THAT ALWAYS MUST BE PRESENT IN THE OUTPUT:
 
@@ -214,7 +217,7 @@ SUMMARY: Based on the user's question about total revenue by category, a bar cha
 OUTPUT EXAMPLE 2 (Complex calculation - calculated fields needed):
 VISUAL_TYPE: BarChartVisual
 FIELD_WELLS_TYPE: BarChartAggregatedFieldWells
-DIMENSION_FIELDS: ["product_category"]
+DIMENSION_FIELDS: ["category"]
 MEASURE_FIELDS: ["profit_margin"]
 AGGREGATION_FUNCTION_REQUIRED: False
 SORT_TYPE: FieldSort
@@ -231,5 +234,6 @@ Always provide specific, actionable planning that directly addresses the user's
 visual_planner_agent = Agent(
     name="Data Visualizer Agent",
     model="gpt-4o-mini",
-    instructions=INSTRUCTIONS
+    instructions=INSTRUCTIONS,
+    output_type=VisualPlan
 )
\ No newline at end of file
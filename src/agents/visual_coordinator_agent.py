@@ -5,76 +5,185 @@ This agent orchestrates the creation of QuickSight visualizations by coordinatin
 between visual planning, JSON definition generation, and analysis creation.
 """
 
-from agents import Agent, ModelSettings, function_tool, Runner
+from dataclasses import replace
+from typing import Optional, Dict, Any
+import asyncio
+import os
+import time
+from agents import Agent, ModelSettings, RunContextWrapper, function_tool, Runner
 from .tools.visual_planner import visual_planner_agent
-from .tools.visual_creator import visual_definition_generator, get_definition_json, add_dataset_identifier
+from .tools.visual_creator import visual_definition_generator, get_definition_json, add_dataset_identifier, DATASET_ARN
 from .tools.quicksight_agent import quicksight_agent
-from ..memory.agent_memory import AGENT_MEMORY
-from ..services.quicksight_service import create_analysis, get_available_analyses, update_analysis_permissions
+from ..memory.agent_memory import AgentRunContext, memory_from_context, session_id_from_context
+from ..services.quicksight_service import get_available_analyses, get_dataset_columns
+from ..services.analysis_jobs import ANALYSIS_JOBS
+from ..services.stage_runner import StageRunner, StageFailedError
+from ..instrumentation import span, payload_size, KIND_STAGE
 from .tools.sql_analyzer import sql_analyzer_agent
+from .tools.sql_parser import analyze_sql, format_sql_breakdown, extract_sql, SqlParseError
+from .tools.definition_compiler import compile_definition, normalize_aggregation, DefinitionCompileError
+from .tools.visual_plan import (VisualPlan, VisualType, AggregationFunction, SortDirection, VISUAL_FIELD_WELLS,
+                                ensure_valid_visual_plan, validate_visual_plan)
+from .tools.definition_patch import VisualEdit, DefinitionEditError, edit_visual
+from .tools.definition_validator import ensure_valid_definition, DefinitionValidationError
+from .tools.result_profile import choose_visual_plan
+
+DATASET_ID = DATASET_ARN.rsplit("/", 1)[-1]
+
+# Stage budgets for run_visual_planner
+SQL_ANALYSIS_TIMEOUT_SECONDS = float(os.getenv("SQL_ANALYSIS_TIMEOUT_SECONDS", "60"))
+DATASET_COLUMNS_TIMEOUT_SECONDS = float(os.getenv("DATASET_COLUMNS_TIMEOUT_SECONDS", "5"))
+VISUAL_PLAN_TIMEOUT_SECONDS = float(os.getenv("VISUAL_PLAN_TIMEOUT_SECONDS", "120"))
+
+
+async def analyze_sql_query(sql_query: str) -> str:
+    """
+    Break down a SQL query into its real column and table names.
+
+    Uses the local SQL parser (memoized by SQL hash) and only falls back to the
+    sql_analyzer_agent when the query cannot be parsed.
+    """
+    if not sql_query or not sql_query.strip():
+        return "SQL BREAKDOWN: no SQL query available"
+    try:
+        return format_sql_breakdown(analyze_sql(sql_query))
+    except SqlParseError as e:
+        print(f"\n⚠️ Local SQL parsing failed ({e}), falling back to sql_analyzer_agent \n")
+        sql_analyzer_result = await Runner.run(sql_analyzer_agent, f"Analyze this SQL query: {sql_query}")
+        return sql_analyzer_result.final_output
+
+
+def _plan_from_profile(latest_context: Any, user_input: str) -> Optional[VisualPlan]:
+    """Rule-based plan from the latest turn's result profile, or None to ask the planner LLM"""
+    if latest_context is None or latest_context.profile is None or not latest_context.sql:
+        return None
+    try:
+        plan = choose_visual_plan(latest_context.profile, analyze_sql(latest_context.sql), user_input)
+    except SqlParseError:
+        return None
+    # A rule plan that fails validation is left to the LLM rather than failing the tool
+    if plan is None or validate_visual_plan(plan):
+        return None
+    return plan
+
+
+async def plan_visual(user_input: str, latest_context: Any = None, required_context: str = "") -> VisualPlan:
+    """
+    Plan one visual: SQL analysis (+ dataset column prefetch) -> visual plan.
+
+    Args:
+        user_input: The visualization request
+        latest_context: ContextRecord of the data insights turn to visualize, if any
+        required_context: Prompt text of the data insights context
+
+    Raises StageFailedError when the plan cannot be made or is invalid.
+    """
+    runner = StageRunner("run_visual_planner")
+
+    # Prefetched alongside the SQL analysis; the plan is still made without it if QuickSight is slow
+    async def dataset_columns():
+        return await asyncio.to_thread(get_dataset_columns, DATASET_ID)
+
+    # Extract and analyze SQL query for better visualization planning
+    async def sql_analysis():
+        if latest_context is not None:
+            sql_query = latest_context.sql or ''
+        else:
+            # Fallback: analyze user input directly for SQL query
+            print(f"\nNo SQL query found in context, proceeding without SQL analysis\n")
+            print(f"\n Checking if the user's request has the SQL query\n")
+            sql_query = extract_sql(user_input)
+            if not sql_query:
+                return None
+        sql_analyzer_result = await analyze_sql_query(sql_query)
+        print(f"\n🔍 SQL analyzer result: {sql_analyzer_result} \n")
+        return sql_analyzer_result
+
+    # Generate visualization plan and reject invalid plans before any QuickSight call
+    async def visual_plan(sql_analysis, dataset_columns):
+        rule_plan = _plan_from_profile(latest_context, user_input)
+        if rule_plan is not None:
+            print(f"\n📐 Visual chosen from the result profile: {rule_plan.summary} \n")
+            return rule_plan
+        formatted_user_input = f"User request: {user_input}"
+        if latest_context is not None:
+            formatted_user_input += f"\nContext:\n{required_context}"
+        if sql_analysis is not None:
+            formatted_user_input += f"\nSQL analyzer result: {sql_analysis}"
+        if dataset_columns:
+            columns = ", ".join(f"{name} ({column_type})" for name, column_type in dataset_columns.items())
+            formatted_user_input += f"\nDataset columns: {columns}"
+        result = await Runner.run(visual_planner_agent, formatted_user_input)
+        return ensure_valid_visual_plan(result.final_output)
+
+    runner.add("dataset_columns", dataset_columns, timeout=DATASET_COLUMNS_TIMEOUT_SECONDS, optional=True)
+    runner.add("sql_analysis", sql_analysis, timeout=SQL_ANALYSIS_TIMEOUT_SECONDS)
+    runner.add("visual_plan", visual_plan, depends_on=("sql_analysis", "dataset_columns"),
+               timeout=VISUAL_PLAN_TIMEOUT_SECONDS)
+    return (await runner.run())["visual_plan"]
+
 
 @function_tool
-async def run_visual_planner(user_input: str) -> str:
+async def run_visual_planner(ctx: RunContextWrapper[AgentRunContext], user_input: str) -> str:
     """
     Creates visualization plan and generates complete JSON definition for QuickSight.
     
-    Workflow: Context retrieval -> SQL analysis -> Visual planning -> JSON generation
+    Workflow: Context retrieval -> SQL analysis (+ dataset column prefetch) -> Visual planning -> JSON compilation
+    Simple result sets with a profile are planned by rules, without the planner LLM.
     Returns: Complete JSON definition ready for QuickSight analysis creation
     """
+    memory = memory_from_context(ctx)
     try : 
-        # Step 1: Get data insights context from memory
-        required_context = AGENT_MEMORY.get_data_insights_context()
+        # Step 1: Get the bounded data insights context (recent turns + summary of older ones)
+        latest_context = memory.get_latest_data_insights()
+        required_context = memory.get_data_insights_context_as_string()
         print(f"\n🔍 Required context: {required_context} \n")
-        
-        # Step 2: Extract and analyze SQL query for better visualization planning
-        if required_context and len(required_context) > 0:
-            latest_context = required_context[-1]  # Get the most recent context
-            if 'agent' in latest_context and isinstance(latest_context['agent'], dict):
-                    sql_query = latest_context['agent'].get('sql', '')
-                    sql_analyzer_result = await Runner.run(sql_analyzer_agent, f"Analyze this SQL query: {sql_query}")
-                    print(f"\n🔍 SQL analyzer result: {sql_analyzer_result} \n")
-                    formatted_user_input = f"User request: {user_input}\nContext: {required_context}\nSQL analyzer result: {sql_analyzer_result}"
-        else:
-            # Fallback: analyze user input directly for SQL query
-            print(f"\nNo SQL query found in context, proceeding without SQL analysis\n")
-            print(f"\n Checking if the user's request has the SQL query\n")
-            sql_analyzer_result = await Runner.run(sql_analyzer_agent, f"Analyze this SQL query: {user_input}")
-            print(f"\n🔍 SQL analyzer result: {sql_analyzer_result} \n")
-            formatted_user_input = f"User request: {user_input}\nSQL analyzer result: {sql_analyzer_result}"
-        
-        # Step 3: Generate visualization plan
-        result = await Runner.run(visual_planner_agent, formatted_user_input)
-        output = result.final_output
-        AGENT_MEMORY.set_visualization_plan(output)
-        AGENT_MEMORY.set_has_visualization_plan(True)
-        print(f"\nVisualization plan: {AGENT_MEMORY.visualization_plan}\n")
-        print(f"\nHas visualization plan: {AGENT_MEMORY.get_has_visualization_plan()}\n")
+
+        # Steps 2-3: SQL analysis and visual planning
+        output = await plan_visual(user_input, latest_context, required_context)
+        with memory.lock:
+            memory.set_visualization_plan(output)
+            memory.set_has_visualization_plan(True)
+        print(f"\nVisualization plan: {memory.get_visualization_plan()}\n")
+        print(f"\nHas visualization plan: {memory.get_has_visualization_plan()}\n")
     except Exception as e:
+        if isinstance(e, StageFailedError) and e.error is not None:
+            e = e.error
         error_msg = f"Sorry, I encountered an error while creating the visualization plan: {str(e)}."
         print(f"\n❌ Error creating visualization plan: {error_msg} \n")
         print(f"\n❌ User's request: {user_input} \n")
         return error_msg
 
     # Step 4: Convert visualization plan to QuickSight JSON definition
-    visualization_plan = AGENT_MEMORY.get_visualization_plan()
+    visualization_plan = memory.get_visualization_plan()
     try :
-        # Generate base JSON structure
-        json_definition = await Runner.run(visual_definition_generator, f"Prepare the json definition from the visualisation plan: {visualization_plan}")
-        print(f"\n✅ Got JSON definition: {json_definition.final_output} \n")
-        
-        # Parse and validate JSON structure
-        valid_json_definition = get_definition_json(json_definition.final_output)
+        # Compile the plan directly; only unsupported plans go through the LLM template generator
+        try:
+            with span("visual_definition.compile", KIND_STAGE) as compile_span:
+                valid_json_definition = compile_definition(visualization_plan)
+                compile_span.set(definition_bytes=payload_size(valid_json_definition))
+            print(f"\n✅ Compiled JSON definition from the visualization plan \n")
+        except DefinitionCompileError as e:
+            print(f"\n⚠️ Could not compile the visualization plan ({e}), falling back to the definition generator \n")
+            json_definition = await Runner.run(visual_definition_generator, f"Prepare the json definition from the visualisation plan: {visualization_plan}")
+            print(f"\n✅ Got JSON definition: {json_definition.final_output} \n")
+            
+            # Parse and validate JSON structure
+            valid_json_definition = get_definition_json(json_definition.final_output)
         print(f"\n✅ Valid JSON definition: {valid_json_definition} \n")
         
         # Add required dataset identifiers for QuickSight
         complete_json_definition = add_dataset_identifier(valid_json_definition)
+        # Catch generator mistakes (wrong field wells, unknown columns, dangling sorts) before QuickSight does
+        ensure_valid_definition(complete_json_definition)
         print(f"\n✅ Complete JSON definition: {complete_json_definition} \n")
         
         # Store complete definition in memory
         output = complete_json_definition
-        AGENT_MEMORY.set_json_visual_definition(output)
-        AGENT_MEMORY.set_has_json_visual_definition(True)
-        print(f"\nHas JSON definition: {AGENT_MEMORY.get_has_json_visual_definition()}\n")
+        with memory.lock:
+            memory.set_json_visual_definition(output)
+            memory.set_has_json_visual_definition(True)
+        print(f"\nHas JSON definition: {memory.get_has_json_visual_definition()}\n")
         return output
     except Exception as e:
         error_msg = f"Sorry, I encountered an error while preparing the json definition: {str(e)}. This might be due to the visualisation plan or the json definition template."
@@ -83,29 +192,90 @@ async def run_visual_planner(user_input: str) -> str:
         return error_msg
     
   
+def _edited_plan(plan: Any, edit: VisualEdit) -> Any:
+    """The stored visualization plan with an edit applied, so a later re-plan starts from it"""
+    if not isinstance(plan, VisualPlan):
+        return plan
+    changes: Dict[str, Any] = {}
+    if edit.visual_type in VisualType.__members__:
+        visual_type = VisualType(edit.visual_type)
+        changes.update(visual_type=visual_type, field_wells_type=VISUAL_FIELD_WELLS.get(visual_type))
+    if edit.aggregation and plan.aggregation_function_required:
+        aggregation = AggregationFunction(normalize_aggregation(edit.aggregation))
+        changes["aggregation_functions"] = [
+            aggregation if edit.measure in (None, measure) else function
+            for measure, function in zip(plan.measure_fields, plan.aggregation_functions)
+        ] or [aggregation]
+    if edit.sort_direction and plan.sort_type is not None:
+        changes["sort_direction"] = SortDirection(edit.sort_direction.upper())
+    return replace(plan, **changes)
+
+
+@function_tool
+def edit_visualization(ctx: RunContextWrapper[AgentRunContext], visual_type: str = "", aggregation: str = "",
+                       measure: str = "", sort_direction: str = "", sort_by: str = "", title: str = "",
+                       visual_id: str = "") -> Dict[str, Any]:
+    """
+    Make a small change to the current visualization's JSON definition without re-planning it.
+
+    Args:
+        visual_type: New QuickSight visual type, e.g. PieChartVisual, LineChartVisual, TableVisual
+        aggregation: New aggregation of the measures, e.g. SUM, AVERAGE, COUNT, MAX
+        measure: Column whose aggregation changes; empty for every measure
+        sort_direction: ASC or DESC
+        sort_by: Column to sort by
+        title: New chart title
+        visual_id: Visual to change; empty for the only visual
+    """
+    memory = memory_from_context(ctx)
+    definition = memory.get_json_visual_definition() if memory.get_has_json_visual_definition() else None
+    if not definition:
+        return {"status": "error", "message": "There is no visualization to edit. Do you want to create a visualization first?"}
+    edit = VisualEdit(visual_id or None, visual_type or None, aggregation or None, measure or None,
+                      sort_direction or None, sort_by or None, title or None)
+    started = time.perf_counter()
+    try:
+        with span("visual_definition.patch", KIND_STAGE) as patch_span:
+            result = edit_visual(definition, edit)
+            ensure_valid_definition(result.definition)
+            patch_span.set(operations=len(result.operations))
+    except (DefinitionEditError, DefinitionValidationError) as e:
+        print(f"\n⚠️ Could not edit the visualization: {e} \n")
+        return {"status": "error", "message": str(e)}
+    with memory.lock:
+        memory.set_json_visual_definition(result.definition)
+        memory.set_visualization_plan(_edited_plan(memory.get_visualization_plan(), edit))
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    print(f"\n✏️ Patched visual {result.visual_id} with {len(result.operations)} operation(s) in {elapsed_ms:.1f} ms \n")
+    return {"status": "edited", "visual_id": result.visual_id, "changes": result.changes(), "definition": result.definition}
+
+
 @function_tool
-async def quicksight_analysis(user_input: str) -> str:
+async def quicksight_analysis(ctx: RunContextWrapper[AgentRunContext], user_input: str) -> str:
     """
-    Creates QuickSight analysis from stored JSON definition.
+    Creates or updates a QuickSight analysis from stored JSON definition.
     
-    Handles analysis creation, permission updates, and analysis listing
-    based on flags set by the quicksight_agent.
+    Handles analysis creation and updates (skipped when the deployed definition
+    is unchanged), permission updates, and analysis listing based on flags set
+    by the quicksight_agent.
     """
     print(f"\n✅ Quicksight analysis called\n")
     
-    # Set analysis flags based on user request
-    await Runner.run(quicksight_agent, user_input)
+    memory = memory_from_context(ctx)
+    
+    # Set analysis flags based on user request (in this session's memory)
+    await Runner.run(quicksight_agent, user_input, context=ctx.context)
     
     # Check if JSON definition exists in memory
-    if AGENT_MEMORY.get_has_json_visual_definition():
+    if memory.get_has_json_visual_definition():
         print(f"\n✅ Has JSON definition\n")
-        json_visual_definition = AGENT_MEMORY.get_json_visual_definition()
+        json_visual_definition = memory.get_json_visual_definition()
         
         # Determine analysis name (user-provided or default)
-        if AGENT_MEMORY.get_quicksight_analysis_name() is None:
+        if memory.get_quicksight_analysis_name() is None:
             analysis_name = "test-analysis-2"
         else:
-            analysis_name = AGENT_MEMORY.get_quicksight_analysis_name()
+            analysis_name = memory.get_quicksight_analysis_name()
         
         # Create valid analysis ID (no spaces)
         analysis_id = analysis_name.strip()
@@ -113,31 +283,44 @@ async def quicksight_analysis(user_input: str) -> str:
             analysis_id = analysis_id.replace(' ', '')
         
         # Execute requested action based on memory flags
-        if AGENT_MEMORY.get_create_analysis():
-            print(f"\n✅ Creating analysis\n")
-            response = create_analysis(json_visual_definition, analysis_name, analysis_id)
-            
-            # Update permissions if analysis creation succeeded
-            if(response.get("status") == "success"):
-                perms_response = update_analysis_permissions(analysis_id)
-                print(f"\n✅ Analysis permissions updated: {perms_response}\n")
-            else:
-                print(f"\n❌ Error creating analysis: {response}\n")
-            
-            AGENT_MEMORY.reset_analysis_flags()
-            print(f"\n✅ Analysis creation status: {response}\n")
+        if memory.get_create_analysis() or memory.get_update_analysis():
+            print(f"\n✅ Publishing analysis\n")
+            # Upsert: created if missing, updated if its definition changed, untouched otherwise.
+            # The QuickSight calls, status polling and permissions run in the background; return the job handle
+            job = ANALYSIS_JOBS.submit(json_visual_definition, analysis_name, analysis_id, session_id_from_context(ctx))
+            with memory.lock:
+                memory.set_quicksight_analysis_id(analysis_id)
+                memory.set_analysis_job_id(job.job_id)
+                memory.reset_analysis_flags()
+            response = {"status": "submitted", "job": job.as_dict()}
+            print(f"\n✅ Analysis publishing submitted: {response}\n")
             return response
             
-        elif AGENT_MEMORY.get_list_analyses():
+        elif memory.get_list_analyses():
             print(f"\n✅ Listing analyses\n")
             response = get_available_analyses()
             print(f"\n✅ Analysis list status: {response}\n")
-            AGENT_MEMORY.reset_analysis_flags()
+            memory.reset_analysis_flags()
             return response
     else:
         return "There is no JSON definition to create a QuickSight analysis from. Do you want to create a visualization plan first?"
 
 
+@function_tool
+def analysis_job_status(ctx: RunContextWrapper[AgentRunContext], job_id: str = "") -> Dict[str, Any]:
+    """
+    Report the progress of a QuickSight analysis creation job.
+
+    Args:
+        job_id: Job id returned by quicksight_analysis; empty for the latest job
+    """
+    job_id = job_id or memory_from_context(ctx).get_analysis_job_id()
+    job = ANALYSIS_JOBS.get_job(job_id, session_id_from_context(ctx)) if job_id else None
+    if job is None:
+        return {"status": "unknown", "message": "No analysis creation job found."}
+    return job.as_dict()
+
+
 # Agent instructions defining workflow coordination logic
 INSTRUCTIONS = """
 You are a Visual Coordinator Agent that manages the complete visualization workflow from planning to QuickSight analysis creation.
@@ -147,13 +330,18 @@ REMEMBER: For a new analysis, you need to create a visualization plan first.
 
 AVAILABLE TOOLS:
 - run_visual_planner
+- edit_visualization
 - quicksight_analysis
+- analysis_job_status
 
 TOOL USAGE:
 - When the user wants to create a visualization :
     - CALL run_visual_planner with the user's request
     - RETURN EXACTLY what run_visual_planner returns (the JSON definition)
     - DO NOT ask questions or add commentary - just return the tool output
+- When the user wants a small change to the current visualization (chart type, aggregation, sort order or title) :
+    - CALL edit_visualization with only the values to change, NOT run_visual_planner
+    - IF edit_visualization returns an error, CALL run_visual_planner with the user's request
 - ONLY When the user prompts to create a QuickSight analysis :- CHECK if the user has provided the name of the analysis in the user's request.
     - IF the user has provided the name of the analysis, THEN :
         - CALL quicksight_analysis with the user's request including the name of the analysis.
@@ -164,12 +352,18 @@ TOOL USAGE:
 - IF the user has not created a visualization definition, THEN :
     - RETURN "There is no visualization definition to create a QuickSight analysis from. Do you want to create a visualization definition first?"
 - IF the user does not want to create a QuickSight analysis, THEN DO NOT CALL quicksight_analysis.
+- ONLY When the user prompts to update an existing QuickSight analysis :
+    - CALL quicksight_analysis with the user's request including the name of the analysis.
+- quicksight_analysis only submits the analysis creation or update; it finishes in the background.
+    - WHEN the user asks whether the analysis is ready or for its status, CALL analysis_job_status.
 
 MANDATORY OUTPUT FORMAT:
 - ALWAYS return EXACTLY the output from the tool call
 - DO NOT add any commentary, questions, or additional text
 - IF run_visual_planner is called: return the JSON definition
+- IF edit_visualization is called: return the edited JSON definition
 - IF quicksight_analysis is called: return the analysis status
+- IF analysis_job_status is called: return the job status
 
 """
 
@@ -178,5 +372,5 @@ visual_coordinator_agent = Agent(
     name="Visual Coordinator Agent",
     model="gpt-4o-mini",
     instructions=INSTRUCTIONS,
-    tools=[run_visual_planner, quicksight_analysis]
+    tools=[run_visual_planner, edit_visualization, quicksight_analysis, analysis_job_status]
 )
\ No newline at end of file
@@ -7,27 +7,40 @@ displays results including SQL queries, insights, and QuickSight dashboard defin
 
 Features:
 - Chat interface for natural language queries
-- Real-time agent processing with visual feedback
+- Streamed agent responses with live tool-call progress
 - Formatted display of JSON dashboard definitions
 - Conversation history management
 - Integration with coordinator agent for task delegation
 """
 
 import streamlit as st
-import asyncio
 import sys
 import os
 from pathlib import Path
 import json
 import ast
+import re
+import uuid
 
 # Add the project root to Python path for imports
 project_root = Path(__file__).parent.parent
 sys.path.insert(0, str(project_root))
 
 # Import agent framework and coordinator
-from agents import Runner, SQLiteSession
+from agents import SQLiteSession
 from src.agents.coordinator_agent import coordinator_agent
+from src.services.analysis_jobs import ANALYSIS_JOBS
+from src.services.background_loop import BACKGROUND_LOOP
+from src.memory.agent_memory import MEMORY_STORE, create_run_context
+from src.memory.memory_backend import AGENT_MEMORY_DB
+from src.memory.compacting_session import CompactingSession
+from src.instrumentation import install_sdk_processor
+from src.streaming import (
+    stream_agent_run, EVENT_AGENT, EVENT_TEXT, EVENT_PARTIAL, EVENT_TOOL_STARTED, EVENT_TOOL_FINISHED, EVENT_FINAL
+)
+
+# Export agent, tool and LLM call spans alongside the service spans (once per process)
+install_sdk_processor()
 
 # ========================================
 # STREAMLIT PAGE CONFIGURATION
@@ -48,10 +61,27 @@ st.set_page_config(
 if "messages" not in st.session_state:
     st.session_state.messages = []
 
+# Each conversation gets its own id, conversation history and agent memory. The id is kept in the
+# URL (?session=...), so reloading the page or restarting the server restores the same session.
+SESSION_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+
+
+def start_session(session_id: str = None):
+    """Use the given session id (or a new one) and write it back to the URL"""
+    st.session_state.session_id = session_id or uuid.uuid4().hex
+    st.query_params["session"] = st.session_state.session_id
+
+
+if "session_id" not in st.session_state:
+    requested_session = st.query_params.get("session", "")
+    start_session(requested_session if SESSION_ID_PATTERN.match(requested_session) else None)
+
 # Initialize agent session for conversation persistence
 if "agent_session" not in st.session_state:
-    # SQLite session stores conversation context across interactions
-    st.session_state.agent_session = SQLiteSession("streamlit_session")
+    # SQLite session stores conversation context across interactions; replay is token-budgeted
+    st.session_state.agent_session = CompactingSession(
+        SQLiteSession(st.session_state.session_id, AGENT_MEMORY_DB or ":memory:")
+    )
 
 # ========================================
 # PAGE HEADER AND TITLE
@@ -70,8 +100,12 @@ with st.sidebar:
     # Reset conversation and start fresh
     if st.button("🗑️ Clear Conversation"):
         st.session_state.messages = []
-        # Create new session to avoid context carryover
-        st.session_state.agent_session = SQLiteSession("streamlit_session_new")
+        # Create new session and memory to avoid context carryover
+        MEMORY_STORE.drop(st.session_state.session_id)
+        start_session()
+        st.session_state.agent_session = CompactingSession(
+            SQLiteSession(st.session_state.session_id, AGENT_MEMORY_DB or ":memory:")
+        )
         st.rerun()
     
     st.markdown("---")
@@ -80,6 +114,21 @@ with st.sidebar:
     st.markdown("### 💡 Sample Questions")
     st.markdown("- What are the top performing products in terms of revenue?")
     st.markdown("- Compare the different product categories in terms of sales it made?")
+    
+    # Show progress of QuickSight analyses being created in the background
+    analysis_jobs = ANALYSIS_JOBS.list_jobs(st.session_state.session_id)
+    if analysis_jobs:
+        st.markdown("---")
+        st.markdown("### 📈 QuickSight Analyses")
+        for job in analysis_jobs[:5]:
+            status_icon = "✅" if job.status == "SUCCEEDED" else "❌" if job.status == "FAILED" else "⏳"
+            st.markdown(f"{status_icon} **{job.analysis_name}** — {job.status}")
+            if job.analysis_status:
+                st.caption(f"QuickSight status: {job.analysis_status} ({job.polls} polls, {job.elapsed_seconds:.0f}s)")
+            if job.error:
+                st.caption(job.error)
+        if st.button("🔄 Refresh status"):
+            st.rerun()
 
 # ========================================
 # CHAT MESSAGE DISPLAY
@@ -112,6 +161,45 @@ for message in st.session_state.messages:
             # Display regular text/markdown messages
             st.markdown(message["content"])
 
+# ========================================
+# STREAMING
+# ========================================
+
+def stream_response(prompt, session, context, status, placeholder) -> str:
+    """
+    Stream the coordinator's answer into the chat and return the final output.
+
+    The agent run executes on the process-wide background event loop, so the
+    OpenAI client's connection pool is reused across messages; updates are
+    rendered here on the script thread, where Streamlit elements can be written.
+    Model tokens and partial knowledge base answers are written to the placeholder
+    as they arrive; agent handoffs and tool calls are listed in the status box.
+    """
+    streamed_text = ""
+    partial_answer = ""
+    final_output = ""
+    updates = stream_agent_run(coordinator_agent, prompt, session=session, context=context)
+    for update in BACKGROUND_LOOP.iterate(updates):
+        if update.kind == EVENT_TEXT:
+            streamed_text += update.text
+            placeholder.markdown(streamed_text + "▌")
+        elif update.kind == EVENT_PARTIAL:
+            partial_answer += update.text
+            if not streamed_text:
+                placeholder.markdown(f"*Retrieving answer from the knowledge base…*\n\n{partial_answer}▌")
+        elif update.kind == EVENT_AGENT:
+            status.update(label=f"🤖 {update.name} ({update.elapsed:.1f}s)")
+        elif update.kind == EVENT_TOOL_STARTED:
+            status.write(f"⚙️ {update.name} started ({update.elapsed:.1f}s)")
+        elif update.kind == EVENT_TOOL_FINISHED:
+            status.write(f"✅ {update.name} finished ({update.elapsed:.1f}s)")
+        elif update.kind == EVENT_FINAL:
+            final_output = update.text
+            status.update(label=f"Done in {update.elapsed:.1f}s", state="complete", expanded=False)
+    # The formatted final response replaces the streamed preview
+    placeholder.empty()
+    return final_output
+
 # ========================================
 # CHAT INPUT AND PROCESSING
 # ========================================
@@ -126,14 +214,22 @@ if prompt := st.chat_input("Ask me about your e-commerce data..."):
     # Process user request through agent system
     with st.chat_message("assistant"):
         with st.spinner("Processing your request..."):
+            # Live progress (handoffs, tool calls) and the streamed answer preview
+            status = st.status("Processing your request...", expanded=False)
+            response_placeholder = st.empty()
             try:
                 # Route request through coordinator agent which handles task delegation
                 # The coordinator decides whether to use data insights or visualization agents
-                response = asyncio.run(
-                    Runner.run(coordinator_agent, prompt, session=st.session_state.agent_session)
-                )
-                
-                assistant_response = response.final_output
+                # Turns of the same session run one at a time; other sessions run concurrently
+                session_id = st.session_state.session_id
+                with MEMORY_STORE.turn_lock(session_id):
+                    assistant_response = stream_response(
+                        prompt,
+                        st.session_state.agent_session,
+                        create_run_context(session_id),
+                        status,
+                        response_placeholder
+                    )
                 
                 # Debug logging for development/troubleshooting
                 print(f"DEBUG - Response preview: {assistant_response[:200]}...")
@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+"""
+Offline Agent Pipeline Benchmark
+
+Replays a corpus of recorded conversations through coordinator_agent with every
+network dependency replaced by the deterministic fakes in fakes.py: scripted
+models for each agent, a canned Bedrock knowledge base and an in-memory
+QuickSight. Latency and failure injection are seeded, so two runs with the same
+arguments exercise the same paths and their numbers are comparable in CI.
+
+Reports throughput, turn latency percentiles, p50/p95 per span (LLM calls,
+tools, pipeline stages, Bedrock and QuickSight calls, caches) and backend call
+counts. With --baseline the run fails (exit code 1) when the turn p95, a span
+p50 or an error count regresses beyond --tolerance.
+
+Usage:
+    python -m src.benchmarks.bench_agents [--iterations 3] [--concurrency 4] [--latency-scale 0.1]
+        [--failure-rate 0.0] [--seed 7] [--stream] [--cold] [--json out.json] [--baseline base.json]
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import sys
+import threading
+import time
+from dataclasses import dataclass, asdict
+from pathlib import Path
+from typing import Optional, Dict, Any, List
+
+# Add project root to path
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+# Offline defaults, set before the app modules read them at import time
+os.environ.setdefault("AGENT_MEMORY_DB", "")
+os.environ.setdefault("TRACE_EXPORT", "")
+os.environ.setdefault("ANALYSIS_POLL_INITIAL_DELAY", "0.05")
+os.environ.setdefault("ANALYSIS_POLL_MAX_DELAY", "0.2")
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-west-2")
+
+from agents import Runner, SQLiteSession, set_trace_processors
+
+from src.agents.coordinator_agent import coordinator_agent
+from src.benchmarks.fakes import DEFAULT_PROFILES, FaultInjector, fake_backends
+from src.instrumentation import TRACER, SdkSpanProcessor, SpanRecord, percentile, summarize
+from src.memory.agent_memory import MEMORY_STORE, create_run_context
+from src.memory.answer_cache import KB_ANSWER_CACHE
+from src.memory.compacting_session import CompactingSession
+from src.services import quicksight_service
+from src.services.analysis_index import ANALYSIS_INDEX
+from src.services.analysis_jobs import ANALYSIS_JOBS, JOB_SUCCEEDED
+from src.streaming import EVENT_TEXT, EVENT_PARTIAL, stream_agent_run
+
+DEFAULT_CORPUS = Path(__file__).parent / "corpus.jsonl"
+# Latency increases below this many milliseconds are scheduling noise, not regressions
+REGRESSION_SLACK_MS = 20.0
+
+
+class MemorySpanSink:
+    """Keeps spans in memory instead of writing a trace file"""
+
+    def __init__(self):
+        self.records: List[SpanRecord] = []
+        self._lock = threading.Lock()
+
+    def write(self, record: SpanRecord):
+        with self._lock:
+            self.records.append(record)
+
+    def flush(self):
+        pass
+
+
+@dataclass
+class TurnResult:
+    conversation: str
+    iteration: int
+    turn: int
+    elapsed_ms: float
+    first_token_ms: Optional[float] = None
+    error: Optional[str] = None
+
+
+def load_corpus(path: Path) -> List[Dict[str, Any]]:
+    with open(path, encoding="utf-8") as corpus_file:
+        return [json.loads(line) for line in corpus_file if line.strip()]
+
+
+def reset_caches():
+    """Start from cold caches: KB answers, analysis index and dataset columns"""
+    KB_ANSWER_CACHE.clear()
+    ANALYSIS_INDEX.invalidate()
+    quicksight_service._dataset_columns_cache.clear()
+
+
+async def run_conversation(conversation: Dict[str, Any], iteration: int, semaphore: asyncio.Semaphore,
+                           stream: bool) -> List[TurnResult]:
+    """Play one conversation turn by turn in its own session"""
+    async with semaphore:
+        session_id = f"bench-{conversation['id']}-{iteration}"
+        session = CompactingSession(SQLiteSession(session_id, ":memory:"))
+        results = []
+        for index, user_input in enumerate(conversation["turns"]):
+            context = create_run_context(session_id)
+            result = TurnResult(conversation["id"], iteration, index, 0.0)
+            started = time.perf_counter()
+            try:
+                if stream:
+                    async for update in stream_agent_run(coordinator_agent, user_input, session=session, context=context):
+                        if result.first_token_ms is None and update.kind in (EVENT_TEXT, EVENT_PARTIAL):
+                            result.first_token_ms = (time.perf_counter() - started) * 1000
+                else:
+                    await Runner.run(coordinator_agent, user_input, session=session, context=context)
+            except Exception as e:
+                result.error = f"{type(e).__name__}: {e}"
+            result.elapsed_ms = (time.perf_counter() - started) * 1000
+            results.append(result)
+        MEMORY_STORE.drop(session_id)
+        return results
+
+
+async def replay(corpus: List[Dict[str, Any]], iterations: int, concurrency: int, stream: bool,
+                 cold: bool) -> List[TurnResult]:
+    semaphore = asyncio.Semaphore(concurrency)
+    results = []
+    for iteration in range(iterations):
+        if cold:
+            reset_caches()
+        batches = await asyncio.gather(*(run_conversation(conversation, iteration, semaphore, stream)
+                                         for conversation in corpus))
+        results.extend(result for batch in batches for result in batch)
+    return results
+
+
+def drain_jobs(timeout: float = 60) -> Dict[str, Any]:
+    """Wait for the background analysis jobs so call counts are complete; a job that raises is counted, not fatal"""
+    jobs = {"count": 0, "succeeded": 0, "failed": 0, "errors": []}
+    for job in ANALYSIS_JOBS.list_jobs():
+        jobs["count"] += 1
+        try:
+            # A job evicted after finishing keeps its handle
+            job = ANALYSIS_JOBS.wait(job.job_id, timeout=timeout) or job
+        except Exception as e:
+            jobs["errors"].append(f"{job.job_id}: {type(e).__name__}: {e}")
+            continue
+        if job.status == JOB_SUCCEEDED:
+            jobs["succeeded"] += 1
+        else:
+            jobs["failed"] += 1
+    return jobs
+
+
+def build_report(results: List[TurnResult], records: List[SpanRecord], wall_seconds: float,
+                 faults: FaultInjector, args: argparse.Namespace, jobs: Dict[str, Any]) -> Dict[str, Any]:
+    latencies = [result.elapsed_ms for result in results]
+    first_tokens = [result.first_token_ms for result in results if result.first_token_ms is not None]
+    return {
+        "config": {key: getattr(args, key) for key in ("iterations", "concurrency", "latency_scale", "failure_rate",
+                                                       "seed", "stream", "cold")},
+        "turns": {
+            "count": len(results),
+            "errors": sum(1 for result in results if result.error),
+            "throughput_per_s": len(results) / wall_seconds if wall_seconds else 0.0,
+            "p50_ms": percentile(latencies, 0.5),
+            "p95_ms": percentile(latencies, 0.95),
+            "p99_ms": percentile(latencies, 0.99),
+            "ttft_p50_ms": percentile(first_tokens, 0.5) if first_tokens else None,
+            "ttft_p95_ms": percentile(first_tokens, 0.95) if first_tokens else None,
+        },
+        "stages": summarize(records),
+        "analysis_jobs": jobs,
+        "calls": dict(sorted(faults.calls.items())),
+        "injected_failures": dict(sorted(faults.failures.items())),
+        "failed_turns": [asdict(result) for result in results if result.error],
+    }
+
+
+def print_report(report: Dict[str, Any]):
+    turns = report["turns"]
+    print(f"\n📊 Turns: {turns['count']} | errors: {turns['errors']} | throughput: {turns['throughput_per_s']:.2f} turns/s")
+    print(f"   turn latency p50 {turns['p50_ms']:.1f} ms | p95 {turns['p95_ms']:.1f} ms | p99 {turns['p99_ms']:.1f} ms")
+    if turns["ttft_p50_ms"] is not None:
+        print(f"   first token p50 {turns['ttft_p50_ms']:.1f} ms | p95 {turns['ttft_p95_ms']:.1f} ms")
+
+    jobs = report["analysis_jobs"]
+    print(f"   analysis jobs {jobs['count']} | succeeded {jobs['succeeded']} | failed {jobs['failed']} | "
+          f"errors {len(jobs['errors'])}")
+
+    print("\n⏱️ Per-stage spans (sorted by total time)")
+    print("=" * 112)
+    print(f"{'kind':<10} | {'name':<42} | {'count':>5} | {'p50 ms':>9} | {'p95 ms':>9} | {'errors':>6} | {'cache':>5}")
+    print("-" * 112)
+    for row in report["stages"]:
+        cache = f"{row['cache_hit_rate']:.0%}" if row["cache_hit_rate"] is not None else "-"
+        print(f"{row['kind']:<10} | {row['name'][:42]:<42} | {row['count']:>5} | {row['p50_ms']:>9.1f} | "
+              f"{row['p95_ms']:>9.1f} | {row['errors']:>6} | {cache:>5}")
+
+    print("\n📞 Backend calls")
+    for name, count in report["calls"].items():
+        failed = report["injected_failures"].get(name, 0)
+        print(f"   {name:<42} {count:>6}" + (f"  ({failed} injected failures)" if failed else ""))
+
+    for result in report["failed_turns"][:10]:
+        print(f"\n❌ {result['conversation']} #{result['iteration']} turn {result['turn']}: {result['error']}")
+    for error in report["analysis_jobs"]["errors"][:10]:
+        print(f"\n❌ analysis job {error}")
+
+
+def find_regressions(report: Dict[str, Any], baseline: Dict[str, Any], tolerance: float,
+                     slack_ms: float = REGRESSION_SLACK_MS) -> List[str]:
+    """
+    Regressions of report against baseline.
+
+    Turns are compared on p95; individual spans on p50, since a single event
+    loop stall can move the p95 of a stage that only runs a few times.
+    """
+    regressions = []
+
+    def check(name: str, metric: str, current: Optional[float], previous: Optional[float]):
+        if current is None or previous is None:
+            return
+        if current > previous * (1 + tolerance) + slack_ms:
+            regressions.append(f"{name}: {metric} {previous:.1f} ms -> {current:.1f} ms")
+
+    check("turn", "p95", report["turns"]["p95_ms"], baseline["turns"]["p95_ms"])
+    if report["turns"]["errors"] > baseline["turns"]["errors"]:
+        regressions.append(f"turn errors: {baseline['turns']['errors']} -> {report['turns']['errors']}")
+    # Baselines written before job outcomes were reported have no analysis_jobs entry
+    baseline_jobs = baseline.get("analysis_jobs", {"failed": 0, "errors": []})
+    current_failures = report["analysis_jobs"]["failed"] + len(report["analysis_jobs"]["errors"])
+    baseline_failures = baseline_jobs["failed"] + len(baseline_jobs["errors"])
+    if current_failures > baseline_failures:
+        regressions.append(f"analysis job failures: {baseline_failures} -> {current_failures}")
+
+    current_stages = {(row["kind"], row["name"]): row for row in report["stages"]}
+    for row in baseline["stages"]:
+        current = current_stages.get((row["kind"], row["name"]))
+        if current is None:
+            continue
+        check(f"{row['kind']} {row['name']}", "p50", current["p50_ms"], row["p50_ms"])
+        if current["errors"] > row["errors"]:
+            regressions.append(f"{row['kind']} {row['name']}: errors {row['errors']} -> {current['errors']}")
+    return regressions
+
+
+def main():
+    """Replay the corpus against the fakes and print (or compare) the results"""
+    parser = argparse.ArgumentParser(description="Offline agent pipeline benchmark")
+    parser.add_argument("--corpus", type=Path, default=DEFAULT_CORPUS, help="JSONL file of {id, turns} conversations")
+    parser.add_argument("--iterations", type=int, default=3, help="Times the whole corpus is replayed")
+    parser.add_argument("--concurrency", type=int, default=4, help="Conversations running at the same time")
+    parser.add_argument("--latency-scale", type=float, default=0.1, help="Multiplier on the simulated service latencies")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Injected failure probability for every backend")
+    parser.add_argument("--seed", type=int, default=7, help="Seed for latency and failure injection")
+    parser.add_argument("--stream", action="store_true", help="Run turns with streaming and report time to first token")
+    parser.add_argument("--cold", action="store_true", help="Clear caches before every iteration")
+    parser.add_argument("--json", type=Path, default=None, help="Write the report as JSON (usable as a baseline)")
+    parser.add_argument("--baseline", type=Path, default=None, help="Earlier --json report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed relative latency increase over the baseline")
+    parser.add_argument("--slack-ms", type=float, default=REGRESSION_SLACK_MS, help="Absolute latency increase always allowed")
+    parser.add_argument("--verbose", action="store_true", help="Show the application's own log output")
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus)
+    profiles = {name: profile.scaled(1.0, args.failure_rate) for name, profile in DEFAULT_PROFILES.items()}
+    faults = FaultInjector(profiles, seed=args.seed, latency_scale=args.latency_scale)
+
+    # Collect our spans and the SDK's agent/tool/handoff spans in memory only
+    sink = MemorySpanSink()
+    TRACER.sink = sink
+    set_trace_processors([SdkSpanProcessor(TRACER)])
+    reset_caches()
+
+    print("🚀 Offline agent pipeline benchmark")
+    print(f"   {len(corpus)} conversations x {args.iterations} iterations | concurrency {args.concurrency} | "
+          f"latency x{args.latency_scale} | failure rate {args.failure_rate} | seed {args.seed}")
+
+    logs = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+    with fake_backends(faults):
+        with logs:
+            started = time.perf_counter()
+            results = asyncio.run(replay(corpus, args.iterations, args.concurrency, args.stream, args.cold))
+            wall_seconds = time.perf_counter() - started
+            # Let background analysis jobs finish so call counts are complete
+            jobs = drain_jobs()
+
+    report = build_report(results, sink.records, wall_seconds, faults, args, jobs)
+    print_report(report)
+
+    if args.json:
+        args.json.write_text(json.dumps(report, indent=2, default=str), encoding="utf-8")
+        print(f"\n💾 Report written to {args.json}")
+
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+        regressions = find_regressions(report, baseline, args.tolerance, args.slack_ms)
+        if regressions:
+            print(f"\n❌ {len(regressions)} regressions against {args.baseline} (tolerance {args.tolerance:.0%}):")
+            for regression in regressions:
+                print(f"   {regression}")
+            sys.exit(1)
+        print(f"\n✅ No regressions against {args.baseline} (tolerance {args.tolerance:.0%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+DataSetIdentifier Substitution Micro-Benchmark
+
+Compares the previous json.dumps / str.replace / json.loads round trip with the
+in-place tree walk in add_dataset_identifier on multi-sheet, multi-visual
+definitions, reporting time per call and peak allocations.
+
+Usage:
+    python -m src.benchmarks.bench_dataset_identifier
+"""
+
+import contextlib
+import copy
+import json
+import os
+import sys
+import timeit
+import tracemalloc
+from pathlib import Path
+from typing import Dict, Any, Callable, List, Tuple
+
+# Add project root to path
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.agents.tools.visual_creator import (
+    add_dataset_identifier,
+    DATASET_ARN,
+    DATASET_IDENTIFIER,
+    DATASET_PLACEHOLDER,
+)
+
+# (sheets, visuals per sheet) combinations to measure
+SIZES: List[Tuple[int, int]] = [(1, 1), (4, 6), (12, 12), (30, 20)]
+
+
+def json_round_trip(json_definition: Dict[str, Any]) -> Dict[str, Any]:
+    """The previous implementation: serialize, global replace, parse"""
+    json_definition["Definition"]["DataSetIdentifierDeclarations"] = [
+        {"DataSetArn": DATASET_ARN, "Identifier": DATASET_IDENTIFIER}
+    ]
+    json_string = json.dumps(json_definition)
+    json_string = json_string.replace(DATASET_PLACEHOLDER, DATASET_IDENTIFIER)
+    return json.loads(json_string)
+
+
+def make_visual(sheet: int, visual: int) -> Dict[str, Any]:
+    column = {"DataSetIdentifier": DATASET_PLACEHOLDER, "ColumnName": "category"}
+    measure = {"DataSetIdentifier": DATASET_PLACEHOLDER, "ColumnName": "item_total"}
+    return {
+        "BarChartVisual": {
+            "VisualId": f"visual-{sheet}-{visual}",
+            "Title": {"FormatText": {"PlainText": f"Revenue by category ({sheet}.{visual})"}},
+            "ChartConfiguration": {
+                "FieldWells": {
+                    "BarChartAggregatedFieldWells": {
+                        "Category": [{"CategoricalDimensionField": {"FieldId": f"category-{visual}", "Column": dict(column)}}],
+                        "Values": [{
+                            "NumericalMeasureField": {
+                                "FieldId": f"item_total-{visual}",
+                                "Column": dict(measure),
+                                "AggregationFunction": {"SimpleNumericalAggregation": "SUM"},
+                            }
+                        }],
+                    }
+                },
+                "SortConfiguration": {"CategorySort": [{"FieldSort": {"FieldId": f"category-{visual}", "Direction": "DESC"}}]},
+            },
+        }
+    }
+
+
+def make_definition(sheets: int, visuals: int) -> Dict[str, Any]:
+    return {
+        "Definition": {
+            "Sheets": [
+                {
+                    "SheetId": f"sheet{sheet}",
+                    "Name": f"Sheet {sheet}",
+                    "Visuals": [make_visual(sheet, visual) for visual in range(visuals)],
+                }
+                for sheet in range(sheets)
+            ],
+            "CalculatedFields": [
+                {"DataSetIdentifier": DATASET_PLACEHOLDER, "Name": "margin", "Expression": "item_total - cost_price"}
+            ],
+        }
+    }
+
+
+def measure(function: Callable[[Dict[str, Any]], Dict[str, Any]], template: Dict[str, Any], number: int) -> Tuple[float, int]:
+    """Return (microseconds per call, peak bytes allocated by one call)"""
+    inputs = [copy.deepcopy(template) for _ in range(number)]
+    iterator = iter(inputs)
+    seconds = timeit.timeit(lambda: function(next(iterator)), number=number)
+
+    sample = copy.deepcopy(template)
+    tracemalloc.start()
+    function(sample)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return seconds / number * 1e6, peak
+
+
+def main():
+    """Run the benchmark and print a comparison table"""
+    # Silence the progress print in add_dataset_identifier while measuring
+    devnull = open(os.devnull, "w")
+
+    def in_place(definition: Dict[str, Any]) -> Dict[str, Any]:
+        with contextlib.redirect_stdout(devnull):
+            return add_dataset_identifier(definition)
+
+    baseline_sample = json_round_trip(make_definition(2, 2))
+    in_place_sample = in_place(make_definition(2, 2))
+    assert baseline_sample == in_place_sample, "in-place substitution must match the JSON round trip"
+
+    print("🚀 DataSetIdentifier substitution benchmark")
+    print("=" * 78)
+    print(f"{'sheets x visuals':>18} | {'round trip µs':>14} | {'in place µs':>12} | {'round trip peak':>15} | {'in place peak':>13}")
+    print("-" * 78)
+    for sheets, visuals in SIZES:
+        template = make_definition(sheets, visuals)
+        number = max(5, 2000 // (sheets * visuals))
+        baseline_time, baseline_peak = measure(json_round_trip, template, number)
+        in_place_time, in_place_peak = measure(in_place, template, number)
+        print(f"{sheets:>8} x {visuals:<7} | {baseline_time:>14.1f} | {in_place_time:>12.1f} | "
+              f"{baseline_peak / 1024:>12.1f} KB | {in_place_peak / 1024:>10.1f} KB")
+
+
+if __name__ == "__main__":
+    main()
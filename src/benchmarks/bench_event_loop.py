@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Per-Message Event Loop Benchmark
+
+Compares the previous Streamlit pattern, asyncio.run per message (new event
+loop, new OpenAI client, new connections), with submitting every message to
+the shared BackgroundLoop, where one client and its connection pool live for
+the whole process. Each "message" makes a few sequential OpenAI API requests,
+like a coordinator turn with tool calls.
+
+By default requests go to a local keep-alive HTTP stub, which isolates event
+loop and connection setup from network time; pass --base-url to measure
+against a real endpoint (TLS setup makes the difference much larger).
+
+Usage:
+    python -m src.benchmarks.bench_event_loop [--messages 50] [--requests 3] [--base-url URL]
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import List, Optional
+
+# Add project root to path
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from openai import AsyncOpenAI
+
+from src.services.background_loop import BackgroundLoop
+
+MODELS_RESPONSE = json.dumps({"object": "list", "data": [{"id": "stub-model", "object": "model", "created": 0, "owned_by": "benchmark"}]}).encode()
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Keep-alive stub that answers every GET with a model list"""
+
+    protocol_version = "HTTP/1.1"
+    # Headers and body are separate writes; avoid Nagle / delayed-ACK stalls
+    disable_nagle_algorithm = True
+    connections = 0
+
+    def setup(self):
+        super().setup()
+        StubHandler.connections += 1
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(MODELS_RESPONSE)))
+        self.end_headers()
+        self.wfile.write(MODELS_RESPONSE)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub_server() -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+async def handle_message(client: AsyncOpenAI, requests: int):
+    for _ in range(requests):
+        await client.models.list()
+
+
+def per_message_asyncio_run(base_url: str, api_key: str, messages: int, requests: int) -> List[float]:
+    """Previous pattern: every message builds a loop and a client, then tears both down"""
+    latencies = []
+    for _ in range(messages):
+        started = time.perf_counter()
+
+        async def message():
+            async with AsyncOpenAI(base_url=base_url, api_key=api_key) as client:
+                await handle_message(client, requests)
+
+        asyncio.run(message())
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+def persistent_loop(base_url: str, api_key: str, messages: int, requests: int) -> List[float]:
+    """New pattern: one loop and one client for the process"""
+    background = BackgroundLoop(name="benchmark-loop")
+
+    async def create_client() -> AsyncOpenAI:
+        return AsyncOpenAI(base_url=base_url, api_key=api_key)
+
+    client = background.run(create_client())
+    latencies = []
+    for _ in range(messages):
+        started = time.perf_counter()
+        background.run(handle_message(client, requests))
+        latencies.append(time.perf_counter() - started)
+    background.run(client.close())
+    background.stop()
+    return latencies
+
+
+def report(name: str, latencies: List[float], connections: Optional[int]):
+    ordered = sorted(latencies)
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    opened = f"{connections:>6}" if connections is not None else f"{'n/a':>6}"
+    print(f"{name:<24} | {statistics.mean(latencies) * 1000:>9.2f} | {statistics.median(latencies) * 1000:>9.2f} | "
+          f"{p95 * 1000:>9.2f} | {opened}")
+
+
+def main():
+    """Run both patterns and print per-message latency"""
+    parser = argparse.ArgumentParser(description="Per-message event loop benchmark")
+    parser.add_argument("--messages", type=int, default=50, help="Messages per pattern")
+    parser.add_argument("--requests", type=int, default=3, help="API requests per message")
+    parser.add_argument("--base-url", default=None, help="Real OpenAI-compatible endpoint (default: local stub)")
+    parser.add_argument("--api-key", default="benchmark", help="API key for --base-url")
+    args = parser.parse_args()
+
+    server = None
+    base_url = args.base_url
+    if base_url is None:
+        server = start_stub_server()
+        base_url = f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+    print("🚀 Per-message event loop benchmark")
+    print(f"   endpoint: {base_url} | {args.messages} messages x {args.requests} requests")
+    print("=" * 72)
+    print(f"{'pattern':<24} | {'mean ms':>9} | {'p50 ms':>9} | {'p95 ms':>9} | {'conns':>6}")
+    print("-" * 72)
+
+    # Warm up imports and the stub before timing
+    per_message_asyncio_run(base_url, args.api_key, 2, 1)
+
+    for name, run in (("asyncio.run per message", per_message_asyncio_run), ("persistent loop", persistent_loop)):
+        StubHandler.connections = 0
+        latencies = run(base_url, args.api_key, args.messages, args.requests)
+        report(name, latencies, StubHandler.connections if server else None)
+
+    if server:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
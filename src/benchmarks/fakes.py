@@ -0,0 +1,593 @@
+"""
+Benchmark Fakes - Deterministic offline stand-ins for OpenAI, Bedrock and QuickSight.
+
+Every live dependency of the agent pipeline has a local replacement here:
+
+- ScriptedModel: an agents SDK Model that plays one agent's role (coordinator,
+  data insights, visual coordinator, planners, ...) from the conversation it
+  is given, calling the same tools and handoffs the real model would;
+- FakeBedrockAgentRuntime: retrieve_and_generate(_stream) answering with
+  canned SQL chosen from the question;
+- FakeQuickSight: create/describe/list/delete analyses, permissions and
+  describe_data_set, with analyses that become ready after a few polls.
+
+Latency and failures are drawn from a seeded RNG keyed by the call (backend,
+operation, request text and how often that request was seen), so a run is
+reproducible even when conversations execute concurrently.
+"""
+
+from contextlib import contextmanager
+from dataclasses import dataclass, field, asdict
+from datetime import datetime, timezone
+from typing import Optional, Dict, Any, List, Iterator, Tuple
+import asyncio
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+
+from botocore.exceptions import ClientError
+from agents import Agent, Usage
+from agents.items import ModelResponse
+from agents.models.interface import Model
+from openai.types.responses import (
+    Response,
+    ResponseCompletedEvent,
+    ResponseCreatedEvent,
+    ResponseFunctionToolCall,
+    ResponseOutputMessage,
+    ResponseOutputText,
+    ResponseTextDeltaEvent,
+)
+
+from ..instrumentation import span, KIND_LLM
+from ..services import aws_clients
+from ..agents.tools.schema_planner import NUMERIC_COLUMNS, DATE_COLUMNS, DATASET_COLUMNS
+from ..agents.tools.visual_plan import VisualPlan
+
+
+class InjectedFailure(RuntimeError):
+    """Failure raised by a fake backend on purpose"""
+
+
+@dataclass
+class LatencyProfile:
+    """
+    Simulated latency and failure rate of one backend operation.
+
+    Args:
+        base_ms: Fixed latency per call
+        jitter_ms: Uniform random extra latency (0..jitter_ms)
+        per_token_ms: Extra latency per generated output token (LLM calls)
+        failure_rate: Probability of an injected failure
+    """
+
+    base_ms: float = 0.0
+    jitter_ms: float = 0.0
+    per_token_ms: float = 0.0
+    failure_rate: float = 0.0
+
+    def scaled(self, factor: float, failure_rate: Optional[float] = None) -> "LatencyProfile":
+        return LatencyProfile(self.base_ms * factor, self.jitter_ms * factor, self.per_token_ms * factor,
+                              self.failure_rate if failure_rate is None else failure_rate)
+
+
+# Rough shape of the live services (gpt-4o-mini, Bedrock KB text-to-SQL, QuickSight control plane)
+DEFAULT_PROFILES: Dict[str, LatencyProfile] = {
+    "llm": LatencyProfile(base_ms=450, jitter_ms=300, per_token_ms=4),
+    "bedrock": LatencyProfile(base_ms=2500, jitter_ms=1500),
+    "quicksight": LatencyProfile(base_ms=250, jitter_ms=150),
+}
+
+
+class FaultInjector:
+    """
+    Seeded latency and failure decisions, deterministic per call key.
+
+    The n-th call with the same (backend, operation, key) always gets the same
+    latency and failure outcome, whatever the interleaving of other calls.
+    """
+
+    def __init__(self, profiles: Optional[Dict[str, LatencyProfile]] = None, seed: int = 7, latency_scale: float = 1.0):
+        self.profiles = dict(profiles or DEFAULT_PROFILES)
+        self.seed = seed
+        self.latency_scale = latency_scale
+        self.calls: Dict[str, int] = {}
+        self.failures: Dict[str, int] = {}
+        self._occurrences: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def decide(self, backend: str, operation: str, key: str = "", output_tokens: int = 0) -> Tuple[float, bool]:
+        """Return (latency in seconds, whether to fail) and count the call"""
+        call_key = f"{backend}:{operation}:{key}"
+        with self._lock:
+            occurrence = self._occurrences.get(call_key, 0)
+            self._occurrences[call_key] = occurrence + 1
+            counter = f"{backend}.{operation}"
+            self.calls[counter] = self.calls.get(counter, 0) + 1
+        digest = hashlib.sha256(f"{self.seed}:{call_key}:{occurrence}".encode()).digest()
+        rng = random.Random(digest)
+        profile = self.profiles.get(backend, LatencyProfile())
+        latency_ms = profile.base_ms + rng.uniform(0, profile.jitter_ms) + profile.per_token_ms * output_tokens
+        fail = rng.random() < profile.failure_rate
+        if fail:
+            with self._lock:
+                self.failures[counter] = self.failures.get(counter, 0) + 1
+        return latency_ms * self.latency_scale / 1000, fail
+
+    def blocking_call(self, backend: str, operation: str, key: str = ""):
+        """Sleep for a sync backend call, raising ClientError when a failure is injected"""
+        latency, fail = self.decide(backend, operation, key)
+        time.sleep(latency)
+        if fail:
+            raise ClientError({"Error": {"Code": "ThrottlingException", "Message": f"Injected {backend} failure"}},
+                              operation)
+
+
+# ========================================
+# MODEL
+# ========================================
+
+# Canned answers: (keywords, SQL, answer, visual plan)
+KNOWLEDGE = [
+    (("category", "revenue"),
+     "SELECT p.category, SUM(si.item_total) AS total_revenue FROM public.dataset_fashion_store_salesitems si "
+     "JOIN public.dataset_fashion_store_products p ON si.product_id = p.product_id GROUP BY p.category "
+     "ORDER BY total_revenue DESC",
+     "Accessories lead revenue with 412,380, followed by Shoes (355,920) and Dresses (298,110).",
+     {"VISUAL_TYPE": "BarChartVisual", "FIELD_WELLS_TYPE": "BarChartAggregatedFieldWells",
+      "DIMENSION_FIELDS": ["category"], "MEASURE_FIELDS": ["item_total"], "AGGREGATION_FUNCTION_REQUIRED": True,
+      "AGGREGATION_FUNCTIONS": ["SUM"], "SORT_TYPE": "FieldSort", "SORT_DIRECTION": "DESC"}),
+    (("month", "trend", "over time"),
+     "SELECT DATE_TRUNC('month', si.sale_date) AS month, SUM(si.item_total) AS revenue "
+     "FROM public.dataset_fashion_store_salesitems si GROUP BY 1 ORDER BY 1",
+     "Revenue grew steadily from January (81,200) to a December peak of 142,900.",
+     {"VISUAL_TYPE": "LineChartVisual", "FIELD_WELLS_TYPE": "LineChartAggregatedFieldWells",
+      "DIMENSION_FIELDS": ["sale_date"], "MEASURE_FIELDS": ["item_total"], "AGGREGATION_FUNCTION_REQUIRED": True,
+      "AGGREGATION_FUNCTIONS": ["SUM"], "SORT_TYPE": "FieldSort", "SORT_DIRECTION": "ASC"}),
+    (("channel",),
+     "SELECT s.channel, COUNT(s.sale_id) AS orders, SUM(s.total_amount) AS revenue "
+     "FROM public.dataset_fashion_store_sales s GROUP BY s.channel ORDER BY revenue DESC",
+     "The app channel brings 58% of revenue; e-commerce brings the remaining 42%.",
+     {"VISUAL_TYPE": "PieChartVisual", "FIELD_WELLS_TYPE": "PieChartAggregatedFieldWells",
+      "DIMENSION_FIELDS": ["channel"], "MEASURE_FIELDS": ["total_amount"], "AGGREGATION_FUNCTION_REQUIRED": True,
+      "AGGREGATION_FUNCTIONS": ["SUM"], "SORT_TYPE": None, "SORT_DIRECTION": None}),
+    (("country", "stock"),
+     "SELECT st.country, SUM(st.stock_quantity) AS stock FROM public.dataset_fashion_store_stock st "
+     "GROUP BY st.country ORDER BY stock DESC",
+     "France holds the most stock (18,400 units), then Germany (15,100) and Spain (12,900).",
+     {"VISUAL_TYPE": "BarChartVisual", "FIELD_WELLS_TYPE": "BarChartAggregatedFieldWells",
+      "DIMENSION_FIELDS": ["country"], "MEASURE_FIELDS": ["stock_quantity"], "AGGREGATION_FUNCTION_REQUIRED": True,
+      "AGGREGATION_FUNCTIONS": ["SUM"], "SORT_TYPE": "FieldSort", "SORT_DIRECTION": "DESC"}),
+    (("age", "customer"),
+     "SELECT c.age_range, COUNT(c.customer_id) AS customers FROM public.dataset_fashion_store_customers c "
+     "GROUP BY c.age_range ORDER BY customers DESC",
+     "Customers aged 25-34 are the largest group (37%), followed by 35-44 (24%).",
+     {"VISUAL_TYPE": "BarChartVisual", "FIELD_WELLS_TYPE": "BarChartAggregatedFieldWells",
+      "DIMENSION_FIELDS": ["age_range"], "MEASURE_FIELDS": ["customer_id"], "AGGREGATION_FUNCTION_REQUIRED": True,
+      "AGGREGATION_FUNCTIONS": ["COUNT"], "SORT_TYPE": "FieldSort", "SORT_DIRECTION": "DESC"}),
+]
+DEFAULT_KNOWLEDGE = (
+    (),
+    "SELECT p.brand, SUM(si.quantity) AS units FROM public.dataset_fashion_store_salesitems si "
+    "JOIN public.dataset_fashion_store_products p ON si.product_id = p.product_id GROUP BY p.brand "
+    "ORDER BY units DESC LIMIT 10",
+    "The top brand sold 9,870 units; the top 10 brands account for 64% of units sold.",
+    {"VISUAL_TYPE": "BarChartVisual", "FIELD_WELLS_TYPE": "BarChartAggregatedFieldWells",
+     "DIMENSION_FIELDS": ["brand"], "MEASURE_FIELDS": ["quantity"], "AGGREGATION_FUNCTION_REQUIRED": True,
+     "AGGREGATION_FUNCTIONS": ["SUM"], "SORT_TYPE": "FieldSort", "SORT_DIRECTION": "DESC"},
+)
+
+VISUAL_WORDS = ("visual", "chart", "plot", "graph", "dashboard")
+ANALYSIS_WORDS = ("analysis", "analyses", "quicksight")
+STATUS_WORDS = ("ready", "status", "finished", "done yet")
+EDIT_WORDS = ("instead", "sort", "switch", "change it")
+# Edit arguments read from a request such as "Change it to a pie chart" or "Show the average instead"
+_EDIT_VISUAL_TYPES = (("pie", "PieChartVisual"), ("line", "LineChartVisual"), ("table", "TableVisual"),
+                      ("bar", "BarChartVisual"))
+_EDIT_AGGREGATIONS = (("average", "AVERAGE"), ("count", "COUNT"), ("maximum", "MAX"), ("minimum", "MIN"),
+                      ("total", "SUM"), ("sum", "SUM"))
+_ANALYSIS_NAME = re.compile(r"(?:named|called)\s+[\"']?([\w\- ]+?)[\"']?\s*$", re.IGNORECASE)
+# "... dashboard named <name> from these questions: <question>; <question>; ..."
+_DASHBOARD_REQUEST = re.compile(r"dashboard\s+(?:named|called)\s+(.+?)\s+from these questions:\s*(.+)$",
+                                re.IGNORECASE | re.DOTALL)
+
+
+def lookup_knowledge(text: str) -> Tuple[Tuple[str, ...], str, str, Dict[str, Any]]:
+    """Canned (keywords, SQL, answer, plan) for the first keyword group found in the text"""
+    lowered = text.lower()
+    for entry in KNOWLEDGE:
+        if any(keyword in lowered for keyword in entry[0]):
+            return entry
+    return DEFAULT_KNOWLEDGE
+
+
+def edit_arguments(lowered: str) -> Dict[str, str]:
+    """edit_visualization arguments for a lowercased edit request"""
+    arguments = {}
+    visual_type = next((visual for word, visual in _EDIT_VISUAL_TYPES if word in lowered), None)
+    if visual_type:
+        arguments["visual_type"] = visual_type
+    # "the average instead of the sum": the first aggregation named is the new one
+    named = sorted((lowered.find(word), aggregation) for word, aggregation in _EDIT_AGGREGATIONS if word in lowered)
+    if named:
+        arguments["aggregation"] = named[0][1]
+    if "ascending" in lowered or "smallest first" in lowered:
+        arguments["sort_direction"] = "ASC"
+    elif "descending" in lowered or "largest first" in lowered:
+        arguments["sort_direction"] = "DESC"
+    return arguments
+
+
+def _estimate_tokens(value: Any) -> int:
+    text = value if isinstance(value, str) else json.dumps(value, default=str)
+    return max(1, len(text) // 4)
+
+
+def _item_text(item: Dict[str, Any]) -> str:
+    content = item.get("content")
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        return " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return ""
+
+
+def turn_state(input: Any) -> Tuple[str, List[Dict[str, Any]]]:
+    """Last user message and the tool calls/outputs produced since it"""
+    if isinstance(input, str):
+        return input, []
+    items = [item if isinstance(item, dict) else item.model_dump() for item in input]
+    last_user = max((index for index, item in enumerate(items) if item.get("role") == "user"), default=-1)
+    user_text = _item_text(items[last_user]) if last_user >= 0 else ""
+    return user_text, items[last_user + 1:]
+
+
+class ScriptedModel(Model):
+    """
+    Deterministic stand-in for one agent's LLM.
+
+    Args:
+        role: Agent role deciding the scripted behavior (see ROLES)
+        agent_name: Name used for the llm.<agent> span
+        faults: Shared FaultInjector for latency and failures
+    """
+
+    ROLES = ("coordinator", "data_insights", "visual_coordinator", "quicksight", "query_planner",
+             "visual_planner", "sql_analyzer", "definition_generator")
+
+    def __init__(self, role: str, agent_name: str, faults: FaultInjector):
+        if role not in self.ROLES:
+            raise ValueError(f"Unknown role {role!r}")
+        self.role = role
+        self.agent_name = agent_name
+        self.faults = faults
+        self._call_ids = 0
+        self._lock = threading.Lock()
+
+    # ---- behavior ----
+
+    def _call(self, name: str, arguments: Dict[str, Any]) -> ResponseFunctionToolCall:
+        with self._lock:
+            self._call_ids += 1
+            call_id = f"call_{self.role}_{self._call_ids}"
+        return ResponseFunctionToolCall(id=f"fc_{call_id}", call_id=call_id, type="function_call",
+                                        name=name, arguments=json.dumps(arguments))
+
+    def _decide(self, input: Any, handoffs: List[Any], output_schema: Any) -> Any:
+        """A tool call, or the final text of this agent's turn"""
+        user_text, turn_items = turn_state(input)
+        lowered = user_text.lower()
+        # Tool results of this turn, ignoring the transfer_to_* outputs left by handoffs
+        call_names = {item.get("call_id"): item.get("name") for item in turn_items if item.get("type") == "function_call"}
+        outputs = [item for item in turn_items if item.get("type") == "function_call_output"
+                   and not str(call_names.get(item.get("call_id"), "")).startswith("transfer_to_")]
+        last_output = outputs[-1].get("output") if outputs else None
+        _, sql, answer, plan = lookup_knowledge(user_text)
+
+        if self.role == "coordinator":
+            if last_output is not None:
+                return str(last_output)
+            dashboard = _DASHBOARD_REQUEST.search(user_text)
+            if dashboard is not None:
+                questions = [question.strip() for question in dashboard.group(2).split(";") if question.strip()]
+                return self._call("create_dashboard", {"questions": questions, "dashboard_name": dashboard.group(1)})
+            wants_visual = any(word in lowered for word in VISUAL_WORDS + ANALYSIS_WORDS + STATUS_WORDS + EDIT_WORDS)
+            target = "visual" if wants_visual else "insights"
+            handoff = next((item for item in handoffs if target in item.agent_name.lower()), handoffs[0])
+            return self._call(handoff.tool_name, {})
+
+        if self.role == "data_insights":
+            if last_output is not None:
+                return f"Summary: {answer}\n\nSQL Used:\n```sql\n{sql}\n```\n\nWould you like to see a visualization of this data?"
+            tool = "retrieve_results" if lowered.lstrip().startswith(("select", "with")) else "plan_and_retrieve"
+            return self._call(tool, {"user_input": user_text})
+
+        if self.role == "visual_coordinator":
+            if last_output is not None:
+                return str(last_output)
+            if any(word in lowered for word in STATUS_WORDS):
+                return self._call("analysis_job_status", {"job_id": ""})
+            if any(word in lowered for word in ANALYSIS_WORDS):
+                return self._call("quicksight_analysis", {"user_input": user_text})
+            if any(word in lowered for word in EDIT_WORDS):
+                return self._call("edit_visualization", edit_arguments(lowered))
+            return self._call("run_visual_planner", {"user_input": user_text})
+
+        if self.role == "quicksight":
+            if last_output is not None:
+                return "Flags set."
+            if "list" in lowered:
+                return self._call("set_list_analyses", {})
+            match = _ANALYSIS_NAME.search(user_text)
+            tool = "set_update_analysis" if "update" in lowered else "set_create_analysis"
+            return self._call(tool, {"user_input": match.group(1) if match else "Benchmark Analysis"})
+
+        if self.role == "query_planner":
+            return f"Use the tables referenced by: {sql}. Join on the foreign keys, group by the dimension and aggregate the measure."
+
+        if self.role == "sql_analyzer":
+            return f"SQL BREAKDOWN: {sql}"
+
+        if self.role == "visual_planner":
+            visual_plan = VisualPlan.from_dict({**plan, "SUMMARY": f"Planned for: {user_text[:80]}"})
+            return self._structured(visual_plan, output_schema)
+
+        # definition_generator: only used for plans the compiler cannot handle
+        return json.dumps({"Definition": {"Sheets": [{"SheetId": "sheet1", "Name": "Sheet 1", "Visuals": []}]}})
+
+    @staticmethod
+    def _structured(value: Any, output_schema: Any) -> str:
+        data = json.loads(json.dumps(asdict(value), default=lambda item: getattr(item, "value", str(item))))
+        text = json.dumps(data)
+        if output_schema is None or output_schema.is_plain_text():
+            return text
+        try:
+            output_schema.validate_json(text)
+            return text
+        except Exception:
+            # Non-object output types are wrapped in {"response": ...}
+            return json.dumps({"response": data})
+
+    # ---- Model interface ----
+
+    async def _respond(self, system_instructions, input, handoffs, output_schema):
+        decision = self._decide(input, handoffs, output_schema)
+        input_tokens = _estimate_tokens(system_instructions or "") + _estimate_tokens(input)
+        output_tokens = _estimate_tokens(decision if isinstance(decision, str) else decision.arguments)
+        user_text, turn_items = turn_state(input)
+        latency, fail = self.faults.decide("llm", self.role, f"{user_text}:{len(turn_items)}", output_tokens)
+        with span(f"llm.{self.agent_name}", KIND_LLM, model="scripted", input_tokens=input_tokens,
+                  output_tokens=output_tokens):
+            await asyncio.sleep(latency)
+            if fail:
+                raise InjectedFailure(f"Injected model failure for {self.agent_name}")
+        if isinstance(decision, str):
+            output = [ResponseOutputMessage(
+                id="msg_scripted", type="message", role="assistant", status="completed",
+                content=[ResponseOutputText(type="output_text", text=decision, annotations=[])],
+            )]
+        else:
+            output = [decision]
+        usage = Usage(requests=1, input_tokens=input_tokens, output_tokens=output_tokens,
+                      total_tokens=input_tokens + output_tokens)
+        return output, usage
+
+    async def get_response(self, system_instructions, input, model_settings, tools, output_schema, handoffs,
+                           tracing, **kwargs) -> ModelResponse:
+        output, usage = await self._respond(system_instructions, input, handoffs, output_schema)
+        return ModelResponse(output=output, usage=usage, response_id=None)
+
+    async def stream_response(self, system_instructions, input, model_settings, tools, output_schema, handoffs,
+                              tracing, **kwargs):
+        output, usage = await self._respond(system_instructions, input, handoffs, output_schema)
+
+        def response(items):
+            return Response(id="resp_scripted", created_at=0, model="scripted", object="response", output=items,
+                            tool_choice="auto", tools=[], parallel_tool_calls=False)
+
+        yield ResponseCreatedEvent(type="response.created", response=response([]), sequence_number=0)
+        if output[0].type == "message":
+            for index, word in enumerate(output[0].content[0].text.split(" ")):
+                yield ResponseTextDeltaEvent(type="response.output_text.delta", delta=word + " ", item_id="msg_scripted",
+                                             output_index=0, content_index=0, sequence_number=index + 1, logprobs=[])
+        yield ResponseCompletedEvent(type="response.completed", response=response(output), sequence_number=len(output) + 1)
+
+
+def agent_roles() -> List[Tuple[Agent, str]]:
+    """Every agent of the application and the role its ScriptedModel plays"""
+    from ..agents.coordinator_agent import coordinator_agent
+    from ..agents.data_insights_agent import data_insights_agent
+    from ..agents.visual_coordinator_agent import visual_coordinator_agent
+    from ..agents.tools.insights_planner import query_planner_agent
+    from ..agents.tools.visual_planner import visual_planner_agent
+    from ..agents.tools.sql_analyzer import sql_analyzer_agent
+    from ..agents.tools.visual_creator import visual_definition_generator
+    from ..agents.tools.quicksight_agent import quicksight_agent
+    return [
+        (coordinator_agent, "coordinator"),
+        (data_insights_agent, "data_insights"),
+        (visual_coordinator_agent, "visual_coordinator"),
+        (quicksight_agent, "quicksight"),
+        (query_planner_agent, "query_planner"),
+        (visual_planner_agent, "visual_planner"),
+        (sql_analyzer_agent, "sql_analyzer"),
+        (visual_definition_generator, "definition_generator"),
+    ]
+
+
+# ========================================
+# AWS
+# ========================================
+
+class FakeBedrockAgentRuntime:
+    """Knowledge base text-to-SQL stand-in"""
+
+    def __init__(self, faults: FaultInjector, stream_chunks: int = 8):
+        self.faults = faults
+        self.stream_chunks = stream_chunks
+
+    def retrieve_and_generate(self, input: Dict[str, str], retrieveAndGenerateConfiguration: Dict[str, Any], **kwargs):
+        question = input["text"]
+        self.faults.blocking_call("bedrock", "retrieve_and_generate", question)
+        _, sql, answer, _ = lookup_knowledge(question)
+        return {
+            "output": {"text": answer},
+            "citations": [{"retrievedReferences": [{"location": {"sqlLocation": {"query": sql}}}]}],
+        }
+
+    def retrieve_and_generate_stream(self, input: Dict[str, str], retrieveAndGenerateConfiguration: Dict[str, Any], **kwargs):
+        question = input["text"]
+        latency, fail = self.faults.decide("bedrock", "retrieve_and_generate_stream", question)
+        _, sql, answer, _ = lookup_knowledge(question)
+        words = answer.split(" ")
+        size = max(1, len(words) // self.stream_chunks)
+        chunks = [" ".join(words[index:index + size]) + " " for index in range(0, len(words), size)]
+
+        def stream():
+            # Half the latency before the first chunk, the rest spread over the chunks
+            time.sleep(latency / 2)
+            if fail:
+                yield {"throttlingException": {"message": "Injected bedrock failure"}}
+                return
+            for chunk in chunks:
+                time.sleep(latency / 2 / len(chunks))
+                yield {"output": {"text": chunk}}
+            yield {"citation": {"retrievedReferences": [{"location": {"sqlLocation": {"query": sql}}}]}}
+
+        return {"stream": stream()}
+
+
+class FakePaginator:
+    def __init__(self, quicksight: "FakeQuickSight"):
+        self.quicksight = quicksight
+
+    def paginate(self, AwsAccountId: str, PaginationConfig: Optional[Dict[str, Any]] = None, **kwargs) -> Iterator[Dict[str, Any]]:
+        page_size = (PaginationConfig or {}).get("PageSize", 100)
+        summaries = self.quicksight.summaries()
+        for start in range(0, max(1, len(summaries)), page_size):
+            self.quicksight.faults.blocking_call("quicksight", "list_analyses", str(start))
+            yield {"AnalysisSummaryList": summaries[start:start + page_size]}
+
+
+class FakeQuickSight:
+    """
+    QuickSight control-plane stand-in.
+
+    Args:
+        faults: Shared FaultInjector
+        ready_after_polls: describe_analysis calls before a new or updated analysis reports *_SUCCESSFUL
+        existing_analyses: Analyses present before the run (exercises list pagination)
+    """
+
+    def __init__(self, faults: FaultInjector, ready_after_polls: int = 2, existing_analyses: int = 150):
+        self.faults = faults
+        self.ready_after_polls = ready_after_polls
+        self.analyses: Dict[str, Dict[str, Any]] = {}
+        self._polls: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        now = datetime.now(timezone.utc)
+        for index in range(existing_analyses):
+            analysis_id = f"existing-analysis-{index:04d}"
+            self.analyses[analysis_id] = self._analysis(analysis_id, f"Existing Analysis {index}", "CREATION_SUCCESSFUL", now)
+
+    @staticmethod
+    def _analysis(analysis_id: str, name: str, status: str, timestamp: datetime) -> Dict[str, Any]:
+        return {
+            "AnalysisId": analysis_id,
+            "Arn": f"arn:aws:quicksight:us-west-2:000000000000:analysis/{analysis_id}",
+            "Name": name,
+            "Status": status,
+            "CreatedTime": timestamp,
+            "LastUpdatedTime": timestamp,
+            "Errors": [],
+        }
+
+    def summaries(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [{key: value for key, value in analysis.items() if key != "Errors"} for analysis in self.analyses.values()]
+
+    def get_paginator(self, operation_name: str) -> FakePaginator:
+        if operation_name != "list_analyses":
+            raise NotImplementedError(operation_name)
+        return FakePaginator(self)
+
+    def create_analysis(self, AwsAccountId: str, AnalysisId: str, Name: str, Definition: Dict[str, Any], **kwargs):
+        self.faults.blocking_call("quicksight", "create_analysis", AnalysisId)
+        with self._lock:
+            if AnalysisId in self.analyses:
+                raise ClientError({"Error": {"Code": "ResourceExistsException", "Message": AnalysisId}}, "CreateAnalysis")
+            self.analyses[AnalysisId] = self._analysis(AnalysisId, Name, "CREATION_IN_PROGRESS", datetime.now(timezone.utc))
+            self._polls[AnalysisId] = 0
+        return {"Status": 202, "AnalysisId": AnalysisId, "Arn": self.analyses[AnalysisId]["Arn"],
+                "CreationStatus": "CREATION_IN_PROGRESS"}
+
+    def update_analysis(self, AwsAccountId: str, AnalysisId: str, Name: str, Definition: Dict[str, Any], **kwargs):
+        self.faults.blocking_call("quicksight", "update_analysis", AnalysisId)
+        with self._lock:
+            analysis = self.analyses.get(AnalysisId)
+            if analysis is None:
+                raise ClientError({"Error": {"Code": "ResourceNotFoundException", "Message": AnalysisId}}, "UpdateAnalysis")
+            analysis.update(Name=Name, Status="UPDATE_IN_PROGRESS", LastUpdatedTime=datetime.now(timezone.utc))
+            self._polls[AnalysisId] = 0
+        return {"Status": 202, "AnalysisId": AnalysisId, "Arn": analysis["Arn"], "UpdateStatus": "UPDATE_IN_PROGRESS"}
+
+    def describe_analysis(self, AwsAccountId: str, AnalysisId: str, **kwargs):
+        self.faults.blocking_call("quicksight", "describe_analysis", AnalysisId)
+        with self._lock:
+            analysis = self.analyses.get(AnalysisId)
+            if analysis is None:
+                raise ClientError({"Error": {"Code": "ResourceNotFoundException", "Message": AnalysisId}}, "DescribeAnalysis")
+            self._polls[AnalysisId] = self._polls.get(AnalysisId, 0) + 1
+            if analysis["Status"].endswith("_IN_PROGRESS") and self._polls[AnalysisId] >= self.ready_after_polls:
+                analysis["Status"] = analysis["Status"].replace("_IN_PROGRESS", "_SUCCESSFUL")
+                analysis["LastUpdatedTime"] = datetime.now(timezone.utc)
+            return {"Status": 200, "Analysis": dict(analysis)}
+
+    def update_analysis_permissions(self, AwsAccountId: str, AnalysisId: str, **kwargs):
+        self.faults.blocking_call("quicksight", "update_analysis_permissions", AnalysisId)
+        return {"Status": 200, "AnalysisId": AnalysisId, "Permissions": kwargs.get("GrantPermissions", [])}
+
+    def delete_analysis(self, AwsAccountId: str, AnalysisId: str, **kwargs):
+        self.faults.blocking_call("quicksight", "delete_analysis", AnalysisId)
+        with self._lock:
+            self.analyses.pop(AnalysisId, None)
+        return {"Status": 200, "AnalysisId": AnalysisId}
+
+    def describe_data_set(self, AwsAccountId: str, DataSetId: str, **kwargs):
+        self.faults.blocking_call("quicksight", "describe_data_set", DataSetId)
+        columns = []
+        for name in sorted(DATASET_COLUMNS):
+            column_type = "DATETIME" if name in DATE_COLUMNS else "DECIMAL" if name in NUMERIC_COLUMNS else "STRING"
+            columns.append({"Name": name, "Type": column_type})
+        return {"Status": 200, "DataSet": {"DataSetId": DataSetId, "OutputColumns": columns}}
+
+
+@dataclass
+class FakeBackends:
+    """The fakes installed for one benchmark run"""
+
+    faults: FaultInjector
+    bedrock: FakeBedrockAgentRuntime
+    quicksight: FakeQuickSight
+    models: Dict[str, ScriptedModel] = field(default_factory=dict)
+
+
+@contextmanager
+def fake_backends(faults: FaultInjector, **quicksight_options: Any) -> Iterator[FakeBackends]:
+    """Swap every agent's model and the shared AWS clients for fakes; restore them on exit"""
+    backends = FakeBackends(faults, FakeBedrockAgentRuntime(faults), FakeQuickSight(faults, **quicksight_options))
+    originals = []
+    for agent, role in agent_roles():
+        originals.append((agent, agent.model))
+        backends.models[role] = agent.model = ScriptedModel(role, agent.name, faults)
+    aws_clients.set_client("bedrock-agent-runtime", backends.bedrock)
+    aws_clients.set_client("quicksight", backends.quicksight)
+    try:
+        yield backends
+    finally:
+        for agent, model in originals:
+            agent.model = model
+        aws_clients.reset_clients()
@@ -0,0 +1,514 @@
+"""
+Instrumentation - Timing spans for agent stages, exported to a local file.
+
+Print statements could not tell whether the query planner, the knowledge base,
+the JSON generator or QuickSight dominated a turn. This module records spans:
+
+- tools, LLM calls (with token counts) and agents, converted from the agents
+  SDK's own trace spans by SdkSpanProcessor;
+- Bedrock, QuickSight, cache and pipeline stage work, recorded with the span()
+  context manager or the traced() decorator, with attributes such as payload
+  sizes and cache hits.
+
+Finished spans are buffered and appended to TRACE_FILE, either one JSON object
+per line (TRACE_EXPORT=jsonl) or as OTLP/JSON export requests (TRACE_EXPORT=otlp)
+that OpenTelemetry tooling can read. Summarize a trace file with:
+
+    python -m src.instrumentation [--file traces.jsonl] [--kind bedrock]
+"""
+
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Optional, Dict, Any, List, Callable, Iterator
+import argparse
+import asyncio
+import atexit
+import contextvars
+import functools
+import json
+import math
+import os
+import secrets
+import threading
+import time
+
+from agents.tracing import TracingProcessor, add_trace_processor, get_current_span, get_current_trace
+
+# "jsonl", "otlp", or empty to disable export
+TRACE_EXPORT = os.getenv("TRACE_EXPORT", "jsonl")
+TRACE_FILE = os.getenv("TRACE_FILE", "traces.jsonl")
+TRACE_FLUSH_BATCH_SIZE = int(os.getenv("TRACE_FLUSH_BATCH_SIZE", "64"))
+SERVICE_NAME = "data-insights-assistant"
+
+# Span kinds
+KIND_AGENT = "agent"
+KIND_TOOL = "tool"
+KIND_LLM = "llm"
+KIND_HANDOFF = "handoff"
+KIND_BEDROCK = "bedrock"
+KIND_QUICKSIGHT = "quicksight"
+KIND_CACHE = "cache"
+KIND_STAGE = "stage"
+KIND_SQL = "sql"
+
+# Kinds that are calls to a remote service (OTLP SPAN_KIND_CLIENT)
+CLIENT_KINDS = {KIND_LLM, KIND_BEDROCK, KIND_QUICKSIGHT}
+
+
+def _hex_id(value: Optional[str], length: int) -> Optional[str]:
+    """Normalize an id ("trace_<hex>", "span_<hex>" or plain hex) to fixed-length hex"""
+    if not value:
+        return None
+    value = value.split("_", 1)[-1]
+    return value[:length].rjust(length, "0")
+
+
+@dataclass
+class SpanRecord:
+    """A finished span"""
+
+    name: str
+    kind: str
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str] = None
+    start: float = 0.0
+    duration_ms: float = 0.0
+    status: str = "ok"
+    error: Optional[str] = None
+    attributes: Dict[str, Any] = field(default_factory=dict)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "kind": self.kind,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start": round(self.start, 6),
+            "duration_ms": round(self.duration_ms, 3),
+            "status": self.status,
+            "error": self.error,
+            "attributes": self.attributes,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "SpanRecord":
+        return cls(**{key: data.get(key) for key in cls.__dataclass_fields__ if key in data})
+
+    def as_otlp(self) -> Dict[str, Any]:
+        """OTLP/JSON span"""
+        start_ns = int(self.start * 1e9)
+        attributes = [{"key": "span.kind", "value": {"stringValue": self.kind}}]
+        for key, value in self.attributes.items():
+            if isinstance(value, bool):
+                attributes.append({"key": key, "value": {"boolValue": value}})
+            elif isinstance(value, int):
+                attributes.append({"key": key, "value": {"intValue": str(value)}})
+            elif isinstance(value, float):
+                attributes.append({"key": key, "value": {"doubleValue": value}})
+            elif value is not None:
+                attributes.append({"key": key, "value": {"stringValue": str(value)}})
+        span = {
+            "traceId": _hex_id(self.trace_id, 32),
+            "spanId": _hex_id(self.span_id, 16),
+            "name": self.name,
+            "kind": 3 if self.kind in CLIENT_KINDS else 1,
+            "startTimeUnixNano": str(start_ns),
+            "endTimeUnixNano": str(start_ns + int(self.duration_ms * 1e6)),
+            "attributes": attributes,
+            "status": {"code": 2, "message": self.error or ""} if self.status == "error" else {"code": 1},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = _hex_id(self.parent_id, 16)
+        return span
+
+    @classmethod
+    def from_otlp(cls, span: Dict[str, Any]) -> "SpanRecord":
+        attributes = {}
+        for attribute in span.get("attributes", []):
+            value = next(iter(attribute["value"].values()), None)
+            if "intValue" in attribute["value"]:
+                value = int(value)
+            attributes[attribute["key"]] = value
+        start_ns = int(span.get("startTimeUnixNano", 0))
+        status = span.get("status", {})
+        return cls(
+            name=span.get("name", ""),
+            kind=attributes.pop("span.kind", ""),
+            trace_id=span.get("traceId", ""),
+            span_id=span.get("spanId", ""),
+            parent_id=span.get("parentSpanId"),
+            start=start_ns / 1e9,
+            duration_ms=(int(span.get("endTimeUnixNano", start_ns)) - start_ns) / 1e6,
+            status="error" if status.get("code") == 2 else "ok",
+            error=status.get("message") or None,
+            attributes=attributes,
+        )
+
+
+class FileSpanSink:
+    """
+    Buffered append-only span file.
+
+    Args:
+        path: Output file
+        otlp: Write OTLP/JSON export requests (one per flush) instead of one span per line
+        batch_size: Buffered spans that trigger a flush
+    """
+
+    def __init__(self, path: str = TRACE_FILE, otlp: bool = False, batch_size: int = TRACE_FLUSH_BATCH_SIZE):
+        self.path = path
+        self.otlp = otlp
+        self.batch_size = batch_size
+        self._buffer: List[SpanRecord] = []
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._registered = False
+
+    def write(self, record: SpanRecord):
+        with self._lock:
+            self._buffer.append(record)
+            if not self._registered:
+                atexit.register(self.flush)
+                self._registered = True
+            if len(self._buffer) < self.batch_size:
+                return
+        self.flush()
+
+    def flush(self):
+        with self._lock:
+            if not self._buffer:
+                return
+            batch, self._buffer = self._buffer, []
+        # Serialize and write outside the buffer lock so recording spans never waits on disk
+        if self.otlp:
+            lines = [json.dumps({
+                "resourceSpans": [{
+                    "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+                    "scopeSpans": [{"scope": {"name": __name__}, "spans": [record.as_otlp() for record in batch]}],
+                }]
+            }, default=str)]
+        else:
+            lines = [json.dumps(record.as_dict(), default=str) for record in batch]
+        with self._write_lock:
+            try:
+                with open(self.path, "a", encoding="utf-8") as trace_file:
+                    trace_file.write("\n".join(lines) + "\n")
+            except OSError as e:
+                print(f"\n❌ Error writing trace spans to {self.path}: {e}\n")
+
+
+def create_default_sink() -> Optional[FileSpanSink]:
+    """File sink configured by TRACE_EXPORT / TRACE_FILE, or None when export is disabled"""
+    if not TRACE_EXPORT or not TRACE_FILE:
+        return None
+    return FileSpanSink(TRACE_FILE, otlp=TRACE_EXPORT == "otlp")
+
+
+class ActiveSpan:
+    """A span being recorded; attributes can be added until it ends"""
+
+    __slots__ = ("name", "kind", "trace_id", "span_id", "parent_id", "start", "attributes")
+
+    def __init__(self, name: str, kind: str, trace_id: str, parent_id: Optional[str], attributes: Dict[str, Any]):
+        self.name = name
+        self.kind = kind
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.start = time.time()
+        self.attributes = attributes
+
+    def set(self, **attributes: Any):
+        self.attributes.update(attributes)
+
+
+_current_span: contextvars.ContextVar[Optional[ActiveSpan]] = contextvars.ContextVar("instrumentation_span", default=None)
+
+
+class Tracer:
+    """Records spans and hands finished ones to the sink"""
+
+    def __init__(self, sink: Optional[FileSpanSink] = None):
+        self.sink = sink
+
+    def record(self, record: SpanRecord):
+        if self.sink is not None:
+            self.sink.write(record)
+
+    def flush(self):
+        if self.sink is not None:
+            self.sink.flush()
+
+    @contextmanager
+    def span(self, name: str, kind: str, **attributes: Any) -> Iterator[ActiveSpan]:
+        """
+        Time the enclosed block as a span.
+
+        The parent is the enclosing span() or, inside an agent run, the current
+        agents SDK span, so stage and service spans line up with tool calls.
+        """
+        parent = _current_span.get()
+        if parent is not None:
+            trace_id, parent_id = parent.trace_id, parent.span_id
+        else:
+            sdk_trace, sdk_span = get_current_trace(), get_current_span()
+            trace_id = sdk_trace.trace_id if sdk_trace is not None else secrets.token_hex(16)
+            parent_id = sdk_span.span_id if sdk_span is not None else None
+        active = ActiveSpan(name, kind, trace_id, parent_id, attributes)
+        token = _current_span.set(active)
+        started = time.perf_counter()
+        status, error = "ok", None
+        try:
+            yield active
+        except BaseException as e:
+            status, error = "error", f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            _current_span.reset(token)
+            self.record(SpanRecord(
+                name=name,
+                kind=kind,
+                trace_id=active.trace_id,
+                span_id=active.span_id,
+                parent_id=active.parent_id,
+                start=active.start,
+                duration_ms=(time.perf_counter() - started) * 1000,
+                status=status,
+                error=error,
+                attributes=active.attributes,
+            ))
+
+
+def create_default_tracer() -> Tracer:
+    return Tracer(create_default_sink())
+
+
+TRACER = create_default_tracer()
+
+
+def span(name: str, kind: str, **attributes: Any):
+    """Context manager timing a block as a span on the shared tracer"""
+    return TRACER.span(name, kind, **attributes)
+
+
+def annotate(**attributes: Any):
+    """Add attributes (cache hits, sizes, counts) to the current span, if any"""
+    active = _current_span.get()
+    if active is not None:
+        active.set(**attributes)
+
+
+def traced(name: str, kind: str) -> Callable:
+    """Decorator recording each call of a sync or async function as a span"""
+    def decorator(function: Callable) -> Callable:
+        if asyncio.iscoroutinefunction(function):
+            @functools.wraps(function)
+            async def async_wrapper(*args, **kwargs):
+                with span(name, kind):
+                    return await function(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(name, kind):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def payload_size(value: Any) -> int:
+    """Approximate serialized size of a payload in bytes"""
+    if value is None:
+        return 0
+    if isinstance(value, (str, bytes)):
+        return len(value)
+    return len(json.dumps(value, default=str))
+
+
+def _iso_to_epoch(value: Optional[str]) -> Optional[float]:
+    return datetime.fromisoformat(value).timestamp() if value else None
+
+
+def _usage_tokens(usage: Any) -> Dict[str, int]:
+    if usage is None:
+        return {}
+    get = usage.get if isinstance(usage, dict) else lambda key: getattr(usage, key, None)
+    tokens = {
+        "input_tokens": get("input_tokens") or get("prompt_tokens"),
+        "output_tokens": get("output_tokens") or get("completion_tokens"),
+    }
+    return {key: value for key, value in tokens.items() if value is not None}
+
+
+class SdkSpanProcessor(TracingProcessor):
+    """Converts agents SDK spans (agents, tools, LLM calls, handoffs) into SpanRecords"""
+
+    def __init__(self, tracer: Tracer = TRACER):
+        self.tracer = tracer
+        self._agent_names: Dict[str, str] = {}
+
+    def on_trace_start(self, trace):
+        pass
+
+    def on_trace_end(self, trace):
+        # A finished agent run is a natural point to write out buffered spans
+        self.tracer.flush()
+
+    def on_span_start(self, span):
+        if span.span_data.type == "agent":
+            self._agent_names[span.span_id] = span.span_data.name
+
+    def on_span_end(self, span):
+        try:
+            record = self._convert(span)
+        except Exception as e:
+            print(f"\n❌ Error converting trace span: {e}\n")
+            return
+        if record is not None:
+            self.tracer.record(record)
+
+    def _convert(self, span) -> Optional[SpanRecord]:
+        data = span.span_data
+        attributes: Dict[str, Any] = {}
+        if data.type == "agent":
+            self._agent_names.pop(span.span_id, None)
+            kind, name = KIND_AGENT, data.name
+        elif data.type == "function":
+            kind, name = KIND_TOOL, data.name
+            attributes = {"input_bytes": payload_size(data.input), "output_bytes": payload_size(data.output)}
+        elif data.type in ("response", "generation"):
+            kind = KIND_LLM
+            response = getattr(data, "response", None)
+            model = getattr(response, "model", None) or getattr(data, "model", None)
+            usage = getattr(data, "usage", None) or getattr(response, "usage", None)
+            attributes = {"model": model, **_usage_tokens(usage)}
+            # Name LLM calls after the agent making them (planner, coordinator, ...)
+            name = f"llm.{self._agent_names.get(span.parent_id, 'unknown')}"
+        elif data.type == "handoff":
+            kind, name = KIND_HANDOFF, f"{data.from_agent}->{data.to_agent}"
+        else:
+            return None
+
+        start = _iso_to_epoch(span.started_at) or time.time()
+        end = _iso_to_epoch(span.ended_at) or start
+        error = span.error
+        return SpanRecord(
+            name=name,
+            kind=kind,
+            trace_id=span.trace_id,
+            span_id=span.span_id,
+            parent_id=span.parent_id,
+            start=start,
+            duration_ms=(end - start) * 1000,
+            status="error" if error else "ok",
+            error=error.get("message") if isinstance(error, dict) else (str(error) if error else None),
+            attributes=attributes,
+        )
+
+    def shutdown(self):
+        self.tracer.flush()
+
+    def force_flush(self):
+        self.tracer.flush()
+
+
+_sdk_processor: Optional[SdkSpanProcessor] = None
+
+
+def install_sdk_processor() -> Optional[SdkSpanProcessor]:
+    """Register the SDK span processor once (no-op when export is disabled)"""
+    global _sdk_processor
+    if _sdk_processor is None and TRACER.sink is not None:
+        _sdk_processor = SdkSpanProcessor(TRACER)
+        add_trace_processor(_sdk_processor)
+    return _sdk_processor
+
+
+# ========================================
+# TRACE FILE SUMMARY
+# ========================================
+
+def load_spans(path: str) -> List[SpanRecord]:
+    """Read spans from a JSONL or OTLP/JSON trace file"""
+    records = []
+    with open(path, encoding="utf-8") as trace_file:
+        for line in trace_file:
+            line = line.strip()
+            if not line:
+                continue
+            data = json.loads(line)
+            if "resourceSpans" in data:
+                for resource_spans in data["resourceSpans"]:
+                    for scope_spans in resource_spans.get("scopeSpans", []):
+                        records.extend(SpanRecord.from_otlp(item) for item in scope_spans.get("spans", []))
+            else:
+                records.append(SpanRecord.from_dict(data))
+    return records
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of a non-empty list"""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(fraction * len(ordered)) - 1))]
+
+
+def summarize(records: List[SpanRecord]) -> List[Dict[str, Any]]:
+    """Per (kind, name) latency percentiles, error counts, tokens and cache hit rate"""
+    groups: Dict[tuple, List[SpanRecord]] = {}
+    for record in records:
+        groups.setdefault((record.kind, record.name), []).append(record)
+
+    rows = []
+    for (kind, name), group in groups.items():
+        durations = [record.duration_ms for record in group]
+        cache_flags = [record.attributes["cache_hit"] for record in group if "cache_hit" in record.attributes]
+        tokens = [
+            (record.attributes.get("input_tokens") or 0) + (record.attributes.get("output_tokens") or 0)
+            for record in group if "input_tokens" in record.attributes or "output_tokens" in record.attributes
+        ]
+        rows.append({
+            "kind": kind,
+            "name": name,
+            "count": len(group),
+            "p50_ms": percentile(durations, 0.5),
+            "p95_ms": percentile(durations, 0.95),
+            "total_ms": sum(durations),
+            "errors": sum(1 for record in group if record.status == "error"),
+            "avg_tokens": sum(tokens) / len(tokens) if tokens else None,
+            "cache_hit_rate": sum(1 for flag in cache_flags if flag) / len(cache_flags) if cache_flags else None,
+        })
+    rows.sort(key=lambda row: row["total_ms"], reverse=True)
+    return rows
+
+
+def main():
+    """Print p50/p95 per stage for a trace file"""
+    parser = argparse.ArgumentParser(description="Summarize exported agent trace spans")
+    parser.add_argument("--file", default=TRACE_FILE, help="JSONL or OTLP/JSON trace file")
+    parser.add_argument("--kind", default=None, help="Only show spans of this kind (tool, llm, bedrock, ...)")
+    args = parser.parse_args()
+
+    records = load_spans(args.file)
+    if args.kind:
+        records = [record for record in records if record.kind == args.kind]
+    if not records:
+        print(f"No spans found in {args.file}")
+        return
+
+    traces = len({record.trace_id for record in records})
+    print(f"📊 {len(records)} spans from {traces} traces in {args.file} (sorted by total time)")
+    print("=" * 118)
+    print(f"{'kind':<10} | {'name':<42} | {'count':>5} | {'p50 ms':>9} | {'p95 ms':>9} | {'errors':>6} | {'tokens':>7} | {'cache':>5}")
+    print("-" * 118)
+    for row in summarize(records):
+        tokens = f"{row['avg_tokens']:.0f}" if row["avg_tokens"] is not None else "-"
+        cache = f"{row['cache_hit_rate']:.0%}" if row["cache_hit_rate"] is not None else "-"
+        print(f"{row['kind']:<10} | {row['name'][:42]:<42} | {row['count']:>5} | {row['p50_ms']:>9.1f} | "
+              f"{row['p95_ms']:>9.1f} | {row['errors']:>6} | {tokens:>7} | {cache:>5}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,30 @@
 import asyncio
 
-from agents import Runner, SQLiteSession
+from agents import SQLiteSession
 
 from .agents.coordinator_agent import coordinator_agent
+from .memory.agent_memory import create_run_context
+from .memory.memory_backend import AGENT_MEMORY_DB
+from .memory.compacting_session import CompactingSession
+from .instrumentation import install_sdk_processor
+from .streaming import stream_agent_run, EVENT_TEXT, EVENT_PARTIAL, EVENT_TOOL_STARTED, EVENT_TOOL_FINISHED, EVENT_FINAL
 
 class Manager:
 
     async def run(self) -> None:
+        # Export agent, tool and LLM call spans alongside the service spans (see src/instrumentation.py)
+        install_sdk_processor()
         # Intialize session to store conversation history
-        session = SQLiteSession("session1")
+        # Agent memory is persisted in the same SQLite file, so both survive restarts
+        # History is replayed through a token budget so coordinator calls stay small
+        session = CompactingSession(SQLiteSession("session1", AGENT_MEMORY_DB or ":memory:"))
+        # Session-scoped agent memory, passed to every tool through the run context
+        run_context = create_run_context(session.session_id)
 
         print("Hi I'm a data analysis and visualization assistant for a digital fashion e-commerce store. I can help you with data insights, visualizations, and QuickSight management. How can I help you today?")
-        # Add initial message to the session
-        await session.add_items([{"role": "assistant", "content": "Hi I'm a data analysis and visualization assistant for a digital fashion e-commerce store. I can help you with data insights, visualizations, and QuickSight management. How can I help you today?"}])
+        # Add initial message to the session (a restored session already has it)
+        if not await session.get_items(limit=1):
+            await session.add_items([{"role": "assistant", "content": "Hi I'm a data analysis and visualization assistant for a digital fashion e-commerce store. I can help you with data insights, visualizations, and QuickSight management. How can I help you today?"}])
 
         while True:
             try:
@@ -27,9 +39,25 @@ class Manager:
                 
                 # By passing the session each run, the agent has knowledge of the conversation history
                 
-                chatbot_response = await Runner.run(coordinator_agent, user_input, session=session)
-                
-                print("\n" + chatbot_response.final_output + "\n")
+                # Stream tokens, tool progress and partial KB answers as they arrive
+                streamed_kind = None
+                async for update in stream_agent_run(coordinator_agent, user_input, session=session, context=run_context):
+                    if update.kind in (EVENT_TEXT, EVENT_PARTIAL):
+                        if streamed_kind != update.kind:
+                            print("\n📚 " if update.kind == EVENT_PARTIAL else "\n", end="")
+                            streamed_kind = update.kind
+                        print(update.text, end="", flush=True)
+                    elif update.kind == EVENT_TOOL_STARTED:
+                        print(f"\n⚙️ {update.name} started ({update.elapsed:.1f}s)")
+                        streamed_kind = None
+                    elif update.kind == EVENT_TOOL_FINISHED:
+                        print(f"\n✅ {update.name} finished ({update.elapsed:.1f}s)")
+                        streamed_kind = None
+                    elif update.kind == EVENT_FINAL:
+                        # Print the final output only if no model text was streamed
+                        if streamed_kind != EVENT_TEXT:
+                            print("\n" + update.text, end="")
+                        print(f"\n\n⏱️ {update.elapsed:.1f}s\n")
                 
             except KeyboardInterrupt:
                 print("\nGoodbye!")
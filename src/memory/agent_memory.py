@@ -3,11 +3,28 @@ Agent Memory - Shared memory system for multi-agent conversations.
 
 This module provides a centralized memory store that allows agents to share
 context, query results, and visualization definitions across interactions.
+Each conversation gets its own AgentMemory from the SessionMemoryStore; the
+memory travels to the tools through the agent run context (AgentRunContext),
+so concurrent conversations in one process never see each other's state.
+When the store has a MemoryBackend, sessions are persisted and restored
+across restarts.
 """
 
-from dataclasses import dataclass
-from typing import Optional, Dict, Any, List
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Optional, Dict, Any, List, Callable
 import json
+import os
+import threading
+import time
+
+from .context_window import ContextRing, ContextRecord
+from .memory_backend import MemoryBackend, LazyBlob, PERSISTED_FIELDS, create_default_backend
+
+# Session id used by callers that do not pass a run context (scripts, tests)
+DEFAULT_SESSION_ID = "default"
+AGENT_MEMORY_MAX_SESSIONS = int(os.getenv("AGENT_MEMORY_MAX_SESSIONS", "1000"))
+AGENT_MEMORY_IDLE_SECONDS = float(os.getenv("AGENT_MEMORY_IDLE_SECONDS", "86400"))
 
 @dataclass
 class AgentMemory:
@@ -18,18 +35,19 @@ class AgentMemory:
     and QuickSight configuration across multiple agent interactions.
     """
     
-    # session context - list of user/agent interactions
-    data_insights_context: Optional[List[Dict[str, Any]]] = None
+    # session context - bounded ring of compact user/agent interactions
+    data_insights_context: ContextRing = field(default_factory=ContextRing)
     context: Optional[List[Dict[str, Any]]] = None
     has_direct_sql_query: Optional[bool] = False
     
     # Data Visualizer Agent outputs  
-    visualization_plan: Optional[str] = None
+    visualization_plan: Optional[Any] = None  # VisualPlan
     json_visual_definition: Optional[Dict[str, Any]] = None
     
     # QuickSight Agent outputs
     quicksight_analysis_id: Optional[str] = None
     quicksight_analysis_name: Optional[str] = None
+    analysis_job_id: Optional[str] = None
     create_analysis: Optional[bool] = False
     update_analysis: Optional[bool] = False
     list_analyses: Optional[bool] = False
@@ -39,19 +57,48 @@ class AgentMemory:
     has_visualization_plan: Optional[bool] = False
     has_json_visual_definition: Optional[bool] = False
 
+    # Guards compound updates; re-entrant so methods can call each other
+    lock: Any = field(default_factory=threading.RLock, init=False, repr=False, compare=False)
+
+    def __setattr__(self, name: str, value: Any):
+        object.__setattr__(self, name, value)
+        # Queue a write for persisted fields once a backend is attached
+        backend = self.__dict__.get("_backend")
+        if backend is not None and name in PERSISTED_FIELDS and not isinstance(value, LazyBlob):
+            backend.write_field(self.__dict__["_session_id"], name, value)
+
+    def attach_backend(self, backend: MemoryBackend, session_id: str):
+        """Restore the session's persisted fields and persist later changes"""
+        for name, value in backend.load_session(session_id).items():
+            object.__setattr__(self, name, value)
+        object.__setattr__(self, "_session_id", session_id)
+        object.__setattr__(self, "_backend", backend)
+
+    def _resolve(self, name: str) -> Any:
+        """Read a field, loading it from the backend if it was restored lazily"""
+        value = getattr(self, name)
+        if isinstance(value, LazyBlob):
+            with self.lock:
+                value = getattr(self, name)
+                if isinstance(value, LazyBlob):
+                    value = value.load()
+                    object.__setattr__(self, name, value)
+        return value
 
     
     def add_data_insights_context_pair(self, user_message: str, agent_response: str):
-        """Add a complete user/agent interaction pair"""
-        if self.data_insights_context is None:
-            self.data_insights_context = []
-        self.data_insights_context.append({"user": user_message, "agent": agent_response})
+        """Add a complete user/agent interaction pair (older pairs are folded into a summary)"""
+        record = ContextRecord.from_pair(user_message, agent_response)
+        with self.lock:
+            self.data_insights_context.append(record)
+            # The ring is mutated in place, so re-assign it to persist the change
+            self.data_insights_context = self.data_insights_context
     
     def set_has_direct_sql_query(self, has_direct_sql_query: bool):
         """Set has_direct_sql_query"""
         self.has_direct_sql_query = has_direct_sql_query
         
-    def set_visualization_plan(self, visualization_plan: str):
+    def set_visualization_plan(self, visualization_plan: Any):
         """Set visualization plan"""
         self.visualization_plan = visualization_plan
 
@@ -67,6 +114,10 @@ class AgentMemory:
         """Store results from QuickSight agent"""
         self.quicksight_analysis_id = analysis_id
 
+    def set_analysis_job_id(self, job_id: str):
+        """Store the id of the latest analysis creation job"""
+        self.analysis_job_id = job_id
+
     def set_has_visualization_plan(self, has_visualization_plan: bool):
         """Set has_visualization_plan"""
         self.has_visualization_plan = has_visualization_plan
@@ -88,22 +139,19 @@ class AgentMemory:
         self.update_analysis = update_analysis
 
     def get_data_insights_context(self) -> List[Dict[str, str]]:
-        """Get the session context as list of user/agent pairs"""
-        return self.data_insights_context or []
+        """Get the recent session context as list of user/agent pairs"""
+        with self.lock:
+            return [record.as_pair() for record in self.data_insights_context.records()]
+
+    def get_latest_data_insights(self) -> Optional[ContextRecord]:
+        """Get the most recent data insights turn"""
+        with self.lock:
+            return self.data_insights_context.latest()
     
     def get_data_insights_context_as_string(self) -> str:
-        """Get the context formatted as a readable string"""
-        if not self.data_insights_context:
-            return ""
-        
-        formatted_context = []
-        for interaction in self.data_insights_context:
-            if interaction["user"]:
-                formatted_context.append(f"\nUser: {interaction['user']}\n")
-            if interaction["agent"]:
-                formatted_context.append(f"\nAgent: {interaction['agent']}\n")
-        
-        return "\n".join(formatted_context)
+        """Get the context formatted as a readable string of bounded size"""
+        with self.lock:
+            return self.data_insights_context.to_prompt()
         
     def get_has_direct_sql_query(self) -> bool:
         """Get has_direct_sql_query"""
@@ -117,13 +165,17 @@ class AgentMemory:
         """Get quicksight_analysis_id"""
         return self.quicksight_analysis_id
 
-    def get_visualization_plan(self) -> str:
+    def get_analysis_job_id(self) -> Optional[str]:
+        """Get the id of the latest analysis creation job"""
+        return self.analysis_job_id
+
+    def get_visualization_plan(self) -> Any:
         """Get visualization plan"""
-        return self.visualization_plan
+        return self._resolve("visualization_plan")
     
     def get_json_visual_definition(self) -> Dict[str, Any]:
         """Get json visual definition"""
-        return self.json_visual_definition
+        return self._resolve("json_visual_definition")
 
     
     def get_has_visualization_plan(self) -> bool:
@@ -148,22 +200,25 @@ class AgentMemory:
     
     def reset_analysis_flags(self):
         """Reset analysis flags"""
-        self.create_analysis = False
-        self.update_analysis = False
-        self.list_analyses = False
+        with self.lock:
+            self.create_analysis = False
+            self.update_analysis = False
+            self.list_analyses = False
 
     def clear(self):
         """Clear all stored data"""
-        self.context = None
-        self.visualization_plan = None
-        self.json_visual_definition = None
-        self.quicksight_analysis_id = None
-        self.quicksight_analysis_name = None
+        with self.lock:
+            self.context = None
+            self.visualization_plan = None
+            self.json_visual_definition = None
+            self.quicksight_analysis_id = None
+            self.quicksight_analysis_name = None
+            self.analysis_job_id = None
 
     
     def __str__(self) -> str:
         """String representation of memory contents"""
-        context_summary = f"{len(self.data_insights_context)} interactions" if self.data_insights_context else "No context"
+        context_summary = f"{len(self.data_insights_context)} interactions (+{self.data_insights_context.folded_turns} summarized)" if self.data_insights_context else "No context"
         return f"""AgentMemory:
 - Context: {context_summary}
 - Has Visualization Plan: {self.get_has_visualization_plan()}
@@ -171,5 +226,120 @@ class AgentMemory:
 - QuickSight Analysis: {self.quicksight_analysis_name} ({self.quicksight_analysis_id})
 """
 
-# Global memory instance for the coordinator
-AGENT_MEMORY = AgentMemory()
\ No newline at end of file
+class SessionMemoryStore:
+    """
+    Thread-safe registry of one AgentMemory per conversation.
+
+    Sessions idle for longer than idle_seconds, and the least recently used
+    sessions beyond max_sessions, are dropped from process memory (persisted
+    sessions are restored from the backend on next use). The default session is
+    kept and never persisted.
+    """
+
+    def __init__(self, max_sessions: int = AGENT_MEMORY_MAX_SESSIONS, idle_seconds: float = AGENT_MEMORY_IDLE_SECONDS,
+                 backend: Optional[MemoryBackend] = None):
+        self.backend = backend
+        self.max_sessions = max_sessions
+        self.idle_seconds = idle_seconds
+        self._sessions: "OrderedDict[str, AgentMemory]" = OrderedDict()
+        self._last_used: Dict[str, float] = {}
+        self._turn_locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def get(self, session_id: str) -> AgentMemory:
+        """Return the memory for a session, creating it on first use"""
+        with self._lock:
+            memory = self._sessions.get(session_id)
+            if memory is None:
+                memory = AgentMemory()
+                if self.backend is not None and session_id != DEFAULT_SESSION_ID:
+                    started = time.perf_counter()
+                    memory.attach_backend(self.backend, session_id)
+                    print(f"\n💾 Restored agent memory for session {session_id} in {(time.perf_counter() - started) * 1000:.1f} ms\n")
+                self._sessions[session_id] = memory
+                self._turn_locks[session_id] = threading.Lock()
+            self._sessions.move_to_end(session_id)
+            self._last_used[session_id] = time.monotonic()
+            self._evict(keep=session_id)
+            return memory
+
+    def turn_lock(self, session_id: str) -> threading.Lock:
+        """Lock that serializes agent turns within one session"""
+        self.get(session_id)
+        with self._lock:
+            return self._turn_locks[session_id]
+
+    def drop(self, session_id: str):
+        """Forget a session, including persisted state and conversation history, e.g. when the user clears the conversation"""
+        with self._lock:
+            memory = self._sessions.pop(session_id, None)
+            self._last_used.pop(session_id, None)
+            self._turn_locks.pop(session_id, None)
+        if memory is not None:
+            object.__setattr__(memory, "_backend", None)
+        if self.backend is not None:
+            self.backend.delete_session(session_id)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._sessions)
+
+    def _evict(self, keep: str):
+        now = time.monotonic()
+        for session_id in list(self._sessions):
+            if session_id in (DEFAULT_SESSION_ID, keep):
+                continue
+            too_many = len(self._sessions) > self.max_sessions
+            if not too_many and now - self._last_used[session_id] < self.idle_seconds:
+                break
+            self._sessions.pop(session_id)
+            self._last_used.pop(session_id)
+            self._turn_locks.pop(session_id)
+
+
+@dataclass
+class AgentRunContext:
+    """Run context passed to Runner.run(context=...) so tools find their session's memory"""
+
+    session_id: str
+    memory: AgentMemory
+    # Receives partial answer text (e.g. streamed KB chunks) while a tool is still running
+    partial_callback: Optional[Callable[[str], None]] = None
+
+
+# Global store of per-session memories, persisted to SQLite unless AGENT_MEMORY_DB is empty
+MEMORY_STORE = SessionMemoryStore(backend=create_default_backend())
+
+# Memory of the default session, used when a run has no AgentRunContext
+AGENT_MEMORY = MEMORY_STORE.get(DEFAULT_SESSION_ID)
+
+
+def create_run_context(session_id: str) -> AgentRunContext:
+    """Build the run context for one turn of a conversation"""
+    return AgentRunContext(session_id=session_id, memory=MEMORY_STORE.get(session_id))
+
+
+def partial_callback_from_context(ctx: Any) -> Optional[Callable[[str], None]]:
+    """Partial-output callback of a streamed run, or None when the run is not streamed"""
+    context = getattr(ctx, "context", ctx)
+    return getattr(context, "partial_callback", None)
+
+
+def session_id_from_context(ctx: Any) -> str:
+    """Session id of the run, or the default session when the run has no AgentRunContext"""
+    context = getattr(ctx, "context", ctx)
+    if isinstance(context, AgentRunContext):
+        return context.session_id
+    return DEFAULT_SESSION_ID
+
+
+def memory_from_context(ctx: Any) -> AgentMemory:
+    """
+    Resolve the session memory from a RunContextWrapper (or an AgentRunContext).
+
+    Falls back to the default session memory when the run has no AgentRunContext.
+    """
+    context = getattr(ctx, "context", ctx)
+    if isinstance(context, AgentRunContext):
+        return context.memory
+    return AGENT_MEMORY
\ No newline at end of file
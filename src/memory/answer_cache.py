@@ -0,0 +1,304 @@
+"""
+Answer Cache - Semantic cache for knowledge base answers.
+
+This module provides a size-bounded, TTL-aware cache that sits in front of the
+Bedrock knowledge base. Entries are keyed on a normalized form of the user's
+question plus the query plan, and can be matched either exactly or by
+embedding similarity so that rephrased questions reuse previous answers.
+Numbers, periods and quoted or capitalised values must match exactly even for
+a similar match: "revenue in Q1 2024" never answers "revenue in Q2 2024".
+"""
+
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional, Dict, Any, Callable, Tuple, FrozenSet
+import hashlib
+import math
+import re
+import threading
+import time
+
+# Sparse embedding: feature index -> weight
+Embedding = Dict[int, float]
+
+_PUNCTUATION = re.compile(r"[^a-z0-9_\s]")
+_WHITESPACE = re.compile(r"\s+")
+_EMBEDDING_DIMENSIONS = 2 ** 18
+
+# Parts of a question that change its answer however similar the rest is
+_RELATIVE_PERIOD = re.compile(
+    r"\b(?:last|this|next|previous|current|past)\s+(?:\d+\s+)?(?:day|week|month|quarter|year)s?\b", re.IGNORECASE)
+_QUESTION_PART = re.compile(r"\"[^\"]+\"|\u201c[^\u201d]+\u201d|(?<!\w)'[^']+'(?!\w)|\w+(?:\.\d+)?|[.!?]")
+_NUMBER = re.compile(r"^\d+(?:\.\d+)?$")
+_QUARTER = re.compile(r"^q[1-4]$", re.IGNORECASE)
+_MONTHS = frozenset({
+    "january", "february", "march", "april", "june", "july", "august", "september", "october",
+    "november", "december", "jan", "feb", "mar", "apr", "jun", "jul", "aug", "sep", "sept", "oct",
+    "nov", "dec",
+})
+
+# Words that carry no meaning for matching questions against each other
+_STOP_WORDS = frozenset({
+    "a", "an", "the", "of", "in", "on", "for", "to", "by", "and", "or", "is", "are",
+    "what", "which", "show", "me", "give", "list", "please", "can", "you", "i", "we",
+    "do", "does", "with", "our", "my", "tell", "about", "query", "plan", "question",
+})
+
+
+def normalize_text(text: Optional[str]) -> str:
+    """Lowercase, strip punctuation and collapse whitespace"""
+    if not text:
+        return ""
+    text = _PUNCTUATION.sub(" ", text.lower())
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+def split_exact_terms(question: Optional[str]) -> Tuple[FrozenSet[str], str]:
+    """
+    Split a question into the terms that must match exactly and the rest.
+
+    Exact terms are numbers (including years), quarters, month names, relative
+    periods ("last month"), quoted values and capitalised words that do not
+    start a sentence ("Germany", "Zara"). Returns the lowercased terms and the
+    question text without them.
+    """
+    if not question:
+        return frozenset(), ""
+    terms = set()
+    rest = []
+    for period in _RELATIVE_PERIOD.findall(question):
+        terms.add(normalize_text(period))
+    sentence_start = True
+    for match in _QUESTION_PART.finditer(_RELATIVE_PERIOD.sub(" ", question)):
+        part = match.group(0)
+        if part in (".", "!", "?"):
+            sentence_start = True
+            continue
+        quoted = part[0] in "\"'\u201c"
+        capitalised = part[0].isupper() and not sentence_start and part != "I"
+        if (quoted or capitalised or _NUMBER.match(part) or _QUARTER.match(part)
+                or part.lower() in _MONTHS):
+            terms.add(normalize_text(part))
+        else:
+            rest.append(part)
+        sentence_start = False
+    return frozenset(terms), " ".join(rest)
+
+
+def make_cache_key(question: str, query_plan: Optional[str] = None) -> str:
+    """Build the exact-match key from the normalized question and query plan"""
+    normalized = f"{normalize_text(question)}\x1f{normalize_text(query_plan)}"
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+def hashed_embedding(text: str) -> Embedding:
+    """
+    Local, dependency-free embedding of a text.
+
+    Hashes unigrams and bigrams of the content words into a sparse vector and
+    L2-normalizes it, so the dot product of two embeddings is their cosine
+    similarity.
+    """
+    tokens = [token for token in normalize_text(text).split() if token not in _STOP_WORDS]
+    features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+
+    vector: Embedding = {}
+    for feature in features:
+        digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+        index = int.from_bytes(digest, "big") % _EMBEDDING_DIMENSIONS
+        vector[index] = vector.get(index, 0.0) + 1.0
+
+    norm = math.sqrt(sum(weight * weight for weight in vector.values()))
+    if norm:
+        for index in vector:
+            vector[index] /= norm
+    return vector
+
+
+def cosine_similarity(a: Embedding, b: Embedding) -> float:
+    """Cosine similarity of two L2-normalized sparse embeddings"""
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(weight * b.get(index, 0.0) for index, weight in a.items())
+
+
+@dataclass
+class CacheEntry:
+    """A cached knowledge base payload and its bookkeeping"""
+
+    payload: Dict[str, Any]
+    embedding: Embedding
+    expires_at: float
+    exact_terms: FrozenSet[str] = frozenset()
+    hits: int = 0
+
+
+@dataclass
+class CacheStats:
+    """Hit/miss counters for an AnswerCache"""
+
+    exact_hits: int = 0
+    similar_hits: int = 0
+    misses: int = 0
+    expirations: int = 0
+    evictions: int = 0
+
+    @property
+    def hits(self) -> int:
+        return self.exact_hits + self.similar_hits
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "exact_hits": self.exact_hits,
+            "similar_hits": self.similar_hits,
+            "misses": self.misses,
+            "expirations": self.expirations,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hit_rate, 4),
+        }
+
+
+class AnswerCache:
+    """
+    Thread-safe LRU cache of knowledge base answers with per-entry TTL.
+
+    Lookups first try an exact match on the normalized question and query plan,
+    then fall back to the most similar cached entry with the same exact terms
+    (see split_exact_terms) whose embedding similarity of the remaining text is
+    at or above the configured threshold.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 256,
+        ttl_seconds: float = 3600.0,
+        similarity_threshold: float = 0.92,
+        embed_fn: Optional[Callable[[str], Embedding]] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        if max_entries <= 0:
+            raise ValueError("max_entries must be positive")
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self.embed_fn = embed_fn or hashed_embedding
+        self.stats = CacheStats()
+        self._clock = clock
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, question: str, query_plan: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Return a cached payload for the question/plan, or None on a miss"""
+        return self._lookup(question, query_plan, record=True)
+
+    def peek(self, question: str, query_plan: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Like get, but without counting the lookup or refreshing the entry's LRU position"""
+        return self._lookup(question, query_plan, record=False)
+
+    def _lookup(self, question: str, query_plan: Optional[str], record: bool) -> Optional[Dict[str, Any]]:
+        key = make_cache_key(question, query_plan)
+        now = self._clock()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry.expires_at > now:
+                    if record:
+                        self._entries.move_to_end(key)
+                        entry.hits += 1
+                        self.stats.exact_hits += 1
+                    return dict(entry.payload)
+                del self._entries[key]
+                self.stats.expirations += 1
+
+        if self.similarity_threshold <= 1.0:
+            exact_terms, rest = split_exact_terms(question)
+            embedding = self.embed_fn(self._embedding_text(rest, query_plan))
+            with self._lock:
+                match = self._most_similar(embedding, exact_terms, now)
+                if match is not None:
+                    match_key, match_entry = match
+                    if record:
+                        self._entries.move_to_end(match_key)
+                        match_entry.hits += 1
+                        self.stats.similar_hits += 1
+                    return dict(match_entry.payload)
+
+        if record:
+            with self._lock:
+                self.stats.misses += 1
+        return None
+
+    def put(
+        self,
+        question: str,
+        query_plan: Optional[str],
+        payload: Dict[str, Any],
+        ttl_seconds: Optional[float] = None,
+    ) -> None:
+        """Store a payload, evicting the least recently used entries if full"""
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        if ttl <= 0:
+            return
+
+        key = make_cache_key(question, query_plan)
+        exact_terms, rest = split_exact_terms(question)
+        embedding = self.embed_fn(self._embedding_text(rest, query_plan))
+        entry = CacheEntry(payload=dict(payload), embedding=embedding, expires_at=self._clock() + ttl,
+                           exact_terms=exact_terms)
+
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats.evictions += 1
+
+    def invalidate(self, question: str, query_plan: Optional[str] = None) -> bool:
+        """Drop a single entry, returning True if it was cached"""
+        with self._lock:
+            return self._entries.pop(make_cache_key(question, query_plan), None) is not None
+
+    def clear(self) -> None:
+        """Drop all entries and reset the counters"""
+        with self._lock:
+            self._entries.clear()
+            self.stats = CacheStats()
+
+    def _embedding_text(self, question: str, query_plan: Optional[str]) -> str:
+        # The question dominates similarity; the plan only disambiguates
+        return f"{question} {question} {query_plan or ''}"
+
+    def _most_similar(self, embedding: Embedding, exact_terms: FrozenSet[str],
+                      now: float) -> Optional[Tuple[str, CacheEntry]]:
+        """Find the best live entry with the same exact terms above the threshold, purging expired ones on the way"""
+        best: Optional[Tuple[str, CacheEntry]] = None
+        best_score = self.similarity_threshold
+        expired = []
+
+        for key, entry in self._entries.items():
+            if entry.expires_at <= now:
+                expired.append(key)
+                continue
+            if entry.exact_terms != exact_terms:
+                continue
+            score = cosine_similarity(embedding, entry.embedding)
+            if score >= best_score:
+                best, best_score = (key, entry), score
+
+        for key in expired:
+            del self._entries[key]
+            self.stats.expirations += 1
+        return best
+
+
+# Global cache instance shared by the data insights tools
+KB_ANSWER_CACHE = AnswerCache()
@@ -0,0 +1,181 @@
+"""
+Compacting Session - Token-budgeted replay of conversation history.
+
+Runner.run replays the whole session history into every coordinator call,
+including JSON definitions echoed back by the visual coordinator, so latency
+and cost grew with the conversation. CompactingSession wraps another session
+(SQLiteSession) and keeps the stored history complete, but the history it
+replays is compacted:
+
+- large tool outputs and assistant messages are replaced by a short reference
+  with a preview (the full values stay in the stored history and AgentMemory);
+- whole turns older than the token budget are folded into one summary message.
+
+History is only cut at user-turn boundaries, so every tool call output is
+replayed together with the call that produced it.
+"""
+
+from typing import Optional, Dict, Any, List, Tuple
+import json
+import os
+
+from agents.memory import SessionABC
+
+from .context_window import compact, estimate_tokens
+
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "3000"))
+HISTORY_SUMMARY_MAX_TOKENS = int(os.getenv("HISTORY_SUMMARY_MAX_TOKENS", "400"))
+HISTORY_ITEM_MAX_CHARS = int(os.getenv("HISTORY_ITEM_MAX_CHARS", "1200"))
+HISTORY_PREVIEW_CHARS = 160
+
+
+def _item_text(item: Dict[str, Any]) -> str:
+    """Text carried by a history item (message content or tool output)"""
+    if item.get("type") == "function_call_output":
+        output = item.get("output")
+        return output if isinstance(output, str) else json.dumps(output, default=str)
+    content = item.get("content")
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        return "\n".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return ""
+
+
+def _item_tokens(item: Dict[str, Any]) -> int:
+    return estimate_tokens(json.dumps(item, default=str))
+
+
+def _reference(kind: str, text: str, key: str = "") -> str:
+    size_kb = len(text.encode("utf-8")) / 1024
+    label = f"{kind} {key}".strip()
+    return (f"[{label} omitted from history: {size_kb:.1f} KB. "
+            f"Preview: {compact(text, HISTORY_PREVIEW_CHARS)}]")
+
+
+def shrink_item(item: Dict[str, Any], max_chars: int = HISTORY_ITEM_MAX_CHARS) -> Dict[str, Any]:
+    """Replace an oversized tool output or message text with a short reference"""
+    text = _item_text(item)
+    if len(text) <= max_chars:
+        return item
+    if item.get("type") == "function_call_output":
+        return {**item, "output": _reference("Tool output", text, item.get("call_id", ""))}
+    content = item.get("content")
+    if isinstance(content, str):
+        return {**item, "content": _reference("Message", text)}
+    if isinstance(content, list):
+        parts = []
+        for part in content:
+            if isinstance(part, dict) and len(part.get("text", "")) > max_chars:
+                part = {**part, "text": _reference("Message", part["text"])}
+            parts.append(part)
+        return {**item, "content": parts}
+    return item
+
+
+def split_turns(items: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+    """Group history items into turns, each starting at a user message"""
+    turns: List[List[Dict[str, Any]]] = []
+    for item in items:
+        if item.get("role") == "user" or not turns:
+            turns.append([])
+        turns[-1].append(item)
+    return turns
+
+
+def summarize_turns(turns: List[List[Dict[str, Any]]], max_tokens: int = HISTORY_SUMMARY_MAX_TOKENS) -> str:
+    """One line per folded turn (question and final reply), newest lines kept within max_tokens"""
+    lines = []
+    for turn in turns:
+        question = next((_item_text(item) for item in turn if item.get("role") == "user"), "")
+        reply = next((_item_text(item) for item in reversed(turn)
+                      if item.get("role") == "assistant" and _item_text(item)), "")
+        line = f"- User: {compact(question, 100)}"
+        if reply:
+            line += f" | Assistant: {compact(reply, 100)}"
+        lines.append(line)
+
+    kept, tokens = [], 0
+    for line in reversed(lines):
+        tokens += estimate_tokens(line) + 1
+        if kept and tokens > max_tokens:
+            break
+        kept.append(line)
+    omitted = len(lines) - len(kept)
+    header = f"Summary of {len(turns)} earlier turns" + (f" ({omitted} oldest omitted)" if omitted else "") + ":"
+    return "\n".join([header] + list(reversed(kept)))
+
+
+def compact_history(items: List[Dict[str, Any]], token_budget: int = HISTORY_TOKEN_BUDGET) -> List[Dict[str, Any]]:
+    """
+    Compact history items to roughly token_budget estimated tokens.
+
+    Returns the newest whole turns that fit the budget (always at least the last
+    turn), with oversized items shrunk, preceded by a summary of older turns.
+    """
+    turns = [[shrink_item(item) for item in turn] for turn in split_turns(items)]
+    kept: List[List[Dict[str, Any]]] = []
+    tokens = 0
+    for turn in reversed(turns):
+        turn_tokens = sum(_item_tokens(item) for item in turn)
+        if kept and tokens + turn_tokens > token_budget:
+            break
+        kept.append(turn)
+        tokens += turn_tokens
+    kept.reverse()
+
+    folded = turns[:len(turns) - len(kept)]
+    compacted = []
+    if folded:
+        compacted.append({"role": "system", "content": summarize_turns(folded)})
+    for turn in kept:
+        compacted.extend(turn)
+    return compacted
+
+
+class CompactingSession(SessionABC):
+    """
+    Session wrapper that stores full history but replays a compacted, token-budgeted view.
+
+    Args:
+        session: Underlying session that stores the history (e.g. SQLiteSession)
+        token_budget: Estimated token budget for the replayed history
+    """
+
+    def __init__(self, session: SessionABC, token_budget: int = HISTORY_TOKEN_BUDGET):
+        self.session = session
+        self.session_id = session.session_id
+        self.session_settings = getattr(session, "session_settings", None)
+        self.token_budget = token_budget
+        # (stored item count, compacted items); history only grows between calls
+        self._cache: Optional[Tuple[int, List[Dict[str, Any]]]] = None
+        self.last_stats: Dict[str, int] = {}
+
+    async def get_items(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        items = await self.session.get_items()
+        if self._cache is not None and self._cache[0] == len(items):
+            compacted = self._cache[1]
+        else:
+            compacted = compact_history(items, self.token_budget)
+            self._cache = (len(items), compacted)
+            self.last_stats = {
+                "stored_items": len(items),
+                "replayed_items": len(compacted),
+                "replayed_tokens": sum(_item_tokens(item) for item in compacted),
+            }
+            print(f"\n🗜️ Session history compacted: {self.last_stats}\n")
+        if limit is not None:
+            return list(compacted[-limit:]) if limit > 0 else []
+        return list(compacted)
+
+    async def add_items(self, items: List[Dict[str, Any]]) -> None:
+        self._cache = None
+        await self.session.add_items(items)
+
+    async def pop_item(self) -> Optional[Dict[str, Any]]:
+        self._cache = None
+        return await self.session.pop_item()
+
+    async def clear_session(self) -> None:
+        self._cache = None
+        await self.session.clear_session()
@@ -0,0 +1,251 @@
+"""
+Context Window - Bounded, compact data insights context for prompts.
+
+Every data insights turn used to be appended to an unbounded list that was
+interpolated into the visual planner prompt, so prompt size grew with the
+session. This module keeps the most recent turns as compact ContextRecord
+objects (question, SQL, a short answer digest, the result profile) in a ring bounded by entry count
+and estimated tokens. Turns pushed out of the ring are folded into a rolling
+summary that is itself capped, so the rendered prompt stays flat no matter how
+long the conversation runs.
+"""
+
+from collections import deque
+from typing import Optional, Dict, Any, List, Deque
+import os
+import re
+import time
+
+from ..agents.tools.result_profile import ResultProfile
+
+CONTEXT_MAX_ENTRIES = int(os.getenv("CONTEXT_MAX_ENTRIES", "6"))
+CONTEXT_MAX_TOKENS = int(os.getenv("CONTEXT_MAX_TOKENS", "1500"))
+CONTEXT_SUMMARY_MAX_TOKENS = int(os.getenv("CONTEXT_SUMMARY_MAX_TOKENS", "300"))
+ANSWER_DIGEST_CHARS = int(os.getenv("ANSWER_DIGEST_CHARS", "400"))
+QUERY_PLAN_CHARS = int(os.getenv("QUERY_PLAN_CHARS", "600"))
+
+_WHITESPACE = re.compile(r"\s+")
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s")
+_TABLE_NAME = re.compile(r"\b(?:from|join)\s+([\w.\"]+)", re.IGNORECASE)
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (about four characters per token)"""
+    return (len(text) + 3) // 4 if text else 0
+
+
+def compact(text: Optional[str], max_chars: int) -> str:
+    """Collapse whitespace and cut to max_chars on a word boundary"""
+    if not text:
+        return ""
+    text = _WHITESPACE.sub(" ", str(text)).strip()
+    if len(text) <= max_chars:
+        return text
+    cut = text.rfind(" ", 0, max_chars)
+    return text[:cut if cut > 0 else max_chars].rstrip(" ,;:") + " …"
+
+
+def digest_answer(answer: Optional[str], max_chars: int = ANSWER_DIGEST_CHARS) -> str:
+    """Keep the leading sentences of an answer up to max_chars"""
+    text = compact(answer, len(answer or ""))
+    if len(text) <= max_chars:
+        return text
+    digest = ""
+    for sentence in _SENTENCE_END.split(text):
+        if len(digest) + len(sentence) + 1 > max_chars:
+            break
+        digest = f"{digest} {sentence}".strip()
+    return digest or compact(text, max_chars)
+
+
+class ContextRecord:
+    """One data insights turn, reduced to what later prompts need"""
+
+    __slots__ = ("question", "sql", "answer_digest", "query_plan", "planner_path", "profile", "created_at", "tokens")
+
+    def __init__(self, question: str, sql: Optional[str] = None, answer_digest: str = "",
+                 query_plan: str = "", planner_path: Optional[str] = None, profile: Optional[ResultProfile] = None):
+        self.question = compact(question, ANSWER_DIGEST_CHARS)
+        # Verbatim: collapsing newlines would let a "--" comment swallow the rest of the query
+        self.sql = (str(sql).strip() or None) if sql else None
+        self.answer_digest = answer_digest
+        self.query_plan = query_plan
+        self.planner_path = planner_path
+        # Shape of the actual result set, when the query could be run locally
+        self.profile = profile
+        self.created_at = time.time()
+        self.tokens = estimate_tokens(self.to_prompt())
+
+    @classmethod
+    def from_pair(cls, user_message: str, agent_response: Any) -> "ContextRecord":
+        """Build a record from a user message and the data insights response dict"""
+        if not isinstance(agent_response, dict):
+            return cls(user_message, answer_digest=digest_answer(str(agent_response or "")))
+        profile = agent_response.get("profile")
+        return cls(
+            user_message,
+            sql=agent_response.get("sql"),
+            answer_digest=digest_answer(agent_response.get("insights")),
+            query_plan=compact(agent_response.get("query_plan"), QUERY_PLAN_CHARS),
+            planner_path=agent_response.get("planner_path"),
+            profile=ResultProfile.from_dict(profile) if isinstance(profile, dict) else profile,
+        )
+
+    def to_state(self) -> Dict[str, Any]:
+        """Plain dict for persistence"""
+        state = {slot: getattr(self, slot) for slot in self.__slots__ if slot != "tokens"}
+        state["profile"] = self.profile.as_dict() if self.profile is not None else None
+        return state
+
+    @classmethod
+    def from_state(cls, state: Dict[str, Any]) -> "ContextRecord":
+        """Rebuild a record saved with to_state (fields are already compacted)"""
+        record = cls.__new__(cls)
+        for slot in cls.__slots__:
+            setattr(record, slot, state.get(slot))
+        record.answer_digest = record.answer_digest or ""
+        record.query_plan = record.query_plan or ""
+        if isinstance(record.profile, dict):
+            record.profile = ResultProfile.from_dict(record.profile)
+        record.tokens = estimate_tokens(record.to_prompt())
+        return record
+
+    def as_pair(self) -> Dict[str, Any]:
+        """Render as the {"user", "agent"} pair shape callers already read"""
+        agent = {"sql": self.sql, "insights": self.answer_digest}
+        if self.query_plan:
+            agent["query_plan"] = self.query_plan
+        if self.planner_path:
+            agent["planner_path"] = self.planner_path
+        if self.profile is not None:
+            agent["profile"] = self.profile.as_dict()
+        return {"user": self.question, "agent": agent}
+
+    def to_prompt(self) -> str:
+        """Prompt text for this turn"""
+        lines = [f"User: {self.question}"]
+        if self.query_plan:
+            lines.append(f"Query plan: {self.query_plan}")
+        if self.sql:
+            lines.append(f"SQL: {self.sql}")
+        if self.answer_digest:
+            lines.append(f"Answer: {self.answer_digest}")
+        if self.profile is not None:
+            lines.append(f"Result profile: {self.profile.to_prompt()}")
+        return "\n".join(lines)
+
+    def summary_line(self) -> str:
+        """One-line digest used when the turn is folded into the rolling summary"""
+        tables = sorted({name.strip('"').split(".")[-1] for name in _TABLE_NAME.findall(self.sql or "")})
+        line = f"- {compact(self.question, 120)}"
+        if tables:
+            line += f" (tables: {', '.join(tables)})"
+        if self.answer_digest:
+            line += f" → {compact(self.answer_digest, 120)}"
+        return line
+
+    def __repr__(self) -> str:
+        return f"ContextRecord(question={self.question!r}, sql={bool(self.sql)}, tokens={self.tokens})"
+
+
+class ContextRing:
+    """
+    Most recent turns bounded by entry count and tokens, plus a rolling summary.
+
+    Args:
+        max_entries: Turns kept verbatim (compacted)
+        max_tokens: Estimated token budget for the verbatim turns
+        summary_max_tokens: Estimated token budget for the rolling summary of older turns
+    """
+
+    def __init__(self, max_entries: int = CONTEXT_MAX_ENTRIES, max_tokens: int = CONTEXT_MAX_TOKENS,
+                 summary_max_tokens: int = CONTEXT_SUMMARY_MAX_TOKENS):
+        self.max_entries = max_entries
+        self.max_tokens = max_tokens
+        self.summary_max_tokens = summary_max_tokens
+        self._records: Deque[ContextRecord] = deque()
+        self._tokens = 0
+        self._summary_lines: Deque[str] = deque()
+        self._summary_tokens = 0
+        self.folded_turns = 0
+
+    def append(self, record: ContextRecord):
+        """Add a turn, folding the oldest turns into the summary when over budget"""
+        self._records.append(record)
+        self._tokens += record.tokens
+        # Always keep the newest turn, even if it alone exceeds the token budget
+        while len(self._records) > 1 and (len(self._records) > self.max_entries or self._tokens > self.max_tokens):
+            self._fold(self._records.popleft())
+
+    def _fold(self, record: ContextRecord):
+        self._tokens -= record.tokens
+        line = record.summary_line()
+        self._summary_lines.append(line)
+        self._summary_tokens += estimate_tokens(line) + 1
+        self.folded_turns += 1
+        while len(self._summary_lines) > 1 and self._summary_tokens > self.summary_max_tokens:
+            self._summary_tokens -= estimate_tokens(self._summary_lines.popleft()) + 1
+
+    def latest(self) -> Optional[ContextRecord]:
+        """Most recent turn, if any"""
+        return self._records[-1] if self._records else None
+
+    def records(self) -> List[ContextRecord]:
+        """Verbatim turns, oldest first"""
+        return list(self._records)
+
+    @property
+    def summary(self) -> str:
+        """Rolling summary of turns that left the ring"""
+        return "\n".join(self._summary_lines)
+
+    @property
+    def token_count(self) -> int:
+        """Estimated tokens of the rendered prompt"""
+        return self._tokens + self._summary_tokens
+
+    def to_prompt(self) -> str:
+        """Render the summary and recent turns for a prompt"""
+        sections = []
+        if self._summary_lines:
+            dropped = self.folded_turns - len(self._summary_lines)
+            header = f"Earlier questions ({self.folded_turns} turns" + (f", {dropped} oldest omitted" if dropped else "") + "):"
+            sections.append(f"{header}\n{self.summary}")
+        if self._records:
+            turns = "\n\n".join(record.to_prompt() for record in self._records)
+            sections.append(f"Recent turns (oldest first):\n{turns}")
+        return "\n\n".join(sections)
+
+    def to_state(self) -> Dict[str, Any]:
+        """Plain dict for persistence"""
+        return {
+            "records": [record.to_state() for record in self._records],
+            "summary_lines": list(self._summary_lines),
+            "folded_turns": self.folded_turns,
+        }
+
+    @classmethod
+    def from_state(cls, state: Dict[str, Any]) -> "ContextRing":
+        """Rebuild a ring saved with to_state, using the current budgets"""
+        ring = cls()
+        ring.folded_turns = state.get("folded_turns", 0)
+        for line in state.get("summary_lines", []):
+            ring._summary_lines.append(line)
+            ring._summary_tokens += estimate_tokens(line) + 1
+        for record_state in state.get("records", []):
+            ring.append(ContextRecord.from_state(record_state))
+        return ring
+
+    def clear(self):
+        """Forget all turns and the summary"""
+        self._records.clear()
+        self._summary_lines.clear()
+        self._tokens = 0
+        self._summary_tokens = 0
+        self.folded_turns = 0
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def __bool__(self) -> bool:
+        return bool(self._records)
@@ -0,0 +1,344 @@
+"""
+Memory Backend - Persistence for per-session AgentMemory.
+
+AgentMemory lives in process memory, so a restart used to lose every session's
+insights, plans and definitions. A MemoryBackend stores the persisted fields of
+each session and restores them when the session is first used again.
+
+SQLiteMemoryBackend is the default: it writes to the same SQLite file as the
+conversation history (SQLiteSession), in WAL mode so readers never wait for the
+writer. Writes are queued, coalesced per field and flushed in one transaction
+by a background thread. Large values (JSON definitions, visual plans) are
+restored as LazyBlob placeholders and only read from disk when first accessed.
+Sessions without activity for MEMORY_SESSION_TTL_DAYS are deleted, together
+with their conversation history, by the same background thread.
+"""
+
+from abc import ABC, abstractmethod
+from typing import Optional, Dict, Any, Tuple, Callable, List
+import atexit
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from .context_window import ContextRing
+
+# SQLite file shared with the conversation history; empty disables persistence
+AGENT_MEMORY_DB = os.getenv("AGENT_MEMORY_DB", "agent_memory.db")
+MEMORY_FLUSH_INTERVAL_SECONDS = float(os.getenv("MEMORY_FLUSH_INTERVAL_SECONDS", "0.5"))
+MEMORY_FLUSH_BATCH_SIZE = int(os.getenv("MEMORY_FLUSH_BATCH_SIZE", "64"))
+# Sessions idle for longer than this are deleted; 0 keeps them forever
+MEMORY_SESSION_TTL_DAYS = float(os.getenv("MEMORY_SESSION_TTL_DAYS", "30"))
+MEMORY_EXPIRY_INTERVAL_SECONDS = float(os.getenv("MEMORY_EXPIRY_INTERVAL_SECONDS", "3600"))
+
+# Conversation history tables of SQLiteSession in the same file (messages first: they reference sessions)
+HISTORY_TABLES = ("agent_messages", "agent_sessions")
+
+# Fields that are loaded lazily on first access
+BLOB_FIELDS = {"json_visual_definition", "visualization_plan"}
+
+
+def _encode_visualization_plan(plan: Any) -> Any:
+    if hasattr(plan, "to_plan_dict"):
+        return {"VisualPlan": plan.to_plan_dict()}
+    return plan
+
+
+def _decode_visualization_plan(value: Any) -> Any:
+    if isinstance(value, dict) and "VisualPlan" in value:
+        from ..agents.tools.visual_plan import VisualPlan
+        return VisualPlan.from_dict(value["VisualPlan"])
+    return value
+
+
+# field -> (encode to JSON-compatible value, decode back)
+FIELD_CODECS: Dict[str, Tuple[Callable[[Any], Any], Callable[[Any], Any]]] = {
+    "data_insights_context": (lambda ring: ring.to_state(), ContextRing.from_state),
+    "visualization_plan": (_encode_visualization_plan, _decode_visualization_plan),
+}
+
+# AgentMemory fields that survive a restart (transient analysis flags are not persisted)
+PERSISTED_FIELDS = {
+    "data_insights_context",
+    "has_direct_sql_query",
+    "visualization_plan",
+    "json_visual_definition",
+    "quicksight_analysis_id",
+    "quicksight_analysis_name",
+    "analysis_job_id",
+    "original_user_query",
+    "has_visualization_plan",
+    "has_json_visual_definition",
+}
+
+
+def encode_field(name: str, value: Any) -> Optional[str]:
+    """Serialize a field value to JSON text (None stays None)"""
+    if value is None:
+        return None
+    encode = FIELD_CODECS.get(name, (lambda item: item, None))[0]
+    return json.dumps(encode(value), default=str)
+
+
+def decode_field(name: str, text: Optional[str]) -> Any:
+    """Deserialize JSON text written by encode_field"""
+    if text is None:
+        return None
+    decode = FIELD_CODECS.get(name, (None, lambda item: item))[1]
+    return decode(json.loads(text))
+
+
+class LazyBlob:
+    """Placeholder for a persisted field that is read from the backend on first access"""
+
+    __slots__ = ("backend", "session_id", "field")
+
+    def __init__(self, backend: "MemoryBackend", session_id: str, field: str):
+        self.backend = backend
+        self.session_id = session_id
+        self.field = field
+
+    def load(self) -> Any:
+        return decode_field(self.field, self.backend.load_field(self.session_id, self.field))
+
+    def __repr__(self) -> str:
+        return f"LazyBlob({self.session_id!r}, {self.field!r})"
+
+
+class MemoryBackend(ABC):
+    """Interface for AgentMemory persistence backends"""
+
+    @abstractmethod
+    def load_session(self, session_id: str) -> Dict[str, Any]:
+        """Persisted fields of a session; blob fields may be LazyBlob placeholders"""
+
+    @abstractmethod
+    def load_field(self, session_id: str, field: str) -> Optional[str]:
+        """Encoded value of one field"""
+
+    @abstractmethod
+    def write_field(self, session_id: str, field: str, value: Any):
+        """Queue a field write"""
+
+    @abstractmethod
+    def delete_session(self, session_id: str):
+        """Remove everything stored for a session"""
+
+    @abstractmethod
+    def expire_sessions(self, max_age_seconds: float) -> List[str]:
+        """Delete sessions idle for longer than max_age_seconds and return their ids"""
+
+    @abstractmethod
+    def flush(self):
+        """Write out queued changes"""
+
+    def close(self):
+        """Flush and release resources"""
+        self.flush()
+
+
+class SQLiteMemoryBackend(MemoryBackend):
+    """
+    SQLite (WAL) backend with write-behind batching and lazy blob loading.
+
+    Args:
+        db_path: SQLite file, normally the same file as the SQLiteSession history
+        flush_interval: Seconds between background flushes
+        batch_size: Queued writes that trigger an immediate flush
+    """
+
+    def __init__(self, db_path: str = AGENT_MEMORY_DB, flush_interval: float = MEMORY_FLUSH_INTERVAL_SECONDS,
+                 batch_size: int = MEMORY_FLUSH_BATCH_SIZE, session_ttl_days: float = MEMORY_SESSION_TTL_DAYS):
+        self.db_path = db_path
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.session_ttl_seconds = session_ttl_days * 86400
+        self._last_expiry = 0.0
+        self._connection: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        self._pending: Dict[Tuple[str, str], Optional[str]] = {}
+        self._pending_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
+        self._flusher: Optional[threading.Thread] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        # Opened on first use so importing the memory module never touches the disk
+        if self._connection is None:
+            connection = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS agent_memory (
+                    session_id TEXT NOT NULL,
+                    field TEXT NOT NULL,
+                    value TEXT,
+                    is_blob INTEGER NOT NULL DEFAULT 0,
+                    updated_at REAL NOT NULL,
+                    PRIMARY KEY (session_id, field)
+                )
+                """
+            )
+            self._connection = connection
+        return self._connection
+
+    def _ensure_flusher(self):
+        if self._flusher is None:
+            self._flusher = threading.Thread(target=self._flush_loop, name="agent-memory-flush", daemon=True)
+            self._flusher.start()
+            atexit.register(self.close)
+
+    def _flush_loop(self):
+        while not self._closed:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"\n❌ Error flushing agent memory: {e}\n")
+            if self.session_ttl_seconds and time.monotonic() - self._last_expiry >= MEMORY_EXPIRY_INTERVAL_SECONDS:
+                self._last_expiry = time.monotonic()
+                try:
+                    expired = self.expire_sessions(self.session_ttl_seconds)
+                    if expired:
+                        print(f"\n🧹 Deleted {len(expired)} agent memory session(s) idle for more than {self.session_ttl_seconds / 86400:g} days\n")
+                except Exception as e:
+                    print(f"\n❌ Error expiring agent memory sessions: {e}\n")
+
+    def load_session(self, session_id: str) -> Dict[str, Any]:
+        # Flush first so a session re-created right after eviction sees its latest writes
+        self.flush()
+        with self._db_lock:
+            rows = self._connect().execute(
+                "SELECT field, CASE WHEN is_blob THEN NULL ELSE value END, is_blob "
+                "FROM agent_memory WHERE session_id = ?",
+                (session_id,),
+            ).fetchall()
+        fields = {}
+        for field, value, is_blob in rows:
+            if field not in PERSISTED_FIELDS:
+                continue
+            fields[field] = LazyBlob(self, session_id, field) if is_blob else decode_field(field, value)
+        return fields
+
+    def load_field(self, session_id: str, field: str) -> Optional[str]:
+        with self._pending_lock:
+            if (session_id, field) in self._pending:
+                return self._pending[(session_id, field)]
+        with self._db_lock:
+            row = self._connect().execute(
+                "SELECT value FROM agent_memory WHERE session_id = ? AND field = ?",
+                (session_id, field),
+            ).fetchone()
+        return row[0] if row else None
+
+    def write_field(self, session_id: str, field: str, value: Any):
+        encoded = encode_field(field, value)
+        with self._pending_lock:
+            self._pending[(session_id, field)] = encoded
+            pending = len(self._pending)
+        self._ensure_flusher()
+        if pending >= self.batch_size:
+            self._wake.set()
+
+    def delete_session(self, session_id: str):
+        with self._pending_lock:
+            for key in [key for key in self._pending if key[0] == session_id]:
+                del self._pending[key]
+        with self._db_lock:
+            connection = self._connect()
+            connection.execute("BEGIN")
+            try:
+                self._delete_rows(connection, [session_id])
+                connection.execute("COMMIT")
+            except Exception:
+                connection.execute("ROLLBACK")
+                raise
+
+    def expire_sessions(self, max_age_seconds: float) -> List[str]:
+        cutoff = time.time() - max_age_seconds
+        with self._pending_lock:
+            # Sessions with queued writes are in use
+            active = {session_id for session_id, _ in self._pending}
+        with self._db_lock:
+            connection = self._connect()
+            activity = "SELECT session_id, MAX(updated_at) AS last_used FROM agent_memory GROUP BY session_id"
+            if self._history_tables(connection):
+                # SQLiteSession stores UTC "YYYY-MM-DD HH:MM:SS" timestamps
+                activity += " UNION ALL SELECT session_id, CAST(strftime('%s', updated_at) AS REAL) FROM agent_sessions"
+            rows = connection.execute(
+                f"SELECT session_id FROM ({activity}) GROUP BY session_id HAVING MAX(last_used) < ?", (cutoff,)
+            ).fetchall()
+            expired = [session_id for session_id, in rows if session_id not in active]
+            if not expired:
+                return []
+            connection.execute("BEGIN")
+            try:
+                self._delete_rows(connection, expired)
+                connection.execute("COMMIT")
+            except Exception:
+                connection.execute("ROLLBACK")
+                raise
+        return expired
+
+    @staticmethod
+    def _history_tables(connection: sqlite3.Connection) -> List[str]:
+        """SQLiteSession tables present in the file (they only exist once a conversation was stored)"""
+        existing = {name for name, in connection.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        return [table for table in HISTORY_TABLES if table in existing]
+
+    def _delete_rows(self, connection: sqlite3.Connection, session_ids: List[str]):
+        """Delete the memory fields and conversation history of sessions (inside a transaction)"""
+        parameters = [(session_id,) for session_id in session_ids]
+        connection.executemany("DELETE FROM agent_memory WHERE session_id = ?", parameters)
+        for table in self._history_tables(connection):
+            connection.executemany(f"DELETE FROM {table} WHERE session_id = ?", parameters)
+
+    def flush(self):
+        # Swap the queue under the DB lock: a load_field that misses the pending dict then waits for the commit
+        # instead of reading the old row while the batch is in flight
+        with self._db_lock:
+            with self._pending_lock:
+                if not self._pending:
+                    return
+                batch, self._pending = self._pending, {}
+            now = time.time()
+            connection = self._connect()
+            connection.execute("BEGIN")
+            try:
+                connection.executemany(
+                    "INSERT INTO agent_memory (session_id, field, value, is_blob, updated_at) VALUES (?, ?, ?, ?, ?) "
+                    "ON CONFLICT(session_id, field) DO UPDATE SET value = excluded.value, "
+                    "is_blob = excluded.is_blob, updated_at = excluded.updated_at",
+                    [(session_id, field, value, int(field in BLOB_FIELDS), now)
+                     for (session_id, field), value in batch.items()],
+                )
+                connection.execute("COMMIT")
+            except Exception:
+                connection.execute("ROLLBACK")
+                # Put the batch back unless newer writes replaced it meanwhile
+                with self._pending_lock:
+                    for key, value in batch.items():
+                        self._pending.setdefault(key, value)
+                raise
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._wake.set()
+        self.flush()
+        with self._db_lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+
+def create_default_backend() -> Optional[MemoryBackend]:
+    """SQLite backend at AGENT_MEMORY_DB, or None when persistence is disabled"""
+    if not AGENT_MEMORY_DB:
+        return None
+    return SQLiteMemoryBackend(AGENT_MEMORY_DB)
@@ -0,0 +1,197 @@
+"""
+Analysis Index - Paginated, cached listing of QuickSight analyses.
+
+list_analyses returns at most one page per call, so the listing walks every page
+with the boto3 paginator and keeps a local index of analysis id, name, status
+and last-updated time. The index is reused until its TTL expires. A refresh
+streams the pages again but only rewrites entries whose LastUpdatedTime moved,
+and drops analyses that are no longer listed. Analyses created or deleted
+through this app update the index directly, so they show up without a refresh,
+along with the hash of the definition they deployed (see analysis_jobs).
+Name filtering follows the SearchAnalyses ANALYSIS_NAME filter operators.
+"""
+
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional, Dict, Any, List, Iterator
+import os
+import threading
+import time
+
+from .aws_clients import get_client
+from ..instrumentation import span, KIND_CACHE, KIND_QUICKSIGHT
+
+AWS_ACCOUNT_ID = '817491136527'
+ANALYSIS_INDEX_TTL_SECONDS = float(os.getenv("ANALYSIS_INDEX_TTL_SECONDS", "60"))
+ANALYSIS_PAGE_SIZE = int(os.getenv("ANALYSIS_PAGE_SIZE", "100"))
+
+# Analyses in these states are hidden from listings
+HIDDEN_STATUSES = {"DELETED"}
+
+
+@dataclass
+class AnalysisEntry:
+    """One analysis in the local index"""
+
+    analysis_id: str
+    name: str
+    arn: Optional[str] = None
+    status: Optional[str] = None
+    created_time: Optional[datetime] = None
+    last_updated_time: Optional[datetime] = None
+    # deployment_hash (definition and name) this app last deployed; lost when the analysis changes elsewhere
+    definition_hash: Optional[str] = None
+
+    @classmethod
+    def from_summary(cls, summary: Dict[str, Any]) -> "AnalysisEntry":
+        """Build an entry from a list_analyses AnalysisSummary"""
+        return cls(
+            analysis_id=summary["AnalysisId"],
+            name=summary.get("Name", summary["AnalysisId"]),
+            arn=summary.get("Arn"),
+            status=summary.get("Status"),
+            created_time=summary.get("CreatedTime"),
+            last_updated_time=summary.get("LastUpdatedTime"),
+        )
+
+    def as_summary(self) -> Dict[str, Any]:
+        """Render the entry in the AnalysisSummary shape list_analyses returns"""
+        summary = {"AnalysisId": self.analysis_id, "Name": self.name}
+        if self.arn:
+            summary["Arn"] = self.arn
+        if self.status:
+            summary["Status"] = self.status
+        if self.created_time:
+            summary["CreatedTime"] = self.created_time
+        if self.last_updated_time:
+            summary["LastUpdatedTime"] = self.last_updated_time
+        return summary
+
+
+@dataclass
+class RefreshStats:
+    """What the last refresh changed"""
+
+    pages: int = 0
+    added: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    removed: int = 0
+    seconds: float = 0.0
+
+
+def iter_analysis_pages(page_size: int = ANALYSIS_PAGE_SIZE) -> Iterator[List[Dict[str, Any]]]:
+    """Stream the AnalysisSummaryList of every list_analyses page, following NextToken"""
+    paginator = get_client('quicksight').get_paginator('list_analyses')
+    pages = paginator.paginate(
+        AwsAccountId = AWS_ACCOUNT_ID,
+        PaginationConfig = {"PageSize": page_size}
+    )
+    for page in pages:
+        yield page.get("AnalysisSummaryList", [])
+
+
+class AnalysisIndex:
+    """Thread-safe, TTL-cached index of the account's analyses"""
+
+    def __init__(self, ttl_seconds: float = ANALYSIS_INDEX_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self._entries: Dict[str, AnalysisEntry] = {}
+        self._refreshed_at: Optional[float] = None
+        self._lock = threading.RLock()
+        self.last_refresh = RefreshStats()
+
+    @property
+    def is_fresh(self) -> bool:
+        """True while the index is younger than its TTL"""
+        return self._refreshed_at is not None and time.monotonic() - self._refreshed_at < self.ttl_seconds
+
+    def refresh(self, force: bool = False) -> RefreshStats:
+        """
+        Bring the index up to date with QuickSight unless it is still fresh.
+
+        Entries are only rewritten when their LastUpdatedTime changed; analyses
+        missing from a complete walk are removed.
+        """
+        with self._lock, span("analysis_index.refresh", KIND_CACHE) as refresh_span:
+            refresh_span.set(cache_hit=self.is_fresh and not force)
+            if self.is_fresh and not force:
+                return self.last_refresh
+
+            started = time.perf_counter()
+            stats = RefreshStats()
+            seen = set()
+            with span("quicksight.list_analyses", KIND_QUICKSIGHT) as list_span:
+                for summaries in iter_analysis_pages():
+                    stats.pages += 1
+                    for summary in summaries:
+                        analysis_id = summary["AnalysisId"]
+                        seen.add(analysis_id)
+                        current = self._entries.get(analysis_id)
+                        if current is None:
+                            self._entries[analysis_id] = AnalysisEntry.from_summary(summary)
+                            stats.added += 1
+                        elif current.last_updated_time != summary.get("LastUpdatedTime") or current.status != summary.get("Status"):
+                            self._entries[analysis_id] = AnalysisEntry.from_summary(summary)
+                            stats.updated += 1
+                        else:
+                            stats.unchanged += 1
+                list_span.set(pages=stats.pages, analyses=len(seen))
+
+            for analysis_id in [analysis_id for analysis_id in self._entries if analysis_id not in seen]:
+                del self._entries[analysis_id]
+                stats.removed += 1
+
+            stats.seconds = time.perf_counter() - started
+            self._refreshed_at = time.monotonic()
+            self.last_refresh = stats
+            print(f"\n✅ Analysis index refreshed: {stats.pages} pages, {stats.added} added, "
+                  f"{stats.updated} updated, {stats.removed} removed in {stats.seconds:.2f}s\n")
+            return stats
+
+    def upsert(self, entry: AnalysisEntry):
+        """Record an analysis created or updated by this app without a refresh"""
+        with self._lock:
+            self._entries[entry.analysis_id] = entry
+
+    def remove(self, analysis_id: str):
+        """Forget an analysis deleted by this app"""
+        with self._lock:
+            self._entries.pop(analysis_id, None)
+
+    def invalidate(self):
+        """Force the next listing to refresh"""
+        with self._lock:
+            self._refreshed_at = None
+
+    def list(self, force_refresh: bool = False) -> List[AnalysisEntry]:
+        """All visible analyses, most recently updated first"""
+        self.refresh(force=force_refresh)
+        with self._lock:
+            entries = [entry for entry in self._entries.values() if entry.status not in HIDDEN_STATUSES]
+        return sorted(entries, key=lambda entry: entry.last_updated_time.timestamp() if entry.last_updated_time else 0.0, reverse=True)
+
+    def search(self, name: str, operator: str = "StringLike", force_refresh: bool = False) -> List[AnalysisEntry]:
+        """
+        Filter analyses by name like the SearchAnalyses ANALYSIS_NAME filter.
+
+        Args:
+            name: Value to match against the analysis name (case-insensitive)
+            operator: "StringEquals" for an exact match, "StringLike" for a substring match
+        """
+        if operator not in ("StringEquals", "StringLike"):
+            raise ValueError(f"Unsupported name filter operator: {operator}")
+        needle = name.strip().lower()
+        if operator == "StringEquals":
+            return [entry for entry in self.list(force_refresh) if entry.name.lower() == needle]
+        return [entry for entry in self.list(force_refresh) if needle in entry.name.lower()]
+
+    def get(self, analysis_id: str) -> Optional[AnalysisEntry]:
+        """Look up an analysis by id, refreshing if the index is stale"""
+        self.refresh()
+        with self._lock:
+            return self._entries.get(analysis_id)
+
+
+# Global index shared by the QuickSight service and the agents
+ANALYSIS_INDEX = AnalysisIndex()
@@ -0,0 +1,358 @@
+"""
+Analysis Jobs - Background pipeline for QuickSight analysis creation.
+
+QuickSight creates analyses asynchronously: create_analysis returns while the
+analysis is still CREATION_IN_PROGRESS. This module runs each creation as a job
+on a worker pool that submits the creation, polls describe_analysis with
+exponential backoff until the analysis reaches a terminal status, and only then
+applies permissions. Callers get an AnalysisJob handle straight away and can
+poll it for progress without blocking the chat turn.
+
+Jobs are upserts keyed on the hash of the Definition content and the analysis
+name: an analysis that does not exist yet is created, one whose last deployment
+hashes differently is updated in place, and one that is already up to date is
+left alone without any QuickSight write call. The hash of each deployment is
+kept in the memory backend, so it survives restarts; an analysis whose
+LastUpdatedTime moved since (edited in QuickSight) is always updated. Jobs for
+the same analysis run one at a time.
+Each job records the conversation that submitted it, so users only see their
+own jobs. Finished jobs are forgotten after ANALYSIS_JOB_RETENTION_SECONDS.
+Definitions that fail the offline validator fail the job without any call.
+"""
+
+from dataclasses import dataclass, field
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Optional, Dict, Any, List, Callable
+import contextvars
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+import uuid
+
+from . import quicksight_service
+from .analysis_index import ANALYSIS_INDEX, AnalysisEntry, HIDDEN_STATUSES
+from ..agents.tools.definition_validator import validate_definition
+from ..memory.agent_memory import MEMORY_STORE
+from ..memory.memory_backend import MemoryBackend
+from ..instrumentation import traced, annotate, KIND_STAGE
+
+# Job states, in pipeline order
+JOB_QUEUED = "QUEUED"
+JOB_CREATING = "CREATING"
+JOB_UPDATING = "UPDATING"
+JOB_WAITING = "WAITING_FOR_ANALYSIS"
+JOB_APPLYING_PERMISSIONS = "APPLYING_PERMISSIONS"
+JOB_SUCCEEDED = "SUCCEEDED"
+JOB_FAILED = "FAILED"
+
+# QuickSight analysis statuses that end the polling loop
+ANALYSIS_SUCCESS_STATUSES = {"CREATION_SUCCESSFUL", "UPDATE_SUCCESSFUL"}
+ANALYSIS_FAILURE_STATUSES = {"CREATION_FAILED", "UPDATE_FAILED", "DELETED"}
+
+# What a job does with the analysis
+ACTION_CREATE = "create"
+ACTION_UPDATE = "update"
+ACTION_UNCHANGED = "unchanged"
+
+ANALYSIS_JOB_WORKERS = int(os.getenv("ANALYSIS_JOB_WORKERS", "4"))
+ANALYSIS_POLL_INITIAL_DELAY = float(os.getenv("ANALYSIS_POLL_INITIAL_DELAY", "1.0"))
+ANALYSIS_POLL_MAX_DELAY = float(os.getenv("ANALYSIS_POLL_MAX_DELAY", "15.0"))
+ANALYSIS_POLL_TIMEOUT = float(os.getenv("ANALYSIS_POLL_TIMEOUT", "300"))
+# Finished jobs are kept this long, and at most ANALYSIS_JOB_MAX_FINISHED of them
+ANALYSIS_JOB_RETENTION_SECONDS = float(os.getenv("ANALYSIS_JOB_RETENTION_SECONDS", "3600"))
+ANALYSIS_JOB_MAX_FINISHED = int(os.getenv("ANALYSIS_JOB_MAX_FINISHED", "200"))
+
+# Memory backend field holding the last deployment of an analysis, stored under DEPLOYMENT_SESSION_PREFIX + id
+DEPLOYMENT_SESSION_PREFIX = "quicksight-analysis:"
+DEPLOYMENT_FIELD = "deployment"
+
+
+class AnalysisNotReadyError(RuntimeError):
+    """Raised when an analysis fails or does not become ready in time"""
+
+
+@dataclass
+class AnalysisJob:
+    """Progress handle for one analysis creation"""
+
+    job_id: str
+    analysis_id: str
+    analysis_name: str
+    # Conversation that submitted the job; None for scripts
+    session_id: Optional[str] = None
+    status: str = JOB_QUEUED
+    action: Optional[str] = None
+    # deployment_hash of the definition and name being published
+    definition_hash: Optional[str] = None
+    analysis_status: Optional[str] = None
+    polls: int = 0
+    error: Optional[str] = None
+    response: Optional[Dict[str, Any]] = None
+    created_at: float = field(default_factory=time.time)
+    updated_at: float = field(default_factory=time.time)
+    events: List[str] = field(default_factory=list)
+
+    @property
+    def done(self) -> bool:
+        """True once the job has succeeded or failed"""
+        return self.status in (JOB_SUCCEEDED, JOB_FAILED)
+
+    @property
+    def elapsed_seconds(self) -> float:
+        """Seconds from submission to the last update"""
+        return self.updated_at - self.created_at
+
+    def as_dict(self) -> Dict[str, Any]:
+        """JSON-friendly view of the job for tools and the UI"""
+        return {
+            "job_id": self.job_id,
+            "analysis_id": self.analysis_id,
+            "analysis_name": self.analysis_name,
+            "status": self.status,
+            "action": self.action,
+            "analysis_status": self.analysis_status,
+            "polls": self.polls,
+            "error": self.error,
+            "elapsed_seconds": round(self.elapsed_seconds, 2),
+            "events": list(self.events),
+        }
+
+
+def deployment_hash(visual_definition: Dict[str, Any], analysis_name: str) -> str:
+    """Hash of what a publish deploys: the Definition content and the analysis name"""
+    content = f"{analysis_name}\x1f{quicksight_service.definition_hash(visual_definition)}"
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def wait_for_analysis(
+    analysis_id: str,
+    timeout: float = ANALYSIS_POLL_TIMEOUT,
+    initial_delay: float = ANALYSIS_POLL_INITIAL_DELAY,
+    max_delay: float = ANALYSIS_POLL_MAX_DELAY,
+    on_poll: Optional[Callable[[str], None]] = None,
+    sleep: Callable[[float], None] = time.sleep,
+) -> Dict[str, Any]:
+    """
+    Poll describe_analysis with exponential backoff until the analysis is ready.
+
+    Args:
+        analysis_id: Analysis to wait for
+        timeout: Give up after this many seconds
+        initial_delay: First delay between polls; doubled after each poll up to max_delay
+        max_delay: Upper bound for the delay between polls
+        on_poll: Called with the QuickSight status after each poll
+
+    Returns:
+        The final describe_analysis "Analysis" object
+
+    Raises:
+        AnalysisNotReadyError: If the analysis fails or the timeout is reached
+    """
+    deadline = time.monotonic() + timeout
+    delay = initial_delay
+    while True:
+        analysis = quicksight_service.describe_analysis(analysis_id).get("Analysis", {})
+        status = analysis.get("Status")
+        if on_poll:
+            on_poll(status)
+        if status in ANALYSIS_SUCCESS_STATUSES:
+            return analysis
+        if status in ANALYSIS_FAILURE_STATUSES:
+            errors = "; ".join(error.get("Message", "") for error in analysis.get("Errors", []))
+            raise AnalysisNotReadyError(f"Analysis {analysis_id} ended with status {status}: {errors or 'no details'}")
+
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise AnalysisNotReadyError(f"Analysis {analysis_id} still {status} after {timeout:.0f}s")
+        # Full jitter keeps concurrent jobs from polling in lockstep
+        sleep(min(remaining, random.uniform(delay / 2, delay)))
+        delay = min(delay * 2, max_delay)
+
+
+class AnalysisJobManager:
+    """
+    Runs analysis creation jobs on a worker pool and keeps their handles.
+
+    Args:
+        backend: Where deployment hashes are kept across restarts; None keeps them in the analysis index only
+    """
+
+    def __init__(self, max_workers: int = ANALYSIS_JOB_WORKERS, retention_seconds: float = ANALYSIS_JOB_RETENTION_SECONDS,
+                 max_finished: int = ANALYSIS_JOB_MAX_FINISHED, backend: Optional[MemoryBackend] = None):
+        self.backend = backend
+        self.retention_seconds = retention_seconds
+        self.max_finished = max_finished
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="analysis-job")
+        self._jobs: Dict[str, AnalysisJob] = {}
+        self._futures: Dict[str, Future] = {}
+        self._analysis_locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, visual_definition: Dict[str, Any], analysis_name: str, analysis_id: str,
+               session_id: Optional[str] = None) -> AnalysisJob:
+        """Queue an analysis upsert (create, update or nothing) and return its job handle immediately"""
+        job = AnalysisJob(job_id=uuid.uuid4().hex[:12], analysis_id=analysis_id, analysis_name=analysis_name,
+                          session_id=session_id)
+        self._record(job, JOB_QUEUED, f"Queued publishing of analysis {analysis_id}")
+        with self._lock:
+            self._evict_finished()
+            self._jobs[job.job_id] = job
+            # Run in a copy of the caller's context so the job's spans join the calling tool's trace
+            self._futures[job.job_id] = self._executor.submit(
+                contextvars.copy_context().run, self._run, job, visual_definition
+            )
+        return job
+
+    def get_job(self, job_id: str, session_id: Optional[str] = None) -> Optional[AnalysisJob]:
+        """Return the job handle, or None for an unknown id or a job of another session"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None or (session_id is not None and job.session_id != session_id):
+            return None
+        return job
+
+    def list_jobs(self, session_id: Optional[str] = None) -> List[AnalysisJob]:
+        """Jobs of one session (all jobs when session_id is None), newest first"""
+        with self._lock:
+            jobs = [job for job in self._jobs.values() if session_id is None or job.session_id == session_id]
+        return sorted(jobs, key=lambda job: job.created_at, reverse=True)
+
+    def wait(self, job_id: str, timeout: Optional[float] = None) -> Optional[AnalysisJob]:
+        """Block until the job finishes (for scripts and tests; the chat flow polls instead)"""
+        with self._lock:
+            future = self._futures.get(job_id)
+        if future is not None:
+            future.result(timeout=timeout)
+        return self.get_job(job_id)
+
+    def _record(self, job: AnalysisJob, status: str, message: str):
+        job.status = status
+        job.updated_at = time.time()
+        job.events.append(message)
+        annotate(job_id=job.job_id, job_status=status, polls=job.polls)
+        print(f"\n🛠️ Analysis job {job.job_id} [{status}]: {message}\n")
+
+    def _evict_finished(self):
+        """Forget finished jobs past the retention period or beyond max_finished (caller holds _lock)"""
+        finished = sorted((job for job in self._jobs.values() if job.done), key=lambda job: job.updated_at)
+        cutoff = time.time() - self.retention_seconds
+        excess = len(finished) - self.max_finished
+        for position, job in enumerate(finished):
+            if position >= excess and job.updated_at >= cutoff:
+                break
+            del self._jobs[job.job_id]
+            self._futures.pop(job.job_id, None)
+        # Per-analysis locks of analyses without remaining jobs
+        in_use = {job.analysis_id for job in self._jobs.values()}
+        for analysis_id in [key for key, lock in self._analysis_locks.items() if key not in in_use and not lock.locked()]:
+            del self._analysis_locks[analysis_id]
+
+    def _analysis_lock(self, analysis_id: str) -> threading.Lock:
+        with self._lock:
+            return self._analysis_locks.setdefault(analysis_id, threading.Lock())
+
+    def _choose_action(self, job: AnalysisJob) -> str:
+        """Create, update or leave the analysis, from the hash of its last deployment by this app"""
+        entry = ANALYSIS_INDEX.get(job.analysis_id)
+        if entry is None or entry.status in HIDDEN_STATUSES:
+            return ACTION_CREATE
+        deployed_hash = entry.definition_hash or self._stored_deployment_hash(entry)
+        return ACTION_UNCHANGED if deployed_hash == job.definition_hash else ACTION_UPDATE
+
+    def _stored_deployment_hash(self, entry: AnalysisEntry) -> Optional[str]:
+        """Deployment hash persisted by an earlier process, or None when unknown or edited in QuickSight since"""
+        if self.backend is None:
+            return None
+        try:
+            stored = self.backend.load_field(DEPLOYMENT_SESSION_PREFIX + entry.analysis_id, DEPLOYMENT_FIELD)
+            deployment = json.loads(stored) if stored else None
+        except Exception as e:
+            print(f"\n⚠️ Could not read the last deployment of {entry.analysis_id}: {e}\n")
+            return None
+        if not isinstance(deployment, dict) or deployment.get("last_updated_time") != str(entry.last_updated_time):
+            return None
+        return deployment.get("hash")
+
+    def _store_deployment(self, entry: AnalysisEntry):
+        if self.backend is not None:
+            self.backend.write_field(DEPLOYMENT_SESSION_PREFIX + entry.analysis_id, DEPLOYMENT_FIELD,
+                                     {"hash": entry.definition_hash, "last_updated_time": str(entry.last_updated_time)})
+
+    @traced("analysis_job.run", KIND_STAGE)
+    def _run(self, job: AnalysisJob, visual_definition: Dict[str, Any]):
+        """Publish the definition; any unexpected error fails the job instead of leaving it queued"""
+        try:
+            self._publish(job, visual_definition)
+        except Exception as e:
+            job.error = f"{type(e).__name__}: {e}"
+            self._record(job, JOB_FAILED, f"Publishing failed: {job.error}")
+
+    def _publish(self, job: AnalysisJob, visual_definition: Dict[str, Any]):
+        # Reject invalid definitions locally instead of after a create/update round trip
+        errors = validate_definition(visual_definition)
+        if errors:
+            job.error = "; ".join(errors)
+            self._record(job, JOB_FAILED, f"Invalid definition, nothing was sent to QuickSight: {job.error}")
+            return
+        job.definition_hash = deployment_hash(visual_definition, job.analysis_name)
+        with self._analysis_lock(job.analysis_id):
+            job.action = self._choose_action(job)
+            annotate(action=job.action)
+            if job.action == ACTION_UNCHANGED:
+                self._record(job, JOB_SUCCEEDED, f"Analysis {job.analysis_id} is already up to date, nothing to publish")
+                return
+
+            if job.action == ACTION_UPDATE:
+                self._record(job, JOB_UPDATING, "Submitting the changed definition to QuickSight")
+                response = quicksight_service.update_analysis(visual_definition, job.analysis_name, job.analysis_id)
+            else:
+                self._record(job, JOB_CREATING, "Submitting analysis to QuickSight")
+                response = quicksight_service.create_analysis(visual_definition, job.analysis_name, job.analysis_id)
+                if response.get("status") != "success" and "ResourceExistsException" in str(response.get("response")):
+                    # Created elsewhere since the index was last refreshed
+                    job.action = ACTION_UPDATE
+                    self._record(job, JOB_UPDATING, "Analysis already exists, updating it instead")
+                    response = quicksight_service.update_analysis(visual_definition, job.analysis_name, job.analysis_id)
+            job.response = response
+            if response.get("status") != "success":
+                job.error = str(response.get("response"))
+                self._record(job, JOB_FAILED, f"{job.action.capitalize()} request failed: {job.error}")
+                return
+
+            def on_poll(analysis_status: str):
+                job.polls += 1
+                job.analysis_status = analysis_status
+                job.updated_at = time.time()
+
+            self._record(job, JOB_WAITING, f"Waiting for QuickSight to finish the analysis {job.action}")
+            try:
+                analysis = wait_for_analysis(job.analysis_id, on_poll=on_poll)
+            except Exception as e:
+                job.error = str(e)
+                self._record(job, JOB_FAILED, job.error)
+                return
+
+            # Permissions stay in place across updates
+            if job.action == ACTION_CREATE:
+                self._record(job, JOB_APPLYING_PERMISSIONS, f"Analysis is {job.analysis_status}, applying permissions")
+                try:
+                    quicksight_service.update_analysis_permissions(job.analysis_id)
+                except Exception as e:
+                    job.error = f"Permission update failed: {e}"
+                    self._record(job, JOB_FAILED, job.error)
+                    return
+
+            # Make the analysis visible in listings without waiting for the index TTL, and remember what was deployed
+            if analysis.get("AnalysisId"):
+                entry = AnalysisEntry.from_summary(analysis)
+                entry.definition_hash = job.definition_hash
+                ANALYSIS_INDEX.upsert(entry)
+                self._store_deployment(entry)
+            self._record(job, JOB_SUCCEEDED, f"Analysis {job.analysis_id} is ready")
+
+
+# Global job manager shared by the agents and the UI
+ANALYSIS_JOBS = AnalysisJobManager(backend=MEMORY_STORE.backend)
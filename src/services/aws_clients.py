@@ -0,0 +1,75 @@
+"""
+AWS Clients - Shared, pooled boto3 clients for QuickSight and Bedrock.
+
+This module provides a client factory that creates each boto3 client once per
+service and region and reuses it across calls, so credential resolution,
+endpoint resolution and connection setup happen only once. Clients use a
+configurable connection pool size and adaptive retry mode with backoff.
+
+boto3 clients are thread-safe once created, but boto3 sessions are not, so
+client creation is serialized behind a lock and each client gets its own
+session.
+"""
+
+from typing import Optional, Dict, Tuple
+import os
+import threading
+
+import boto3
+from botocore.client import BaseClient
+from botocore.config import Config
+
+# Connection pool size per client; should cover the number of concurrent callers
+AWS_MAX_POOL_CONNECTIONS = int(os.getenv("AWS_MAX_POOL_CONNECTIONS", "25"))
+# Retry mode ("adaptive" adds client-side rate limiting on top of "standard" backoff)
+AWS_RETRY_MODE = os.getenv("AWS_RETRY_MODE", "adaptive")
+AWS_MAX_ATTEMPTS = int(os.getenv("AWS_MAX_ATTEMPTS", "5"))
+
+_clients: Dict[Tuple[str, Optional[str]], BaseClient] = {}
+_clients_lock = threading.Lock()
+
+
+def client_config() -> Config:
+    """botocore configuration shared by every client"""
+    return Config(
+        max_pool_connections=AWS_MAX_POOL_CONNECTIONS,
+        retries={"mode": AWS_RETRY_MODE, "max_attempts": AWS_MAX_ATTEMPTS},
+        tcp_keepalive=True,
+    )
+
+
+def get_client(service_name: str, region_name: Optional[str] = None) -> BaseClient:
+    """
+    Return the shared client for a service and region, creating it on first use.
+
+    Args:
+        service_name: boto3 service name, e.g. "quicksight" or "bedrock-agent-runtime"
+        region_name: AWS region; None uses the default region resolution
+
+    Returns:
+        Thread-safe boto3 client reused by all callers in this process
+    """
+    key = (service_name, region_name)
+    client = _clients.get(key)
+    if client is not None:
+        return client
+
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            session = boto3.session.Session()
+            client = session.client(service_name, region_name=region_name, config=client_config())
+            _clients[key] = client
+    return client
+
+
+def set_client(service_name: str, client: BaseClient, region_name: Optional[str] = None) -> None:
+    """Install a client for a service, e.g. a stubbed or differently configured one"""
+    with _clients_lock:
+        _clients[(service_name, region_name)] = client
+
+
+def reset_clients() -> None:
+    """Drop all cached clients so the next call re-resolves credentials and endpoints"""
+    with _clients_lock:
+        _clients.clear()
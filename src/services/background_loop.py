@@ -0,0 +1,104 @@
+"""
+Background Loop - One long-lived asyncio event loop per server process.
+
+Streamlit reruns the app script for every message, and calling asyncio.run
+there creates and closes an event loop each time. Async HTTP clients (the
+OpenAI client behind the agents SDK) keep their connection pools on the loop
+they were first used on, so every message paid connection and TLS setup again.
+BackgroundLoop runs a single event loop on a daemon thread; callers on any
+thread submit coroutines to it, so clients and their pools live across messages.
+"""
+
+from concurrent.futures import Future
+from typing import Optional, Any, AsyncIterator, Coroutine, Iterator
+import asyncio
+import queue
+import threading
+
+
+class BackgroundLoop:
+    """Event loop running on its own daemon thread, started on first use"""
+
+    def __init__(self, name: str = "agent-event-loop"):
+        self.name = name
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        """The running loop, starting the thread if needed"""
+        if self._loop is None:
+            self.start()
+        return self._loop
+
+    def start(self):
+        """Start the loop thread (no-op if already running)"""
+        with self._lock:
+            if self._loop is not None:
+                return
+            loop = asyncio.new_event_loop()
+            ready = threading.Event()
+
+            def run():
+                asyncio.set_event_loop(loop)
+                loop.call_soon(ready.set)
+                loop.run_forever()
+
+            self._thread = threading.Thread(target=run, name=self.name, daemon=True)
+            self._thread.start()
+            ready.wait()
+            self._loop = loop
+
+    def submit(self, coroutine: Coroutine) -> Future:
+        """Schedule a coroutine on the loop from any thread and return a concurrent Future"""
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+    def run(self, coroutine: Coroutine, timeout: Optional[float] = None) -> Any:
+        """Run a coroutine on the loop and block the calling thread until it finishes"""
+        return self.submit(coroutine).result(timeout)
+
+    def iterate(self, async_iterator: AsyncIterator) -> Iterator:
+        """
+        Consume an async iterator on the loop and yield its items on the calling thread.
+
+        Lets a synchronous caller (e.g. the Streamlit script thread) render
+        streamed updates while the producer runs on the background loop.
+        """
+        items: "queue.Queue" = queue.Queue()
+        done = object()
+
+        async def drain():
+            try:
+                async for item in async_iterator:
+                    items.put(item)
+            finally:
+                items.put(done)
+
+        future = self.submit(drain())
+        try:
+            while True:
+                item = items.get()
+                if item is done:
+                    break
+                yield item
+            # Re-raise errors from the producer
+            future.result()
+        finally:
+            if not future.done():
+                future.cancel()
+
+    def stop(self):
+        """Stop the loop and join its thread"""
+        with self._lock:
+            if self._loop is None:
+                return
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._loop.close()
+            self._loop = None
+            self._thread = None
+
+
+# Shared loop for the Streamlit app; all sessions submit their agent runs here
+BACKGROUND_LOOP = BackgroundLoop()
@@ -0,0 +1,246 @@
+"""
+Local Query Engine - Embedded DuckDB over snapshots of the fashion store tables.
+
+The seven dataset_fashion_store_* tables are small enough to hold in process.
+When DuckDB is installed (the "local" extra) and Parquet or CSV snapshots of
+the tables exist in LOCAL_ENGINE_DATA_DIR, SQL runs locally on DuckDB's
+vectorized columnar engine and returns real result rows in milliseconds,
+instead of only the knowledge base's prose answer.
+
+Snapshots are named after the tables, e.g. dataset_fashion_store_sales.parquet
+or dataset_fashion_store_sales.csv. They are loaded once, on first use, into a
+"public" schema so the knowledge base's SQL (public.dataset_fashion_store_*)
+runs unchanged. Without DuckDB or snapshots the engine reports itself
+unavailable and callers keep using the Bedrock knowledge base.
+"""
+
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Optional, Dict, Any, List, Tuple
+import argparse
+import os
+import re
+import threading
+import time
+
+try:
+    import duckdb
+except ImportError:  # optional dependency: pip install "template-agent[local]"
+    duckdb = None
+
+from ..agents.tools.schema_planner import SCHEMA_NAME, SCHEMA_TABLES
+from ..agents.tools.result_profile import ResultProfile, ColumnProfile, column_role, json_value, ROLE_DIMENSION
+from ..instrumentation import span, KIND_SQL
+
+LOCAL_ENGINE_ENABLED = os.getenv("LOCAL_ENGINE", "1") == "1"
+LOCAL_ENGINE_DATA_DIR = os.getenv("LOCAL_ENGINE_DATA_DIR", "data/fashion_store")
+# Rows fetched per query; larger results are truncated
+LOCAL_ENGINE_MAX_ROWS = int(os.getenv("LOCAL_ENGINE_MAX_ROWS", "1000"))
+# Rows shown in the "Sample Data" table of an answer
+LOCAL_ENGINE_SAMPLE_ROWS = int(os.getenv("LOCAL_ENGINE_SAMPLE_ROWS", "10"))
+
+# Snapshot extension -> DuckDB table function, in order of preference
+SNAPSHOT_READERS = {".parquet": "read_parquet", ".csv": "read_csv_auto"}
+
+_READ_ONLY_STATEMENT = re.compile(r"^\s*(select|with)\b", re.IGNORECASE)
+
+
+class LocalQueryError(RuntimeError):
+    """Raised when the local engine is unavailable or cannot run a query"""
+
+
+@dataclass
+class QueryResult:
+    """Rows of a locally executed query"""
+
+    sql: str
+    columns: List[str]
+    rows: List[Tuple[Any, ...]]
+    truncated: bool = False
+    elapsed_ms: float = 0.0
+    profile: Optional[ResultProfile] = None
+
+    def records(self) -> List[Dict[str, Any]]:
+        return [dict(zip(self.columns, row)) for row in self.rows]
+
+    def as_markdown(self, max_rows: int = LOCAL_ENGINE_SAMPLE_ROWS) -> str:
+        """Markdown table of the first max_rows rows"""
+        def cell(value: Any) -> str:
+            if value is None:
+                return ""
+            if isinstance(value, float):
+                return f"{value:,.2f}"
+            return str(value).replace("|", "\\|")
+
+        lines = [
+            "| " + " | ".join(self.columns) + " |",
+            "| " + " | ".join("---" for _ in self.columns) + " |",
+        ]
+        lines += ["| " + " | ".join(cell(value) for value in row) + " |" for row in self.rows[:max_rows]]
+        if len(self.rows) > max_rows:
+            lines.append(f"\n_{max_rows} of {len(self.rows)}{'+' if self.truncated else ''} rows shown_")
+        return "\n".join(lines)
+
+    def summary(self) -> str:
+        count = f"{len(self.rows)}{'+' if self.truncated else ''}"
+        return f"The query returned {count} rows with columns {', '.join(self.columns)} (computed locally in {self.elapsed_ms:.1f} ms)."
+
+
+@dataclass
+class LoadStats:
+    """Tables loaded from snapshots and their row counts"""
+
+    tables: Dict[str, int] = field(default_factory=dict)
+    elapsed_ms: float = 0.0
+
+
+class LocalQueryEngine:
+    """
+    Thread-safe embedded DuckDB database over the fashion store snapshots.
+
+    Args:
+        data_dir: Directory holding one Parquet or CSV snapshot per table
+        max_rows: Default row limit per query
+    """
+
+    def __init__(self, data_dir: str = LOCAL_ENGINE_DATA_DIR, max_rows: int = LOCAL_ENGINE_MAX_ROWS):
+        self.data_dir = Path(data_dir)
+        self.max_rows = max_rows
+        self.last_load: Optional[LoadStats] = None
+        self._connection = None
+        self._lock = threading.Lock()
+
+    def snapshot_files(self) -> Dict[str, Path]:
+        """Snapshot file for every table that has one"""
+        files = {}
+        for table in SCHEMA_TABLES:
+            for extension in SNAPSHOT_READERS:
+                path = self.data_dir / f"{table}{extension}"
+                if path.is_file():
+                    files[table] = path
+                    break
+        return files
+
+    @property
+    def available(self) -> bool:
+        """True when DuckDB is installed and at least one snapshot exists"""
+        if self._connection is not None:
+            return True
+        return LOCAL_ENGINE_ENABLED and duckdb is not None and bool(self.snapshot_files())
+
+    def load(self, force: bool = False) -> LoadStats:
+        """Load every snapshot into a fresh in-memory database (once, unless forced)"""
+        with self._lock:
+            if self._connection is not None and not force:
+                return self.last_load
+            if duckdb is None:
+                raise LocalQueryError("DuckDB is not installed; install the 'local' extra to query locally")
+            files = self.snapshot_files()
+            if not files:
+                raise LocalQueryError(f"No table snapshots found in {self.data_dir}")
+
+            started = time.perf_counter()
+            stats = LoadStats()
+            connection = duckdb.connect(":memory:")
+            connection.execute(f"CREATE SCHEMA IF NOT EXISTS {SCHEMA_NAME}")
+            for table, path in files.items():
+                reader = SNAPSHOT_READERS[path.suffix]
+                location = str(path.resolve()).replace("'", "''")
+                connection.execute(f"CREATE TABLE {SCHEMA_NAME}.{table} AS SELECT * FROM {reader}('{location}')")
+                stats.tables[table] = connection.execute(f"SELECT COUNT(*) FROM {SCHEMA_NAME}.{table}").fetchone()[0]
+            # Unqualified table names resolve to the snapshots too
+            connection.execute(f"SET search_path = '{SCHEMA_NAME},main'")
+            # Queries come from users and the KB: no file or network access from here on
+            connection.execute("SET enable_external_access = false")
+            connection.execute("SET lock_configuration = true")
+
+            if self._connection is not None:
+                self._connection.close()
+            self._connection = connection
+            stats.elapsed_ms = (time.perf_counter() - started) * 1000
+            self.last_load = stats
+            print(f"\n🦆 Local engine loaded {len(stats.tables)} tables from {self.data_dir} in {stats.elapsed_ms:.0f} ms: {stats.tables}\n")
+            return stats
+
+    def execute(self, sql: str, max_rows: Optional[int] = None, profile: bool = False) -> QueryResult:
+        """
+        Run one read-only SELECT/WITH statement and return up to max_rows rows.
+
+        With profile=True the result also carries a ResultProfile computed over
+        the whole result set (not only the fetched rows).
+
+        Raises LocalQueryError for other statements, or when the engine is unavailable;
+        DuckDB errors (unknown table, dialect differences) propagate as raised.
+        """
+        statement = sql.strip().rstrip(";").strip()
+        if not _READ_ONLY_STATEMENT.match(statement) or ";" in statement:
+            raise LocalQueryError("Only single SELECT or WITH statements can run locally")
+        limit = max_rows or self.max_rows
+        self.load()
+
+        with span("local_engine.query", KIND_SQL, sql_chars=len(statement)) as query_span:
+            started = time.perf_counter()
+            # A cursor is a per-call connection to the same database, safe to use from any thread
+            cursor = self._connection.cursor()
+            try:
+                result = cursor.execute(statement)
+                columns = [description[0] for description in result.description]
+                rows = result.fetchmany(limit + 1)
+                result_profile = self._profile(cursor, statement) if profile else None
+            finally:
+                cursor.close()
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            truncated = len(rows) > limit
+            query_span.set(rows=min(len(rows), limit), truncated=truncated, profiled=result_profile is not None)
+        return QueryResult(statement, columns, rows[:limit], truncated, elapsed_ms, result_profile)
+
+    @staticmethod
+    def _profile(cursor, statement: str) -> Optional[ResultProfile]:
+        """Types from DESCRIBE, then row count, distinct/null counts and min/max in one aggregate pass"""
+        try:
+            described = cursor.execute(f"DESCRIBE {statement}").fetchall()
+            aggregates = ["COUNT(*)"]
+            for name, *_ in described:
+                quoted = '"' + name.replace('"', '""') + '"'
+                aggregates += [f"COUNT(DISTINCT {quoted})", f"COUNT(*) - COUNT({quoted})", f"MIN({quoted})", f"MAX({quoted})"]
+            values = cursor.execute(f"SELECT {', '.join(aggregates)} FROM ({statement}) AS profiled").fetchone()
+        except Exception as e:
+            # e.g. duplicate output column names; the answer is still returned without a profile
+            print(f"\n⚠️ Could not profile the query result: {e}\n")
+            return None
+
+        columns = []
+        for position, (name, column_type, *_) in enumerate(described):
+            distinct, nulls, low, high = values[1 + position * 4: 5 + position * 4]
+            role = column_role(column_type)
+            column = ColumnProfile(name, column_type, role, distinct, nulls)
+            if role != ROLE_DIMENSION:
+                column.min, column.max = json_value(low), json_value(high)
+            columns.append(column)
+        return ResultProfile(values[0], columns)
+
+
+# Shared engine over LOCAL_ENGINE_DATA_DIR
+LOCAL_ENGINE = LocalQueryEngine()
+
+
+def main():
+    """Load the snapshots and optionally run a query"""
+    parser = argparse.ArgumentParser(description="Query the fashion store snapshots locally with DuckDB")
+    parser.add_argument("--data-dir", default=LOCAL_ENGINE_DATA_DIR, help="Directory of table snapshots")
+    parser.add_argument("--sql", default=None, help="SELECT statement to run")
+    args = parser.parse_args()
+
+    engine = LocalQueryEngine(args.data_dir)
+    stats = engine.load()
+    missing = sorted(set(SCHEMA_TABLES) - set(stats.tables))
+    if missing:
+        print(f"⚠️ No snapshot for: {', '.join(missing)}")
+    if args.sql:
+        result = engine.execute(args.sql)
+        print(result.as_markdown(max_rows=engine.max_rows))
+        print(f"\n{result.summary()}")
+
+
+if __name__ == "__main__":
+    main()
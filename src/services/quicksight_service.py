@@ -5,15 +5,40 @@ This service provides functions to create, update, and manage QuickSight analyse
 and dashboards through the AWS SDK. Handles permissions and error management.
 """
 
-import boto3
-from typing import Dict, Any
+from typing import Dict, Any, Optional, Tuple
 from botocore.exceptions import ClientError
+import hashlib
 import json
+import os
+import time
 
+from .aws_clients import get_client
+from .analysis_index import ANALYSIS_INDEX
+from ..instrumentation import traced, span, annotate, payload_size, KIND_CACHE, KIND_QUICKSIGHT
 
+# Dataset columns change rarely; cache them instead of describing the dataset every turn
+DATASET_COLUMNS_TTL_SECONDS = float(os.getenv("DATASET_COLUMNS_TTL_SECONDS", "300"))
+_dataset_columns_cache: Dict[str, Tuple[float, Dict[str, str]]] = {}
 
 
+def definition_hash(visual_definition: Dict[str, Any]) -> str:
+    """
+    Content hash of an analysis Definition.
+
+    Keys are sorted and the dataset declarations and calculated fields are
+    ordered by name, so definitions that only differ in ordering hash the same.
+    """
+    definition = dict(visual_definition.get("Definition", visual_definition))
+    if "DataSetIdentifierDeclarations" in definition:
+        definition["DataSetIdentifierDeclarations"] = sorted(definition["DataSetIdentifierDeclarations"],
+                                                             key=lambda declaration: str(declaration.get("Identifier")))
+    if "CalculatedFields" in definition:
+        definition["CalculatedFields"] = sorted(definition["CalculatedFields"], key=lambda field: str(field.get("Name")))
+    canonical = json.dumps(definition, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
 
+
+@traced("quicksight.create_analysis", KIND_QUICKSIGHT)
 def create_analysis(visual_definition: Dict[str, Any], name: str,analysis_id: str) -> Dict[str, Any]:
     """
     Create a QuickSight analysis from a visual definition.
@@ -28,8 +53,9 @@ def create_analysis(visual_definition: Dict[str, Any], name: str,analysis_id: st
     """
 
     print(f"\n✅ Creating analysis: {analysis_id}\n")
+    annotate(definition_bytes=payload_size(visual_definition))
     try :
-        client = boto3.client('quicksight')
+        client = get_client('quicksight')
         response = client.create_analysis(
             AwsAccountId = '817491136527',
             Name = name,
@@ -42,12 +68,37 @@ def create_analysis(visual_definition: Dict[str, Any], name: str,analysis_id: st
         print(f"\n❌ Error creating analysis: {e}\n")
         return {"status": "error", "response": str(e)}
     
+@traced("quicksight.update_analysis", KIND_QUICKSIGHT)
+def update_analysis(visual_definition: Dict[str, Any], name: str, analysis_id: str) -> Dict[str, Any]:
+    """
+    Replace the definition of an existing QuickSight analysis.
+
+    Returns:
+        Dict containing status and response from AWS
+    """
+    print(f"\n✅ Updating analysis: {analysis_id}\n")
+    annotate(definition_bytes=payload_size(visual_definition))
+    try:
+        client = get_client('quicksight')
+        response = client.update_analysis(
+            AwsAccountId = '817491136527',
+            Name = name,
+            AnalysisId = analysis_id,
+            Definition = visual_definition["Definition"]
+        )
+        print(f"\n✅ Analysis update status: {response}\n")
+        return {"status": "success", "response": response}
+    except Exception as e:
+        print(f"\n❌ Error updating analysis: {e}\n")
+        return {"status": "error", "response": str(e)}
+
+@traced("quicksight.create_dashboard", KIND_QUICKSIGHT)
 def create_dashboard(dashboard_definition: Dict[str, Any]) -> Dict[str, Any]:
     """
     Create a simple test dashboard in QuickSight
     """
     try:
-        client = boto3.client('quicksight')
+        client = get_client('quicksight')
         
         response = client.create_dashboard(
             AwsAccountId = '817491136527',
@@ -59,16 +110,63 @@ def create_dashboard(dashboard_definition: Dict[str, Any]) -> Dict[str, Any]:
     except Exception as e:
         return {"status": "error", "response": str(e)}
 
-def get_available_analyses() -> Dict[str, Any]:
+def get_available_analyses(name_filter: Optional[str] = None, force_refresh: bool = False) -> Dict[str, Any]:
     """
-    Get the list of available analyses
+    Get the list of available analyses from the paginated, cached analysis index.
+
+    Args:
+        name_filter: Only return analyses whose name contains this text (case-insensitive)
+        force_refresh: Re-list from QuickSight even if the index is still fresh
+    """
+    if name_filter:
+        entries = ANALYSIS_INDEX.search(name_filter, force_refresh=force_refresh)
+    else:
+        entries = ANALYSIS_INDEX.list(force_refresh=force_refresh)
+    return {
+        "AnalysisSummaryList": [entry.as_summary() for entry in entries],
+        "Count": len(entries)
+    }
+
+@traced("quicksight.describe_analysis", KIND_QUICKSIGHT)
+def describe_analysis(analysis_id: str) -> Dict[str, Any]:
     """
-    client = boto3.client('quicksight')
-    response = client.list_analyses(
-        AwsAccountId = '817491136527'
+    Describe an analysis, including its creation Status and any Errors
+    """
+    client = get_client('quicksight')
+    response = client.describe_analysis(
+        AwsAccountId = '817491136527',
+        AnalysisId = analysis_id
     )
     return response
 
+@traced("quicksight.describe_data_set", KIND_QUICKSIGHT)
+def describe_data_set(data_set_id: str) -> Dict[str, Any]:
+    """
+    Describe a dataset, including its OutputColumns
+    """
+    client = get_client('quicksight')
+    response = client.describe_data_set(
+        AwsAccountId = '817491136527',
+        DataSetId = data_set_id
+    )
+    return response
+
+def get_dataset_columns(data_set_id: str, force_refresh: bool = False) -> Dict[str, str]:
+    """
+    Get the output columns of a dataset as {column name: QuickSight type}, cached for DATASET_COLUMNS_TTL_SECONDS.
+    """
+    with span("dataset_columns.get", KIND_CACHE) as cache_span:
+        cached = _dataset_columns_cache.get(data_set_id)
+        cache_hit = cached is not None and not force_refresh and time.monotonic() - cached[0] < DATASET_COLUMNS_TTL_SECONDS
+        cache_span.set(cache_hit=cache_hit)
+        if cache_hit:
+            return cached[1]
+        response = describe_data_set(data_set_id)
+        columns = {column['Name']: column.get('Type', '') for column in response['DataSet'].get('OutputColumns', [])}
+        _dataset_columns_cache[data_set_id] = (time.monotonic(), columns)
+        return columns
+
+@traced("quicksight.update_analysis_permissions", KIND_QUICKSIGHT)
 def update_analysis_permissions(analysis_id: str) -> Dict[str, Any]:
     """
     Update the permissions of an analysis for the user to be able to view the analysis.
@@ -88,7 +186,7 @@ def update_analysis_permissions(analysis_id: str) -> Dict[str, Any]:
             ]
         }
     ]
-    client = boto3.client('quicksight')
+    client = get_client('quicksight')
     response = client.update_analysis_permissions(
         AwsAccountId = '817491136527',
         AnalysisId = analysis_id,
@@ -96,6 +194,7 @@ def update_analysis_permissions(analysis_id: str) -> Dict[str, Any]:
     )
     return response
 
+@traced("quicksight.update_dashboard_permissions", KIND_QUICKSIGHT)
 def update_dashboard_permissions(dashboard_id: str) -> Dict[str, Any]:
     """
     Update the permissions of a dashboard for the user to be able to view the dashboard.
@@ -115,7 +214,7 @@ def update_dashboard_permissions(dashboard_id: str) -> Dict[str, Any]:
             ]
         }
     ]
-    client = boto3.client('quicksight')
+    client = get_client('quicksight')
     response = client.update_dashboard_permissions(
         AwsAccountId = '817491136527',
         DashboardId = dashboard_id,
@@ -123,32 +222,35 @@ def update_dashboard_permissions(dashboard_id: str) -> Dict[str, Any]:
     )
     return response
 
+@traced("quicksight.delete_dashboard", KIND_QUICKSIGHT)
 def delete_dashboard(dashboard_id: str) -> Dict[str, Any]:
     """
     Delete a dashboard
     """
-    client = boto3.client('quicksight')
+    client = get_client('quicksight')
     response = client.delete_dashboard(
         AwsAccountId = '817491136527',
         DashboardId = dashboard_id
     )
     return response
 
+@traced("quicksight.delete_analysis", KIND_QUICKSIGHT)
 def delete_analysis(analysis_id: str) -> Dict[str, Any]:
     """
     Delete an analysis
     """
-    client = boto3.client('quicksight')
+    client = get_client('quicksight')
     response = client.delete_analysis(
         AwsAccountId = '817491136527',
         AnalysisId = analysis_id
     )
+    ANALYSIS_INDEX.remove(analysis_id)
     return response
 
 #This API action is supported only when the account has an active Capacity Pricing plan.
 def generateEmbedUrlForAnonymousUser():
     try:
-        client = boto3.client('quicksight')
+        client = get_client('quicksight')
         response = client.generate_embed_url_for_anonymous_user(
             AwsAccountId = '817491136527',
             Namespace = 'default',
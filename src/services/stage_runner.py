@@ -0,0 +1,220 @@
+"""
+Stage Runner - Concurrent execution of dependent pipeline stages.
+
+Tool pipelines such as run_visual_planner and plan_and_retrieve used to await
+each step in turn, even when steps did not depend on each other. A StageRunner
+is a small DAG: each stage names the stages it depends on and receives their
+results as keyword arguments, and every stage starts as soon as its
+dependencies finish. The runner enforces per-stage and pipeline timeouts,
+cancels work that is no longer needed, and records how long each stage took.
+
+Stages marked optional never fail the pipeline: on error or timeout their result
+is None and dependents still run. Speculative stages are optional stages that
+nothing waits for; if still running when the pipeline completes they are cancelled.
+"""
+
+from dataclasses import dataclass, field
+from typing import Optional, Dict, Any, Tuple, Callable, Awaitable
+import asyncio
+import time
+
+from ..instrumentation import span, KIND_STAGE
+
+STAGE_OK = "ok"
+STAGE_FAILED = "failed"
+STAGE_TIMEOUT = "timeout"
+STAGE_CANCELLED = "cancelled"
+STAGE_SKIPPED = "skipped"
+
+
+class StageFailedError(Exception):
+    """A required stage failed, timed out or could not run"""
+
+    def __init__(self, stage: str, status: str, error: Optional[BaseException] = None):
+        self.stage = stage
+        self.status = status
+        self.error = error
+        detail = f": {error}" if error is not None and str(error) else ""
+        super().__init__(f"Stage '{stage}' {status}{detail}")
+
+
+@dataclass
+class Stage:
+    """One unit of work; func is called with the results of depends_on as keyword arguments"""
+
+    name: str
+    func: Callable[..., Awaitable[Any]]
+    depends_on: Tuple[str, ...] = ()
+    timeout: Optional[float] = None
+    optional: bool = False
+    speculative: bool = False
+
+
+@dataclass
+class StageTiming:
+    """Outcome of a stage, with start offset and duration relative to the pipeline start"""
+
+    name: str
+    status: str = STAGE_SKIPPED
+    started: float = 0.0
+    elapsed: float = 0.0
+    error: Optional[str] = None
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "status": self.status,
+            "started": round(self.started, 3),
+            "elapsed": round(self.elapsed, 3),
+            "error": self.error,
+        }
+
+
+@dataclass
+class PipelineResult:
+    """Stage results by name plus per-stage timings"""
+
+    results: Dict[str, Any] = field(default_factory=dict)
+    timings: Dict[str, StageTiming] = field(default_factory=dict)
+    elapsed: float = 0.0
+
+    def __getitem__(self, name: str) -> Any:
+        return self.results.get(name)
+
+    def status(self, name: str) -> str:
+        return self.timings[name].status
+
+    def report(self) -> str:
+        """One line per stage, in start order"""
+        lines = [f"total {self.elapsed:.2f}s"]
+        for timing in sorted(self.timings.values(), key=lambda item: item.started):
+            line = f"{timing.name}: {timing.status} @{timing.started:.2f}s +{timing.elapsed:.2f}s"
+            if timing.error:
+                line += f" ({timing.error})"
+            lines.append(line)
+        return " | ".join(lines)
+
+
+class StageRunner:
+    """
+    DAG of async stages run with maximum concurrency.
+
+    Args:
+        name: Pipeline name used in logs
+        timeout: Optional budget for the whole pipeline in seconds
+    """
+
+    def __init__(self, name: str, timeout: Optional[float] = None):
+        self.name = name
+        self.timeout = timeout
+        self._stages: Dict[str, Stage] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    def add(self, name: str, func: Callable[..., Awaitable[Any]], depends_on: Tuple[str, ...] = (),
+            timeout: Optional[float] = None, optional: bool = False, speculative: bool = False) -> "StageRunner":
+        """Register a stage; dependencies must already be registered"""
+        if name in self._stages:
+            raise ValueError(f"Duplicate stage '{name}'")
+        missing = [dependency for dependency in depends_on if dependency not in self._stages]
+        if missing:
+            raise ValueError(f"Stage '{name}' depends on unknown stages: {missing}")
+        self._stages[name] = Stage(name, func, tuple(depends_on), timeout, optional or speculative, speculative)
+        return self
+
+    def _dependency_failed(self, stage: Stage, dependency: str) -> None:
+        """Input for a dependency that did not produce a result"""
+        if not self._stages[dependency].optional:
+            raise StageFailedError(stage.name, STAGE_SKIPPED)
+        return None
+
+    async def result(self, name: str) -> Any:
+        """
+        Wait for another stage of the running pipeline from inside a stage.
+
+        Lets a stage consult a speculative stage only when it needs it, without
+        declaring a dependency that would make it always wait.
+        Returns None if that stage failed, timed out or was cancelled.
+        """
+        try:
+            return await asyncio.shield(self._tasks[name])
+        except asyncio.CancelledError:
+            if not self._tasks[name].cancelled():
+                raise
+            return None
+        except Exception:
+            return None
+
+    async def run(self) -> PipelineResult:
+        """
+        Run every stage and return their results and timings.
+
+        Raises StageFailedError when a required stage fails, times out or is
+        skipped, after cancelling the stages still running.
+        """
+        result = PipelineResult(timings={name: StageTiming(name) for name in self._stages})
+        started = time.perf_counter()
+        tasks = self._tasks = {}
+
+        async def run_stage(stage: Stage) -> Any:
+            timing = result.timings[stage.name]
+            # Registration order guarantees dependency tasks exist already
+            inputs = {}
+            for dependency in stage.depends_on:
+                try:
+                    # Shielded so cancelling one dependent never cancels a shared dependency
+                    inputs[dependency] = await asyncio.shield(tasks[dependency])
+                except asyncio.CancelledError:
+                    if not tasks[dependency].cancelled():
+                        raise
+                    inputs[dependency] = self._dependency_failed(stage, dependency)
+                except Exception:
+                    inputs[dependency] = self._dependency_failed(stage, dependency)
+
+            timing.started = time.perf_counter() - started
+            try:
+                with span(f"{self.name}.{stage.name}", KIND_STAGE):
+                    value = await asyncio.wait_for(stage.func(**inputs), stage.timeout)
+            except asyncio.TimeoutError as e:
+                timing.status, timing.error = STAGE_TIMEOUT, f"exceeded {stage.timeout}s"
+                if stage.optional:
+                    return None
+                raise StageFailedError(stage.name, STAGE_TIMEOUT, e)
+            except asyncio.CancelledError:
+                timing.status = STAGE_CANCELLED
+                raise
+            except Exception as e:
+                timing.status, timing.error = STAGE_FAILED, str(e)
+                if stage.optional:
+                    return None
+                raise StageFailedError(stage.name, STAGE_FAILED, e) from e
+            finally:
+                timing.elapsed = time.perf_counter() - started - timing.started
+            timing.status = STAGE_OK
+            result.results[stage.name] = value
+            return value
+
+        for stage in self._stages.values():
+            tasks[stage.name] = asyncio.create_task(run_stage(stage), name=f"{self.name}:{stage.name}")
+
+        required = [tasks[name] for name, stage in self._stages.items() if not stage.speculative]
+        try:
+            done, pending = await asyncio.wait(required, timeout=self.timeout, return_when=asyncio.FIRST_EXCEPTION)
+            errors = [task.exception() for task in done if task.exception() is not None]
+            if errors:
+                # Report the stage that failed rather than a dependent that was skipped because of it
+                raise next((error for error in errors if getattr(error, "status", None) != STAGE_SKIPPED), errors[0])
+            if pending:
+                names = [name for name, task in tasks.items() if task in pending]
+                raise StageFailedError(names[0], STAGE_TIMEOUT, asyncio.TimeoutError(f"pipeline exceeded {self.timeout}s"))
+        finally:
+            # Cancel speculative stages nobody used and anything left after a failure
+            unfinished = [task for task in tasks.values() if not task.done()]
+            for task in unfinished:
+                task.cancel()
+            if unfinished:
+                await asyncio.gather(*unfinished, return_exceptions=True)
+            for task in tasks.values():
+                if task.done() and not task.cancelled():
+                    task.exception()  # mark retrieved so asyncio does not log it
+            result.elapsed = time.perf_counter() - started
+            print(f"\n⏱️ {self.name} stages: {result.report()}\n")
+        return result
@@ -0,0 +1,111 @@
+"""
+Streaming - Incremental agent output for the Streamlit UI and the CLI.
+
+Runs the coordinator with Runner.run_streamed and turns the SDK stream into a
+small set of UI events: model text deltas, agent handoffs, tool call start and
+finish, and partial knowledge base answers pushed by tools through the run
+context. Both front ends consume the same event stream, so the first model
+token reaches the user as soon as it is generated instead of after the whole
+coordinator -> insights -> planner -> KB chain has finished.
+"""
+
+from dataclasses import dataclass
+from typing import Optional, Dict, Any, AsyncIterator
+import asyncio
+import time
+
+from agents import Agent, Runner
+
+from .memory.agent_memory import AgentRunContext
+
+# Event kinds, in the order they usually appear
+EVENT_AGENT = "agent"
+EVENT_TOOL_STARTED = "tool_started"
+EVENT_TOOL_FINISHED = "tool_finished"
+EVENT_PARTIAL = "partial"
+EVENT_TEXT = "text"
+EVENT_FINAL = "final"
+
+
+@dataclass
+class StreamUpdate:
+    """One incremental update from a streamed agent run"""
+
+    kind: str
+    text: str = ""
+    name: Optional[str] = None
+    elapsed: float = 0.0
+
+
+_DONE = object()
+
+
+def _tool_call_name(raw_item: Any) -> str:
+    return getattr(raw_item, "name", None) or (raw_item.get("name") if isinstance(raw_item, dict) else None) or "tool"
+
+
+def _tool_call_id(raw_item: Any) -> Optional[str]:
+    if isinstance(raw_item, dict):
+        return raw_item.get("call_id")
+    return getattr(raw_item, "call_id", None)
+
+
+async def stream_agent_run(
+    agent: Agent,
+    user_input: str,
+    session: Any = None,
+    context: Optional[AgentRunContext] = None,
+) -> AsyncIterator[StreamUpdate]:
+    """
+    Run an agent with streaming and yield StreamUpdate events as they happen.
+
+    The last event is always EVENT_FINAL with the run's final output. Errors from
+    the run are raised to the caller after the events produced so far.
+    """
+    started = time.perf_counter()
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+
+    def emit(kind: str, text: str = "", name: Optional[str] = None):
+        queue.put_nowait(StreamUpdate(kind, text, name, time.perf_counter() - started))
+
+    # Tools run their blocking calls on worker threads, so partials are handed over thread-safely
+    if context is not None:
+        context.partial_callback = lambda text: loop.call_soon_threadsafe(emit, EVENT_PARTIAL, text)
+
+    result = Runner.run_streamed(agent, user_input, session=session, context=context)
+    tool_names: Dict[str, str] = {}
+
+    async def pump():
+        try:
+            async for event in result.stream_events():
+                if event.type == "raw_response_event":
+                    if getattr(event.data, "type", None) == "response.output_text.delta":
+                        emit(EVENT_TEXT, event.data.delta)
+                elif event.type == "agent_updated_stream_event":
+                    emit(EVENT_AGENT, name=event.new_agent.name)
+                elif event.type == "run_item_stream_event":
+                    if event.name == "tool_called":
+                        name = _tool_call_name(event.item.raw_item)
+                        tool_names[_tool_call_id(event.item.raw_item)] = name
+                        emit(EVENT_TOOL_STARTED, name=name)
+                    elif event.name == "tool_output":
+                        emit(EVENT_TOOL_FINISHED, name=tool_names.get(_tool_call_id(event.item.raw_item), "tool"))
+        finally:
+            queue.put_nowait(_DONE)
+
+    pump_task = asyncio.create_task(pump())
+    try:
+        while True:
+            update = await queue.get()
+            if update is _DONE:
+                break
+            yield update
+        await pump_task
+    finally:
+        if not pump_task.done():
+            pump_task.cancel()
+        if context is not None:
+            context.partial_callback = None
+
+    yield StreamUpdate(EVENT_FINAL, str(result.final_output or ""), elapsed=time.perf_counter() - started)
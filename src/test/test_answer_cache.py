@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Answer Cache Test Suite
+
+Offline tests for the knowledge base answer cache:
+- Rephrased questions reuse a cached answer
+- Near-miss questions (other quarter, year, month, value or top N) never do
+- TTL expiry and non-counting peeks
+"""
+
+import sys
+from pathlib import Path
+
+# Add project root to path
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.memory.answer_cache import AnswerCache, split_exact_terms
+
+LONG_QUESTION = ("What was the total revenue by product category for the online channel, "
+                 "compared with the average order value, in Q1 2024?")
+
+REPHRASED_PAIRS = [
+    ("Show me revenue by category", "revenue by category please"),
+    ("What is the revenue by category in Q1 2024?", "Revenue by category in Q1 2024"),
+    ("Total sales by brand for \"Zara\"", "total sales for brand \"Zara\""),
+]
+
+NEAR_MISS_PAIRS = [
+    (LONG_QUESTION, LONG_QUESTION.replace("Q1", "Q2")),
+    (LONG_QUESTION, LONG_QUESTION.replace("2024", "2023")),
+    ("What was the total revenue by product category for the online channel in March?",
+     "What was the total revenue by product category for the online channel in April?"),
+    ("What was the total revenue by product category for the online channel in Germany?",
+     "What was the total revenue by product category for the online channel in France?"),
+    ("Total revenue by product category for the brand \"Zara\" across all channels",
+     "Total revenue by product category for the brand \"Mango\" across all channels"),
+    ("top 5 brands by total revenue across all channels and countries",
+     "top 10 brands by total revenue across all channels and countries"),
+    ("What was the total revenue by product category for the online channel last month?",
+     "What was the total revenue by product category for the online channel this month?"),
+]
+
+
+class FakeClock:
+    """Manually advanced clock for TTL tests"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class AnswerCacheTester:
+    """Test suite for the knowledge base answer cache"""
+
+    def __init__(self):
+        self.test_results = []
+
+    def log_test(self, test_name: str, success: bool, message: str = ""):
+        """Log test results"""
+        status = "✅ PASS" if success else "❌ FAIL"
+        print(f"{status} {test_name}")
+        if message:
+            print(f"   └─ {message}")
+        self.test_results.append({'test': test_name, 'success': success, 'message': message})
+
+    def check(self, test_name: str, actual, expected):
+        """Compare actual and expected values and log the outcome"""
+        self.log_test(test_name, actual == expected, "" if actual == expected else f"expected {expected}, got {actual}")
+
+    def test_exact_terms(self):
+        """Numbers, periods and values are split from the rest of the question"""
+        terms, rest = split_exact_terms("Revenue by brand in Germany for Q1 2024 and last month")
+        self.check("Exact Terms", terms, frozenset({"germany", "q1", "2024", "last month"}))
+        self.check("Remaining Text", rest, "Revenue by brand in for and")
+        self.check("Sentence Start Not A Value", split_exact_terms("Revenue by brand")[0], frozenset())
+
+    def test_rephrased_hits(self):
+        """Rephrased questions with the same values are served from the cache"""
+        for first, second in REPHRASED_PAIRS:
+            cache = AnswerCache()
+            cache.put(first, None, {"answer": first})
+            self.check(f"Similar Hit: {second}", cache.get(second), {"answer": first})
+
+    def test_near_miss(self):
+        """Questions that differ only in a value are never served each other's answer"""
+        for number, (first, second) in enumerate(NEAR_MISS_PAIRS, 1):
+            cache = AnswerCache()
+            cache.put(first, None, {"answer": first})
+            self.check(f"Exact Hit {number}", cache.get(first), {"answer": first})
+            self.check(f"Near Miss {number}", cache.get(second), None)
+
+    def test_expiry(self):
+        """Entries expire after their TTL"""
+        clock = FakeClock()
+        cache = AnswerCache(ttl_seconds=10, clock=clock)
+        cache.put("revenue by category", None, {"answer": 1})
+        clock.now = 11
+        self.check("Expired Entry", cache.get("revenue by category"), None)
+        self.check("Expiration Counted", cache.stats.expirations, 1)
+
+    def test_peek(self):
+        """peek finds entries without counting a lookup"""
+        cache = AnswerCache()
+        cache.put("revenue by category", None, {"answer": 1})
+        self.check("Peek Hit", cache.peek("show me revenue by category"), {"answer": 1})
+        self.check("Peek Miss", cache.peek("stock by country"), None)
+        self.check("Peek Not Counted", cache.stats.hits + cache.stats.misses, 0)
+
+    def run_all_tests(self):
+        """Execute all answer cache tests"""
+        print("🚀 Starting Answer Cache Test Suite")
+        print("=" * 50)
+        for test_func in (self.test_exact_terms, self.test_rephrased_hits, self.test_near_miss, self.test_expiry,
+                          self.test_peek):
+            test_func()
+
+        passed = sum(1 for result in self.test_results if result['success'])
+        total = len(self.test_results)
+        print("\n" + "=" * 50)
+        print(f"Total Tests: {total}")
+        print(f"Passed: {passed}")
+        print(f"Failed: {total - passed}")
+        return passed == total
+
+
+def main():
+    """Main test execution function"""
+    tester = AnswerCacheTester()
+    success = tester.run_all_tests()
+    sys.exit(0 if success else 1)
+
+
+if __name__ == "__main__":
+    main()
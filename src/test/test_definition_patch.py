@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+Definition Patch Test Suite
+
+Offline tests for definition diffs and typed visual edits:
+- apply_patch(d, diff(d, e)) rebuilds e and leaves d untouched
+- Each kind of VisualEdit produces a definition that passes validation
+- Edits that do not fit the visual and patches that do not apply are rejected
+"""
+
+import copy
+import sys
+from pathlib import Path
+
+# Add project root to path
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.agents.tools.definition_compiler import compile_definition
+from src.agents.tools.definition_patch import (
+    diff, apply_patch, edit_visual, VisualEdit, PatchOp, PatchError, DefinitionEditError, Match, OP_REPLACE, OP_REMOVE,
+)
+from src.agents.tools.definition_validator import validate_definition
+from src.agents.tools.visual_creator import add_dataset_identifier
+
+BAR_PLAN = {
+    "VISUAL_TYPE": "BarChartVisual",
+    "FIELD_WELLS_TYPE": "BarChartAggregatedFieldWells",
+    "DIMENSION_FIELDS": ["category"],
+    "MEASURE_FIELDS": ["item_total", "unit_price"],
+    "AGGREGATION_FUNCTION_REQUIRED": True,
+    "AGGREGATION_FUNCTIONS": ["SUM", "SUM"],
+    "SORT_TYPE": "FieldSort",
+    "SORT_DIRECTION": "DESC",
+}
+
+LINE_PLAN = {
+    "VISUAL_TYPE": "LineChartVisual",
+    "FIELD_WELLS_TYPE": "LineChartAggregatedFieldWells",
+    "DIMENSION_FIELDS": ["sale_date"],
+    "MEASURE_FIELDS": ["total_amount"],
+    "AGGREGATION_FUNCTION_REQUIRED": True,
+    "AGGREGATION_FUNCTIONS": ["SUM"],
+    "SORT_TYPE": "FieldSort",
+    "SORT_DIRECTION": "ASC",
+    "DATE_GRANULARITY": "MONTH",
+}
+
+# One edit of each kind, with a check that the edited visual shows the change
+EDITS = [
+    ("Visual Type", VisualEdit(visual_type="PieChartVisual"),
+     lambda visual: "PieChartVisual" in visual),
+    ("Aggregation", VisualEdit(aggregation="average"),
+     lambda visual: all(measure["NumericalMeasureField"]["AggregationFunction"] == {"SimpleNumericalAggregation": "AVERAGE"}
+                        for measure in bar_wells(visual)["Values"])),
+    ("Measure Aggregation", VisualEdit(aggregation="MAX", measure="unit_price"),
+     lambda visual: [measure["NumericalMeasureField"]["AggregationFunction"]["SimpleNumericalAggregation"]
+                     for measure in bar_wells(visual)["Values"]] == ["SUM", "MAX"]),
+    ("Sort Direction", VisualEdit(sort_direction="asc"),
+     lambda visual: bar_sort(visual)["Direction"] == "ASC"),
+    ("Sort By", VisualEdit(sort_by="unit_price"),
+     lambda visual: bar_sort(visual)["FieldId"] == bar_wells(visual)["Values"][1]["NumericalMeasureField"]["FieldId"]),
+    ("Title", VisualEdit(title="Revenue by category"),
+     lambda visual: visual["BarChartVisual"]["Title"]["FormatText"]["PlainText"] == "Revenue by category"),
+    ("Combined", VisualEdit(visual_type="LineChartVisual", aggregation="AVERAGE", sort_direction="ASC"),
+     lambda visual: "LineChartVisual" in visual),
+]
+
+INVALID_EDITS = [
+    ("Empty Edit", VisualEdit()),
+    ("Unknown Visual", VisualEdit(visual_id="visual9", title="x")),
+    ("Unknown Type", VisualEdit(visual_type="SankeyDiagramVisual")),
+    ("Unknown Aggregation", VisualEdit(aggregation="median-ish")),
+    ("Unknown Measure", VisualEdit(aggregation="SUM", measure="colour")),
+    ("Bad Direction", VisualEdit(sort_direction="UP")),
+    ("Unknown Sort Field", VisualEdit(sort_by="colour")),
+    ("Unsortable Type", VisualEdit(visual_type="PivotTableVisual", sort_direction="ASC")),
+]
+
+
+def build_definition(*plans):
+    """Definition as the pipeline publishes it: one sheet, compiled visuals, datasets declared and a grid layout"""
+    definition = add_dataset_identifier(compile_definition(plans[0]))
+    sheet = definition["Definition"]["Sheets"][0]
+    for number, plan in enumerate(plans[1:], 2):
+        visual = compile_definition(plan)["Definition"]["Sheets"][0]["Visuals"][0]
+        next(iter(visual.values()))["VisualId"] = f"visual{number}"
+        sheet["Visuals"].append(visual)
+    sheet["Layouts"] = [{"Configuration": {"GridLayout": {"Elements": [
+        {"ElementId": next(iter(visual.values()))["VisualId"], "ElementType": "VISUAL", "ColumnSpan": 36, "RowSpan": 12}
+        for visual in sheet["Visuals"]
+    ]}}}]
+    return definition
+
+
+def first_visual(definition):
+    return definition["Definition"]["Sheets"][0]["Visuals"][0]
+
+
+def bar_wells(visual):
+    return visual["BarChartVisual"]["ChartConfiguration"]["FieldWells"]["BarChartAggregatedFieldWells"]
+
+
+def bar_sort(visual):
+    return visual["BarChartVisual"]["ChartConfiguration"]["SortConfiguration"]["CategorySort"][0]["FieldSort"]
+
+
+def diff_pairs():
+    """(name, old, new) definitions covering replaced, changed, added and removed elements"""
+    old = build_definition(BAR_PLAN)
+
+    retyped = build_definition(dict(BAR_PLAN, VISUAL_TYPE="PieChartVisual", FIELD_WELLS_TYPE="PieChartAggregatedFieldWells",
+                                    SORT_TYPE=None, SORT_DIRECTION=None))
+    aggregated = copy.deepcopy(old)
+    bar_wells(first_visual(aggregated))["Values"][0]["NumericalMeasureField"]["AggregationFunction"] = {
+        "SimpleNumericalAggregation": "AVERAGE"}
+    resorted = copy.deepcopy(old)
+    bar_sort(first_visual(resorted))["Direction"] = "ASC"
+    retitled = copy.deepcopy(old)
+    first_visual(retitled)["BarChartVisual"]["Title"] = {"FormatText": {"PlainText": "Revenue"}}
+    with_visual = build_definition(BAR_PLAN, LINE_PLAN)
+    with_sheet = copy.deepcopy(old)
+    second_sheet = copy.deepcopy(build_definition(LINE_PLAN)["Definition"]["Sheets"][0])
+    second_sheet["SheetId"] = "sheet2"
+    with_sheet["Definition"]["Sheets"].append(second_sheet)
+    reordered = build_definition(BAR_PLAN, LINE_PLAN)
+    reordered["Definition"]["Sheets"][0]["Visuals"].reverse()
+
+    return [
+        ("Visual Type", old, retyped),
+        ("Aggregation", old, aggregated),
+        ("Sort", old, resorted),
+        ("Title", old, retitled),
+        ("Added Visual", old, with_visual),
+        ("Removed Visual", with_visual, old),
+        ("Added Sheet", old, with_sheet),
+        ("Reordered Visuals", with_visual, reordered),
+        ("Unchanged", old, copy.deepcopy(old)),
+    ]
+
+
+class DefinitionPatchTester:
+    """Test suite for definition diffs and typed visual edits"""
+
+    def __init__(self):
+        self.test_results = []
+
+    def log_test(self, test_name: str, success: bool, message: str = ""):
+        """Log test results"""
+        status = "✅ PASS" if success else "❌ FAIL"
+        print(f"{status} {test_name}")
+        if message:
+            print(f"   └─ {message}")
+        self.test_results.append({'test': test_name, 'success': success, 'message': message})
+
+    def check(self, test_name: str, actual, expected):
+        """Compare actual and expected values and log the outcome"""
+        self.log_test(test_name, actual == expected, "" if actual == expected else f"expected {expected}, got {actual}")
+
+    def check_raises(self, test_name: str, error_type, func, *args):
+        """func(*args) raises error_type"""
+        try:
+            result = func(*args)
+            self.log_test(test_name, False, f"no error raised, got {result}")
+        except error_type:
+            self.log_test(test_name, True)
+        except Exception as e:
+            self.log_test(test_name, False, f"expected {error_type.__name__}, got {type(e).__name__}: {e}")
+
+    def test_round_trip(self):
+        """Applying the diff of two definitions to the first rebuilds the second"""
+        for name, old, new in diff_pairs():
+            before = copy.deepcopy(old)
+            operations = diff(old, new)
+            self.check(f"Round Trip: {name}", apply_patch(old, operations), new)
+            self.check(f"Original Unchanged: {name}", old, before)
+        self.check("No Changes, No Operations", diff(build_definition(BAR_PLAN), build_definition(BAR_PLAN)), [])
+
+    def test_edits(self):
+        """Each kind of edit changes the visual and keeps the definition valid"""
+        for name, edit, changed in EDITS:
+            definition = build_definition(BAR_PLAN)
+            before = copy.deepcopy(definition)
+            result = edit_visual(definition, edit)
+            self.check(f"Edit Valid: {name}", validate_definition(result.definition), [])
+            self.log_test(f"Edit Applied: {name}", bool(result.operations) and changed(first_visual(result.definition)))
+            self.check(f"Edit Patch Replays: {name}", apply_patch(definition, result.operations), result.definition)
+            self.check(f"Edit Input Unchanged: {name}", definition, before)
+
+        definition = build_definition(BAR_PLAN, LINE_PLAN)
+        result = edit_visual(definition, VisualEdit(visual_id="visual2", sort_direction="DESC"))
+        self.check("Edit By Visual Id Valid", validate_definition(result.definition), [])
+        self.check("Edit By Visual Id Target", result.visual_id, "visual2")
+        self.check("Edit By Visual Id Leaves Others", first_visual(result.definition), first_visual(definition))
+
+    def test_rejected(self):
+        """Edits that do not fit the visual and patches that do not resolve raise"""
+        definition = build_definition(BAR_PLAN)
+        for name, edit in INVALID_EDITS:
+            self.check_raises(f"Rejected: {name}", DefinitionEditError, edit_visual, definition, edit)
+        self.check_raises("Rejected: Ambiguous Visual", DefinitionEditError, edit_visual,
+                          build_definition(BAR_PLAN, LINE_PLAN), VisualEdit(title="x"))
+
+        missing_sheet = ("Definition", "Sheets", Match("SheetId", "sheet9"), "Name")
+        self.check_raises("Patch: Missing Element", PatchError, apply_patch, definition,
+                          [PatchOp(OP_REPLACE, missing_sheet, "x")])
+        self.check_raises("Patch: Missing Key", PatchError, apply_patch, definition,
+                          [PatchOp(OP_REMOVE, ("Definition", "Unknown"))])
+        self.check_raises("Patch: Document Root", PatchError, apply_patch, definition, [PatchOp(OP_REPLACE, (), {})])
+
+    def run_all_tests(self):
+        """Execute all definition patch tests"""
+        print("🚀 Starting Definition Patch Test Suite")
+        print("=" * 50)
+        for test_func in (self.test_round_trip, self.test_edits, self.test_rejected):
+            test_func()
+
+        passed = sum(1 for result in self.test_results if result['success'])
+        total = len(self.test_results)
+        print("\n" + "=" * 50)
+        print(f"Total Tests: {total}")
+        print(f"Passed: {passed}")
+        print(f"Failed: {total - passed}")
+        return passed == total
+
+
+def main():
+    """Main test execution function"""
+    tester = DefinitionPatchTester()
+    success = tester.run_all_tests()
+    sys.exit(0 if success else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Definition Validator Test Suite
+
+Offline tests for the QuickSight definition validator:
+- Compiled definitions of the common visual types pass
+- Mismatched field wells, sorts without a valid FieldId, empty calculated
+  fields, unknown columns and undeclared datasets are reported
+- Values of the wrong JSON type are reported instead of raising (fuzz)
+"""
+
+import copy
+import sys
+from pathlib import Path
+
+# Add project root to path
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.agents.tools.definition_compiler import compile_definition
+from src.agents.tools.definition_validator import validate_definition, ensure_valid_definition, DefinitionValidationError
+from src.agents.tools.visual_creator import add_dataset_identifier
+
+BAR_PLAN = {
+    "VISUAL_TYPE": "BarChartVisual",
+    "FIELD_WELLS_TYPE": "BarChartAggregatedFieldWells",
+    "DIMENSION_FIELDS": ["category"],
+    "MEASURE_FIELDS": ["item_total", "margin"],
+    "AGGREGATION_FUNCTION_REQUIRED": True,
+    "AGGREGATION_FUNCTIONS": ["SUM", "SUM"],
+    "SORT_TYPE": "FieldSort",
+    "SORT_DIRECTION": "DESC",
+    "CALCULATED_FIELDS_REQUIRED": True,
+    "CALCULATED_FIELDS": {"margin": "sum({item_total}) - sum({unit_price})"},
+}
+
+VALID_PLANS = [
+    BAR_PLAN,
+    {"VISUAL_TYPE": "LineChartVisual", "FIELD_WELLS_TYPE": "LineChartAggregatedFieldWells",
+     "DIMENSION_FIELDS": ["sale_date"], "MEASURE_FIELDS": ["total_amount"], "AGGREGATION_FUNCTION_REQUIRED": True,
+     "AGGREGATION_FUNCTIONS": ["SUM"], "SORT_TYPE": "FieldSort", "SORT_DIRECTION": "ASC", "DATE_GRANULARITY": "MONTH"},
+    {"VISUAL_TYPE": "PieChartVisual", "FIELD_WELLS_TYPE": "PieChartAggregatedFieldWells",
+     "DIMENSION_FIELDS": ["channel"], "MEASURE_FIELDS": ["total_amount"], "AGGREGATION_FUNCTION_REQUIRED": True,
+     "AGGREGATION_FUNCTIONS": ["SUM"]},
+    {"VISUAL_TYPE": "TableVisual", "FIELD_WELLS_TYPE": "TableAggregatedFieldWells",
+     "DIMENSION_FIELDS": ["brand"], "MEASURE_FIELDS": ["item_total"], "AGGREGATION_FUNCTION_REQUIRED": True,
+     "AGGREGATION_FUNCTIONS": ["AVERAGE"]},
+]
+
+# Keys whose value must be a string; a list or object there must be reported
+STRING_KEYS = {"SheetId", "VisualId", "FieldId", "ColumnName", "DataSetIdentifier", "Identifier", "Direction",
+               "SimpleNumericalAggregation", "ElementId", "Expression"}
+
+
+def build_definition(plan):
+    """Definition as the pipeline publishes it: compiled, with datasets declared and a grid layout"""
+    definition = add_dataset_identifier(compile_definition(plan))
+    sheet = definition["Definition"]["Sheets"][0]
+    visual_id = next(iter(sheet["Visuals"][0].values()))["VisualId"]
+    sheet["Layouts"] = [{"Configuration": {"GridLayout": {"Elements": [
+        {"ElementId": visual_id, "ElementType": "VISUAL", "ColumnSpan": 36, "RowSpan": 12}
+    ]}}}]
+    return definition
+
+
+def bar_visual(definition):
+    return definition["Definition"]["Sheets"][0]["Visuals"][0]["BarChartVisual"]
+
+
+def string_leaves(node, path=()):
+    """Paths of every string value in a JSON tree"""
+    if isinstance(node, dict):
+        for key, value in node.items():
+            yield from string_leaves(value, path + (key,))
+    elif isinstance(node, list):
+        for index, value in enumerate(node):
+            yield from string_leaves(value, path + (index,))
+    elif isinstance(node, str):
+        yield path
+
+
+def replaced(definition, path, value):
+    """Copy of the definition with the value at path replaced"""
+    result = copy.deepcopy(definition)
+    node = result
+    for key in path[:-1]:
+        node = node[key]
+    node[path[-1]] = value
+    return result
+
+
+class DefinitionValidatorTester:
+    """Test suite for the offline definition validator"""
+
+    def __init__(self):
+        self.test_results = []
+
+    def log_test(self, test_name: str, success: bool, message: str = ""):
+        """Log test results"""
+        status = "✅ PASS" if success else "❌ FAIL"
+        print(f"{status} {test_name}")
+        if message:
+            print(f"   └─ {message}")
+        self.test_results.append({'test': test_name, 'success': success, 'message': message})
+
+    def check(self, test_name: str, actual, expected):
+        """Compare actual and expected values and log the outcome"""
+        self.log_test(test_name, actual == expected, "" if actual == expected else f"expected {expected}, got {actual}")
+
+    def check_error(self, test_name: str, definition, fragment: str):
+        """The definition is rejected with an error mentioning fragment"""
+        errors = validate_definition(definition)
+        success = any(fragment in error for error in errors)
+        self.log_test(test_name, success, "" if success else f"expected an error with {fragment!r}, got {errors}")
+
+    def test_valid(self):
+        """Compiled definitions pass"""
+        for plan in VALID_PLANS:
+            self.check(f"Valid {plan['VISUAL_TYPE']}", validate_definition(build_definition(plan)), [])
+        definition = build_definition(BAR_PLAN)
+        self.check("Ensure Valid Returns Definition", ensure_valid_definition(definition) is definition, True)
+
+    def test_invalid(self):
+        """Each kind of invalid definition is reported"""
+        definition = build_definition(BAR_PLAN)
+
+        mismatched = copy.deepcopy(definition)
+        field_wells = bar_visual(mismatched)["ChartConfiguration"]["FieldWells"]
+        field_wells["PieChartAggregatedFieldWells"] = field_wells.pop("BarChartAggregatedFieldWells")
+        self.check_error("Mismatched Field Wells", mismatched, "field wells must be BarChartAggregatedFieldWells")
+
+        no_sort_field = copy.deepcopy(definition)
+        del bar_visual(no_sort_field)["ChartConfiguration"]["SortConfiguration"]["CategorySort"][0]["FieldSort"]["FieldId"]
+        self.check_error("Sort Without FieldId", no_sort_field, "FieldSort has no FieldId")
+
+        unknown_sort_field = copy.deepcopy(definition)
+        bar_visual(unknown_sort_field)["ChartConfiguration"]["SortConfiguration"]["CategorySort"][0]["FieldSort"]["FieldId"] = "brand"
+        self.check_error("Sort On Missing FieldId", unknown_sort_field, "which is not in the field wells")
+
+        bad_direction = copy.deepcopy(definition)
+        bar_visual(bad_direction)["ChartConfiguration"]["SortConfiguration"]["CategorySort"][0]["FieldSort"]["Direction"] = "UP"
+        self.check_error("Invalid Sort Direction", bad_direction, "Direction must be ASC or DESC")
+
+        empty_expression = copy.deepcopy(definition)
+        empty_expression["Definition"]["CalculatedFields"][0]["Expression"] = " "
+        self.check_error("Empty Calculated Field", empty_expression, "has an empty Expression")
+
+        unknown_column = copy.deepcopy(definition)
+        bar_visual(unknown_column)["ChartConfiguration"]["FieldWells"]["BarChartAggregatedFieldWells"]["Category"][0][
+            "CategoricalDimensionField"]["Column"]["ColumnName"] = "colour"
+        self.check_error("Unknown Column", unknown_column, "unknown column 'colour'")
+
+        undeclared = copy.deepcopy(definition)
+        undeclared["Definition"]["DataSetIdentifierDeclarations"][0]["Identifier"] = "other"
+        self.check_error("Undeclared Dataset", undeclared, "is not declared")
+
+        bad_layout = copy.deepcopy(definition)
+        bad_layout["Definition"]["Sheets"][0]["Layouts"][0]["Configuration"]["GridLayout"]["Elements"][0]["ElementId"] = "visual9"
+        self.check_error("Layout Element Not A Visual", bad_layout, "is not a visual of the sheet")
+
+        self.check("Missing Definition", validate_definition({}), ["Definition key not found in the json definition"])
+        try:
+            ensure_valid_definition(mismatched)
+            self.log_test("Ensure Valid Raises", False, "no error raised")
+        except DefinitionValidationError as e:
+            self.log_test("Ensure Valid Raises", bool(e.errors))
+
+    def test_fuzz_types(self):
+        """Every string value swapped for a list, an object or a number is reported, never raised"""
+        definition = build_definition(BAR_PLAN)
+        raised, unreported, checked = [], [], 0
+        for path in string_leaves(definition):
+            value = definition
+            for key in path:
+                value = value[key]
+            for bad_value in ([value], {"value": value}, 7):
+                checked += 1
+                try:
+                    errors = validate_definition(replaced(definition, path, bad_value))
+                except Exception as e:
+                    raised.append(f"{'/'.join(map(str, path))} = {bad_value!r}: {type(e).__name__}")
+                    continue
+                if path[-1] in STRING_KEYS and not errors:
+                    unreported.append(f"{'/'.join(map(str, path))} = {bad_value!r}")
+        self.log_test(f"Fuzz No Exceptions ({checked} cases)", not raised, "; ".join(raised[:5]))
+        self.log_test("Fuzz Bad Types Reported", not unreported, "; ".join(unreported[:5]))
+
+    def run_all_tests(self):
+        """Execute all definition validator tests"""
+        print("🚀 Starting Definition Validator Test Suite")
+        print("=" * 50)
+        for test_func in (self.test_valid, self.test_invalid, self.test_fuzz_types):
+            test_func()
+
+        passed = sum(1 for result in self.test_results if result['success'])
+        total = len(self.test_results)
+        print("\n" + "=" * 50)
+        print(f"Total Tests: {total}")
+        print(f"Passed: {passed}")
+        print(f"Failed: {total - passed}")
+        return passed == total
+
+
+def main():
+    """Main test execution function"""
+    tester = DefinitionValidatorTester()
+    success = tester.run_all_tests()
+    sys.exit(0 if success else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+SQL Parser Test Suite
+
+Offline tests for the local SQL breakdown engine used by the visual planner:
+- Column vs alias separation (AS and implicit aliases)
+- Table alias resolution (si.item_total)
+- Aggregate wrappers, CTEs and subqueries
+- Memoization by SQL hash
+"""
+
+import sys
+from pathlib import Path
+
+# Add project root to path
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.agents.tools.sql_parser import analyze_sql, extract_sql, SqlParseError, _sql_hash
+
+REVENUE_BY_CATEGORY_SQL = """
+SELECT p.category, SUM(si.item_total) AS total_revenue
+FROM public.dataset_fashion_store_salesitems si
+JOIN public.dataset_fashion_store_products p ON si.product_id = p.product_id
+GROUP BY p.category
+ORDER BY total_revenue DESC
+LIMIT 10;
+"""
+
+MONTHLY_CTE_SQL = """
+WITH monthly AS (
+    SELECT DATE_TRUNC('month', si.sale_date) AS month_start, SUM(si.item_total) revenue
+    FROM dataset_fashion_store_salesitems AS si
+    GROUP BY 1
+)
+SELECT m.month_start, m.revenue
+FROM monthly m
+WHERE m.revenue > (SELECT AVG(total_amount) FROM dataset_fashion_store_sales)
+"""
+
+SUBQUERY_SQL = """
+select x.brand, x.rev from (
+    select p.brand, sum(si.quantity * si.unit_price) as rev
+    from dataset_fashion_store_products p
+    left join dataset_fashion_store_salesitems si on si.product_id = p.product_id
+    group by p.brand
+) as x order by x.rev desc
+"""
+
+
+class SqlParserTester:
+    """Test suite for the local SQL parser"""
+
+    def __init__(self):
+        self.test_results = []
+
+    def log_test(self, test_name: str, success: bool, message: str = ""):
+        """Log test results"""
+        status = "✅ PASS" if success else "❌ FAIL"
+        print(f"{status} {test_name}")
+        if message:
+            print(f"   └─ {message}")
+        self.test_results.append({'test': test_name, 'success': success, 'message': message})
+
+    def check(self, test_name: str, actual, expected):
+        """Compare actual and expected values and log the outcome"""
+        self.log_test(test_name, actual == expected, "" if actual == expected else f"expected {expected}, got {actual}")
+
+    def test_aliases(self):
+        """Aliases are separated from real column names"""
+        breakdown = analyze_sql(REVENUE_BY_CATEGORY_SQL)
+        self.check("Alias Columns", breakdown["column_names"], ["category", "item_total", "product_id"])
+        self.check("Alias Tables", breakdown["table_names"], ["dataset_fashion_store_salesitems", "dataset_fashion_store_products"])
+        self.check("Table Aliases", breakdown["table_aliases"], {"si": "dataset_fashion_store_salesitems", "p": "dataset_fashion_store_products"})
+        self.check("Column Aliases", breakdown["column_aliases"], {"total_revenue": "SUM(si.item_total)"})
+        self.check("Aggregations", breakdown["aggregations"], {"SUM": ["item_total"]})
+        self.check("Row Filters", breakdown["row_filters"], ["LIMIT"])
+
+    def test_cte(self):
+        """CTE names and their output aliases are not reported as real tables/columns"""
+        breakdown = analyze_sql(MONTHLY_CTE_SQL)
+        self.check("CTE Columns", breakdown["column_names"], ["sale_date", "item_total", "total_amount"])
+        self.check("CTE Tables", breakdown["table_names"], ["dataset_fashion_store_salesitems", "dataset_fashion_store_sales"])
+        self.check("CTE Names", breakdown["derived_tables"], ["monthly"])
+        self.check("CTE Row Filters", breakdown["row_filters"], ["WHERE"])
+
+    def test_subquery(self):
+        """Derived tables in FROM are resolved through their alias"""
+        breakdown = analyze_sql(SUBQUERY_SQL)
+        self.check("Subquery Columns", breakdown["column_names"], ["brand", "quantity", "unit_price", "product_id"])
+        self.check("Subquery Tables", breakdown["table_names"], ["dataset_fashion_store_products", "dataset_fashion_store_salesitems"])
+        self.check("No Row Filters", breakdown["row_filters"], [])
+
+    def test_memoization(self):
+        """Equivalent SQL is served from the cache and callers get independent copies"""
+        first = analyze_sql(REVENUE_BY_CATEGORY_SQL)
+        first["column_names"].append("mutated")
+        second = analyze_sql("  " + REVENUE_BY_CATEGORY_SQL.replace("\n", " ") + "  ")
+        self.check("Memoized Copy", second["column_names"], ["category", "item_total", "product_id"])
+
+        brand_sql = "SELECT SUM(item_total) FROM dataset_fashion_store_salesitems WHERE brand = 'Zara'"
+        self.check("Cache Key Ignores Keyword Case", _sql_hash(brand_sql),
+                   _sql_hash("select  sum(item_total)\nfrom dataset_fashion_store_salesitems -- revenue\nwhere brand = 'Zara';"))
+        self.check("Cache Key Keeps Literal Case", _sql_hash(brand_sql) == _sql_hash(brand_sql.replace("Zara", "ZARA")), False)
+        self.check("Cache Key Keeps Quoted Identifier Case",
+                   _sql_hash('SELECT "Brand" FROM t') == _sql_hash('SELECT "brand" FROM t'), False)
+
+    def test_errors(self):
+        """Malformed SQL raises SqlParseError and free text yields no SQL"""
+        try:
+            analyze_sql("SELECT SUM(item_total FROM dataset_fashion_store_salesitems")
+            self.log_test("Unbalanced Parenthesis", False, "no error raised")
+        except SqlParseError:
+            self.log_test("Unbalanced Parenthesis", True)
+        self.check("Extract Without SQL", extract_sql("Create a bar chart of revenue"), None)
+        self.check("Extract Code Block", extract_sql("Chart this:\n```sql\nSELECT a FROM t\n```"), "SELECT a FROM t")
+
+    def run_all_tests(self):
+        """Execute all SQL parser tests"""
+        print("🚀 Starting SQL Parser Test Suite")
+        print("=" * 50)
+        for test_func in (self.test_aliases, self.test_cte, self.test_subquery, self.test_memoization, self.test_errors):
+            test_func()
+
+        passed = sum(1 for result in self.test_results if result['success'])
+        total = len(self.test_results)
+        print("\n" + "=" * 50)
+        print(f"Total Tests: {total}")
+        print(f"Passed: {passed}")
+        print(f"Failed: {total - passed}")
+        return passed == total
+
+
+def main():
+    """Main test execution function"""
+    tester = SqlParserTester()
+    success = tester.run_all_tests()
+    sys.exit(0 if success else 1)
+
+
+if __name__ == "__main__":
+    main()